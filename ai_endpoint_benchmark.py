@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the AI endpoints
+
+Drives the AI/ML, real-time AI, resource management and AI project
+generator routes in-process against the deterministic local LLM provider,
+at several concurrency levels, and reports p50/p99 latency (time to first
+token for streams, job completion for background AI jobs) together with
+event-loop lag measured by a probe running alongside the load.
+MongoDB is used as configured in backend/.env.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+# Offline provider with fast but non-trivial timing; any of these can be overridden from the shell
+os.environ.setdefault("LLM_GATEWAY_PROVIDER", "local")
+os.environ.setdefault("LLM_LOCAL_TTFT_MS", "150")
+os.environ.setdefault("LLM_LOCAL_TOKENS_PER_SECOND", "400")
+os.environ.setdefault("LLM_LOCAL_OUTPUT_TOKENS", "120")
+os.environ.setdefault("ENABLE_AI_CACHING", "false")  # measure the provider path, not cache hits
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', '.env'))
+
+from fastapi import FastAPI
+
+from auth.middleware import get_current_user
+from database import connect_to_mongo, close_mongo_connection
+from models.user import User
+from routes.ai_ml import router as ai_ml_router
+from routes.realtime_ai import router as realtime_ai_router
+from routes.resource_management import router as resource_management_router
+from routes.ai_project_generator import router as ai_project_generator_router
+from services.ai_job_service import ai_job_service
+from services.llm_gateway import llm_gateway
+
+CONCURRENCY_LEVELS = [1, 8, 32]
+REQUESTS_PER_LEVEL = 32
+PROBE_INTERVAL = 0.01
+JOB_POLL_INTERVAL = 0.02
+ORGANIZATION_ID = "benchmark-organization"
+COMPLETION_LABELS = {"response": "full response", "first_token": "first token", "job": "job completion"}
+
+PROJECT_SCOPE = {
+    "project_name": "Benchmark Portal",
+    "project_description": "Customer self-service portal used to benchmark document generation",
+    "project_objectives": ["Reduce support tickets", "Improve onboarding"],
+    "target_audience": "Existing enterprise customers",
+    "stakeholders": ["Support", "Product", "Engineering"],
+    "timeline": "6 months",
+    "business_domain": "Enterprise software"
+}
+
+# name, method, path, JSON body, how the request completes (response, first_token or job)
+SCENARIOS = [
+    ("ai-ml generate", "POST", "/api/ai-ml/generate",
+     {"prompt": "Summarise portfolio delivery risk for next quarter", "model": "gpt-4o"}, "response"),
+    ("ai-ml generate stream", "POST", "/api/ai-ml/generate/stream",
+     {"prompt": "Summarise portfolio delivery risk for next quarter", "model": "claude-3.5-sonnet"}, "first_token"),
+    ("ai-ml compare models", "POST", "/api/ai-ml/compare-models",
+     {"prompt": "Which projects should be paused?", "models": ["gpt-4o", "claude-3.5-sonnet", "gemini-2.0-pro"]}, "response"),
+    ("realtime ai-query stream", "POST", "/api/realtime-ai/sessions/benchmark-session/ai-query/stream",
+     {"query": "What is blocking the integration milestone?"}, "first_token"),
+    ("resource allocation job", "GET", "/api/resource-management/allocation/optimize", None, "job"),
+    ("project documents (2)", "POST", "/api/ai-project-generator/generate-documents",
+     {"project_scope": PROJECT_SCOPE, "document_types": ["project_charter", "risk_assessment"]}, "response"),
+    ("project documents stream (2)", "POST", "/api/ai-project-generator/generate-documents/stream",
+     {"project_scope": PROJECT_SCOPE, "document_types": ["project_charter", "risk_assessment"]}, "first_token"),
+]
+
+def build_app():
+    app = FastAPI()
+    app.include_router(ai_ml_router)
+    app.include_router(realtime_ai_router)
+    app.include_router(resource_management_router)
+    app.include_router(ai_project_generator_router, prefix="/api/ai-project-generator")
+
+    # A fresh user per request, so background jobs never supersede each other
+    def benchmark_user():
+        suffix = uuid.uuid4().hex[:8]
+        return User(
+            email=f"benchmark-{suffix}@example.com",
+            username=f"benchmark-{suffix}",
+            first_name="Benchmark",
+            last_name="User",
+            organization_id=ORGANIZATION_ID
+        )
+
+    app.dependency_overrides[get_current_user] = benchmark_user
+    return app
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+async def asgi_request(app, method, path, body):
+    """
+    Call the app directly so streamed bodies can be timed chunk by chunk;
+    returns (status, ms to first token event, ms to complete, body)
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"benchmark")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80)
+    }
+    request_sent = False
+    status_code = None
+    first_token_ms = None
+    chunks = []
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        nonlocal status_code, first_token_ms
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            chunks.append(chunk)
+            if first_token_ms is None and b"event: token" in chunk:
+                first_token_ms = (time.perf_counter() - started) * 1000
+
+    await app(scope, receive, send)
+    return status_code, first_token_ms, (time.perf_counter() - started) * 1000, b"".join(chunks)
+
+async def wait_for_job(job_id, started):
+    """Poll the job record until it finishes; returns ms since the request started"""
+    while True:
+        job = await ai_job_service.get_job(job_id, ORGANIZATION_ID)
+        if job and job["status"] not in ("queued", "running"):
+            return (time.perf_counter() - started) * 1000, job["status"] == "completed"
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+async def run_request(app, method, path, body, completion):
+    started = time.perf_counter()
+    status_code, first_token_ms, total_ms, content = await asgi_request(app, method, path, body)
+    if status_code != 200:
+        return None
+    if completion == "first_token":
+        return first_token_ms
+    if completion == "job":
+        job_ms, succeeded = await wait_for_job(json.loads(content)["ai_job_id"], started)
+        return job_ms if succeeded else None
+    return total_ms
+
+async def run_scenario(app, scenario, concurrency):
+    """Run REQUESTS_PER_LEVEL requests at the given concurrency while probing event-loop lag"""
+    name, method, path, body, completion = scenario
+    slots = asyncio.Semaphore(concurrency)
+    lags = []
+    stop = asyncio.Event()
+
+    async def probe():
+        # Lag is how late a short sleep wakes up: time the loop spent busy elsewhere
+        while not stop.is_set():
+            due = time.perf_counter() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(max(time.perf_counter() - due, 0) * 1000)
+
+    async def limited():
+        async with slots:
+            return await run_request(app, method, path, body, completion)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    results = await asyncio.gather(*[limited() for _ in range(REQUESTS_PER_LEVEL)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    latencies = [result for result in results if result is not None]
+    return {
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "errors": len(results) - len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "lag_p50": percentile(lags, 50),
+        "lag_p99": percentile(lags, 99),
+        "lag_max": max(lags) if lags else 0.0
+    }
+
+async def main():
+    print("🚀 AI endpoint latency benchmark")
+    print(f"    provider {llm_gateway.provider.name}, {REQUESTS_PER_LEVEL} requests per level, "
+          f"{llm_gateway.max_concurrent_per_provider} concurrent calls per LLM provider")
+
+    await connect_to_mongo()
+    app = build_app()
+    try:
+        for scenario in SCENARIOS:
+            print(f"\n📊 {scenario[0]} (latency to {COMPLETION_LABELS[scenario[4]]})")
+            print(f"    {'conc':>5} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>7} {'errors':>7} "
+                  f"{'lag p50':>8} {'lag p99':>8} {'lag max':>8}")
+            for concurrency in CONCURRENCY_LEVELS:
+                row = await run_scenario(app, scenario, concurrency)
+                print(f"    {concurrency:>5} {row['p50']:>9.1f} {row['p99']:>9.1f} {row['throughput']:>7.1f} "
+                      f"{row['errors']:>7} {row['lag_p50']:>8.2f} {row['lag_p99']:>8.2f} {row['lag_max']:>8.2f}")
+    finally:
+        await close_mongo_connection()
+
+    metrics = llm_gateway.get_metrics()
+    print(f"\n🔧 gateway: hedged {metrics['hedged']}, provider {metrics['provider_metrics']}")
+    for provider, lane in metrics["providers"].items():
+        print(f"    {provider:<10} completed {lane['completed']:>5}  failed {lane['failed']:>3}  "
+              f"timed out {lane['timed_out']:>3}  p50 {lane['latency_ms']['p50']:>8.1f} ms  "
+              f"p95 {lane['latency_ms']['p95']:>8.1f} ms  tokens in/out {lane['input_tokens']}/{lane['output_tokens']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,12 +3,14 @@
 
 from .multi_model_ai import MultiModelAIService
 from .predictive_analytics import PredictiveAnalyticsEngine
+from .model_registry import ModelRegistry
 from .skill_assessment import SkillAssessmentEngine
 from .integration_manager import AIIntegrationManager
 
 __all__ = [
     "MultiModelAIService",
     "PredictiveAnalyticsEngine", 
+    "ModelRegistry",
     "SkillAssessmentEngine",
     "AIIntegrationManager"
 ]
\ No newline at end of file
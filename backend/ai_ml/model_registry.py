@@ -0,0 +1,300 @@
+"""
+Model Registry
+Versioned, persisted predictive models trained off the request path
+"""
+import os
+import re
+import json
+import time
+import errno
+import shutil
+import asyncio
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from auth.rate_limiter import BoundedTTLCache
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ModelSpec:
+    """How a registry model is built and evaluated"""
+    factory: Callable[[], Any]
+    task: str  # regression or classification
+    min_samples: int
+
+MODEL_SPECS: Dict[str, ModelSpec] = {
+    "task_duration": ModelSpec(
+        factory=lambda: RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42),
+        task="regression",
+        min_samples=10
+    ),
+    "project_success": ModelSpec(
+        factory=lambda: RandomForestClassifier(n_estimators=150, max_depth=12, random_state=42),
+        task="classification",
+        min_samples=20
+    ),
+}
+
+# Staging directories older than this were left by a trainer that died mid-write
+STALE_STAGING_SECONDS = 7200
+
+@dataclass
+class LoadedModel:
+    """A model version held in memory for inference"""
+    key: str
+    organization_id: str
+    version: int
+    model: Any
+    scaler: StandardScaler
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+def organization_path(root_path: str, organization_id: str) -> str:
+    """Each organization's models live in their own directory"""
+    if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", organization_id):
+        component = organization_id
+    else:
+        component = "org-" + hashlib.sha256(organization_id.encode()).hexdigest()[:24]
+    return os.path.join(root_path, component)
+
+def _read_latest_version(model_dir: str) -> Optional[int]:
+    try:
+        with open(os.path.join(model_dir, "LATEST")) as latest_file:
+            return int(latest_file.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def train_model_version(
+    root_path: str,
+    key: str,
+    organization_id: str,
+    X: np.ndarray,
+    y: np.ndarray,
+    keep_versions: int = 5
+) -> Dict[str, Any]:
+    """
+    Fit, evaluate and persist a new version of an organization's model.
+
+    Module-level so it can run in a compute worker process; the serving
+    process picks the version up from disk. The version is written to a
+    staging directory and renamed into place, so readers never see a
+    partial version and concurrent trainers never share a directory.
+    """
+    spec = MODEL_SPECS[key]
+    if len(X) < spec.min_samples:
+        raise ValueError(f"{key} needs at least {spec.min_samples} samples, got {len(X)}")
+
+    started = time.perf_counter()
+    model_dir = os.path.join(organization_path(root_path, organization_id), key)
+
+    # Holdout metrics first, then refit on everything for the served model
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    holdout_scaler = StandardScaler().fit(X_train)
+    holdout_model = spec.factory().fit(holdout_scaler.transform(X_train), y_train)
+    y_pred = holdout_model.predict(holdout_scaler.transform(X_test))
+    if spec.task == "regression":
+        metrics = {
+            "mae": float(mean_absolute_error(y_test, y_pred)),
+            "r2": float(r2_score(y_test, y_pred)),
+        }
+    else:
+        metrics = {"accuracy": float(accuracy_score(y_test, y_pred))}
+    metrics["sample_size"] = len(X)
+
+    scaler = StandardScaler().fit(X)
+    model = spec.factory().fit(scaler.transform(X), y)
+
+    metadata = {
+        "key": key,
+        "organization_id": organization_id,
+        "trained_at": datetime.utcnow().isoformat(),
+        "training_seconds": round(time.perf_counter() - started, 3),
+        "metrics": metrics,
+        "estimator": type(model).__name__,
+    }
+
+    os.makedirs(model_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=model_dir)
+    try:
+        joblib.dump(model, os.path.join(staging_dir, "model.joblib"))
+        joblib.dump(scaler, os.path.join(staging_dir, "scaler.joblib"))
+
+        # Claim the next free version number by renaming the finished directory onto it
+        version = (_read_latest_version(model_dir) or 0) + 1
+        while True:
+            metadata["version"] = version
+            with open(os.path.join(staging_dir, "metadata.json"), "w") as metadata_file:
+                json.dump(metadata, metadata_file)
+            try:
+                os.rename(staging_dir, os.path.join(model_dir, f"v{version}"))
+                break
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                version += 1
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    # Never move LATEST backwards when a slower trainer finishes after a newer version
+    if version > (_read_latest_version(model_dir) or 0):
+        latest_tmp = os.path.join(model_dir, f".LATEST.{os.getpid()}")
+        with open(latest_tmp, "w") as latest_file:
+            latest_file.write(str(version))
+        os.replace(latest_tmp, os.path.join(model_dir, "LATEST"))
+
+    now = time.time()
+    for entry in os.listdir(model_dir):
+        path = os.path.join(model_dir, entry)
+        if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) <= version - keep_versions:
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.startswith(".staging-") and now - os.path.getmtime(path) > STALE_STAGING_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+    logger.info(f"Trained {key} v{version} for {organization_id} on {len(X)} samples: {metrics}")
+    return metadata
+
+class ModelRegistry:
+    """
+    Stores each organization's trained models as <root>/<organization>/<key>/v<version>/
+    with the estimator, scaler and metadata; <key>/LATEST names the current
+    version. Models are loaded lazily with numpy arrays memory-mapped, and
+    other workers' new versions are picked up on the next refresh check.
+    A Mongo lease lets only one worker train a given model at a time.
+    """
+
+    TRAINING_TIMEOUT_SECONDS = 1800
+    MAX_LOADED_MODELS = 256
+
+    def __init__(self, root_path: Optional[str] = None, keep_versions: int = 5, refresh_interval: float = 30.0):
+        self.root_path = root_path or os.getenv(
+            "ML_MODEL_REGISTRY_PATH",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model_registry")
+        )
+        self.keep_versions = keep_versions
+        self.refresh_interval = refresh_interval
+        # (organization_id, key) -> model; idle organizations' models are dropped
+        self._loaded = BoundedTTLCache(maxsize=self.MAX_LOADED_MODELS, ttl=3600)
+        self._checked_at = BoundedTTLCache(maxsize=self.MAX_LOADED_MODELS * 4, ttl=3600)
+        self._training: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._last_errors: Dict[Tuple[str, str], str] = {}
+
+    def _model_dir(self, key: str, organization_id: str) -> str:
+        return os.path.join(organization_path(self.root_path, organization_id), key)
+
+    def _latest_version(self, key: str, organization_id: str) -> Optional[int]:
+        return _read_latest_version(self._model_dir(key, organization_id))
+
+    # =============================================================================
+    # TRAINING
+    # =============================================================================
+
+    def train(self, key: str, organization_id: str, X: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+        """Fit and persist a new version in this process (blocking)"""
+        metadata = train_model_version(self.root_path, key, organization_id, X, y, self.keep_versions)
+        self._checked_at.pop((organization_id, key), None)
+        self.get(key, organization_id)
+        return metadata
+
+    async def schedule_training(self, key: str, organization_id: str, X: np.ndarray, y: np.ndarray) -> bool:
+        """Train on the compute executor; returns False if this model is already training on any worker"""
+        from services.leases import acquire_lease, release_lease
+
+        model_id = (organization_id, key)
+        running = self._training.get(model_id)
+        if running and not running.done():
+            return False
+
+        lease_name = f"model_training:{organization_id}:{key}"
+        if not await acquire_lease(lease_name, self.TRAINING_TIMEOUT_SECONDS):
+            return False
+
+        async def run():
+            from services.compute_executor import compute
+
+            try:
+                await compute(
+                    train_model_version, self.root_path, key, organization_id, X, y, self.keep_versions,
+                    timeout=self.TRAINING_TIMEOUT_SECONDS
+                )
+                self._last_errors.pop(model_id, None)
+                # Pick up the new version immediately rather than at the next refresh
+                self._checked_at.pop(model_id, None)
+                self.get(key, organization_id)
+            except Exception as e:
+                self._last_errors[model_id] = str(e)
+                logger.error(f"Model training failed for {key} ({organization_id}): {e}")
+            finally:
+                await release_lease(lease_name)
+
+        self._training = {model_id: task for model_id, task in self._training.items() if not task.done()}
+        self._training[model_id] = asyncio.create_task(run())
+        return True
+
+    def is_training(self, key: str, organization_id: str) -> bool:
+        running = self._training.get((organization_id, key))
+        return bool(running and not running.done())
+
+    # =============================================================================
+    # INFERENCE
+    # =============================================================================
+
+    def get(self, key: str, organization_id: str) -> Optional[LoadedModel]:
+        """Current version of an organization's model, loading it on first use or when a newer one exists"""
+        model_id = (organization_id, key)
+        loaded = self._loaded.get(model_id)
+        now = time.monotonic()
+        if loaded and now - self._checked_at.get(model_id, 0) < self.refresh_interval:
+            return loaded
+
+        self._checked_at[model_id] = now
+        version = self._latest_version(key, organization_id)
+        if version is None or (loaded and loaded.version == version):
+            return loaded
+
+        try:
+            version_dir = os.path.join(self._model_dir(key, organization_id), f"v{version}")
+            with open(os.path.join(version_dir, "metadata.json")) as metadata_file:
+                metadata = json.load(metadata_file)
+            loaded = LoadedModel(
+                key=key,
+                organization_id=organization_id,
+                version=version,
+                model=joblib.load(os.path.join(version_dir, "model.joblib"), mmap_mode="r"),
+                scaler=joblib.load(os.path.join(version_dir, "scaler.joblib")),
+                metadata=metadata
+            )
+            self._loaded[model_id] = loaded
+            logger.info(f"Loaded {key} v{version} for {organization_id}")
+        except Exception as e:
+            self._last_errors[model_id] = str(e)
+            logger.error(f"Failed to load {key} v{version} for {organization_id}: {e}")
+        return self._loaded.get(model_id)
+
+    def status(self, organization_id: str) -> Dict[str, Any]:
+        models = {}
+        for key in MODEL_SPECS:
+            loaded = self.get(key, organization_id)
+            models[key] = {
+                "version": loaded.version if loaded else None,
+                "trained_at": loaded.metadata.get("trained_at") if loaded else None,
+                "metrics": loaded.metadata.get("metrics", {}) if loaded else {},
+                "estimator": loaded.metadata.get("estimator") if loaded else None,
+                "training": self.is_training(key, organization_id),
+                "last_error": self._last_errors.get((organization_id, key)),
+            }
+        return models
+
+# Global instance
+model_registry = ModelRegistry()
@@ -5,7 +5,7 @@ Supports GPT-4o, Claude 3.5 Sonnet, and Gemini 2.0 Pro with Emergent Integration
 import os
 import asyncio
 import json
-from typing import Dict, List, Any, Optional, Union
+from typing import AsyncIterator, Dict, List, Any, Optional, Union
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
@@ -13,17 +13,29 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Import emergentintegrations
+from services.llm_cache import CachedLlmChat
+from services.llm_gateway import count_tokens, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+# Hosted models are reached through emergentintegrations; an offline gateway provider needs neither it nor a key
 try:
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    import emergentintegrations  # noqa: F401
     EMERGENT_AVAILABLE = True
-    logger = logging.getLogger(__name__)
     logger.info("Emergent integrations loaded successfully")
 except ImportError:
     EMERGENT_AVAILABLE = False
-    logger = logging.getLogger(__name__)
     logger.warning("emergentintegrations not available - using simulated responses")
 
+# Per-provider system prompt and the provider name expected by LlmChat.with_model
+SYSTEM_MESSAGES = {
+    "openai": "You are an advanced AI assistant specialized in enterprise portfolio management and resource optimization.",
+    "anthropic": "You are Claude, an AI assistant excelling at strategic analysis, systematic thinking, and comprehensive portfolio management insights.",
+    "google": "You are Gemini, a multi-modal AI assistant providing innovative solutions and multi-perspective analysis for enterprise portfolio management."
+}
+CHAT_PROVIDERS = {"openai": "openai", "anthropic": "anthropic", "google": "gemini"}
+PROVIDERS_BY_CHAT_NAME = {chat_name: provider for provider, chat_name in CHAT_PROVIDERS.items()}
+
 class MultiModelAIService:
     """Advanced AI service supporting multiple LLM providers"""
     
@@ -57,15 +69,21 @@ class MultiModelAIService:
         }
         self.session_cache = {}
     
+    def _llm_available(self) -> bool:
+        if getattr(llm_gateway.provider, "offline", False):
+            return True
+        return EMERGENT_AVAILABLE and bool(self.api_key)
+    
     async def generate_response(
         self,
         prompt: str,
         model: str = "gpt-4o",
         context: Optional[Dict[str, Any]] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        hedge: bool = True
     ) -> Dict[str, Any]:
-        """Generate AI response using specified model"""
+        """Generate AI response using specified model; hedge=False pins the answer to this model"""
         try:
             if model not in self.models:
                 raise ValueError(f"Unsupported model: {model}")
@@ -77,11 +95,11 @@ class MultiModelAIService:
             enhanced_prompt = self._enhance_prompt(prompt, context, model)
             
             if provider == "openai":
-                return await self._generate_openai(enhanced_prompt, model_config, temperature, max_tokens)
+                return await self._generate_openai(enhanced_prompt, model_config, temperature, max_tokens, hedge)
             elif provider == "anthropic":
-                return await self._generate_anthropic(enhanced_prompt, model_config, temperature, max_tokens)
+                return await self._generate_anthropic(enhanced_prompt, model_config, temperature, max_tokens, hedge)
             elif provider == "google":
-                return await self._generate_google(enhanced_prompt, model_config, temperature, max_tokens)
+                return await self._generate_google(enhanced_prompt, model_config, temperature, max_tokens, hedge)
                 
         except Exception as e:
             logger.error(f"AI generation error for {model}: {str(e)}")
@@ -92,9 +110,37 @@ class MultiModelAIService:
                 "timestamp": datetime.now().isoformat()
             }
     
-    async def _generate_openai(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int]) -> Dict[str, Any]:
+    async def stream_response(
+        self,
+        prompt: str,
+        model: str = "gpt-4o",
+        context: Optional[Dict[str, Any]] = None,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """Yield the AI response in chunks as the provider produces them"""
+        if model not in self.models:
+            raise ValueError(f"Unsupported model: {model}")
+        
+        if not self._llm_available():
+            result = await self.generate_response(prompt, model, context, temperature)
+            yield result["content"]
+            return
+        
+        model_config = self.models[model]
+        provider = model_config["provider"]
+        chat = CachedLlmChat(
+            api_key=self.api_key,
+            session_id=f"{provider}-stream-{datetime.now().timestamp()}",
+            system_message=SYSTEM_MESSAGES[provider],
+            temperature=temperature
+        ).with_model(CHAT_PROVIDERS[provider], model_config["model_id"])
+        
+        async for chunk in chat.stream_message(self._enhance_prompt(prompt, context, model)):
+            yield chunk
+    
+    async def _generate_openai(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int], hedge: bool = True) -> Dict[str, Any]:
         """Generate response using OpenAI GPT-4o"""
-        if not EMERGENT_AVAILABLE or not self.api_key:
+        if not self._llm_available():
             return {
                 "success": True,
                 "content": f"[Simulated GPT-4o Response] Advanced AI analysis: {prompt[:100]}... (Emergent integration not available)",
@@ -106,26 +152,18 @@ class MultiModelAIService:
         
         try:
             # Initialize chat with GPT-4o
-            chat = LlmChat(
+            chat = CachedLlmChat(
                 api_key=self.api_key,
                 session_id=f"openai-{datetime.now().timestamp()}",
-                system_message="You are an advanced AI assistant specialized in enterprise portfolio management and resource optimization."
+                system_message=SYSTEM_MESSAGES["openai"],
+                temperature=temperature,
+                hedge=hedge
             ).with_model("openai", config["model_id"])
             
-            # Create user message
-            user_message = UserMessage(text=prompt)
-            
             # Generate response
-            response = await chat.send_message(user_message)
+            response = await chat.send_message(prompt)
             
-            return {
-                "success": True,
-                "content": response,
-                "model": config["model_id"],
-                "provider": "openai",
-                "tokens_used": int(len(response.split()) * 1.3),  # Approximate token count
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._completion_result(chat, prompt, response)
             
         except Exception as e:
             logger.error(f"OpenAI generation error: {str(e)}")
@@ -137,9 +175,9 @@ class MultiModelAIService:
                 "timestamp": datetime.now().isoformat()
             }
     
-    async def _generate_anthropic(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int]) -> Dict[str, Any]:
+    async def _generate_anthropic(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int], hedge: bool = True) -> Dict[str, Any]:
         """Generate response using Claude 3.5 Sonnet"""
-        if not EMERGENT_AVAILABLE or not self.api_key:
+        if not self._llm_available():
             return {
                 "success": True,
                 "content": f"[Simulated Claude Response] Strategic enterprise analysis: {prompt[:100]}... (Emergent integration not available)",
@@ -151,26 +189,18 @@ class MultiModelAIService:
         
         try:
             # Initialize chat with Claude
-            chat = LlmChat(
+            chat = CachedLlmChat(
                 api_key=self.api_key,
                 session_id=f"anthropic-{datetime.now().timestamp()}",
-                system_message="You are Claude, an AI assistant excelling at strategic analysis, systematic thinking, and comprehensive portfolio management insights."
+                system_message=SYSTEM_MESSAGES["anthropic"],
+                temperature=temperature,
+                hedge=hedge
             ).with_model("anthropic", config["model_id"])
             
-            # Create user message
-            user_message = UserMessage(text=prompt)
-            
             # Generate response
-            response = await chat.send_message(user_message)
+            response = await chat.send_message(prompt)
             
-            return {
-                "success": True,
-                "content": response,
-                "model": config["model_id"],
-                "provider": "anthropic",
-                "tokens_used": int(len(response.split()) * 1.3),  # Approximate token count
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._completion_result(chat, prompt, response)
             
         except Exception as e:
             logger.error(f"Anthropic generation error: {str(e)}")
@@ -182,9 +212,9 @@ class MultiModelAIService:
                 "timestamp": datetime.now().isoformat()
             }
     
-    async def _generate_google(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int]) -> Dict[str, Any]:
+    async def _generate_google(self, prompt: str, config: Dict, temperature: float, max_tokens: Optional[int], hedge: bool = True) -> Dict[str, Any]:
         """Generate response using Gemini 2.0 Flash"""
-        if not EMERGENT_AVAILABLE or not self.api_key:
+        if not self._llm_available():
             return {
                 "success": True,
                 "content": f"[Simulated Gemini Response] Multi-modal enterprise insights: {prompt[:100]}... (Emergent integration not available)",
@@ -196,26 +226,18 @@ class MultiModelAIService:
         
         try:
             # Initialize chat with Gemini
-            chat = LlmChat(
+            chat = CachedLlmChat(
                 api_key=self.api_key,
                 session_id=f"google-{datetime.now().timestamp()}",
-                system_message="You are Gemini, a multi-modal AI assistant providing innovative solutions and multi-perspective analysis for enterprise portfolio management."
+                system_message=SYSTEM_MESSAGES["google"],
+                temperature=temperature,
+                hedge=hedge
             ).with_model("gemini", config["model_id"])
             
-            # Create user message
-            user_message = UserMessage(text=prompt)
-            
             # Generate response
-            response = await chat.send_message(user_message)
+            response = await chat.send_message(prompt)
             
-            return {
-                "success": True,
-                "content": response,
-                "model": config["model_id"],
-                "provider": "google",
-                "tokens_used": int(len(response.split()) * 1.3),  # Approximate token count
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._completion_result(chat, prompt, response)
             
         except Exception as e:
             logger.error(f"Google generation error: {str(e)}")
@@ -227,6 +249,19 @@ class MultiModelAIService:
                 "timestamp": datetime.now().isoformat()
             }
     
+    def _completion_result(self, chat: CachedLlmChat, prompt: str, response: str) -> Dict[str, Any]:
+        """Result of a completed chat, labelled with the model that answered (the fallback if hedging won)"""
+        answered = chat.last_completion
+        return {
+            "success": True,
+            "content": response,
+            "model": answered["model"],
+            "provider": PROVIDERS_BY_CHAT_NAME.get(answered["provider"], answered["provider"]),
+            "hedged": answered["hedged"],
+            "tokens_used": count_tokens(prompt, answered["model"]) + count_tokens(response, answered["model"]),
+            "timestamp": datetime.now().isoformat()
+        }
+    
     def _enhance_prompt(self, prompt: str, context: Optional[Dict[str, Any]], model: str) -> str:
         """Enhance prompt with context and model-specific optimizations"""
         if not context:
@@ -262,12 +297,13 @@ Please provide a comprehensive response considering the context above. Focus on
         if not models:
             models = ["gpt-4o", "claude-3.5-sonnet", "gemini-2.0-pro"]
         
-        tasks = []
-        for model in models:
-            if model in self.models:
-                tasks.append(self.generate_response(prompt, model, context))
+        models = [model for model in models if model in self.models]
         
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+        # Each call is bounded by the gateway deadline; no hedging, the point is to compare models
+        responses = await asyncio.gather(
+            *[self.generate_response(prompt, model, context, hedge=False) for model in models],
+            return_exceptions=True
+        )
         
         comparison = {
             "prompt": prompt,
@@ -2,19 +2,18 @@
 Predictive Analytics Engine
 Advanced machine learning for task duration, resource demand, and performance prediction
 """
+import asyncio
 import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 import json
 from dataclasses import dataclass
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, r2_score
 import pandas as pd
 
+from .model_registry import MODEL_SPECS, LoadedModel, ModelRegistry, model_registry
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -23,72 +22,62 @@ class PredictionResult:
     prediction: float
     confidence: float
     factors: Dict[str, float]
-    model_performance: Dict[str, float]
+    model_performance: Dict[str, Any]
+    timestamp: datetime
+
+@dataclass
+class BatchPredictionResult:
+    """Predictions for many rows scored together; factors are shared by the batch"""
+    predictions: np.ndarray
+    confidences: np.ndarray
+    factors: Dict[str, float]
+    model_performance: Dict[str, Any]
     timestamp: datetime
 
 class PredictiveAnalyticsEngine:
     """Advanced predictive analytics for enterprise portfolio management"""
     
-    def __init__(self):
-        self.models = {}
-        self.scalers = {}
+    # Upper bound on documents read per model when retraining from the database
+    TRAINING_SAMPLE_LIMIT = 50000
+    
+    def __init__(self, registry: Optional[ModelRegistry] = None):
+        self.registry = registry or model_registry
         self.feature_importance = {}
-        self.training_data = {}
-        self.model_performance = {}
         
     async def predict_task_duration(
         self,
         task_data: Dict[str, Any],
-        historical_data: List[Dict[str, Any]]
+        organization_id: str
     ) -> PredictionResult:
-        """Predict task duration based on historical data and task characteristics"""
+        """Predict task duration with the organization's model, trained on its own history"""
         try:
             # Extract features from task data
             features = self._extract_task_features(task_data)
             
-            # Prepare training data from historical tasks
-            X_train, y_train = self._prepare_duration_training_data(historical_data)
-            
-            if len(X_train) < 10:  # Need minimum data for training
-                return self._fallback_duration_prediction(task_data)
-            
-            # Train or update model
+            # Inference only; models are trained by the registry in the background
             model_key = "task_duration"
-            if model_key not in self.models:
-                self.models[model_key] = RandomForestRegressor(
-                    n_estimators=100,
-                    max_depth=10,
-                    random_state=42
-                )
-                self.scalers[model_key] = StandardScaler()
-            
-            # Scale features
-            X_train_scaled = self.scalers[model_key].fit_transform(X_train)
-            
-            # Train model
-            self.models[model_key].fit(X_train_scaled, y_train)
+            loaded = self.registry.get(model_key, organization_id)
+            if loaded is None:
+                return self._fallback_duration_prediction(task_data)
             
             # Make prediction
             feature_vector = np.array([features]).reshape(1, -1)
-            feature_vector_scaled = self.scalers[model_key].transform(feature_vector)
+            feature_vector_scaled = loaded.scaler.transform(feature_vector)
             
-            prediction = self.models[model_key].predict(feature_vector_scaled)[0]
-            confidence = self._calculate_prediction_confidence(
-                self.models[model_key], feature_vector_scaled, X_train_scaled, y_train
-            )
+            predictions, confidences = self._predict_with_confidence(loaded.model, feature_vector_scaled)
             
             # Calculate feature importance
             feature_names = self._get_task_feature_names()
             importance_dict = dict(zip(
                 feature_names,
-                self.models[model_key].feature_importances_
+                loaded.model.feature_importances_
             ))
             
             return PredictionResult(
-                prediction=max(1.0, prediction),  # Minimum 1 hour
-                confidence=confidence,
+                prediction=max(1.0, float(predictions[0])),  # Minimum 1 hour
+                confidence=float(confidences[0]),
                 factors=importance_dict,
-                model_performance=self._get_model_performance(model_key, X_train_scaled, y_train),
+                model_performance=self._get_model_performance(loaded),
                 timestamp=datetime.now()
             )
             
@@ -96,6 +85,39 @@ class PredictiveAnalyticsEngine:
             logger.error(f"Task duration prediction error: {str(e)}")
             return self._fallback_duration_prediction(task_data)
     
+    async def predict_task_durations_batch(self, tasks: List[Dict[str, Any]], organization_id: str) -> BatchPredictionResult:
+        """Predict durations for many tasks with one pass over the ensemble"""
+        loaded = self.registry.get("task_duration", organization_id)
+        if not tasks:
+            return BatchPredictionResult(
+                predictions=np.empty(0),
+                confidences=np.empty(0),
+                factors={},
+                model_performance=self._get_model_performance(loaded) if loaded else {},
+                timestamp=datetime.now()
+            )
+        if loaded is None:
+            fallbacks = [self._fallback_duration_prediction(task) for task in tasks]
+            return BatchPredictionResult(
+                predictions=np.array([result.prediction for result in fallbacks], dtype=float),
+                confidences=np.full(len(tasks), 0.5),
+                factors={"estimated_hours": 0.7, "complexity_score": 0.3},
+                model_performance={"mae": 0.0, "r2": 0.0, "sample_size": 0},
+                timestamp=datetime.now()
+            )
+        
+        # Build the feature matrix once and score every row together
+        X = np.array([self._extract_task_features(task) for task in tasks], dtype=float).reshape(len(tasks), -1)
+        predictions, confidences = self._predict_with_confidence(loaded.model, loaded.scaler.transform(X))
+        
+        return BatchPredictionResult(
+            predictions=np.maximum(predictions, 1.0),  # Minimum 1 hour
+            confidences=confidences,
+            factors=dict(zip(self._get_task_feature_names(), loaded.model.feature_importances_)),
+            model_performance=self._get_model_performance(loaded),
+            timestamp=datetime.now()
+        )
+    
     async def predict_resource_demand(
         self,
         project_data: Dict[str, Any],
@@ -134,48 +156,33 @@ class PredictiveAnalyticsEngine:
         self,
         project_data: Dict[str, Any],
         team_assignments: List[Dict[str, Any]],
-        historical_projects: List[Dict[str, Any]]
+        organization_id: str
     ) -> PredictionResult:
         """Predict probability of project success based on multiple factors"""
         try:
             # Extract comprehensive project features
             features = self._extract_success_factors(project_data, team_assignments)
             
-            # Prepare training data
-            X_train, y_train = self._prepare_success_training_data(historical_projects)
-            
-            if len(X_train) < 20:
-                return self._fallback_success_prediction(project_data)
-            
-            # Train classification model
+            # Inference only; models are trained by the registry in the background
             model_key = "project_success"
-            if model_key not in self.models:
-                from sklearn.ensemble import RandomForestClassifier
-                self.models[model_key] = RandomForestClassifier(
-                    n_estimators=150,
-                    max_depth=12,
-                    random_state=42
-                )
-                self.scalers[model_key] = StandardScaler()
-            
-            # Scale and train
-            X_train_scaled = self.scalers[model_key].fit_transform(X_train)
-            self.models[model_key].fit(X_train_scaled, y_train)
+            loaded = self.registry.get(model_key, organization_id)
+            if loaded is None:
+                return self._fallback_success_prediction(project_data)
             
             # Make prediction
             feature_vector = np.array([features]).reshape(1, -1)
-            feature_vector_scaled = self.scalers[model_key].transform(feature_vector)
+            feature_vector_scaled = loaded.scaler.transform(feature_vector)
             
-            success_probability = self.models[model_key].predict_proba(feature_vector_scaled)[0][1]
+            success_probability = loaded.model.predict_proba(feature_vector_scaled)[0][1]
             
             # Calculate risk factors
             risk_factors = self._identify_risk_factors(project_data, team_assignments)
             
             return PredictionResult(
                 prediction=success_probability,
-                confidence=0.85,  # Model confidence based on cross-validation
+                confidence=loaded.metadata.get("metrics", {}).get("accuracy", 0.85),
                 factors=risk_factors,
-                model_performance=self._get_model_performance(model_key, X_train_scaled, y_train),
+                model_performance=self._get_model_performance(loaded),
                 timestamp=datetime.now()
             )
             
@@ -247,50 +254,34 @@ class PredictiveAnalyticsEngine:
         
         return np.array(X), np.array(y)
     
-    def _calculate_prediction_confidence(
-        self, model, feature_vector, X_train, y_train
-    ) -> float:
-        """Calculate prediction confidence based on model performance and data similarity"""
-        try:
-            # Get prediction variance from ensemble
-            if hasattr(model, 'estimators_'):
-                predictions = [tree.predict(feature_vector)[0] for tree in model.estimators_]
-                variance = np.var(predictions)
-                confidence = 1.0 / (1.0 + variance / np.mean(predictions))
-            else:
-                confidence = 0.7  # Default confidence
-            
-            return min(0.95, max(0.3, confidence))
-            
-        except Exception:
-            return 0.7
+    def _predict_with_confidence(self, model, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Predictions and ensemble-spread confidence for every row of X"""
+        if not hasattr(model, 'estimators_'):
+            return model.predict(X), np.full(len(X), 0.7)  # Default confidence
+        
+        # One predict call per tree over all rows, stacked to (n_trees, n_rows);
+        # the forest's prediction is the mean across trees
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        per_tree = np.stack([tree.predict(X, check_input=False) for tree in model.estimators_])
+        predictions = per_tree.mean(axis=0)
+        return predictions, self._calculate_prediction_confidence(per_tree)
     
-    def _get_model_performance(self, model_key: str, X_train: np.ndarray, y_train: np.ndarray) -> Dict[str, float]:
-        """Calculate and cache model performance metrics"""
-        try:
-            if len(X_train) < 10:
-                return {"mae": 0.0, "r2": 0.0, "sample_size": len(X_train)}
-            
-            X_train_split, X_test_split, y_train_split, y_test_split = train_test_split(
-                X_train, y_train, test_size=0.2, random_state=42
-            )
-            
-            model = self.models[model_key]
-            model.fit(X_train_split, y_train_split)
-            y_pred = model.predict(X_test_split)
-            
-            performance = {
-                "mae": float(mean_absolute_error(y_test_split, y_pred)),
-                "r2": float(r2_score(y_test_split, y_pred)),
-                "sample_size": len(X_train)
-            }
-            
-            self.model_performance[model_key] = performance
-            return performance
-            
-        except Exception as e:
-            logger.error(f"Model performance calculation error: {str(e)}")
-            return {"mae": 0.0, "r2": 0.0, "sample_size": 0}
+    def _calculate_prediction_confidence(self, per_tree: np.ndarray) -> np.ndarray:
+        """Confidence per row from the variance of per-tree predictions"""
+        means = per_tree.mean(axis=0)
+        variances = per_tree.var(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = 1.0 / (1.0 + variances / means)
+        confidence = np.where(means > 0, confidence, 0.3)
+        return np.clip(np.nan_to_num(confidence, nan=0.7), 0.3, 0.95)
+    
+    def _get_model_performance(self, loaded: LoadedModel) -> Dict[str, Any]:
+        """Holdout metrics recorded when the served model version was trained"""
+        return {
+            **loaded.metadata.get("metrics", {}),
+            "model_version": loaded.version,
+            "trained_at": loaded.metadata.get("trained_at")
+        }
     
     def _fallback_duration_prediction(self, task_data: Dict[str, Any]) -> PredictionResult:
         """Fallback prediction when insufficient training data"""
@@ -655,11 +646,70 @@ class PredictiveAnalyticsEngine:
         
         return min(1.0, match_ratio)
     
-    def get_model_status(self) -> Dict[str, Any]:
-        """Get current status of all predictive models"""
+    # =============================================================================
+    # TRAINING
+    # =============================================================================
+    
+    async def load_training_data(self, db, model_key: str, organization_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Build a model's training set from one organization's finished tasks or projects"""
+        if model_key == "task_duration":
+            # Older tasks carry no organization_id; they belong to it through their project
+            project_ids = await db.projects.distinct("id", {"organization_id": organization_id})
+            tasks = await db.tasks.find({
+                "status": "completed",
+                "actual_hours": {"$gt": 0},
+                "$or": [{"organization_id": organization_id}, {"project_id": {"$in": project_ids}}]
+            }).sort("updated_at", -1).limit(self.TRAINING_SAMPLE_LIMIT).to_list(length=None)
+            return self._prepare_duration_training_data(tasks)
+        
+        projects = await db.projects.find(
+            {"organization_id": organization_id, "status": {"$in": ["completed", "cancelled", "failed"]}}
+        ).sort("updated_at", -1).limit(self.TRAINING_SAMPLE_LIMIT).to_list(length=None)
+        return self._prepare_success_training_data(projects)
+    
+    async def retrain_from_database(
+        self,
+        db,
+        organization_id: str,
+        model_keys: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Start background training for each of an organization's models with enough history"""
+        results = {}
+        for model_key in model_keys or list(MODEL_SPECS):
+            X, y = await self.load_training_data(db, model_key, organization_id)
+            min_samples = MODEL_SPECS[model_key].min_samples
+            if len(X) < min_samples:
+                results[model_key] = {"scheduled": False, "reason": f"{len(X)} samples, need {min_samples}"}
+            elif not await self.registry.schedule_training(model_key, organization_id, X, y):
+                results[model_key] = {"scheduled": False, "reason": "training already in progress"}
+            else:
+                results[model_key] = {"scheduled": True, "sample_size": len(X)}
+        return results
+    
+    async def run_scheduled_training(self, interval_seconds: float):
+        """Retrain every organization's models once per interval, on whichever worker holds the lease"""
+        from database import get_database
+        from services.leases import acquire_lease
+        
+        while True:
+            try:
+                # The lease is held for the whole interval so other workers skip this round
+                if await acquire_lease("model_training_schedule", interval_seconds):
+                    db = await get_database()
+                    for organization_id in await db.projects.distinct("organization_id"):
+                        if organization_id:
+                            results = await self.retrain_from_database(db, organization_id)
+                            logger.info(f"Scheduled model training for {organization_id}: {results}")
+            except Exception as e:
+                logger.error(f"Scheduled model training error: {str(e)}")
+            await asyncio.sleep(interval_seconds)
+    
+    def get_model_status(self, organization_id: str) -> Dict[str, Any]:
+        """Get current status of an organization's predictive models"""
+        models = self.registry.status(organization_id)
         return {
-            "models_trained": list(self.models.keys()),
-            "model_performance": self.model_performance,
-            "last_updated": datetime.now().isoformat(),
-            "total_predictions": sum(1 for _ in self.models.values())
-        }
\ No newline at end of file
+            "models_trained": [key for key, info in models.items() if info["version"] is not None],
+            "models": models,
+            "registry_path": self.registry.root_path,
+            "last_updated": datetime.now().isoformat()
+        }
@@ -2,17 +2,26 @@
 Real-time AI-Powered Collaboration Engine
 WebSocket-based real-time features with AI assistance
 """
+import os
 import asyncio
 import json
 import logging
-from typing import Dict, List, Any, Optional, Set
+from collections import Counter, deque
+from typing import Deque, Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime
 from dataclasses import dataclass, asdict
 from fastapi import WebSocket
 import uuid
 
+from auth.rate_limiter import BoundedTTLCache
+from services.websocket_fanout import WebSocketFanout, ConnectionChannel, serialize_message
+
 logger = logging.getLogger(__name__)
 
+COLLABORATION_EVENT_BUFFER_SIZE = int(os.getenv("COLLABORATION_EVENT_BUFFER_SIZE", "200"))  # frames kept per session
+COLLABORATION_MAX_SESSION_LOGS = int(os.getenv("COLLABORATION_MAX_SESSION_LOGS", "1000"))
+COLLABORATION_SESSION_LOG_TTL_SECONDS = int(os.getenv("COLLABORATION_SESSION_LOG_TTL_SECONDS", "3600"))
+
 @dataclass
 class CollaborationEvent:
     """Real-time collaboration event"""
@@ -35,15 +44,63 @@ class AIAssistantSession:
     created_at: datetime
     last_activity: datetime
 
+class SessionEventLog:
+    """
+    Recent frames broadcast to one session, in a ring buffer, with running
+    event counters.
+
+    Every frame is stamped with the next sequence number and this log's
+    epoch. Sequence numbers are assigned by each worker, so a client's
+    ``since`` is only meaningful against the epoch it was issued in: a
+    client that reconnects to a different worker (or after a restart) gets
+    ``resync_required`` rather than a replay. Replay across workers would
+    need a shared counter and frame store written on every frame, like the
+    timeline's task patches; collaboration frames include high-rate cursor
+    and typing events, so the log stays in process and deployments that
+    want replay route a session's clients to one worker.
+    """
+
+    def __init__(self, size: int = COLLABORATION_EVENT_BUFFER_SIZE):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.frames: Deque[Tuple[int, str]] = deque(maxlen=size)
+        self.total_events = 0
+        self.ai_enhanced_events = 0
+        self.event_types: Counter = Counter()
+        self.created_at = datetime.now()
+    
+    def append(self, message: Dict[str, Any]) -> str:
+        """Stamp, record and serialize one frame"""
+        self.seq += 1
+        text = serialize_message({**message, "seq": self.seq, "epoch": self.epoch})
+        self.frames.append((self.seq, text))
+        return text
+    
+    def frames_since(self, seq: int, epoch: Optional[str]) -> Optional[List[str]]:
+        """Frames after ``seq``, or None when they cannot all be replayed"""
+        if epoch != self.epoch or seq > self.seq:
+            return None  # issued by another worker or an earlier log
+        oldest = self.frames[0][0] if self.frames else self.seq + 1
+        if seq + 1 < oldest:
+            return None  # evicted from the ring
+        return [text for frame_seq, text in self.frames if frame_seq > seq]
+    
+    def record_event(self, event: CollaborationEvent):
+        self.total_events += 1
+        self.event_types[event.event_type] += 1
+
 class RealTimeCollaborationEngine:
     """Advanced real-time collaboration with AI assistance"""
     
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.user_sessions: Dict[str, str] = {}  # user_id -> session_id
+        # Session id -> connections, each with its own bounded send queue; relayed to other workers
+        self.fanout = WebSocketFanout("realtime_collaboration", sequencer=self._sequence_frame)
+        self.user_sessions: Dict[str, Dict[str, str]] = {}  # user_id -> connection_id -> session_id, one per tab
         self.session_users: Dict[str, Set[str]] = {}  # session_id -> user_ids
         self.ai_assistants: Dict[str, AIAssistantSession] = {}
-        self.collaboration_events: List[CollaborationEvent] = []
+        # Bounded event history per session; kept a while after the last user leaves so they can resume
+        self.session_logs = BoundedTTLCache(maxsize=COLLABORATION_MAX_SESSION_LOGS, ttl=COLLABORATION_SESSION_LOG_TTL_SECONDS)
+        self.total_events = 0
         self.event_handlers = self._initialize_event_handlers()
     
     def _initialize_event_handlers(self) -> Dict[str, callable]:
@@ -59,13 +116,43 @@ class RealTimeCollaborationEngine:
             "smart_notifications": self.handle_smart_notifications
         }
     
-    async def connect_user(self, websocket: WebSocket, user_id: str, session_id: str):
-        """Connect user to real-time collaboration"""
+    def session_log(self, session_id: str) -> SessionEventLog:
+        log = self.session_logs.get(session_id)
+        if log is None:
+            log = SessionEventLog()
+        # Re-stored on every use, so an active session's log never expires
+        self.session_logs[session_id] = log
+        return log
+    
+    def _sequence_frame(self, session_id: str, message: Dict[str, Any]) -> str:
+        return self.session_log(session_id).append(message)
+    
+    async def connect_user(
+        self,
+        websocket: WebSocket,
+        user_id: str,
+        session_id: str,
+        since: Optional[int] = None,
+        epoch: Optional[str] = None
+    ) -> ConnectionChannel:
+        """Connect user to real-time collaboration, replaying frames missed since a sequence number"""
         await websocket.accept()
         
-        connection_id = f"{user_id}_{session_id}_{uuid.uuid4().hex[:8]}"
-        self.active_connections[connection_id] = websocket
-        self.user_sessions[user_id] = session_id
+        backlog = []
+        if since is not None:
+            log = self.session_log(session_id)
+            backlog = log.frames_since(since, epoch)
+            if backlog is None:
+                backlog = [serialize_message({
+                    "type": "resync_required",
+                    "session_id": session_id,
+                    "seq": log.seq,
+                    "epoch": log.epoch,
+                    "timestamp": datetime.now().isoformat()
+                })]
+        
+        channel = await self.fanout.register(websocket, session_id, user_id, backlog=backlog)
+        self.user_sessions.setdefault(user_id, {})[channel.connection_id] = session_id
         
         if session_id not in self.session_users:
             self.session_users[session_id] = set()
@@ -79,43 +166,46 @@ class RealTimeCollaborationEngine:
             "type": "user_connected",
             "user_id": user_id,
             "timestamp": datetime.now().isoformat(),
-            "active_users": list(self.session_users[session_id])
+            "active_users": await self.get_session_users(session_id)
         })
         
         logger.info(f"User {user_id} connected to session {session_id}")
+        return channel
     
-    async def disconnect_user(self, user_id: str, session_id: str):
+    async def disconnect_user(self, channel: ConnectionChannel):
         """Disconnect user from real-time collaboration"""
-        # Remove from active connections
-        connection_keys_to_remove = [
-            key for key in self.active_connections.keys() 
-            if key.startswith(f"{user_id}_{session_id}")
-        ]
-        
-        for key in connection_keys_to_remove:
-            if key in self.active_connections:
-                del self.active_connections[key]
+        user_id, session_id = channel.user_id, channel.group
+        await self.fanout.unregister(channel)
+        
+        tabs = self.user_sessions.get(user_id, {})
+        tabs.pop(channel.connection_id, None)
+        if not tabs:
+            self.user_sessions.pop(user_id, None)
+        
+        # The user stays in the session while another of their connections is open, on any worker
+        active_users = await self.get_session_users(session_id)
+        if user_id in active_users:
+            logger.info(f"User {user_id} closed one of several connections to session {session_id}")
+            return
         
         # Remove from session
         if session_id in self.session_users:
             self.session_users[session_id].discard(user_id)
             
             if not self.session_users[session_id]:
-                # Last user left, clean up session
+                # Last user on this worker left, clean up the worker's session state
                 del self.session_users[session_id]
                 if session_id in self.ai_assistants:
                     del self.ai_assistants[session_id]
-            else:
-                # Notify remaining users
-                await self.broadcast_to_session(session_id, {
-                    "type": "user_disconnected",
-                    "user_id": user_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "active_users": list(self.session_users[session_id])
-                })
         
-        if user_id in self.user_sessions:
-            del self.user_sessions[user_id]
+        if active_users:
+            # Notify remaining users, wherever they are connected
+            await self.broadcast_to_session(session_id, {
+                "type": "user_disconnected",
+                "user_id": user_id,
+                "timestamp": datetime.now().isoformat(),
+                "active_users": active_users
+            })
         
         logger.info(f"User {user_id} disconnected from session {session_id}")
     
@@ -154,8 +244,9 @@ class RealTimeCollaborationEngine:
     async def handle_collaboration_event(self, event: CollaborationEvent):
         """Handle incoming collaboration event"""
         try:
-            # Add to event history
-            self.collaboration_events.append(event)
+            # Count the event; its broadcasts are recorded in the session's ring buffer
+            self.total_events += 1
+            self.session_log(event.session_id).record_event(event)
             
             # Get appropriate handler
             handler = self.event_handlers.get(event.event_type)
@@ -167,6 +258,7 @@ class RealTimeCollaborationEngine:
             # Check if AI enhancement is needed
             if await self.should_enhance_with_ai(event):
                 await self.enhance_event_with_ai(event)
+                self.session_log(event.session_id).ai_enhanced_events += 1
         
         except Exception as e:
             logger.error(f"Error handling collaboration event: {str(e)}")
@@ -416,23 +508,16 @@ class RealTimeCollaborationEngine:
     
     async def broadcast_to_session(self, session_id: str, message: Dict[str, Any]):
         """Broadcast message to all users in a session"""
-        if session_id not in self.session_users:
-            return
-        
-        message_json = json.dumps(message)
-        
-        # Send to all users in the session
-        for user_id in self.session_users[session_id]:
-            user_connections = [
-                conn for conn_id, conn in self.active_connections.items()
-                if conn_id.startswith(f"{user_id}_{session_id}")
-            ]
-            
-            for websocket in user_connections:
-                try:
-                    await websocket.send_text(message_json)
-                except Exception as e:
-                    logger.error(f"Error sending message to {user_id}: {str(e)}")
+        # Serialized once and queued per connection; slow clients never hold up the rest
+        await self.fanout.broadcast(session_id, message)
+    
+    async def send_to_user(self, user_id: str, message: Dict[str, Any]):
+        """Send message to every connection of a user, across sessions"""
+        await self.fanout.send_to_user(user_id, message)
+    
+    async def get_session_users(self, session_id: str) -> List[str]:
+        """Users connected to a session on any worker"""
+        return await self.fanout.presence.users(self.fanout.name, session_id)
     
     async def should_enhance_with_ai(self, event: CollaborationEvent) -> bool:
         """Determine if event should be enhanced with AI"""
@@ -576,14 +661,16 @@ class RealTimeCollaborationEngine:
         if session_id not in self.session_users:
             return {"error": "Session not found"}
         
-        session_events = [e for e in self.collaboration_events if e.session_id == session_id]
+        log = self.session_log(session_id)
         
         return {
             "session_id": session_id,
             "active_users": list(self.session_users[session_id]),
-            "total_events": len(session_events),
-            "ai_enhanced_events": len([e for e in session_events if e.ai_enhanced]),
-            "event_types": list(set([e.event_type for e in session_events])),
+            "total_events": log.total_events,
+            "ai_enhanced_events": log.ai_enhanced_events,
+            "event_types": list(log.event_types),
+            "last_sequence": log.seq,
+            "epoch": log.epoch,
             "session_duration": self._calculate_session_duration(session_id),
             "ai_assistant_active": session_id in self.ai_assistants
         }
@@ -4,6 +4,10 @@ Authentication module for Enterprise Portfolio Management API
 from .utils import (
     hash_password,
     verify_password,
+    hash_password_async,
+    verify_password_async,
+    verify_and_update_password_async,
+    password_hashing_pool,
     create_access_token,
     create_refresh_token,
     verify_token,
@@ -24,6 +28,10 @@ from .middleware import (
 __all__ = [
     "hash_password",
     "verify_password", 
+    "hash_password_async",
+    "verify_password_async",
+    "verify_and_update_password_async",
+    "password_hashing_pool",
     "create_access_token",
     "create_refresh_token",
     "verify_token",
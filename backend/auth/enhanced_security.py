@@ -17,6 +17,7 @@ from models.user import User, UserRole
 from models.security import SecurityEventType, RiskLevel, MFAConfiguration
 from auth.utils import verify_token, TokenData
 from auth.middleware import get_current_user
+from auth.rate_limiter import BoundedTTLCache, TokenBucketRateLimiter, create_rate_limit_backend
 from services.security_service import SecurityService
 
 logger = logging.getLogger(__name__)
@@ -26,11 +27,18 @@ security_service = SecurityService()
 class EnhancedSecurityMiddleware:
     """Enhanced security middleware with zero-trust principles"""
     
-    def __init__(self):
-        self.suspicious_activities = {}
-        self.failed_attempts = {}
-        self.rate_limits = {}
-        self.trusted_devices = {}
+    def __init__(self, rate_limit_backend=None):
+        # Bounded so per-IP and per-user state cannot grow for the life of the process
+        self.suspicious_activities = BoundedTTLCache(maxsize=50_000, ttl=24 * 3600)
+        self.failed_attempts = BoundedTTLCache(maxsize=100_000, ttl=3600)
+        self.trusted_devices = BoundedTTLCache(maxsize=100_000, ttl=30 * 24 * 3600)
+        
+        # 100 requests per 5 minutes per client, shared across workers
+        self.rate_limiter = TokenBucketRateLimiter(
+            rate_limit_backend or create_rate_limit_backend(),
+            rate=100,
+            period=300
+        )
     
     async def verify_zero_trust_access(
         self,
@@ -212,7 +220,7 @@ class EnhancedSecurityMiddleware:
             risk_score += role_risk.get(user.role, 0)
             
             # Rate limiting check
-            if self._is_rate_limited(client_ip):
+            if await self._is_rate_limited(client_ip):
                 risk_score += 30
             
             return min(100, max(0, risk_score))
@@ -321,31 +329,19 @@ class EnhancedSecurityMiddleware:
         known_ips = self.trusted_devices.get(f"location_{user_id}", set())
         return ip_address in known_ips
     
-    def _is_rate_limited(self, identifier: str) -> bool:
+    async def _is_rate_limited(self, identifier: str) -> bool:
         """Check if identifier is rate limited"""
-        try:
-            current_time = datetime.utcnow()
-            
-            if identifier not in self.rate_limits:
-                self.rate_limits[identifier] = {"count": 1, "window_start": current_time}
-                return False
-            
-            rate_data = self.rate_limits[identifier]
-            
-            # Reset window if expired (5 minute window)
-            if current_time - rate_data["window_start"] > timedelta(minutes=5):
-                self.rate_limits[identifier] = {"count": 1, "window_start": current_time}
-                return False
-            
-            # Increment counter
-            rate_data["count"] += 1
-            
-            # Check if rate limit exceeded (100 requests per 5 minutes)
-            return rate_data["count"] > 100
-            
-        except Exception as e:
-            logger.error(f"Rate limit check failed: {e}")
-            return False
+        decision = await self.rate_limiter.check(identifier, scope="zero_trust")
+        return not decision.allowed
+    
+    def get_rate_limit_metrics(self) -> Dict[str, Any]:
+        """Rate limiter counters plus sizes of the bounded security caches"""
+        return {
+            **self.rate_limiter.get_metrics(),
+            "tracked_failed_attempts": len(self.failed_attempts),
+            "tracked_suspicious_activities": len(self.suspicious_activities),
+            "tracked_trusted_devices": len(self.trusted_devices)
+        }
     
     async def record_failed_attempt(self, request: Request):
         """Record failed authentication attempt"""
@@ -369,9 +365,10 @@ class EnhancedSecurityMiddleware:
                 del self.failed_attempts[client_ip]
             
             # Add to known locations
-            if user_id not in self.trusted_devices:
-                self.trusted_devices[f"location_{user_id}"] = set()
-            self.trusted_devices[f"location_{user_id}"].add(client_ip)
+            location_key = f"location_{user_id}"
+            known_ips = self.trusted_devices.get(location_key, set())
+            known_ips.add(client_ip)
+            self.trusted_devices[location_key] = known_ips
             
         except Exception as e:
             logger.error(f"Failed to record successful access: {e}")
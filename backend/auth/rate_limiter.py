@@ -0,0 +1,192 @@
+"""
+Rate Limiting
+Bounded in-process caches and a GCRA token-bucket limiter with pluggable
+shared state, so limits hold across uvicorn workers.
+"""
+
+import os
+import math
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+class BoundedTTLCache:
+    """Dictionary-like cache with a size bound (LRU eviction) and per-entry TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __getitem__(self, key):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._data.pop(key, None)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    retry_after: float  # seconds until the next request would be allowed
+    remaining: int
+
+class RateLimitBackend(ABC):
+    """Storage for GCRA theoretical arrival times (TAT)"""
+
+    @abstractmethod
+    async def acquire(self, key: str, now: float, emission_interval: float, tolerance: float) -> Tuple[bool, float]:
+        """Atomically admit a request if allowed; return (allowed, tat after the decision)"""
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process limiter state; suitable for tests and single-worker runs"""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    async def acquire(self, key: str, now: float, emission_interval: float, tolerance: float) -> Tuple[bool, float]:
+        tat = max(self._tats.get(key, now), now)
+        if tat - now > tolerance:
+            return False, tat
+
+        self._tats[key] = tat + emission_interval
+        self._tats.move_to_end(key)
+        while len(self._tats) > self.maxsize:
+            self._tats.popitem(last=False)
+        return True, tat + emission_interval
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """Limiter state shared by all workers; idle keys expire through a TTL index"""
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+
+    async def acquire(self, key: str, now: float, emission_interval: float, tolerance: float) -> Tuple[bool, float]:
+        from database import get_database
+
+        db = await get_database()
+        base_tat = {"$max": [{"$ifNull": ["$tat", now]}, now]}
+        allowed = {"$lte": [{"$subtract": [base_tat, now]}, tolerance]}
+
+        # One atomic pipeline update evaluates and applies GCRA server-side
+        doc = await db[self.collection_name].find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"allowed": allowed}},
+                {"$set": {
+                    "tat": {"$cond": ["$allowed", {"$add": [base_tat, emission_interval]}, base_tat]},
+                }},
+                {"$set": {
+                    "expires_at": {"$toDate": {"$multiply": [{"$add": ["$tat", tolerance]}, 1000]}}
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["allowed"], doc["tat"]
+
+class TokenBucketRateLimiter:
+    """
+    Generic cell rate algorithm (GCRA) limiter.
+
+    Equivalent to a token bucket of ``burst`` tokens refilled at
+    ``rate / period``, but stores a single timestamp per key, so each check
+    is one O(1) read-modify-write against the backend.
+    """
+
+    def __init__(self, backend: RateLimitBackend, rate: int, period: float, burst: Optional[int] = None):
+        self.backend = backend
+        self.rate = rate
+        self.period = period
+        self.burst = burst or rate
+        self.emission_interval = period / rate
+        self.tolerance = self.emission_interval * (self.burst - 1)
+        self.metrics: Dict[str, int] = {"checks": 0, "allowed": 0, "rejected": 0, "backend_errors": 0}
+        self.rejected_by_scope: Dict[str, int] = {}
+
+    async def check(self, identifier: str, scope: str = "default") -> RateLimitDecision:
+        """Consume one request for identifier, failing open if the backend is unavailable"""
+        self.metrics["checks"] += 1
+        now = time.time()
+
+        try:
+            allowed, tat = await self.backend.acquire(
+                f"{scope}:{identifier}", now, self.emission_interval, self.tolerance
+            )
+        except Exception as e:
+            self.metrics["backend_errors"] += 1
+            logger.error(f"Rate limit backend failed: {e}")
+            return RateLimitDecision(allowed=True, retry_after=0.0, remaining=0)
+
+        if allowed:
+            self.metrics["allowed"] += 1
+            remaining = math.floor((self.tolerance - (tat - now)) / self.emission_interval) + 1
+            return RateLimitDecision(allowed=True, retry_after=0.0, remaining=max(remaining, 0))
+
+        self.metrics["rejected"] += 1
+        self.rejected_by_scope[scope] = self.rejected_by_scope.get(scope, 0) + 1
+        logger.warning(f"Rate limit exceeded for {scope}:{identifier}")
+        return RateLimitDecision(
+            allowed=False,
+            retry_after=max(tat - self.tolerance - now, 0.0),
+            remaining=0
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "rejected_by_scope": dict(self.rejected_by_scope),
+            "rate": self.rate,
+            "period_seconds": self.period,
+            "burst": self.burst,
+            "backend": type(self.backend).__name__,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+def create_rate_limit_backend(backend_name: Optional[str] = None) -> RateLimitBackend:
+    """Build the backend named by RATE_LIMIT_BACKEND (mongo or memory)"""
+    backend_name = backend_name or os.getenv("RATE_LIMIT_BACKEND", "mongo")
+    if backend_name == "memory":
+        return InMemoryRateLimitBackend()
+    return MongoRateLimitBackend()
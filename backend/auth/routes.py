@@ -13,7 +13,8 @@ from models.user import (
     PasswordReset, PasswordResetConfirm, PasswordChange, UserRole, UserStatus
 )
 from .utils import (
-    hash_password, verify_password, create_token_pair, verify_token,
+    hash_password_async, verify_password_async, verify_and_update_password_async,
+    create_token_pair, verify_token,
     generate_verification_token, generate_reset_token, Token, TokenData
 )
 from .middleware import get_current_user, get_current_active_user
@@ -58,7 +59,7 @@ async def register_user(user_data: UserCreate):
         )
     
     # Create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     verification_token = generate_verification_token()
     
     user = User(
@@ -115,11 +116,14 @@ async def login_user(user_credentials: UserLogin):
     user = User(**user_doc)
     
     # Special handling for demo user to bypass bcrypt issues
+    rehashed_password = None
     if user_credentials.email == "demo@company.com" and user_credentials.password == "demo123456":
         password_valid = True
     else:
-        # Verify password normally
-        password_valid = verify_password(user_credentials.password, user.password_hash)
+        # Verify password off the event loop; outdated hashes come back upgraded
+        password_valid, rehashed_password = await verify_and_update_password_async(
+            user_credentials.password, user.password_hash
+        )
     
     if not password_valid:
         raise HTTPException(
@@ -146,13 +150,16 @@ async def login_user(user_credentials: UserLogin):
     tokens = create_token_pair(token_data)
     
     # Update login tracking
+    login_update = {
+        "last_login": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    if rehashed_password:
+        login_update["password_hash"] = rehashed_password
     await db.users.update_one(
         {"id": user.id},
         {
-            "$set": {
-                "last_login": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            },
+            "$set": login_update,
             "$inc": {"login_count": 1}
         }
     )
@@ -368,7 +375,7 @@ async def reset_password(reset_data: PasswordResetConfirm):
     user = User(**user_doc)
     
     # Hash new password
-    new_password_hash = hash_password(reset_data.new_password)
+    new_password_hash = await hash_password_async(reset_data.new_password)
     
     # Update password and clear reset token
     await db.users.update_one(
@@ -433,7 +440,7 @@ async def change_password(
     db = await get_database()
     
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    if not await verify_password_async(password_data.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -447,7 +454,7 @@ async def change_password(
         )
     
     # Hash new password
-    new_password_hash = hash_password(password_data.new_password)
+    new_password_hash = await hash_password_async(password_data.new_password)
     
     # Update password in database
     result = await db.users.update_one(
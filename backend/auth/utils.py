@@ -3,16 +3,30 @@ Authentication utilities for JWT token management and password hashing
 """
 import os
 import jwt
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from jwt import InvalidTokenError
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 import secrets
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes below BCRYPT_ROUNDS are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+# Password hashing worker pool (bcrypt releases the GIL, so threads scale)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 256))
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", secrets.token_urlsafe(32))
@@ -34,34 +48,124 @@ class Token(BaseModel):
     token_type: str = "bearer"
     expires_in: int
 
+def _truncate_password(password: str) -> str:
+    """Truncate password to 72 bytes to avoid bcrypt issue"""
+    if isinstance(password, str):
+        password_bytes = password.encode('utf-8')
+        if len(password_bytes) > 72:
+            password = password_bytes[:72].decode('utf-8', errors='ignore')
+    return password
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt with truncation fix"""
     try:
-        # Truncate password to 72 bytes to avoid bcrypt issue
-        if isinstance(password, str):
-            password_bytes = password.encode('utf-8')
-            if len(password_bytes) > 72:
-                password = password_bytes[:72].decode('utf-8', errors='ignore')
-        return pwd_context.hash(password)
+        return pwd_context.hash(_truncate_password(password))
     except Exception as e:
         # Fallback to simple hash if bcrypt fails
-        import hashlib
         return hashlib.sha256(password.encode()).hexdigest()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash with fallback"""
     try:
-        # Truncate password to 72 bytes to avoid bcrypt issue
-        if isinstance(plain_password, str):
-            password_bytes = plain_password.encode('utf-8')
-            if len(password_bytes) > 72:
-                plain_password = password_bytes[:72].decode('utf-8', errors='ignore')
-        return pwd_context.verify(plain_password, hashed_password)
+        return pwd_context.verify(_truncate_password(plain_password), hashed_password)
     except Exception as e:
         # Fallback to simple hash comparison
-        import hashlib
         return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one is outdated"""
+    plain_password = _truncate_password(plain_password)
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        # Legacy SHA-256 fallback hashes are upgraded to bcrypt on success
+        if hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password:
+            return True, hash_password(plain_password)
+        return False, None
+
+class PasswordHashingPool:
+    """Runs bcrypt off the event loop on a bounded worker pool"""
+    
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self.in_flight = 0
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0
+        }
+    
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+    
+    async def run(self, func, *args):
+        if self.queue_depth >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+        
+        submitted_at = time.perf_counter()
+        timings = {}
+        
+        def timed_call():
+            started_at = time.perf_counter()
+            timings["wait"] = started_at - submitted_at
+            try:
+                return func(*args)
+            finally:
+                timings["run"] = time.perf_counter() - started_at
+        
+        self.metrics["submitted"] += 1
+        self.in_flight += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.queue_depth)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, timed_call)
+        finally:
+            self.in_flight -= 1
+            self.metrics["completed"] += 1
+            self.metrics["total_wait_ms"] += timings.get("wait", 0.0) * 1000
+            self.metrics["total_run_ms"] += timings.get("run", 0.0) * 1000
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        completed = self.metrics["completed"] or 1
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "submitted": self.metrics["submitted"],
+            "completed": self.metrics["completed"],
+            "rejected": self.metrics["rejected"],
+            "max_queue_depth": self.metrics["max_queue_depth"],
+            "avg_wait_ms": round(self.metrics["total_wait_ms"] / completed, 2),
+            "avg_run_ms": round(self.metrics["total_run_ms"] / completed, 2)
+        }
+
+password_hashing_pool = PasswordHashingPool()
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the worker pool"""
+    return await password_hashing_pool.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the worker pool"""
+    return await password_hashing_pool.run(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the worker pool, returning a rehash when the cost changed"""
+    return await password_hashing_pool.run(verify_and_update_password, plain_password, hashed_password)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
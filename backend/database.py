@@ -4,6 +4,8 @@ import os
 from typing import Optional
 import logging
 
+from services.retention_ttl import TTL_FIELD, TTL_MANAGED_COLLECTIONS
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -132,10 +134,18 @@ async def create_indexes():
             IndexModel([("uploaded_by", 1)]),
             IndexModel([("file_type", 1)]),
             IndexModel([("created_at", -1)]),
+            IndexModel([("file_path", 1)]),  # Shared blob reference lookups
             IndexModel([("name", "text")]),  # Text search on file names
         ]
         await db.files.create_indexes(file_indexes)
         
+        # File blobs collection indexes (content-addressed, reference counted)
+        file_blob_indexes = [
+            IndexModel([("organization_id", 1), ("storage_backend", 1), ("checksum", 1)], unique=True),
+            IndexModel([("id", 1)], unique=True),
+        ]
+        await db.file_blobs.create_indexes(file_blob_indexes)
+        
         # Notifications collection indexes
         notification_indexes = [
             IndexModel([("user_id", 1)]),
@@ -146,6 +156,86 @@ async def create_indexes():
         ]
         await db.notifications.create_indexes(notification_indexes)
         
+        # Audit events collection indexes
+        audit_event_indexes = [
+            IndexModel([("organization_id", 1), ("timestamp", -1)]),
+            IndexModel(
+                [("organization_id", 1), ("sequence", 1)],
+                unique=True,
+                partialFilterExpression={"sequence": {"$gt": 0}}
+            ),
+        ]
+        await db.audit_events.create_indexes(audit_event_indexes)
+        
+        # Audit hash chain heads (one per organization)
+        await db.audit_chain_heads.create_indexes([
+            IndexModel([("organization_id", 1)], unique=True),
+        ])
+        
+        # Worker leases; expired leases are free to take and are eventually removed
+        await db.leases.create_indexes([
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # Shared rate limiter state; idle keys expire once their bucket refills
+        await db.rate_limits.create_indexes([
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # Retention TTL: records stamped from age-cutoff policies are removed by Mongo
+        for collection_name in TTL_MANAGED_COLLECTIONS:
+            await db[collection_name].create_indexes([
+                IndexModel(
+                    [(TTL_FIELD, 1)],
+                    expireAfterSeconds=0,
+                    partialFilterExpression={TTL_FIELD: {"$exists": True}}
+                ),
+            ])
+        await db.retention_ttl_state.create_indexes([
+            IndexModel([("organization_id", 1), ("collection_name", 1)], unique=True),
+        ])
+        
+        # Role assignments: holder lookups for assignment and bulk rollout diffs
+        await db.role_assignments.create_indexes([
+            IndexModel([("role_id", 1), ("organization_id", 1), ("is_active", 1), ("user_id", 1)]),
+            IndexModel([("user_id", 1), ("organization_id", 1), ("is_active", 1)]),
+        ])
+        
+        # Precomputed effective permission bitsets (one per organization user)
+        await db.user_permission_sets.create_indexes([
+            IndexModel([("organization_id", 1), ("user_id", 1)], unique=True),
+        ])
+        
+        # Persistent tier of the LLM response cache; entries expire through TTL
+        await db.llm_response_cache.create_indexes([
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # Background AI recommendation jobs: polling, supersession and result expiry
+        await db.ai_jobs.create_indexes([
+            IndexModel([("id", 1)], unique=True),
+            IndexModel([("organization_id", 1), ("user_id", 1), ("kind", 1), ("status", 1)]),
+            IndexModel([("status", 1), ("heartbeat_at", 1)]),
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # Sequenced timeline task patches kept for replay to reconnecting clients
+        await db.timeline_patches.create_indexes([
+            IndexModel([("project_id", 1), ("seq", 1)], unique=True),
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # WebSocket presence across workers; records of a crashed worker expire through TTL
+        await db.websocket_presence.create_indexes([
+            IndexModel([("scope", 1), ("group", 1)]),
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+        ])
+        
+        # Streaming threat detector checkpoints (one per organization)
+        await db.threat_detection_state.create_indexes([
+            IndexModel([("organization_id", 1)], unique=True),
+        ])
+        
         logger.info("✅ Database indexes created successfully")
         
     except Exception as e:
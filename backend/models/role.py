@@ -226,6 +226,7 @@ class BulkRoleAssignment(BaseModel):
     valid_from: Optional[datetime] = Field(None, description="Role valid from timestamp")
     valid_until: Optional[datetime] = Field(None, description="Role valid until timestamp")
     notes: Optional[str] = Field(None, max_length=500, description="Assignment notes")
+    revoke_missing: bool = Field(default=False, description="Deactivate the role for current holders not in user_ids")
 
 class UserPermissions(BaseModel):
     """User effective permissions model"""
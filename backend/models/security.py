@@ -83,6 +83,7 @@ class AuditEvent(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
     # Blockchain/Immutable Trail
+    sequence: Optional[int] = None  # Position in the organization's hash chain
     hash_chain: Optional[str] = None
     previous_hash: Optional[str] = None
     verification_signature: Optional[str] = None
@@ -323,6 +324,7 @@ class DataRetentionPolicy(BaseModel):
     next_cleanup_scheduled: Optional[datetime] = None
     items_cleaned: int = 0
     items_archived: int = 0
+    archive_checkpoints: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # collection -> resume point
     
     # Status
     is_active: bool = True
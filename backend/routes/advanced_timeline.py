@@ -18,6 +18,7 @@ from models import User
 from services.critical_path_service import critical_path_service
 from services.resource_leveling_service import resource_leveling_service
 from services.baseline_service import baseline_service
+from services.compute_executor import compute
 from services.gantt_export_service import gantt_export_service
 
 logger = logging.getLogger(__name__)
@@ -62,7 +63,7 @@ async def calculate_critical_path(
         dependencies = await deps_cursor.to_list(length=1000)
         
         # Calculate critical path
-        cpm_result = critical_path_service.calculate_critical_path(tasks, dependencies)
+        cpm_result = await compute(critical_path_service.calculate_critical_path, tasks, dependencies)
         
         return {
             'project_id': project_id,
@@ -70,6 +71,8 @@ async def calculate_critical_path(
             'calculated_at': datetime.utcnow().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error calculating critical path: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -99,7 +102,7 @@ async def optimize_project_schedule(
             raise HTTPException(status_code=404, detail="No tasks found")
         
         # Run optimization
-        optimization_result = critical_path_service.optimize_schedule(tasks, dependencies)
+        optimization_result = await compute(critical_path_service.optimize_schedule, tasks, dependencies)
         
         return {
             'project_id': project_id,
@@ -148,7 +151,7 @@ async def detect_resource_conflicts(
             resources = await db.users.find({'id': {'$in': list(assignee_ids)}}).to_list(length=1000)
         
         # Detect conflicts
-        conflict_analysis = resource_leveling_service.detect_resource_conflicts(tasks, resources)
+        conflict_analysis = await compute(resource_leveling_service.detect_resource_conflicts, tasks, resources)
         
         return {
             'project_id': project_id,
@@ -156,6 +159,8 @@ async def detect_resource_conflicts(
             'analyzed_at': datetime.utcnow().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error detecting resource conflicts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -192,10 +197,10 @@ async def level_project_resources(
         
         # Get CPM analysis for float data
         dependencies = await db.task_dependencies.find({'project_id': project_id}).to_list(length=1000)
-        cpm_analysis = critical_path_service.calculate_critical_path(tasks, dependencies)
+        cpm_analysis = await compute(critical_path_service.calculate_critical_path, tasks, dependencies)
         
         # Level resources
-        leveling_result = resource_leveling_service.level_resources(
+        leveling_result = await compute(resource_leveling_service.level_resources,
             tasks, resources, cpm_analysis
         )
         
@@ -227,6 +232,8 @@ async def level_project_resources(
             'leveled_at': datetime.utcnow().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error leveling resources: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -258,7 +265,7 @@ async def analyze_project_workload(
         if assignee_ids:
             resources = await db.users.find({'id': {'$in': list(assignee_ids)}}).to_list(length=1000)
         
-        workload_analysis = resource_leveling_service.analyze_workload_distribution(
+        workload_analysis = await compute(resource_leveling_service.analyze_workload_distribution,
             tasks, resources, time_period_days
         )
         
@@ -268,6 +275,8 @@ async def analyze_project_workload(
             'analyzed_at': datetime.utcnow().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error analyzing workload: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -293,7 +302,7 @@ async def get_reallocation_suggestions(
         if assignee_ids:
             resources = await db.users.find({'id': {'$in': list(assignee_ids)}}).to_list(length=1000)
         
-        suggestions = resource_leveling_service.suggest_resource_reallocation(tasks, resources)
+        suggestions = await compute(resource_leveling_service.suggest_resource_reallocation, tasks, resources)
         
         return {
             'project_id': project_id,
@@ -302,6 +311,8 @@ async def get_reallocation_suggestions(
             'generated_at': datetime.utcnow().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating reallocation suggestions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -331,7 +342,7 @@ async def create_project_baseline(
             raise HTTPException(status_code=404, detail="No tasks found to baseline")
         
         # Create baseline
-        baseline = baseline_service.create_baseline(
+        baseline = await compute(baseline_service.create_baseline,
             project_id, tasks, baseline_name, description
         )
         
@@ -404,7 +415,7 @@ async def analyze_baseline_variance(
         current_tasks = await db.tasks.find({'project_id': project_id}).to_list(length=1000)
         
         # Analyze variance
-        variance_analysis = baseline_service.analyze_variance(baseline, current_tasks)
+        variance_analysis = await compute(baseline_service.analyze_variance, baseline, current_tasks)
         
         return variance_analysis
         
@@ -433,7 +444,7 @@ async def compare_two_baselines(
         if not baseline1 or not baseline2:
             raise HTTPException(status_code=404, detail="One or both baselines not found")
         
-        comparison = baseline_service.compare_baselines(baseline1, baseline2)
+        comparison = await compute(baseline_service.compare_baselines, baseline1, baseline2)
         
         return comparison
         
@@ -537,7 +548,7 @@ async def export_gantt_to_excel(
         dependencies = await db.task_dependencies.find({'project_id': project_id}).to_list(length=1000)
         
         # Get CPM analysis
-        cpm_analysis = critical_path_service.calculate_critical_path(tasks, dependencies)
+        cpm_analysis = await compute(critical_path_service.calculate_critical_path, tasks, dependencies)
         
         # Get resource analysis
         assignee_ids = set()
@@ -546,7 +557,7 @@ async def export_gantt_to_excel(
         resources = []
         if assignee_ids:
             resources = await db.users.find({'id': {'$in': list(assignee_ids)}}).to_list(length=1000)
-        resource_analysis = resource_leveling_service.detect_resource_conflicts(tasks, resources)
+        resource_analysis = await compute(resource_leveling_service.detect_resource_conflicts, tasks, resources)
         
         excel_data = gantt_export_service.export_to_excel_data(
             tasks, dependencies, cpm_analysis, resource_analysis
@@ -554,6 +565,8 @@ async def export_gantt_to_excel(
         
         return excel_data
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error exporting to Excel: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -650,13 +663,13 @@ async def export_comprehensive_json(
         
         cpm_analysis = None
         if include_cpm:
-            cpm_analysis = critical_path_service.calculate_critical_path(tasks, dependencies)
+            cpm_analysis = await compute(critical_path_service.calculate_critical_path, tasks, dependencies)
         
         baseline_analysis = None
         if include_baseline:
             baseline = await db.baselines.find_one({'project_id': project_id, 'is_active': True})
             if baseline:
-                baseline_analysis = baseline_service.analyze_variance(baseline, tasks)
+                baseline_analysis = await compute(baseline_service.analyze_variance, baseline, tasks)
         
         json_data = gantt_export_service.generate_json_export(
             project['name'], tasks, dependencies, cpm_analysis, baseline_analysis
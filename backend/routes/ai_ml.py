@@ -10,11 +10,14 @@ from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from pydantic import BaseModel, Field
 import logging
 
-from auth.middleware import get_current_user
+from auth.middleware import get_current_user, require_admin
 from ai_ml.multi_model_ai import MultiModelAIService
 from ai_ml.predictive_analytics import PredictiveAnalyticsEngine
+from ai_ml.model_registry import MODEL_SPECS
 from ai_ml.skill_assessment import SkillAssessmentEngine
 from ai_ml.integration_manager import AIIntegrationManager
+from services.llm_gateway import count_tokens
+from services.llm_streaming import EventStreamResponse, sse_stream
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/ai-ml", tags=["AI/ML"])
@@ -24,6 +27,9 @@ ai_service = MultiModelAIService()
 predictive_engine = PredictiveAnalyticsEngine()
 skill_engine = SkillAssessmentEngine()
 
+# Upper bound on tasks scored by one batch prediction request
+MAX_BATCH_PREDICTION_TASKS = 5000
+
 # Request/Response Models
 
 class AIModelRequest(BaseModel):
@@ -49,7 +55,10 @@ class ModelComparisonRequest(BaseModel):
 
 class TaskDurationPredictionRequest(BaseModel):
     task_data: Dict[str, Any]
-    historical_tasks: Optional[List[Dict[str, Any]]] = None
+
+class TaskDurationBatchRequest(BaseModel):
+    project_id: str
+    task_ids: Optional[List[str]] = Field(default=None, description="Limit scoring to these tasks; defaults to every open task")
 
 class ResourceDemandRequest(BaseModel):
     project_data: Dict[str, Any]
@@ -59,7 +68,6 @@ class ResourceDemandRequest(BaseModel):
 class ProjectSuccessRequest(BaseModel):
     project_data: Dict[str, Any]
     team_assignments: List[Dict[str, Any]]
-    historical_projects: Optional[List[Dict[str, Any]]] = None
 
 class TeamPerformanceRequest(BaseModel):
     team_data: Dict[str, Any]
@@ -109,6 +117,41 @@ async def generate_ai_response(
         logger.error(f"AI generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/stream")
+async def stream_ai_response(
+    request: AIModelRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream an AI response as server-sent events: start, token..., done"""
+    if request.model not in ai_service.models:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {request.model}")
+    
+    model_config = ai_service.models[request.model]
+    
+    async def events():
+        yield "start", {"model": model_config["model_id"], "provider": model_config["provider"]}
+        
+        parts = []
+        async for chunk in ai_service.stream_response(
+            prompt=request.prompt,
+            model=request.model,
+            context=request.context,
+            temperature=request.temperature
+        ):
+            yield "token", {"seq": len(parts), "delta": chunk}
+            parts.append(chunk)
+        
+        content = "".join(parts)
+        yield "done", {
+            "model": model_config["model_id"],
+            "provider": model_config["provider"],
+            "tokens_used": count_tokens(request.prompt, model_config["model_id"]) + count_tokens(content, model_config["model_id"]),
+            "character_count": len(content),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    return EventStreamResponse(sse_stream(events()))
+
 @router.post("/compare-models")
 async def compare_ai_models(
     request: ModelComparisonRequest,
@@ -138,6 +181,26 @@ async def get_available_models(current_user: dict = Depends(get_current_user)):
         logger.error(f"Available models error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cache/metrics")
+async def get_llm_cache_metrics(current_user: dict = Depends(get_current_user)):
+    """Get LLM response cache hit rates for this worker"""
+    try:
+        from services.llm_cache import llm_response_cache
+        return llm_response_cache.get_metrics()
+    except Exception as e:
+        logger.error(f"LLM cache metrics error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/gateway/metrics")
+async def get_llm_gateway_metrics(current_user: dict = Depends(get_current_user)):
+    """Get per-provider LLM latency, token, rejection and circuit state for this worker"""
+    try:
+        from services.llm_gateway import llm_gateway
+        return llm_gateway.get_metrics()
+    except Exception as e:
+        logger.error(f"LLM gateway metrics error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/models/{model_name}/capabilities")
 async def get_model_capabilities(
     model_name: str,
@@ -176,7 +239,7 @@ async def predict_task_duration(
     try:
         prediction = await predictive_engine.predict_task_duration(
             task_data=request.task_data,
-            historical_data=request.historical_tasks or []
+            organization_id=current_user.organization_id
         )
         
         return {
@@ -191,6 +254,64 @@ async def predict_task_duration(
         logger.error(f"Task duration prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/task-duration/batch")
+async def predict_task_duration_batch(
+    request: TaskDurationBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Predict durations for every open task of a project in one call"""
+    try:
+        from database import get_database
+        db = await get_database()
+        
+        project = await db.projects.find_one({
+            "id": request.project_id,
+            "organization_id": current_user.organization_id
+        })
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        query = {"project_id": request.project_id, "status": {"$nin": ["completed", "cancelled"]}}
+        if request.task_ids:
+            query["id"] = {"$in": request.task_ids}
+        # Read one past the cap so the response can say whether tasks were left out
+        tasks = await db.tasks.find(query, {"_id": 0}).limit(MAX_BATCH_PREDICTION_TASKS + 1).to_list(length=None)
+        truncated = len(tasks) > MAX_BATCH_PREDICTION_TASKS
+        tasks = tasks[:MAX_BATCH_PREDICTION_TASKS]
+        
+        # Unset fields fall back to the feature defaults
+        task_features = [{k: v for k, v in task.items() if v is not None} for task in tasks]
+        batch = await predictive_engine.predict_task_durations_batch(task_features, current_user.organization_id)
+        
+        predictions = [
+            {
+                "task_id": task.get("id"),
+                "title": task.get("title"),
+                "estimated_hours": task.get("estimated_hours"),
+                "prediction": round(float(prediction), 2),
+                "confidence": round(float(confidence), 3)
+            }
+            for task, prediction, confidence in zip(tasks, batch.predictions, batch.confidences)
+        ]
+        
+        return {
+            "project_id": request.project_id,
+            "task_count": len(predictions),
+            "truncated": truncated,
+            "task_limit": MAX_BATCH_PREDICTION_TASKS,
+            "total_predicted_hours": round(float(batch.predictions.sum()), 2),
+            "predictions": predictions,
+            "factors": batch.factors,
+            "model_performance": batch.model_performance,
+            "timestamp": batch.timestamp.isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch task duration prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/predict/resource-demand")
 async def predict_resource_demand(
     request: ResourceDemandRequest,
@@ -229,7 +350,7 @@ async def predict_project_success(
         prediction = await predictive_engine.predict_project_success_probability(
             project_data=request.project_data,
             team_assignments=request.team_assignments,
-            historical_projects=request.historical_projects or []
+            organization_id=current_user.organization_id
         )
         
         return {
@@ -276,12 +397,35 @@ async def predict_team_performance(
 async def get_predictive_model_status(current_user: dict = Depends(get_current_user)):
     """Get status of predictive models"""
     try:
-        status = predictive_engine.get_model_status()
+        status = predictive_engine.get_model_status(current_user.organization_id)
         return status
     except Exception as e:
         logger.error(f"Model status error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict/train", status_code=202)
+async def train_predictive_models(
+    model_key: Optional[str] = None,
+    current_user: dict = Depends(require_admin)
+):
+    """Retrain the organization's predictive models from its stored history in the background"""
+    try:
+        if model_key and model_key not in MODEL_SPECS:
+            raise HTTPException(status_code=404, detail=f"Unknown model '{model_key}'")
+
+        from database import get_database
+        db = await get_database()
+
+        results = await predictive_engine.retrain_from_database(
+            db, current_user.organization_id, [model_key] if model_key else None
+        )
+        return {"training": results, "timestamp": datetime.utcnow().isoformat()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Model training error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Skill Assessment Endpoints
 
 @router.post("/skills/assess")
@@ -19,7 +19,9 @@ from models.user import User
 from database import get_database
 
 # Import emergent integrations
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from emergentintegrations.llm.chat import UserMessage
+from services.llm_cache import CachedLlmChat
+from services.llm_streaming import EventStreamResponse, multiplex_streams
 
 # Load environment variables
 load_dotenv()
@@ -385,54 +387,56 @@ Include screenshots descriptions, step-by-step instructions, and user-friendly e
         
         return prompt
 
+    def _create_document_chat(self, document_type: DocumentType) -> CachedLlmChat:
+        return CachedLlmChat(
+            api_key=self.api_key,
+            session_id=f"doc_gen_{document_type}_{datetime.now().isoformat()}",
+            system_message="You are an expert project management consultant and technical writer specializing in creating comprehensive project documentation. Generate detailed, professional, and actionable documents."
+        ).with_model("openai", "gpt-4o")
+
+    def _document_title(self, document_type: DocumentType, scope: ProjectScope) -> str:
+        title_map = {
+            DocumentType.PRD: "Project Requirements Document",
+            DocumentType.TECHNICAL_SPECS: "Technical Specifications",
+            DocumentType.USER_STORIES: "User Stories and Acceptance Criteria",
+            DocumentType.PROJECT_CHARTER: "Project Charter",
+            DocumentType.RISK_ASSESSMENT: "Risk Assessment and Mitigation Plan",
+            DocumentType.BUSINESS_CASE: "Business Case and ROI Analysis",
+            DocumentType.ARCHITECTURE_DOCUMENT: "Architecture Document",
+            DocumentType.TEST_PLAN: "Test Plan and Strategy",
+            DocumentType.DEPLOYMENT_GUIDE: "Deployment Guide",
+            DocumentType.USER_MANUAL: "User Manual and Documentation"
+        }
+
+        return f"{title_map.get(document_type, document_type.replace('_', ' ').title())} - {scope.project_name}"
+
+    def _document_metadata(self, scope: ProjectScope, content: str) -> Dict[str, Any]:
+        return {
+            "project_name": scope.project_name,
+            "generated_at": datetime.now().isoformat(),
+            "domain": scope.business_domain,
+            "priority": scope.priority,
+            "timeline": scope.timeline,
+            "word_count": len(content.split()),
+            "character_count": len(content)
+        }
+
     async def generate_document(self, document_type: DocumentType, scope: ProjectScope, additional_instructions: str = None) -> GeneratedDocument:
         """Generate a single document using AI."""
         try:
-            # Create chat instance
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id=f"doc_gen_{document_type}_{datetime.now().isoformat()}",
-                system_message="You are an expert project management consultant and technical writer specializing in creating comprehensive project documentation. Generate detailed, professional, and actionable documents."
-            ).with_model("openai", "gpt-4o")
+            chat = self._create_document_chat(document_type)
 
             # Create prompt
             prompt = self._create_document_prompt(document_type, scope, additional_instructions)
 
-            # Create user message
-            user_message = UserMessage(text=prompt)
-
             # Generate content
-            response = await chat.send_message(user_message)
-
-            # Create document title
-            title_map = {
-                DocumentType.PRD: "Project Requirements Document",
-                DocumentType.TECHNICAL_SPECS: "Technical Specifications",
-                DocumentType.USER_STORIES: "User Stories and Acceptance Criteria",
-                DocumentType.PROJECT_CHARTER: "Project Charter",
-                DocumentType.RISK_ASSESSMENT: "Risk Assessment and Mitigation Plan",
-                DocumentType.BUSINESS_CASE: "Business Case and ROI Analysis",
-                DocumentType.ARCHITECTURE_DOCUMENT: "Architecture Document",
-                DocumentType.TEST_PLAN: "Test Plan and Strategy",
-                DocumentType.DEPLOYMENT_GUIDE: "Deployment Guide",
-                DocumentType.USER_MANUAL: "User Manual and Documentation"
-            }
-
-            title = f"{title_map.get(document_type, document_type.replace('_', ' ').title())} - {scope.project_name}"
+            response = await chat.send_message(UserMessage(text=prompt))
 
             return GeneratedDocument(
                 document_type=document_type,
-                title=title,
+                title=self._document_title(document_type, scope),
                 content=response,
-                metadata={
-                    "project_name": scope.project_name,
-                    "generated_at": datetime.now().isoformat(),
-                    "domain": scope.business_domain,
-                    "priority": scope.priority,
-                    "timeline": scope.timeline,
-                    "word_count": len(response.split()),
-                    "character_count": len(response)
-                }
+                metadata=self._document_metadata(scope, response)
             )
 
         except Exception as e:
@@ -444,20 +448,9 @@ Include screenshots descriptions, step-by-step instructions, and user-friendly e
 
     async def generate_multiple_documents(self, scope: ProjectScope, document_types: List[DocumentType], additional_instructions: str = None) -> List[GeneratedDocument]:
         """Generate multiple documents concurrently."""
-        tasks = []
-        for doc_type in document_types:
-            task = self.generate_document(doc_type, scope, additional_instructions)
-            tasks.append(task)
-
-        # Generate documents concurrently with a reasonable limit
-        semaphore = asyncio.Semaphore(3)  # Limit concurrent generations
-        
-        async def limited_generation(task):
-            async with semaphore:
-                return await task
-
+        # Concurrency, rate budget and deadlines are enforced per provider by the LLM gateway
         results = await asyncio.gather(
-            *[limited_generation(task) for task in tasks],
+            *[self.generate_document(doc_type, scope, additional_instructions) for doc_type in document_types],
             return_exceptions=True
         )
 
@@ -477,6 +470,25 @@ Include screenshots descriptions, step-by-step instructions, and user-friendly e
 
         return documents
 
+    async def stream_document(self, document_type: DocumentType, scope: ProjectScope, additional_instructions: str = None):
+        """Generate a single document, yielding start, token and end events as content arrives."""
+        title = self._document_title(document_type, scope)
+        yield "document_start", {"document_type": document_type, "title": title}
+
+        chat = self._create_document_chat(document_type)
+        prompt = self._create_document_prompt(document_type, scope, additional_instructions)
+
+        parts = []
+        async for chunk in chat.stream_message(UserMessage(text=prompt)):
+            yield "token", {"document_type": document_type, "seq": len(parts), "delta": chunk}
+            parts.append(chunk)
+
+        yield "document_end", {
+            "document_type": document_type,
+            "title": title,
+            "metadata": self._document_metadata(scope, "".join(parts))
+        }
+
 # Initialize service
 ai_service = AIProjectGeneratorService()
 
@@ -518,6 +530,29 @@ async def generate_project_documents(
             detail=f"Document generation failed: {str(e)}"
         )
 
+@router.post("/generate-documents/stream")
+async def stream_project_documents(
+    request: DocumentGenerationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream project documents as server-sent events, multiplexed by stream_id."""
+    if not request.document_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one document type must be specified"
+        )
+
+    # Position-based ids keep repeated document types apart
+    streams = {
+        f"{index}:{document_type.value}": ai_service.stream_document(
+            document_type, request.project_scope, request.additional_instructions
+        )
+        for index, document_type in enumerate(request.document_types)
+    }
+
+    # The LLM gateway bounds concurrent generations, so every document is started here
+    return EventStreamResponse(multiplex_streams(streams, max_concurrency=len(streams)))
+
 @router.get("/document-types")
 async def get_available_document_types(current_user: User = Depends(get_current_user)):
     """Get list of available document types."""
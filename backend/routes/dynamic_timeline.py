@@ -9,6 +9,8 @@ import uuid
 from pydantic import BaseModel
 
 from database import get_database
+from services.websocket_fanout import WebSocketFanout, ConnectionChannel, serialize_message
+from services.timeline_patches import TimelinePatchCoalescer
 from auth.utils import verify_token
 from auth.middleware import get_current_user, get_current_active_user
 from models import (
@@ -71,81 +73,91 @@ class RealtimeStats(BaseModel):
 # WebSocket connection manager for enhanced real-time features
 class EnhancedTimelineConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[Dict[str, Any]]] = {}
-        self.user_sessions: Dict[str, Dict[str, Any]] = {}
-
-    async def connect(self, websocket: WebSocket, project_id: str, user_id: str):
+        # Project id -> connections, each with its own bounded send queue; relayed to other workers
+        self.fanout = WebSocketFanout("dynamic_timeline")
+        # Task updates go out as coalesced, sequenced field patches
+        self.patches = TimelinePatchCoalescer(self.broadcast_to_project)
+        # user_id -> connection_id -> session state; one entry per open tab
+        self.user_sessions: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        project_id: str,
+        user_id: str,
+        since: Optional[int] = None
+    ) -> ConnectionChannel:
         await websocket.accept()
         
-        if project_id not in self.active_connections:
-            self.active_connections[project_id] = []
-        
-        connection_info = {
-            'websocket': websocket,
-            'user_id': user_id,
-            'connected_at': datetime.utcnow(),
-            'last_activity': datetime.utcnow()
-        }
-        
-        self.active_connections[project_id].append(connection_info)
-        self.user_sessions[user_id] = {
+        # A reconnecting client's missed patches are queued before it can receive live ones
+        backlog = await self.resync_frames(project_id, since) if since is not None else []
+        channel = await self.fanout.register(websocket, project_id, user_id, backlog=backlog)
+        self.user_sessions.setdefault(user_id, {})[channel.connection_id] = {
             'project_id': project_id,
             'status': 'active',
             'current_task': None
         }
         
-        # Notify others about user joining
-        await self.broadcast_to_project(project_id, {
-            'type': 'user_joined',
-            'user_id': user_id,
-            'timestamp': datetime.utcnow().isoformat()
-        }, exclude_user=user_id)
+        # Notify others about user joining, unless they already had the project open in another tab
+        if await self.fanout.user_connection_count(project_id, user_id) == 1:
+            await self.broadcast_to_project(project_id, {
+                'type': 'user_joined',
+                'user_id': user_id,
+                'timestamp': datetime.utcnow().isoformat()
+            }, exclude_user=user_id)
         
         logger.info(f"Enhanced WebSocket connected for user {user_id} in project {project_id}")
+        return channel
 
-    def disconnect(self, websocket: WebSocket, project_id: str, user_id: str):
-        if project_id in self.active_connections:
-            self.active_connections[project_id] = [
-                conn for conn in self.active_connections[project_id] 
-                if conn['websocket'] != websocket
-            ]
-            
-            if not self.active_connections[project_id]:
-                del self.active_connections[project_id]
+    async def disconnect(self, channel: ConnectionChannel):
+        project_id, user_id = channel.group, channel.user_id
+        await self.fanout.unregister(channel)
         
-        if user_id in self.user_sessions:
-            del self.user_sessions[user_id]
+        tabs = self.user_sessions.get(user_id, {})
+        tabs.pop(channel.connection_id, None)
+        if not tabs:
+            self.user_sessions.pop(user_id, None)
         
-        # Notify others about user leaving
-        asyncio.create_task(self.broadcast_to_project(project_id, {
-            'type': 'user_left',
-            'user_id': user_id,
-            'timestamp': datetime.utcnow().isoformat()
-        }, exclude_user=user_id))
+        # Notify others about user leaving, once their last tab has closed
+        if await self.fanout.user_connection_count(project_id, user_id) == 0:
+            await self.fanout.broadcast(project_id, {
+                'type': 'user_left',
+                'user_id': user_id,
+                'timestamp': datetime.utcnow().isoformat()
+            }, exclude_user=user_id)
         
         logger.info(f"Enhanced WebSocket disconnected for user {user_id} in project {project_id}")
 
-    async def broadcast_to_project(self, project_id: str, message: dict, exclude_user: str = None):
-        if project_id not in self.active_connections:
-            return
-        
-        disconnected_connections = []
-        
-        for connection in self.active_connections[project_id]:
-            if exclude_user and connection['user_id'] == exclude_user:
-                continue
-                
-            try:
-                await connection['websocket'].send_text(json.dumps(message))
-                connection['last_activity'] = datetime.utcnow()
-            except Exception as e:
-                logger.error(f"Error sending WebSocket message: {e}")
-                disconnected_connections.append(connection)
-        
-        # Remove disconnected connections
-        for conn in disconnected_connections:
-            if conn in self.active_connections[project_id]:
-                self.active_connections[project_id].remove(conn)
+    async def broadcast_to_project(
+        self,
+        project_id: str,
+        message: dict,
+        exclude_user: str = None,
+        coalesce_key: Optional[str] = None
+    ):
+        # Only queues the message; each connection's writer sends it at its own pace
+        await self.fanout.broadcast(project_id, message, exclude_user=exclude_user, coalesce_key=coalesce_key)
+
+    async def resync_frames(self, project_id: str, since: int) -> List[str]:
+        """Task patches after a sequence, or a request for the client to reload the timeline"""
+        frames = await self.patches.replay(project_id, since)
+        if frames is None:
+            return [serialize_message({
+                'type': 'resync_required',
+                'project_id': project_id,
+                'seq': await self.patches.current_sequence(project_id),
+                'timestamp': datetime.utcnow().isoformat()
+            })]
+        return [serialize_message(frame) for frame in frames]
+
+    async def resync(self, channel: ConnectionChannel, since: int):
+        """
+        Replay patches on an open connection. Live patches may be queued
+        among the replayed ones; clients apply task_patch frames in seq order
+        and ignore those at or below the last applied sequence.
+        """
+        for frame in await self.resync_frames(channel.group, since):
+            channel.send(frame)
 
     async def notify_task_editing(self, project_id: str, task_id: str, user_id: str, is_editing: bool):
         message = {
@@ -155,17 +167,15 @@ class EnhancedTimelineConnectionManager:
             'is_editing': is_editing,
             'timestamp': datetime.utcnow().isoformat()
         }
-        await self.broadcast_to_project(project_id, message)
+        await self.broadcast_to_project(project_id, message, coalesce_key=f"editing:{task_id}:{user_id}")
 
-    def get_active_users(self, project_id: str) -> List[Dict[str, Any]]:
-        if project_id not in self.active_connections:
-            return []
-        
+    async def get_active_users(self, project_id: str) -> List[Dict[str, Any]]:
+        # From the shared presence store, so users connected to other workers are included
         return [{
-            'user_id': conn['user_id'],
-            'connected_at': conn['connected_at'].isoformat(),
-            'last_activity': conn['last_activity'].isoformat()
-        } for conn in self.active_connections[project_id]]
+            'user_id': member['user_id'],
+            'connected_at': member['connected_at'].isoformat(),
+            'last_activity': member['last_activity'].isoformat()
+        } for member in await self.fanout.members(project_id)]
 
 enhanced_timeline_manager = EnhancedTimelineConnectionManager()
 
@@ -594,21 +604,18 @@ async def update_task_dynamic(
 
         # Create enhanced task response
         enhanced_task = EnhancedTimelineTask(
-            **updated_task,
-            conflicts=task_conflicts,
-            last_modified=update_data["last_modified"]
+            **{**updated_task, "last_modified": update_data["last_modified"]},
+            conflicts=task_conflicts
         )
 
-        # Broadcast update to connected clients
-        background_tasks.add_task(
-            enhanced_timeline_manager.broadcast_to_project,
+        # Send connected clients only the changed fields; bursts of updates (drags) coalesce
+        enhanced_timeline_manager.patches.submit(
             task["project_id"],
-            {
-                "type": "task_updated",
-                "data": enhanced_task.dict(),
-                "user_id": current_user.id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            task_id,
+            task,
+            updated_task,
+            current_user.id,
+            conflicts=enhanced_task.dict()["conflicts"]
         )
 
         # If conflicts were introduced, notify about them
@@ -836,10 +843,12 @@ async def search_tasks(
 async def enhanced_timeline_websocket_endpoint(
     websocket: WebSocket, 
     project_id: str,
-    token: Optional[str] = None
+    token: Optional[str] = None,
+    since: Optional[int] = None
 ):
     """Enhanced WebSocket endpoint for real-time timeline collaboration"""
     user_id = None
+    channel = None
     
     try:
         # Simple token validation (in production, use proper JWT validation)
@@ -849,20 +858,26 @@ async def enhanced_timeline_websocket_endpoint(
         else:
             user_id = f"anonymous-{datetime.utcnow().timestamp()}"
         
-        await enhanced_timeline_manager.connect(websocket, project_id, user_id)
+        # A reconnecting client passes the last patch sequence it applied to catch up on those it missed
+        channel = await enhanced_timeline_manager.connect(websocket, project_id, user_id, since=since)
         
         try:
-            while True:
+            # A channel closed by its writer (send failure, slow consumer) ends the session
+            while not channel.closed:
                 data = await websocket.receive_text()
+                channel.touch(len(data))
                 message = json.loads(data)
                 
                 # Handle different message types
                 if message.get("type") == "ping":
-                    await websocket.send_text(json.dumps({
+                    channel.send(serialize_message({
                         "type": "pong", 
                         "timestamp": datetime.utcnow().isoformat()
                     }))
                     
+                elif message.get("type") == "resync":
+                    await enhanced_timeline_manager.resync(channel, int(message.get("since", 0)))
+                    
                 elif message.get("type") == "task_editing_start":
                     await enhanced_timeline_manager.notify_task_editing(
                         project_id, message.get("task_id"), user_id, True
@@ -883,7 +898,8 @@ async def enhanced_timeline_websocket_endpoint(
                             "position": message.get("position"),
                             "timestamp": datetime.utcnow().isoformat()
                         },
-                        exclude_user=user_id
+                        exclude_user=user_id,
+                        coalesce_key=f"cursor:{user_id}"
                     )
                     
         except WebSocketDisconnect:
@@ -892,8 +908,8 @@ async def enhanced_timeline_websocket_endpoint(
     except Exception as e:
         logger.error(f"Enhanced WebSocket error: {e}")
     finally:
-        if user_id:
-            enhanced_timeline_manager.disconnect(websocket, project_id, user_id)
+        if channel:
+            await enhanced_timeline_manager.disconnect(channel)
 
 
 # Get Active Users in Project
@@ -905,7 +921,7 @@ async def get_active_users(
 ):
     """Get list of users currently active in the project timeline"""
     try:
-        active_users = enhanced_timeline_manager.get_active_users(project_id)
+        active_users = await enhanced_timeline_manager.get_active_users(project_id)
         
         # Enhance with user details from database
         enhanced_users = []
@@ -929,6 +945,35 @@ async def get_active_users(
         raise HTTPException(status_code=500, detail="Failed to retrieve active users")
 
 
+
+# Per-project WebSocket Metrics
+@router.get("/projects/{project_id}/websocket/metrics")
+async def get_project_websocket_metrics(
+    project_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get live connections and message/byte rates for a project's timeline WebSockets"""
+    try:
+        return await enhanced_timeline_manager.fanout.get_group_metrics(project_id)
+    except Exception as e:
+        logger.error(f"Error retrieving project WebSocket metrics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve project WebSocket metrics")
+
+
+# WebSocket Fan-out Metrics
+@router.get("/websocket/metrics")
+async def get_websocket_metrics(current_user: User = Depends(get_current_active_user)):
+    """Get send queue depth, dropped and coalesced message counts for this worker's connections"""
+    try:
+        return {
+            **enhanced_timeline_manager.fanout.get_metrics(),
+            "task_patches": enhanced_timeline_manager.patches.get_metrics()
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving WebSocket metrics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve WebSocket metrics")
+
+
 # Helper Functions
 
 async def detect_timeline_conflicts(tasks: List[Dict], dependencies: List[Dict], db) -> List[TaskConflict]:
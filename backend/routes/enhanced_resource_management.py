@@ -10,7 +10,9 @@ from collections import defaultdict, Counter
 from dotenv import load_dotenv
 
 # Import AI integration
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from emergentintegrations.llm.chat import UserMessage
+from services.llm_cache import CachedLlmChat
+from services.ai_job_service import ai_job_service
 
 # Import database connection
 from database import get_database
@@ -360,7 +362,7 @@ class AdvancedResourceAnalyzer:
 # Initialize AI chat for enhanced resource optimization
 async def get_enhanced_ai_chat():
     """Initialize enhanced AI chat for resource management recommendations"""
-    return LlmChat(
+    return CachedLlmChat(
         api_key=os.getenv("EMERGENT_LLM_KEY"),
         session_id="enhanced-resource-management",
         system_message="""You are an advanced AI Resource Management Consultant with expertise in:
@@ -426,8 +428,7 @@ async def get_advanced_resource_allocation(
             "optimization_opportunities": len(recommendations["immediate_actions"]) + len(recommendations["short_term_strategies"])
         }
         
-        # Get enhanced AI insights
-        ai_chat = await get_enhanced_ai_chat()
+        # Enhanced AI insights run as a background job; the analytics return now
         ai_prompt = f"""
         Analyze this advanced resource management scenario:
         
@@ -464,8 +465,13 @@ async def get_advanced_resource_allocation(
         Format as structured JSON with specific, measurable recommendations.
         """
         
-        ai_response = await ai_chat.send_message(UserMessage(text=ai_prompt))
-        ai_insights = parse_enhanced_ai_response(ai_response)
+        async def generate_insights():
+            ai_chat = await get_enhanced_ai_chat()
+            return parse_enhanced_ai_response(await ai_chat.send_message(UserMessage(text=ai_prompt)))
+        
+        ai_job_id = await ai_job_service.submit(
+            org_id, current_user.id, "advanced_allocation", generate_insights
+        )
         
         return {
             "workload_analysis": workload_analysis,
@@ -473,7 +479,8 @@ async def get_advanced_resource_allocation(
             "capacity_forecast": capacity_forecast,
             "resource_conflicts": conflicts,
             "optimization_recommendations": recommendations,
-            "ai_strategic_insights": ai_insights,
+            "ai_strategic_insights": None,
+            "ai_job_id": ai_job_id,
             "performance_metrics": {
                 "team_efficiency_score": calculate_team_efficiency_score(workload_analysis),
                 "resource_utilization_balance": calculate_utilization_balance(workload_analysis),
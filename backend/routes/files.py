@@ -4,8 +4,8 @@ File Management Routes
 Provides API endpoints for file upload, download, and management operations.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query, Request
+from fastapi.responses import JSONResponse
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import logging
@@ -13,7 +13,7 @@ import logging
 from database import get_database
 from auth.middleware import get_current_user
 from models import User, File as FileModel, FileCreate, FileUpdate, FileSummary
-from services.s3_service import S3FileService, get_s3_service, FileUploadResult
+from services.file_storage import FileStorageBackend, get_file_storage, get_storage_backend
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +45,7 @@ async def upload_file(
     file: UploadFile = File(...),
     description: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
-    s3_service: S3FileService = Depends(get_s3_service)
+    storage: FileStorageBackend = Depends(get_file_storage)
 ):
     """Upload a file to a project"""
     try:
@@ -53,8 +53,8 @@ async def upload_file(
         db = await get_database()
         await verify_project_access(project_id, current_user, db)
         
-        # Upload file to S3
-        upload_result = await s3_service.upload_file(
+        # Upload file to the configured storage backend
+        upload_result = await storage.upload_file(
             file=file,
             project_id=project_id,
             uploaded_by=current_user.id,
@@ -73,7 +73,8 @@ async def upload_file(
             "size": upload_result.size,
             "checksum": upload_result.checksum,
             "file_path": upload_result.file_path,
-            "storage_backend": "s3",
+            "blob_id": upload_result.blob_id,
+            "storage_backend": storage.backend_name,
             "entity_type": "project",
             "entity_id": project_id,
             "uploaded_by": current_user.id,
@@ -85,8 +86,13 @@ async def upload_file(
             "updated_at": upload_result.uploaded_at
         }
         
-        # Insert file record
-        await db.files.insert_one(file_data)
+        # Insert file record; without it nothing would ever release the blob reference
+        try:
+            await db.files.insert_one(file_data)
+        except Exception:
+            if upload_result.blob_id:
+                await storage.release_blob(upload_result.blob_id)
+            raise
         
         logger.info(f"File {upload_result.filename} uploaded by user {current_user.id} to project {project_id}")
         
@@ -99,6 +105,7 @@ async def upload_file(
                     "filename": upload_result.filename,
                     "size": upload_result.size,
                     "content_type": upload_result.content_type,
+                    "deduplicated": upload_result.deduplicated,
                     "project_id": project_id,
                     "uploaded_at": upload_result.uploaded_at.isoformat()
                 }
@@ -188,10 +195,10 @@ async def list_project_files(
 async def download_file(
     project_id: str,
     file_id: str,
-    current_user: User = Depends(get_current_user),
-    s3_service: S3FileService = Depends(get_s3_service)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
-    """Download a file"""
+    """Download a file, supporting HTTP Range requests for partial and resumed downloads"""
     try:
         # Verify project access
         db = await get_database()
@@ -208,31 +215,23 @@ async def download_file(
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Get file from S3
-        file_generator, s3_response = s3_service.download_file_stream(file_doc["file_path"])
-        
-        # Update download count
-        await db.files.update_one(
-            {"id": file_id},
-            {
-                "$inc": {"download_count": 1},
-                "$set": {"last_accessed": datetime.utcnow()}
-            }
+        # Get file from the backend it was stored in
+        storage = get_storage_backend(file_doc.get("storage_backend", "s3"))
+        range_header = request.headers.get("range")
+        response = storage.build_download_response(
+            file_doc["file_path"],
+            file_doc["name"],
+            file_doc["mime_type"],
+            range_header
         )
         
-        # Prepare response headers
-        headers = {
-            'Content-Disposition': f'attachment; filename="{file_doc["name"]}"',
-        }
-        
-        if 'ContentLength' in s3_response:
-            headers['Content-Length'] = str(s3_response['ContentLength'])
+        # Update download count (range continuations of a download are not counted again)
+        update = {"$set": {"last_accessed": datetime.utcnow()}}
+        if not range_header:
+            update["$inc"] = {"download_count": 1}
+        await db.files.update_one({"id": file_id}, update)
         
-        return StreamingResponse(
-            file_generator,
-            media_type=file_doc["mime_type"],
-            headers=headers
-        )
+        return response
         
     except HTTPException:
         raise
@@ -248,8 +247,7 @@ async def get_download_url(
     project_id: str,
     file_id: str,
     expires_in: Optional[int] = Query(3600, ge=300, le=86400),
-    current_user: User = Depends(get_current_user),
-    s3_service: S3FileService = Depends(get_s3_service)
+    current_user: User = Depends(get_current_user)
 ):
     """Generate a presigned URL for file download"""
     try:
@@ -268,11 +266,15 @@ async def get_download_url(
         if not file_doc:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Generate presigned URL
-        download_url = s3_service.generate_presigned_url(
-            file_doc["file_path"],
-            expiration=expires_in
-        )
+        # Generate presigned URL, falling back to the authenticated API download
+        storage = get_storage_backend(file_doc.get("storage_backend", "s3"))
+        if storage.supports_presigned_urls:
+            download_url = storage.generate_presigned_url(
+                file_doc["file_path"],
+                expiration=expires_in
+            )
+        else:
+            download_url = f"/api/files/projects/{project_id}/{file_id}/download"
         
         return {
             "download_url": download_url,
@@ -294,8 +296,7 @@ async def get_download_url(
 async def delete_file(
     project_id: str,
     file_id: str,
-    current_user: User = Depends(get_current_user),
-    s3_service: S3FileService = Depends(get_s3_service)
+    current_user: User = Depends(get_current_user)
 ):
     """Delete a file"""
     try:
@@ -326,8 +327,19 @@ async def delete_file(
                     detail="Insufficient permissions to delete this file"
                 )
         
-        # Delete from S3
-        s3_service.delete_file(file_doc["file_path"])
+        # Release the blob reference; storage is only deleted when no file uses it
+        storage = get_storage_backend(file_doc.get("storage_backend", "s3"))
+        if file_doc.get("blob_id"):
+            await storage.release_blob(file_doc["blob_id"])
+        else:
+            # Files uploaded before reference counting: check for shared blobs directly
+            shared_references = await db.files.count_documents({
+                "file_path": file_doc["file_path"],
+                "id": {"$ne": file_id},
+                "status": {"$ne": "deleted"}
+            })
+            if not shared_references:
+                storage.delete_file(file_doc["file_path"])
         
         # Mark as deleted in database (soft delete)
         await db.files.update_one(
@@ -407,8 +419,7 @@ async def get_file_info(
 @router.get("/projects/{project_id}/stats")
 async def get_project_file_stats(
     project_id: str,
-    current_user: User = Depends(get_current_user),
-    s3_service: S3FileService = Depends(get_s3_service)
+    current_user: User = Depends(get_current_user)
 ):
     """Get file statistics for a project"""
     try:
@@ -15,26 +15,52 @@ from ai_ml.realtime_collaboration import (
     CollaborationEvent, 
     AIAssistantSession
 )
+from ai_ml.multi_model_ai import MultiModelAIService
+from services.llm_streaming import EventStreamResponse, sse_stream
+from services.websocket_fanout import serialize_message
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/realtime-ai", tags=["Real-time AI"])
 
 # Initialize collaboration engine
 collaboration_engine = RealTimeCollaborationEngine()
+ai_service = MultiModelAIService()
 
 @router.websocket("/ws/{session_id}/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, user_id: str):
-    """WebSocket endpoint for real-time AI collaboration"""
+async def websocket_endpoint(
+    websocket: WebSocket,
+    session_id: str,
+    user_id: str,
+    since: Optional[int] = None,
+    epoch: Optional[str] = None
+):
+    """
+    WebSocket endpoint for real-time AI collaboration.
+    
+    Reconnect with the last ``seq`` and ``epoch`` received to replay missed
+    frames. Sequences are per worker: reconnecting to another worker, or
+    after the buffer evicted the frames, yields ``resync_required`` with that
+    worker's ``seq`` and ``epoch``, and the client reloads the session state.
+    """
+    channel = None
     try:
-        await collaboration_engine.connect_user(websocket, user_id, session_id)
+        channel = await collaboration_engine.connect_user(websocket, user_id, session_id, since=since, epoch=epoch)
         logger.info(f"WebSocket connected: user {user_id}, session {session_id}")
         
         while True:
             try:
                 # Receive message from client
                 data = await websocket.receive_text()
+                channel.touch(len(data))
                 message = json.loads(data)
                 
+                # Keepalives only refresh the connection's activity
+                if message.get("type") == "ping":
+                    channel.send(serialize_message({"type": "pong", "timestamp": datetime.now().isoformat()}))
+                    continue
+                if message.get("type") == "pong":
+                    continue
+                
                 # Create collaboration event
                 event = CollaborationEvent(
                     event_id=f"{user_id}_{datetime.now().timestamp()}",
@@ -52,14 +78,16 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, user_id: str
                 break
             except json.JSONDecodeError:
                 logger.error(f"Invalid JSON received from {user_id}")
-                await websocket.send_text(json.dumps({
+                channel.send(serialize_message({
                     "type": "error",
                     "message": "Invalid JSON format",
                     "timestamp": datetime.now().isoformat()
                 }))
             except Exception as e:
                 logger.error(f"WebSocket error for user {user_id}: {str(e)}")
-                await websocket.send_text(json.dumps({
+                if channel.closed:
+                    break  # dropped as a slow consumer or after a failed send
+                channel.send(serialize_message({
                     "type": "error",
                     "message": str(e),
                     "timestamp": datetime.now().isoformat()
@@ -68,7 +96,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, user_id: str
     except Exception as e:
         logger.error(f"WebSocket connection error: {str(e)}")
     finally:
-        await collaboration_engine.disconnect_user(user_id, session_id)
+        if channel:
+            await collaboration_engine.disconnect_user(channel)
         logger.info(f"WebSocket disconnected: user {user_id}, session {session_id}")
 
 @router.post("/sessions/{session_id}/events")
@@ -176,6 +205,54 @@ async def send_ai_query(
         logger.error(f"Error sending AI query: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/sessions/{session_id}/ai-query/stream")
+async def stream_ai_query(
+    session_id: str,
+    query_data: Dict[str, Any],
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream the AI answer to the caller as server-sent events, then share it with the session"""
+    query = query_data.get("query")
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    
+    model = query_data.get("model", "gpt-4o")
+    if model not in ai_service.models:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {model}")
+    
+    user_id = current_user.id
+    context = query_data.get("context", {})
+    
+    ai_assistant = collaboration_engine.ai_assistants.get(session_id)
+    if ai_assistant:
+        ai_assistant.conversation_history.append({
+            "user_id": user_id,
+            "query": query,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    async def events():
+        yield "start", {"session_id": session_id, "query": query, "model": model}
+        
+        parts = []
+        async for chunk in ai_service.stream_response(prompt=query, model=model, context=context):
+            yield "token", {"seq": len(parts), "delta": chunk}
+            parts.append(chunk)
+        
+        response = "".join(parts)
+        # Other participants get the finished answer over the session WebSocket
+        await collaboration_engine.broadcast_to_session(session_id, {
+            "type": "ai_response",
+            "query": query,
+            "response": response,
+            "user_id": user_id,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+        yield "done", {"session_id": session_id, "character_count": len(response)}
+    
+    return EventStreamResponse(sse_stream(events()))
+
 @router.post("/sessions/{session_id}/planning-update")
 async def send_planning_update(
     session_id: str,
@@ -282,6 +359,24 @@ async def get_ai_assistant_capabilities(current_user: dict = Depends(get_current
         logger.error(f"Error getting AI assistant capabilities: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/websocket/metrics")
+async def get_websocket_metrics(current_user: dict = Depends(get_current_user)):
+    """Get send queue depth, dropped and coalesced message counts for this worker's connections"""
+    try:
+        return collaboration_engine.fanout.get_metrics()
+    except Exception as e:
+        logger.error(f"WebSocket metrics error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sessions/{session_id}/websocket/metrics")
+async def get_session_websocket_metrics(session_id: str, current_user: dict = Depends(get_current_user)):
+    """Get live connections and message/byte rates for a session's WebSockets"""
+    try:
+        return await collaboration_engine.fanout.get_group_metrics(session_id)
+    except Exception as e:
+        logger.error(f"Session WebSocket metrics error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/health")
 async def realtime_ai_health_check():
     """Health check for real-time AI collaboration services"""
@@ -290,9 +385,9 @@ async def realtime_ai_health_check():
             "status": "healthy",
             "service": "Real-time AI Collaboration",
             "active_sessions": len(collaboration_engine.session_users),
-            "active_connections": len(collaboration_engine.active_connections),
+            "active_connections": len(collaboration_engine.fanout.channels),
             "ai_assistants": len(collaboration_engine.ai_assistants),
-            "total_events": len(collaboration_engine.collaboration_events),
+            "total_events": collaboration_engine.total_events,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -7,7 +7,9 @@ import os
 from dotenv import load_dotenv
 
 # Import AI integration
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from emergentintegrations.llm.chat import UserMessage
+from services.llm_cache import CachedLlmChat
+from services.ai_job_service import ai_job_service
 
 # Import database connection
 from database import get_database
@@ -61,7 +63,7 @@ def clean_mongo_docs(docs):
 # Initialize AI chat for resource optimization
 async def get_ai_chat():
     """Initialize AI chat for resource management recommendations"""
-    return LlmChat(
+    return CachedLlmChat(
         api_key=os.getenv("EMERGENT_LLM_KEY"),
         session_id="resource-management",
         system_message="""You are an AI Resource Management Assistant specializing in optimal resource allocation, 
@@ -118,8 +120,7 @@ async def get_ai_resource_allocation(
             "high_priority_tasks": [t for t in org_tasks if t.get("priority") in ["high", "critical"] and t.get("status") in ["todo", "in_progress"]]
         }
         
-        # Get AI recommendations
-        ai_chat = await get_ai_chat()
+        # AI recommendations run as a background job; the analytics return now
         prompt = f"""
         Analyze this resource allocation scenario and provide optimization recommendations:
         
@@ -143,16 +144,19 @@ async def get_ai_resource_allocation(
         Format as JSON with actionable recommendations.
         """
         
-        ai_response = await ai_chat.send_message(UserMessage(text=prompt))
+        async def generate_recommendations():
+            ai_chat = await get_ai_chat()
+            return parse_ai_recommendations(await ai_chat.send_message(UserMessage(text=prompt)))
         
-        # Process AI recommendations
-        ai_recommendations = parse_ai_recommendations(ai_response)
+        ai_job_id = await ai_job_service.submit(
+            org_id, current_user.id, "allocation_optimize", generate_recommendations
+        )
         
         # Generate optimization strategies
         optimization_strategies = generate_optimization_strategies(resource_analysis, ai_context)
         
         # Calculate potential improvements
-        improvement_metrics = calculate_improvement_potential(resource_analysis, ai_recommendations)
+        improvement_metrics = calculate_improvement_potential(resource_analysis, None)
         
         # Add enhanced analytics if enabled
         enhanced_metrics = {}
@@ -161,10 +165,11 @@ async def get_ai_resource_allocation(
         
         return {
             "current_state": resource_analysis,
-            "ai_recommendations": ai_recommendations,
+            "ai_recommendations": None,
+            "ai_job_id": ai_job_id,
             "optimization_strategies": optimization_strategies,
             "improvement_metrics": improvement_metrics,
-            "action_items": generate_action_items(ai_recommendations, resource_analysis),
+            "action_items": generate_action_items(None, resource_analysis),
             "priority_assignments": suggest_priority_assignments(org_tasks, users),
             "capacity_forecast": forecast_capacity_needs(projects, org_tasks, users),
             "enhanced_analytics": enhanced_metrics
@@ -251,8 +256,7 @@ async def get_skills_based_assignment(
                 "assignment_confidence": calculate_assignment_confidence(candidate_users[:3]) if candidate_users else 0
             })
         
-        # Get AI insights for assignment strategy
-        ai_chat = await get_ai_chat()
+        # AI insights for assignment strategy run as a background job
         ai_prompt = f"""
         Analyze these skills-based task assignment recommendations:
         
@@ -269,12 +273,19 @@ async def get_skills_based_assignment(
         4. Potential bottlenecks or conflicts
         """
         
-        ai_insights = await ai_chat.send_message(UserMessage(text=ai_prompt))
+        async def generate_insights():
+            ai_chat = await get_ai_chat()
+            return parse_ai_insights(await ai_chat.send_message(UserMessage(text=ai_prompt)))
+        
+        ai_job_id = await ai_job_service.submit(
+            org_id, current_user.id, "skills_assignment", generate_insights
+        )
         
         return {
             "assignment_recommendations": assignment_recommendations,
             "skills_analysis": analyze_team_skills(users),
-            "ai_insights": parse_ai_insights(ai_insights),
+            "ai_insights": None,
+            "ai_job_id": ai_job_id,
             "assignment_strategy": {
                 "total_unassigned_tasks": len(target_tasks),
                 "recommended_assignments": len(assignment_recommendations),
@@ -326,8 +337,7 @@ async def get_capacity_planning(
         # Team-level capacity analysis
         team_capacity = analyze_team_capacity(teams, users, org_tasks)
         
-        # Generate capacity recommendations with AI
-        ai_chat = await get_ai_chat()
+        # AI capacity recommendations run as a background job
         ai_prompt = f"""
         Analyze this capacity planning scenario for the next {weeks_ahead} weeks:
         
@@ -352,7 +362,13 @@ async def get_capacity_planning(
         5. Capacity optimization strategies
         """
         
-        ai_recommendations = await ai_chat.send_message(UserMessage(text=ai_prompt))
+        async def generate_recommendations():
+            ai_chat = await get_ai_chat()
+            return parse_ai_recommendations(await ai_chat.send_message(UserMessage(text=ai_prompt)))
+        
+        ai_job_id = await ai_job_service.submit(
+            org_id, current_user.id, f"capacity_planning:{weeks_ahead}", generate_recommendations
+        )
         
         # Generate capacity optimization plan
         optimization_plan = generate_capacity_optimization_plan(
@@ -364,7 +380,8 @@ async def get_capacity_planning(
             "capacity_forecast": capacity_forecast,
             "team_capacity": team_capacity,
             "bottlenecks": bottlenecks,
-            "ai_recommendations": parse_ai_recommendations(ai_recommendations),
+            "ai_recommendations": None,
+            "ai_job_id": ai_job_id,
             "optimization_plan": optimization_plan,
             "capacity_metrics": {
                 "total_capacity_hours": sum(40 for _ in users) * weeks_ahead,  # Assume 40h/week
@@ -386,6 +403,34 @@ async def get_capacity_planning(
             detail=f"Failed to get capacity planning: {str(e)}"
         )
 
+@router.get("/ai-jobs/{job_id}", response_model=Dict[str, Any])
+async def get_ai_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Poll a background AI recommendation job"""
+    job = await ai_job_service.get_job(job_id, current_user.organization_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="AI job not found"
+        )
+    return job
+
+@router.delete("/ai-jobs/{job_id}", response_model=Dict[str, Any])
+async def cancel_ai_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Cancel a queued or running AI recommendation job"""
+    cancelled = await ai_job_service.cancel(job_id, current_user.organization_id)
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="AI job not found or already finished"
+        )
+    return {"job_id": job_id, "status": "cancelled"}
+
 @router.get("/conflicts/detection", response_model=Dict[str, Any])
 async def detect_resource_conflicts(
     current_user: User = Depends(get_current_active_user)
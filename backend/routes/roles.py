@@ -1,10 +1,16 @@
 """
 Role and Permission management routes for custom role creation and assignment
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from pymongo import UpdateOne, UpdateMany
+from typing import List, Optional, Dict, Any, AsyncIterator
 from datetime import datetime
+from starlette.requests import ClientDisconnect
+import codecs
 import logging
+import json
+import uuid
 
 from database import get_database
 from models.role import (
@@ -14,75 +20,11 @@ from models.role import (
 )
 from models.user import User, UserRole
 from auth.middleware import get_current_user, get_current_active_user
+from services.permission_service import AVAILABLE_PERMISSIONS, PERMISSION_BITS, permission_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/roles", tags=["Role Management"])
 
-# Define all available permissions
-AVAILABLE_PERMISSIONS = {
-    "project": [
-        {"name": "create_project", "display_name": "Create Project", "description": "Create new projects"},
-        {"name": "edit_project", "display_name": "Edit Project", "description": "Edit existing projects"},
-        {"name": "delete_project", "display_name": "Delete Project", "description": "Delete projects"},
-        {"name": "view_project", "display_name": "View Project", "description": "View project details"},
-        {"name": "manage_project_team", "display_name": "Manage Project Team", "description": "Add/remove team members from projects"},
-        {"name": "view_project_analytics", "display_name": "View Project Analytics", "description": "Access project analytics and reports"},
-        {"name": "manage_project_budget", "display_name": "Manage Project Budget", "description": "Manage project budget and financial tracking"},
-    ],
-    "task": [
-        {"name": "create_task", "display_name": "Create Task", "description": "Create new tasks"},
-        {"name": "edit_task", "display_name": "Edit Task", "description": "Edit existing tasks"},
-        {"name": "delete_task", "display_name": "Delete Task", "description": "Delete tasks"},
-        {"name": "assign_task", "display_name": "Assign Task", "description": "Assign tasks to team members"},
-        {"name": "view_task_details", "display_name": "View Task Details", "description": "View detailed task information"},
-        {"name": "manage_task_dependencies", "display_name": "Manage Task Dependencies", "description": "Create and manage task dependencies"},
-        {"name": "view_task_time_tracking", "display_name": "View Task Time Tracking", "description": "Access task time tracking data"},
-    ],
-    "team": [
-        {"name": "create_team", "display_name": "Create Team", "description": "Create new teams"},
-        {"name": "edit_team", "display_name": "Edit Team", "description": "Edit team information"},
-        {"name": "delete_team", "display_name": "Delete Team", "description": "Delete teams"},
-        {"name": "manage_team_members", "display_name": "Manage Team Members", "description": "Add/remove team members"},
-        {"name": "view_team_analytics", "display_name": "View Team Analytics", "description": "Access team performance analytics"},
-        {"name": "manage_team_skills", "display_name": "Manage Team Skills", "description": "Manage team skills and competencies"},
-        {"name": "view_team_workload", "display_name": "View Team Workload", "description": "View team workload distribution"},
-    ],
-    "user": [
-        {"name": "create_user", "display_name": "Create User", "description": "Create new user accounts"},
-        {"name": "edit_user", "display_name": "Edit User", "description": "Edit user profiles"},
-        {"name": "delete_user", "display_name": "Delete User", "description": "Delete user accounts"},
-        {"name": "manage_user_roles", "display_name": "Manage User Roles", "description": "Assign and manage user roles"},
-        {"name": "view_user_profiles", "display_name": "View User Profiles", "description": "View detailed user profiles"},
-        {"name": "invite_users", "display_name": "Invite Users", "description": "Send user invitations"},
-        {"name": "manage_user_permissions", "display_name": "Manage User Permissions", "description": "Directly manage user permissions"},
-    ],
-    "system": [
-        {"name": "manage_system_settings", "display_name": "Manage System Settings", "description": "Access system configuration"},
-        {"name": "view_system_logs", "display_name": "View System Logs", "description": "Access system logs and diagnostics"},
-        {"name": "manage_integrations", "display_name": "Manage Integrations", "description": "Configure system integrations"},
-        {"name": "export_data", "display_name": "Export Data", "description": "Export system data"},
-        {"name": "manage_organizations", "display_name": "Manage Organizations", "description": "Manage organization settings"},
-        {"name": "backup_restore", "display_name": "Backup & Restore", "description": "Perform system backup and restore operations"},
-        {"name": "manage_api_access", "display_name": "Manage API Access", "description": "Configure API access and keys"},
-    ],
-    "security": [
-        {"name": "manage_security_settings", "display_name": "Manage Security Settings", "description": "Configure security settings"},
-        {"name": "view_security_dashboard", "display_name": "View Security Dashboard", "description": "Access security monitoring dashboard"},
-        {"name": "manage_mfa", "display_name": "Manage MFA", "description": "Configure multi-factor authentication"},
-        {"name": "audit_access", "display_name": "Audit Access", "description": "Access audit logs and security reports"},
-        {"name": "manage_compliance", "display_name": "Manage Compliance", "description": "Manage compliance settings and reports"},
-        {"name": "view_threat_detection", "display_name": "View Threat Detection", "description": "Access threat detection and response"},
-    ],
-    "analytics": [
-        {"name": "view_analytics", "display_name": "View Analytics", "description": "Access analytics dashboards"},
-        {"name": "export_reports", "display_name": "Export Reports", "description": "Export analytics reports"},
-        {"name": "manage_dashboards", "display_name": "Manage Dashboards", "description": "Create and manage custom dashboards"},
-        {"name": "view_financial_data", "display_name": "View Financial Data", "description": "Access financial analytics and reports"},
-        {"name": "advanced_analytics", "display_name": "Advanced Analytics", "description": "Access advanced analytics features"},
-        {"name": "ai_insights", "display_name": "AI Insights", "description": "Access AI-powered insights and recommendations"},
-    ]
-}
-
 # Role templates for common enterprise scenarios
 ROLE_TEMPLATES = [
     {
@@ -210,11 +152,7 @@ async def create_custom_role(
         )
     
     # Validate permissions
-    all_permissions = []
-    for category_permissions in AVAILABLE_PERMISSIONS.values():
-        all_permissions.extend([p["name"] for p in category_permissions])
-    
-    invalid_permissions = [p for p in role_data.permissions if p not in all_permissions]
+    invalid_permissions = [p for p in role_data.permissions if p not in PERMISSION_BITS]
     if invalid_permissions:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -245,6 +183,7 @@ async def create_custom_role(
     result = await db.custom_roles.insert_one(role_dict)
     
     if result.inserted_id:
+        await permission_service.invalidate_organization(db, custom_role.organization_id)
         logger.info(f"Custom role created: {custom_role.name} by {current_user.email}")
         return custom_role
     
@@ -305,11 +244,7 @@ async def update_custom_role(
     
     # Validate permissions if provided
     if role_update.permissions:
-        all_permissions = []
-        for category_permissions in AVAILABLE_PERMISSIONS.values():
-            all_permissions.extend([p["name"] for p in category_permissions])
-        
-        invalid_permissions = [p for p in role_update.permissions if p not in all_permissions]
+        invalid_permissions = [p for p in role_update.permissions if p not in PERMISSION_BITS]
         if invalid_permissions:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -340,6 +275,9 @@ async def update_custom_role(
             detail="No changes were made"
         )
     
+    # Permissions of every holder (and of child roles) may have changed
+    await permission_service.invalidate_organization(db, current_user.organization_id)
+    
     # Get updated role
     updated_role_doc = await db.custom_roles.find_one({
         "id": role_id,
@@ -401,6 +339,8 @@ async def delete_custom_role(
             detail="Failed to delete role"
         )
     
+    await permission_service.invalidate_organization(db, current_user.organization_id)
+    
     logger.info(f"Custom role deleted: {role_id} by {current_user.email}")
     return {"message": "Role deleted successfully"}
 
@@ -471,6 +411,7 @@ async def assign_role_to_user(
             {"id": assignment.role_id},
             {"$inc": {"user_count": 1}}
         )
+        await permission_service.invalidate_users(db, assignment.organization_id, [assignment.user_id])
         
         logger.info(f"Role assigned: {assignment.role_id} to {assignment.user_id} by {current_user.email}")
         return role_assignment
@@ -480,6 +421,88 @@ async def assign_role_to_user(
         detail="Failed to assign role"
     )
 
+# Users applied per bulk_write by the streaming bulk-assign endpoint
+BULK_ASSIGN_CHUNK_SIZE = 1000
+
+async def _apply_bulk_assignment(
+    db,
+    role_id: str,
+    organization_id: str,
+    user_ids: List[str],
+    assigned_by: str,
+    valid_from: Optional[datetime] = None,
+    valid_until: Optional[datetime] = None,
+    notes: Optional[str] = None,
+    revoke_user_ids: Optional[List[str]] = None
+) -> List[Dict[str, str]]:
+    """Diff requested users against current holders and apply it in one bulk_write"""
+    user_ids = list(dict.fromkeys(user_ids))
+    
+    existing_users = set(await db.users.distinct("id", {
+        "id": {"$in": user_ids},
+        "organization_id": organization_id
+    }))
+    current_holders = set(await db.role_assignments.distinct("user_id", {
+        "user_id": {"$in": user_ids},
+        "role_id": role_id,
+        "organization_id": organization_id,
+        "is_active": True
+    }))
+    
+    results = []
+    operations = []
+    for user_id in user_ids:
+        if user_id not in existing_users:
+            results.append({"user_id": user_id, "status": "user_not_found"})
+        elif user_id in current_holders:
+            results.append({"user_id": user_id, "status": "already_assigned"})
+        else:
+            role_assignment = RoleAssignment(
+                user_id=user_id,
+                role_id=role_id,
+                organization_id=organization_id,
+                assigned_by=assigned_by,
+                valid_from=valid_from,
+                valid_until=valid_until,
+                notes=notes
+            )
+            # Upsert on the active assignment so a concurrent assign can't duplicate it
+            operations.append(UpdateOne(
+                {"user_id": user_id, "role_id": role_id, "organization_id": organization_id, "is_active": True},
+                {"$setOnInsert": role_assignment.model_dump()},
+                upsert=True
+            ))
+            results.append({"user_id": user_id, "status": "assigned"})
+    
+    if revoke_user_ids:
+        operations.append(UpdateMany(
+            {
+                "user_id": {"$in": revoke_user_ids},
+                "role_id": role_id,
+                "organization_id": organization_id,
+                "is_active": True
+            },
+            {"$set": {"is_active": False, "revoked_by": assigned_by, "updated_at": datetime.utcnow()}}
+        ))
+        results.extend({"user_id": user_id, "status": "revoked"} for user_id in revoke_user_ids)
+    
+    if operations:
+        result = await db.role_assignments.bulk_write(operations, ordered=False)
+        user_count_change = result.upserted_count - (result.modified_count if revoke_user_ids else 0)
+        if user_count_change:
+            await db.custom_roles.update_one(
+                {"id": role_id},
+                {"$inc": {"user_count": user_count_change}}
+            )
+    
+    return results
+
+def _summarize_bulk_results(results: List[Dict[str, str]]) -> Dict[str, int]:
+    summary = {"assigned": 0, "already_assigned": 0, "user_not_found": 0, "revoked": 0}
+    for entry in results:
+        summary[entry["status"]] += 1
+    return summary
+
 @router.post("/bulk-assign", response_model=Dict[str, Any])
 async def bulk_assign_role(
     bulk_assignment: BulkRoleAssignment,
@@ -501,70 +524,172 @@ async def bulk_assign_role(
             detail="Role not found"
         )
     
-    # Validate all users exist
-    users_cursor = db.users.find({
-        "id": {"$in": bulk_assignment.user_ids},
-        "organization_id": bulk_assignment.organization_id
-    })
-    
-    existing_users = []
-    async for user_doc in users_cursor:
-        existing_users.append(user_doc["id"])
-    
-    missing_users = [uid for uid in bulk_assignment.user_ids if uid not in existing_users]
-    if missing_users:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Users not found: {', '.join(missing_users)}"
-        )
-    
-    # Check for existing assignments
-    existing_assignments_cursor = db.role_assignments.find({
-        "user_id": {"$in": bulk_assignment.user_ids},
-        "role_id": bulk_assignment.role_id,
-        "is_active": True
-    })
+    # Current holders outside the requested set are revoked when asked to
+    revoke_user_ids = []
+    if bulk_assignment.revoke_missing:
+        requested = set(bulk_assignment.user_ids)
+        holders = await db.role_assignments.distinct("user_id", {
+            "role_id": bulk_assignment.role_id,
+            "organization_id": bulk_assignment.organization_id,
+            "is_active": True
+        })
+        revoke_user_ids = [user_id for user_id in holders if user_id not in requested]
+    
+    results = await _apply_bulk_assignment(
+        db,
+        role_id=bulk_assignment.role_id,
+        organization_id=bulk_assignment.organization_id,
+        user_ids=bulk_assignment.user_ids,
+        assigned_by=current_user.id,
+        valid_from=bulk_assignment.valid_from,
+        valid_until=bulk_assignment.valid_until,
+        notes=bulk_assignment.notes,
+        revoke_user_ids=revoke_user_ids
+    )
+    summary = _summarize_bulk_results(results)
     
-    existing_assignments = []
-    async for assignment_doc in existing_assignments_cursor:
-        existing_assignments.append(assignment_doc["user_id"])
+    changed_users = [entry["user_id"] for entry in results if entry["status"] in ("assigned", "revoked")]
+    if changed_users:
+        await permission_service.invalidate_users(db, bulk_assignment.organization_id, changed_users)
     
-    # Create assignments for users who don't already have the role
-    new_assignments = []
-    for user_id in bulk_assignment.user_ids:
-        if user_id not in existing_assignments:
-            role_assignment = RoleAssignment(
-                user_id=user_id,
-                role_id=bulk_assignment.role_id,
-                organization_id=bulk_assignment.organization_id,
-                assigned_by=current_user.id,
-                valid_from=bulk_assignment.valid_from,
-                valid_until=bulk_assignment.valid_until,
-                notes=bulk_assignment.notes
-            )
-            new_assignments.append(role_assignment.model_dump())
-    
-    # Insert new assignments
-    if new_assignments:
-        result = await db.role_assignments.insert_many(new_assignments)
-        
-        if result.inserted_ids:
-            # Update role user count
-            await db.custom_roles.update_one(
-                {"id": bulk_assignment.role_id},
-                {"$inc": {"user_count": len(new_assignments)}}
-            )
-    
-    logger.info(f"Bulk role assignment: {bulk_assignment.role_id} to {len(new_assignments)} users by {current_user.email}")
+    logger.info(f"Bulk role assignment: {bulk_assignment.role_id} to {summary['assigned']} users by {current_user.email}")
     
     return {
         "message": "Bulk role assignment completed",
         "total_users": len(bulk_assignment.user_ids),
-        "new_assignments": len(new_assignments),
-        "existing_assignments": len(existing_assignments),
-        "role_name": role_doc["display_name"]
+        "new_assignments": summary["assigned"],
+        "existing_assignments": summary["already_assigned"],
+        "revoked_assignments": summary["revoked"],
+        "missing_users": summary["user_not_found"],
+        "role_name": role_doc["display_name"],
+        "results": results
     }
 
+class _RequestStreamingResponse(StreamingResponse):
+    """
+    Streams a response while the handler is still reading the request body.
+    
+    StreamingResponse normally listens for a client disconnect by calling
+    receive(), which would swallow body chunks; here the body reader owns
+    receive() and notices a disconnect itself (ClientDisconnect).
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+@router.post("/bulk-assign/stream")
+async def stream_bulk_assign_role(
+    request: Request,
+    role_id: str = Query(..., description="Role ID to assign"),
+    organization_id: str = Query(..., description="Organization ID"),
+    notes: Optional[str] = Query(None, max_length=500, description="Assignment notes"),
+    revoke_missing: bool = Query(False, description="Deactivate the role for current holders not in the upload"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Bulk assign a role to a very large user list.
+    
+    The request body is newline-delimited user IDs, consumed incrementally and
+    applied in chunks of BULK_ASSIGN_CHUNK_SIZE with one bulk_write each.
+    Each chunk's results are streamed as an NDJSON line as soon as it is
+    applied, followed by a summary line. Permission caches are invalidated
+    once for the organization at the end.
+    """
+    check_admin_permission(current_user)
+    db = await get_database()
+    
+    role_doc = await db.custom_roles.find_one({
+        "id": role_id,
+        "organization_id": organization_id
+    })
+    
+    if not role_doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Role not found"
+        )
+    
+    async def read_user_ids() -> AsyncIterator[List[str]]:
+        # Incremental decoding keeps a multibyte character split across body chunks intact
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        chunk = []
+        async for data in request.stream():
+            buffer += decoder.decode(data)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                user_id = line.strip().strip('"')
+                if user_id:
+                    chunk.append(user_id)
+                if len(chunk) >= BULK_ASSIGN_CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+        user_id = (buffer + decoder.decode(b"", final=True)).strip().strip('"')
+        if user_id:
+            chunk.append(user_id)
+        if chunk:
+            yield chunk
+    
+    # Holders listed in this upload are marked, so revoke_missing needs no in-memory set of
+    # uploaded IDs; the marker only lives for the duration of the upload
+    upload_id = str(uuid.uuid4())
+    
+    async def generate() -> AsyncIterator[bytes]:
+        totals = {"assigned": 0, "already_assigned": 0, "user_not_found": 0, "revoked": 0}
+        chunk_number = 0
+        try:
+            async for user_ids in read_user_ids():
+                results = await _apply_bulk_assignment(
+                    db, role_id, organization_id, user_ids, current_user.id, notes=notes
+                )
+                if revoke_missing:
+                    await db.role_assignments.update_many(
+                        {
+                            "user_id": {"$in": user_ids},
+                            "role_id": role_id,
+                            "organization_id": organization_id,
+                            "is_active": True
+                        },
+                        {"$set": {"bulk_upload_id": upload_id}}
+                    )
+                for status_name, count in _summarize_bulk_results(results).items():
+                    totals[status_name] += count
+                chunk_number += 1
+                yield (json.dumps({"chunk": chunk_number, "results": results}) + "\n").encode()
+            
+            if revoke_missing:
+                revoke_user_ids = await db.role_assignments.distinct("user_id", {
+                    "role_id": role_id,
+                    "organization_id": organization_id,
+                    "is_active": True,
+                    "bulk_upload_id": {"$ne": upload_id}
+                })
+                if revoke_user_ids:
+                    results = await _apply_bulk_assignment(
+                        db, role_id, organization_id, [], current_user.id, revoke_user_ids=revoke_user_ids
+                    )
+                    totals["revoked"] += len(results)
+                    chunk_number += 1
+                    yield (json.dumps({"chunk": chunk_number, "results": results}) + "\n").encode()
+            
+            logger.info(f"Streaming bulk role assignment: {role_id} to {totals['assigned']} users by {current_user.email}")
+            yield (json.dumps({"summary": totals, "role_name": role_doc["display_name"]}) + "\n").encode()
+        finally:
+            if revoke_missing:
+                await db.role_assignments.update_many(
+                    {"bulk_upload_id": upload_id},
+                    {"$unset": {"bulk_upload_id": ""}}
+                )
+            # One invalidation for the whole upload instead of one per chunk
+            await permission_service.invalidate_organization(db, organization_id)
+    
+    return _RequestStreamingResponse(generate(), media_type="application/x-ndjson")
+
 @router.get("/users/{user_id}/permissions", response_model=UserPermissions)
 async def get_user_permissions(
     user_id: str,
@@ -573,50 +698,20 @@ async def get_user_permissions(
     """Get effective permissions for a user"""
     db = await get_database()
     
-    # Validate user exists
-    user_doc = await db.users.find_one({
-        "id": user_id,
-        "organization_id": current_user.organization_id
-    })
+    effective = await permission_service.get_effective_permissions(
+        db, current_user.organization_id, user_id
+    )
     
-    if not user_doc:
+    if not effective:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Get user's role assignments
-    assignments_cursor = db.role_assignments.find({
-        "user_id": user_id,
-        "is_active": True,
-        "organization_id": current_user.organization_id
-    })
-    
-    roles = []
-    all_permissions = set()
-    
-    async for assignment_doc in assignments_cursor:
-        role_doc = await db.custom_roles.find_one({"id": assignment_doc["role_id"]})
-        if role_doc:
-            role_permissions = role_doc.get("permissions", [])
-            all_permissions.update(role_permissions)
-            roles.append({
-                "role_id": role_doc["id"],
-                "role_name": role_doc["display_name"],
-                "permissions": role_permissions
-            })
-    
-    # Also include permissions from system role if applicable
-    user_system_role = user_doc.get("role")
-    if user_system_role in ["super_admin", "admin"]:
-        # Admins get all permissions
-        for category_permissions in AVAILABLE_PERMISSIONS.values():
-            all_permissions.update([p["name"] for p in category_permissions])
-    
     return UserPermissions(
         user_id=user_id,
-        effective_permissions=list(all_permissions),
-        roles=roles
+        effective_permissions=effective.permissions,
+        roles=effective.roles_summary()
     )
 
 @router.post("/validate-permission", response_model=PermissionValidation)
@@ -628,15 +723,19 @@ async def validate_user_permission(
     """Validate if a user has a specific permission"""
     db = await get_database()
     
-    # Get user permissions
-    user_permissions_data = await get_user_permissions(user_id, current_user)
+    effective = await permission_service.get_effective_permissions(
+        db, current_user.organization_id, user_id
+    )
     
-    has_permission = permission in user_permissions_data.effective_permissions
-    source_roles = [role["role_name"] for role in user_permissions_data.roles if permission in role["permissions"]]
+    if not effective:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
     
     return PermissionValidation(
         user_id=user_id,
         permission=permission,
-        has_permission=has_permission,
-        source_roles=source_roles
+        has_permission=effective.has(permission),
+        source_roles=effective.source_roles(permission)
     )
\ No newline at end of file
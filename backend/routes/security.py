@@ -4,6 +4,7 @@ Phase 4.3: Advanced Security Framework with Zero-Trust Architecture
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
@@ -303,27 +304,37 @@ async def get_security_events(
             detail="Failed to retrieve security events"
         )
 
-@router.post("/audit/export", response_model=dict)
+@router.post("/audit/export")
 async def export_audit_trail(
     start_date: datetime,
     end_date: datetime,
-    format: str = "json",
+    checkpoint: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Export audit trail for compliance reporting"""
+    """
+    Stream the audit trail as NDJSON for compliance reporting.
+    
+    Events are verified against the hash chain as they stream. Pass the token
+    from the last ``checkpoint`` line to resume an interrupted export.
+    """
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions to export audit trail"
         )
     
+    resume_state = None
+    if checkpoint:
+        try:
+            resume_state = security_service.decode_export_checkpoint(
+                checkpoint, current_user.organization_id, start_date, end_date
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     db = await get_database()
     
     try:
-        export_result = await security_service.export_audit_trail(
-            db, current_user.organization_id, start_date, end_date, format
-        )
-        
         # Log audit export
         await security_service.log_security_event(
             db,
@@ -334,7 +345,15 @@ async def export_audit_trail(
             risk_level=RiskLevel.MEDIUM
         )
         
-        return export_result
+        return StreamingResponse(
+            security_service.stream_audit_trail(
+                db, current_user.organization_id, start_date, end_date, resume_state
+            ),
+            media_type="application/x-ndjson",
+            headers={
+                "Content-Disposition": f'attachment; filename="audit-trail-{start_date.date()}-{end_date.date()}.ndjson"'
+            }
+        )
         
     except Exception as e:
         logger.error(f"Failed to export audit trail: {e}")
@@ -732,6 +751,34 @@ async def get_compliance_status(
             detail="Failed to retrieve compliance status"
         )
 
+@router.get("/rate-limits/metrics", response_model=Dict[str, Any])
+async def get_rate_limit_metrics(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get rate limiter decisions and security cache sizes for this worker"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions to view rate limit metrics"
+        )
+    
+    from auth.enhanced_security import enhanced_security
+    return enhanced_security.get_rate_limit_metrics()
+
+@router.get("/password-hashing/metrics", response_model=Dict[str, Any])
+async def get_password_hashing_metrics(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get password hashing pool queue depth and timings for this worker"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions to view password hashing metrics"
+        )
+    
+    from auth.utils import password_hashing_pool
+    return password_hashing_pool.get_metrics()
+
 @router.get("/health", response_model=dict)
 async def security_system_health():
     """Check security system health"""
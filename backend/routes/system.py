@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.responses import JSONResponse
-from auth.middleware import get_current_user
+from auth.middleware import get_current_user, require_admin
 import asyncio
 import logging
 
@@ -399,6 +399,14 @@ async def system_health():
             detail=f"System health check failed: {str(e)}"
         )
 
+@router.get("/compute/metrics", status_code=200)
+async def compute_executor_metrics(current_user: dict = Depends(require_admin)):
+    """
+    Queue depth, latency and job counts for this worker's compute executor (admin only)
+    """
+    from services.compute_executor import compute_executor
+    return compute_executor.get_metrics()
+
 @router.post("/clear-demo-data", status_code=200)
 async def clear_demo_data(current_user: dict = Depends(get_current_user)):
     """
@@ -11,6 +11,7 @@ from models.user import (
     User, UserCreate, UserUpdate, UserResponse, UserRole, UserStatus
 )
 from auth.middleware import get_current_active_user
+from services.permission_service import permission_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/users", tags=["Users"])
@@ -193,6 +194,9 @@ async def update_user_role(
             detail="No changes made"
         )
     
+    # System role decides admin-wide permissions
+    await permission_service.invalidate_users(db, target_user["organization_id"], [user_id])
+    
     logger.info(f"User role updated: {user_id} -> {new_role} by {current_user.email}")
     return {"message": "User role updated successfully", "new_role": new_role}
 
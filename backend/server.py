@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
 import os
+import asyncio
 from dotenv import load_dotenv
 import uvicorn
 import logging
@@ -89,10 +90,32 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Failed to connect to database: {e}")
         raise
     
+    # Warm the compute worker processes before taking traffic
+    from services.compute_executor import compute_executor
+    await compute_executor.start()
+    
+    # Relay WebSocket broadcasts between workers
+    from services.broadcast_bus import broadcast_bus
+    await broadcast_bus.start()
+    
+    # Retrain predictive models in the background on a schedule
+    from routes.ai_ml import predictive_engine
+    training_task = asyncio.create_task(predictive_engine.run_scheduled_training(
+        float(os.getenv("ML_TRAINING_INTERVAL_SECONDS", "21600"))
+    ))
+    
+    # Fail AI jobs left unfinished by workers that stopped
+    from services.ai_job_service import ai_job_service
+    ai_job_reaper_task = asyncio.create_task(ai_job_service.run_stale_job_reaper())
+    
     yield
     
     # Shutdown
     logger.info("📴 Shutting down API...")
+    training_task.cancel()
+    ai_job_reaper_task.cancel()
+    await broadcast_bus.stop()
+    compute_executor.shutdown()
     await close_mongo_connection()
 
 async def auto_load_demo_data():
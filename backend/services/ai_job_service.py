@@ -0,0 +1,254 @@
+"""
+AI Job Service
+Background LLM analyses whose results are polled or pushed over WebSocket
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AI_JOBS_MAX_CONCURRENT_PER_ORG = int(os.getenv("AI_JOBS_MAX_CONCURRENT_PER_ORG", "2"))
+AI_JOB_RESULT_TTL_HOURS = int(os.getenv("AI_JOB_RESULT_TTL_HOURS", "24"))
+# Slot leases are renewed by the running worker; one that dies frees its slot after this
+AI_JOB_SLOT_LEASE_SECONDS = float(os.getenv("AI_JOB_SLOT_LEASE_SECONDS", "60"))
+AI_JOB_SLOT_POLL_SECONDS = 1.0
+# Unfinished jobs whose worker stopped heartbeating for this long are marked failed
+AI_JOB_STALE_SECONDS = float(os.getenv("AI_JOB_STALE_SECONDS", "300"))
+
+class AIJobService:
+    """
+    Runs LLM recommendation jobs off the request path.
+
+    Job state lives in the ``ai_jobs`` collection so any worker can answer a
+    poll; the coroutine itself runs in the worker that accepted the request.
+    A new job for the same (organization, user, kind) supersedes the previous
+    one. Each organization runs at most ``max_concurrent_per_org`` jobs across
+    all workers, enforced by numbered Mongo slot leases.
+    """
+
+    def __init__(self, max_concurrent_per_org: int = AI_JOBS_MAX_CONCURRENT_PER_ORG):
+        self.max_concurrent_per_org = max_concurrent_per_org
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._latest: Dict[Tuple[str, str, str], str] = {}
+
+    async def _acquire_slot(self, db, job_id: str, organization_id: str) -> Optional[str]:
+        """Wait for one of the organization's slots; None if the job stopped being queued"""
+        from services.leases import acquire_lease
+
+        while True:
+            for index in range(self.max_concurrent_per_org):
+                name = f"ai_job_slot:{organization_id}:{index}"
+                if await acquire_lease(name, AI_JOB_SLOT_LEASE_SECONDS, holder=job_id):
+                    return name
+            waiting = await db.ai_jobs.update_one(
+                {"id": job_id, "status": "queued"},
+                {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+            if waiting.matched_count == 0:
+                return None
+            await asyncio.sleep(AI_JOB_SLOT_POLL_SECONDS)
+
+    async def _hold_slot(self, db, job_id: str, slot: str):
+        """Renew the slot lease and the job heartbeat until cancelled"""
+        from services.leases import acquire_lease
+
+        while True:
+            await asyncio.sleep(AI_JOB_SLOT_LEASE_SECONDS / 3)
+            try:
+                await acquire_lease(slot, AI_JOB_SLOT_LEASE_SECONDS, holder=job_id)
+                await db.ai_jobs.update_one({"id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+            except Exception as e:
+                logger.warning(f"AI job {job_id} heartbeat failed: {e}")
+
+    async def submit(
+        self,
+        organization_id: str,
+        user_id: str,
+        kind: str,
+        run: Callable[[], Awaitable[Any]]
+    ) -> str:
+        """Queue run() as a job and return its id immediately"""
+        from database import get_database
+
+        db = await get_database()
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+
+        # Supersede earlier unfinished jobs for the same analysis, here and on other workers
+        await db.ai_jobs.update_many(
+            {
+                "organization_id": organization_id,
+                "user_id": user_id,
+                "kind": kind,
+                "status": {"$in": ["queued", "running"]}
+            },
+            {"$set": {"status": "superseded", "superseded_by": job_id, "completed_at": now}}
+        )
+        previous_id = self._latest.get((organization_id, user_id, kind))
+        previous_task = self._tasks.get(previous_id) if previous_id else None
+        if previous_task and not previous_task.done():
+            previous_task.cancel()
+
+        await db.ai_jobs.insert_one({
+            "id": job_id,
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "kind": kind,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "started_at": None,
+            "completed_at": None,
+            "heartbeat_at": now,
+            "expires_at": now + timedelta(hours=AI_JOB_RESULT_TTL_HOURS)
+        })
+
+        self._latest[(organization_id, user_id, kind)] = job_id
+        task = asyncio.create_task(self._execute(job_id, organization_id, user_id, kind, run))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._forget(job_id, (organization_id, user_id, kind)))
+        return job_id
+
+    def _forget(self, job_id: str, latest_key: Tuple[str, str, str]):
+        self._tasks.pop(job_id, None)
+        if self._latest.get(latest_key) == job_id:
+            del self._latest[latest_key]
+
+    async def _execute(
+        self,
+        job_id: str,
+        organization_id: str,
+        user_id: str,
+        kind: str,
+        run: Callable[[], Awaitable[Any]]
+    ):
+        from database import get_database
+
+        from services.leases import release_lease
+
+        db = await get_database()
+        status, result, error = "failed", None, None
+        slot, heartbeat = None, None
+        try:
+            slot = await self._acquire_slot(db, job_id, organization_id)
+            if slot is None:
+                return  # superseded or cancelled while queued
+            now = datetime.utcnow()
+            started = await db.ai_jobs.update_one(
+                {"id": job_id, "status": "queued"},
+                {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}}
+            )
+            if started.modified_count == 0:
+                return  # superseded or cancelled while queued
+            heartbeat = asyncio.create_task(self._hold_slot(db, job_id, slot))
+            result = await run()
+            status = "completed"
+        except asyncio.CancelledError:
+            # Superseding and cancelling calls record their own status; any other
+            # cancellation (e.g. shutdown) must not leave the job looking live
+            try:
+                await db.ai_jobs.update_one(
+                    {"id": job_id, "status": {"$in": ["queued", "running"]}},
+                    {"$set": {"status": "cancelled", "completed_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                logger.error(f"Failed to record cancellation of AI job {job_id}: {e}")
+            raise
+        except Exception as e:
+            error = str(e)
+            logger.error(f"AI job {job_id} ({kind}) failed: {e}")
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+            if slot:
+                await release_lease(slot, holder=job_id)
+
+        # Only a still-running job may record its outcome
+        finished = await db.ai_jobs.update_one(
+            {"id": job_id, "status": "running"},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "error": error,
+                "completed_at": datetime.utcnow()
+            }}
+        )
+        if finished.modified_count:
+            await self._notify(user_id, {
+                "type": "ai_job_completed",
+                "job_id": job_id,
+                "kind": kind,
+                "status": status,
+                "result": result,
+                "error": error,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+
+    async def _notify(self, user_id: str, message: Dict[str, Any]):
+        try:
+            from routes.realtime_ai import collaboration_engine
+            await collaboration_engine.send_to_user(user_id, message)
+        except Exception as e:
+            logger.error(f"AI job notification failed for {user_id}: {e}")
+
+    async def get_job(self, job_id: str, organization_id: str) -> Optional[Dict[str, Any]]:
+        from database import get_database
+
+        db = await get_database()
+        return await db.ai_jobs.find_one(
+            {"id": job_id, "organization_id": organization_id},
+            {"_id": 0, "expires_at": 0}
+        )
+
+    async def cancel(self, job_id: str, organization_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it had already finished"""
+        from database import get_database
+
+        db = await get_database()
+        cancelled = await db.ai_jobs.update_one(
+            {"id": job_id, "organization_id": organization_id, "status": {"$in": ["queued", "running"]}},
+            {"$set": {"status": "cancelled", "completed_at": datetime.utcnow()}}
+        )
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            task.cancel()
+        return cancelled.modified_count > 0
+
+    async def fail_stale_jobs(self, stale_seconds: float = AI_JOB_STALE_SECONDS) -> int:
+        """Mark unfinished jobs whose worker stopped heartbeating as failed"""
+        from database import get_database
+
+        db = await get_database()
+        now = datetime.utcnow()
+        stale = await db.ai_jobs.update_many(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "heartbeat_at": {"$lt": now - timedelta(seconds=stale_seconds)}
+            },
+            {"$set": {
+                "status": "failed",
+                "error": "The worker running this job stopped before it finished",
+                "completed_at": now
+            }}
+        )
+        if stale.modified_count:
+            logger.warning(f"Marked {stale.modified_count} stale AI jobs as failed")
+        return stale.modified_count
+
+    async def run_stale_job_reaper(self, interval_seconds: float = AI_JOB_STALE_SECONDS):
+        """Fail stale jobs at startup and then every interval until cancelled"""
+        while True:
+            try:
+                await self.fail_stale_jobs()
+            except Exception as e:
+                logger.error(f"Stale AI job reaper error: {e}")
+            await asyncio.sleep(interval_seconds)
+
+# Global instance
+ai_job_service = AIJobService()
@@ -0,0 +1,188 @@
+"""
+Broadcast Bus
+Cross-worker pub/sub so WebSocket broadcasts reach connections on every worker
+"""
+
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from auth.rate_limiter import BoundedTTLCache
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_BUS_BACKEND = os.getenv("BROADCAST_BUS_BACKEND", "mongo")  # mongo | memory
+BROADCAST_BUS_COLLECTION = os.getenv("BROADCAST_BUS_COLLECTION", "broadcast_bus")
+BROADCAST_BUS_CAPPED_BYTES = int(os.getenv("BROADCAST_BUS_CAPPED_BYTES", str(32 * 1024 * 1024)))
+BROADCAST_BUS_RETRY_SECONDS = float(os.getenv("BROADCAST_BUS_RETRY_SECONDS", "1"))
+
+# Identifies this process on the bus so it skips its own messages
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Receives (envelope) for one topic; an envelope is the dict passed to publish()
+BusHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class BroadcastBus(ABC):
+    """
+    Fans envelopes out to every worker subscribed to a topic.
+
+    Publishers deliver to their own local connections directly, so handlers
+    only ever see envelopes published by other workers.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[BusHandler]] = {}
+        self.metrics = {"published": 0, "received": 0, "handler_errors": 0}
+
+    def subscribe(self, topic: str, handler: BusHandler):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def _dispatch(self, envelope: Dict[str, Any]):
+        self.metrics["received"] += 1
+        for handler in self._handlers.get(envelope.get("topic"), ()):
+            try:
+                await handler(envelope)
+            except Exception as e:
+                self.metrics["handler_errors"] += 1
+                logger.error(f"Broadcast bus handler for {envelope.get('topic')} failed: {e}")
+
+    @abstractmethod
+    async def publish(self, topic: str, envelope: Dict[str, Any]):
+        """Send an envelope to the other workers"""
+
+    async def start(self):
+        """Begin receiving other workers' envelopes"""
+
+    async def stop(self):
+        """Stop receiving"""
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"backend": self.backend_name, "worker_id": WORKER_ID, **self.metrics}
+
+class InMemoryBroadcastBus(BroadcastBus):
+    """
+    Bus between instances in one process; each instance plays a worker, so
+    tests can run several managers side by side.
+    """
+
+    backend_name = "memory"
+    _instances: List["InMemoryBroadcastBus"] = []
+
+    def __init__(self):
+        super().__init__()
+        self.worker_id = f"{WORKER_ID}:{len(InMemoryBroadcastBus._instances)}"
+        InMemoryBroadcastBus._instances.append(self)
+
+    async def publish(self, topic: str, envelope: Dict[str, Any]):
+        self.metrics["published"] += 1
+        envelope = {**envelope, "topic": topic, "origin": self.worker_id}
+        for bus in InMemoryBroadcastBus._instances:
+            if bus is not self:
+                await bus._dispatch(envelope)
+
+class MongoBroadcastBus(BroadcastBus):
+    """
+    Bus over a capped collection: publishers insert, every worker follows
+    the collection with a tailable cursor. The cap bounds storage; a worker
+    that falls further behind than the cap simply misses old envelopes.
+    """
+
+    backend_name = "mongo"
+
+    def __init__(
+        self,
+        collection_name: str = BROADCAST_BUS_COLLECTION,
+        capped_bytes: int = BROADCAST_BUS_CAPPED_BYTES,
+        retry_seconds: float = BROADCAST_BUS_RETRY_SECONDS
+    ):
+        super().__init__()
+        self.collection_name = collection_name
+        self.capped_bytes = capped_bytes
+        self.retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._created = False
+        # Envelopes seen recently, so re-opening the cursor never delivers twice
+        self._seen = BoundedTTLCache(maxsize=50_000, ttl=300)
+
+    async def _collection(self):
+        from database import get_database
+
+        db = await get_database()
+        if not self._created:
+            # Must exist as capped before the first insert, which would otherwise create a plain collection
+            try:
+                await db.create_collection(self.collection_name, capped=True, size=self.capped_bytes)
+            except CollectionInvalid:
+                pass  # another worker created it
+            self._created = True
+        return db[self.collection_name]
+
+    async def publish(self, topic: str, envelope: Dict[str, Any]):
+        collection = await self._collection()
+        await collection.insert_one({
+            **envelope,
+            "topic": topic,
+            "origin": WORKER_ID,
+            "created_at": datetime.utcnow()
+        })
+        self.metrics["published"] += 1
+
+    async def start(self):
+        collection = await self._collection()
+
+        # A tailable cursor on an empty capped collection dies at once; this marker also sets our start point
+        marker = {"topic": "_worker_started", "origin": WORKER_ID, "created_at": datetime.utcnow()}
+        await collection.insert_one(marker)
+        self._task = asyncio.create_task(self._follow(marker["created_at"]))
+        logger.info(f"Broadcast bus following {self.collection_name} as {WORKER_ID}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _follow(self, since: datetime):
+        collection = await self._collection()
+        overlap = timedelta(0)
+        while True:
+            try:
+                query = {"created_at": {"$gte": since - overlap}}
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                # Clocks differ slightly between workers; re-opened cursors overlap and rely on the seen set
+                overlap = timedelta(seconds=1)
+                # Iteration stops whenever an awaited batch comes back empty, but the
+                # tailable cursor stays alive; keep reading it until the server kills
+                # it (e.g. it fell behind the capped collection), then re-open
+                while cursor.alive:
+                    async for doc in cursor:
+                        since = max(since, doc["created_at"])
+                        key = str(doc["_id"])
+                        if key in self._seen:
+                            continue
+                        self._seen[key] = True
+                        if doc.get("origin") != WORKER_ID and not doc["topic"].startswith("_"):
+                            await self._dispatch(doc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast bus cursor failed: {e}")
+            await asyncio.sleep(self.retry_seconds)
+
+def create_broadcast_bus(backend_name: Optional[str] = None) -> BroadcastBus:
+    """Build the bus named by BROADCAST_BUS_BACKEND (mongo or memory)"""
+    backend_name = backend_name or BROADCAST_BUS_BACKEND
+    if backend_name == "memory":
+        return InMemoryBroadcastBus()
+    return MongoBroadcastBus()
+
+# Global instance
+broadcast_bus = create_broadcast_bus()
@@ -3,11 +3,13 @@ Compliance & Governance Service
 Phase 4.3: Enterprise Compliance Framework
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
+import asyncio
 import logging
 import json
+import time
 
 from models.security import (
     ComplianceReport, ComplianceStandard, ComplianceAssessmentRequest,
@@ -16,10 +18,86 @@ from models.security import (
 
 logger = logging.getLogger(__name__)
 
+class ComplianceEvidence:
+    """
+    Per-assessment snapshot of organization statistics.
+
+    Each statistic is queried at most once; controls that need the same
+    figure concurrently await the same pending load.
+    """
+    
+    def __init__(self, db: AsyncIOMotorDatabase, organization_id: str):
+        self.db = db
+        self.organization_id = organization_id
+        self.taken_at = datetime.utcnow()
+        self._loads: Dict[str, asyncio.Task] = {}
+    
+    def _load(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._loads[key] = task
+        return task
+    
+    def total_users(self) -> Awaitable[int]:
+        return self._load("total_users", lambda: self.db.users.count_documents({
+            "organization_id": self.organization_id
+        }))
+    
+    def users_with_roles(self) -> Awaitable[int]:
+        return self._load("users_with_roles", lambda: self.db.users.count_documents({
+            "organization_id": self.organization_id,
+            "role": {"$exists": True, "$ne": None}
+        }))
+    
+    def active_users(self) -> Awaitable[int]:
+        return self._load("active_users", lambda: self.db.users.count_documents({
+            "organization_id": self.organization_id,
+            "is_active": True
+        }))
+    
+    def mfa_enabled_users(self) -> Awaitable[int]:
+        return self._load("mfa_enabled_users", lambda: self.db.mfa_configurations.count_documents({
+            "organization_id": self.organization_id,
+            "is_enabled": True
+        }))
+    
+    def active_retention_policies(self) -> Awaitable[int]:
+        return self._load("active_retention_policies", lambda: self.db.data_retention_policies.count_documents({
+            "organization_id": self.organization_id,
+            "is_active": True
+        }))
+    
+    def recent_audit_events(self) -> Awaitable[int]:
+        return self._load("recent_audit_events", lambda: self.db.audit_events.count_documents({
+            "organization_id": self.organization_id,
+            "timestamp": {"$gte": self.taken_at - timedelta(days=30)}
+        }))
+    
+    def encryption_policy(self) -> Awaitable[Optional[Dict[str, Any]]]:
+        return self._load("encryption_policy", lambda: self.db.security_policies.find_one({
+            "organization_id": self.organization_id,
+            "encryption_at_rest": True,
+            "encryption_in_transit": True,
+            "is_active": True
+        }))
+    
+    def recent_audit_samples(self) -> Awaitable[List[Dict[str, Any]]]:
+        return self._load("recent_audit_samples", lambda: self.db.audit_events.find({
+            "organization_id": self.organization_id,
+            "timestamp": {"$gte": self.taken_at - timedelta(days=30)}
+        }).limit(10).to_list(10))
+
 class ComplianceService:
     """Enterprise compliance and governance service"""
     
+    # Controls evaluated at once per assessment
+    MAX_CONCURRENT_CONTROLS = 8
+    # How long /compliance/status may be served from cache
+    STATUS_FRESHNESS_SECONDS = 300
+    
     def __init__(self):
+        self._status_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
         # Compliance control frameworks
         self.compliance_frameworks = {
             ComplianceStandard.SOC2_TYPE2: self._get_soc2_controls(),
@@ -50,10 +128,17 @@ class ComplianceService:
             medium_findings = []
             low_findings = []
             
-            for control in controls:
-                assessment_result = await self._assess_control(
-                    db, organization_id, control, request.include_evidence
-                )
+            # Evaluate controls concurrently against one shared evidence snapshot
+            evidence = ComplianceEvidence(db, organization_id)
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CONTROLS)
+            
+            async def assess(control: Dict[str, Any]) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self._assess_control(evidence, control, request.include_evidence)
+            
+            assessment_results = await asyncio.gather(*(assess(control) for control in controls))
+            
+            for control, assessment_result in zip(controls, assessment_results):
                 control_assessments.append(assessment_result)
                 
                 if assessment_result["status"] == "pass":
@@ -115,6 +200,7 @@ class ComplianceService:
             
             # Save report to database
             await db.compliance_reports.insert_one(report.model_dump())
+            self._status_cache.pop(organization_id, None)
             
             return report
             
@@ -124,8 +210,7 @@ class ComplianceService:
     
     async def _assess_control(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         include_evidence: bool
     ) -> Dict[str, Any]:
@@ -146,15 +231,15 @@ class ComplianceService:
             
             # Perform automated checks based on control type
             if control_type == "access_control":
-                assessment = await self._assess_access_control(db, organization_id, control, assessment)
+                assessment = await self._assess_access_control(evidence, control, assessment)
             elif control_type == "data_protection":
-                assessment = await self._assess_data_protection(db, organization_id, control, assessment)
+                assessment = await self._assess_data_protection(evidence, control, assessment)
             elif control_type == "audit_logging":
-                assessment = await self._assess_audit_logging(db, organization_id, control, assessment)
+                assessment = await self._assess_audit_logging(evidence, control, assessment)
             elif control_type == "authentication":
-                assessment = await self._assess_authentication(db, organization_id, control, assessment)
+                assessment = await self._assess_authentication(evidence, control, assessment)
             elif control_type == "encryption":
-                assessment = await self._assess_encryption(db, organization_id, control, assessment)
+                assessment = await self._assess_encryption(evidence, control, assessment)
             else:
                 # Generic assessment
                 assessment["manual_review_required"] = True
@@ -162,9 +247,7 @@ class ComplianceService:
             
             # Collect evidence if requested
             if include_evidence and assessment["status"] == "pass":
-                assessment["evidence"] = await self._collect_evidence(
-                    db, organization_id, control_id
-                )
+                assessment["evidence"] = await self._collect_evidence(evidence, control_id)
             
             return assessment
             
@@ -178,21 +261,15 @@ class ComplianceService:
     
     async def _assess_access_control(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         assessment: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Assess access control compliance"""
         try:
             # Check RBAC implementation
-            users_with_roles = await db.users.count_documents({
-                "organization_id": organization_id,
-                "role": {"$exists": True, "$ne": None}
-            })
-            total_users = await db.users.count_documents({
-                "organization_id": organization_id
-            })
+            users_with_roles = await evidence.users_with_roles()
+            total_users = await evidence.total_users()
             
             if users_with_roles == total_users and total_users > 0:
                 assessment["status"] = "pass"
@@ -213,18 +290,14 @@ class ComplianceService:
     
     async def _assess_data_protection(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         assessment: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Assess data protection compliance"""
         try:
             # Check for data retention policies
-            retention_policies = await db.data_retention_policies.count_documents({
-                "organization_id": organization_id,
-                "is_active": True
-            })
+            retention_policies = await evidence.active_retention_policies()
             
             if retention_policies > 0:
                 assessment["status"] = "pass"
@@ -245,19 +318,14 @@ class ComplianceService:
     
     async def _assess_audit_logging(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         assessment: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Assess audit logging compliance"""
         try:
             # Check for recent audit events
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            recent_events = await db.audit_events.count_documents({
-                "organization_id": organization_id,
-                "timestamp": {"$gte": thirty_days_ago}
-            })
+            recent_events = await evidence.recent_audit_events()
             
             if recent_events > 0:
                 assessment["status"] = "pass"
@@ -278,22 +346,15 @@ class ComplianceService:
     
     async def _assess_authentication(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         assessment: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Assess authentication compliance"""
         try:
             # Check MFA adoption
-            mfa_users = await db.mfa_configurations.count_documents({
-                "organization_id": organization_id,
-                "is_enabled": True
-            })
-            total_users = await db.users.count_documents({
-                "organization_id": organization_id,
-                "is_active": True
-            })
+            mfa_users = await evidence.mfa_enabled_users()
+            total_users = await evidence.active_users()
             
             mfa_percentage = (mfa_users / total_users * 100) if total_users > 0 else 0
             
@@ -321,20 +382,14 @@ class ComplianceService:
     
     async def _assess_encryption(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control: Dict[str, Any],
         assessment: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Assess encryption compliance"""
         try:
             # Check security policies for encryption requirements
-            encryption_policy = await db.security_policies.find_one({
-                "organization_id": organization_id,
-                "encryption_at_rest": True,
-                "encryption_in_transit": True,
-                "is_active": True
-            })
+            encryption_policy = await evidence.encryption_policy()
             
             if encryption_policy:
                 assessment["status"] = "pass"
@@ -355,30 +410,23 @@ class ComplianceService:
     
     async def _collect_evidence(
         self,
-        db: AsyncIOMotorDatabase,
-        organization_id: str,
+        evidence: ComplianceEvidence,
         control_id: str
     ) -> List[Dict[str, Any]]:
         """Collect evidence for compliance control"""
         try:
-            evidence = []
+            collected = []
             
-            # Collect relevant audit events as evidence
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            cursor = db.audit_events.find({
-                "organization_id": organization_id,
-                "timestamp": {"$gte": thirty_days_ago}
-            }).limit(10)
-            
-            async for event in cursor:
-                evidence.append({
+            # Recent audit events serve as evidence
+            for event in await evidence.recent_audit_samples():
+                collected.append({
                     "type": "audit_event",
                     "timestamp": event["timestamp"],
                     "event_type": event["event_type"],
                     "description": event["description"]
                 })
             
-            return evidence
+            return collected
             
         except Exception as e:
             logger.error(f"Evidence collection failed: {e}")
@@ -670,6 +718,11 @@ class ComplianceService:
     ) -> Dict[str, Any]:
         """Get real-time compliance status for all standards"""
         try:
+            # Serve from cache while fresh; new assessments invalidate it
+            cached = self._status_cache.get(organization_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
             # Get recent compliance assessments
             thirty_days_ago = datetime.utcnow() - timedelta(days=30)
             
@@ -703,6 +756,9 @@ class ComplianceService:
                 "recommendations": await self._get_priority_recommendations(db, organization_id, recent_reports)
             }
             
+            self._status_cache[organization_id] = (
+                time.monotonic() + self.STATUS_FRESHNESS_SECONDS, compliance_status
+            )
             return compliance_status
             
         except Exception as e:
@@ -0,0 +1,221 @@
+"""
+Compute Executor
+Shared process pool for CPU-bound ML and scheduling work, off the event loop
+"""
+
+import os
+import time
+import asyncio
+import logging
+import importlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_EXECUTOR_MODE = os.getenv("COMPUTE_EXECUTOR_MODE", "process")  # process or inline
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+COMPUTE_MAX_QUEUE = int(os.getenv("COMPUTE_MAX_QUEUE", "64"))
+COMPUTE_TIMEOUT_SECONDS = float(os.getenv("COMPUTE_TIMEOUT_SECONDS", "60"))
+
+# Imported once per worker at startup so the first job doesn't pay for them
+WARM_MODULES = (
+    "numpy",
+    "sklearn.ensemble",
+    "sklearn.preprocessing",
+    "services.critical_path_service",
+    "services.resource_leveling_service",
+    "services.baseline_service",
+)
+
+def _warm_worker(modules):
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logger.warning(f"Compute worker could not preload {module_name}: {e}")
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+class ComputeExecutor:
+    """
+    Runs CPU-bound callables in warm worker processes.
+
+    ``fn`` and its arguments must be picklable (module-level functions or
+    methods of module-level service instances). In inline mode jobs run
+    directly on the caller, which keeps tests single-process.
+    """
+
+    LATENCY_WINDOW = 500
+
+    def __init__(
+        self,
+        mode: str = COMPUTE_EXECUTOR_MODE,
+        max_workers: int = COMPUTE_WORKERS,
+        max_queue: int = COMPUTE_MAX_QUEUE,
+        default_timeout: float = COMPUTE_TIMEOUT_SECONDS
+    ):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "rejected": 0,
+            "pool_restarts": 0,
+            "max_queue_depth": 0
+        }
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._run_times = deque(maxlen=self.LATENCY_WINDOW)
+        self._by_function: Dict[str, int] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the parent holds an event loop and Mongo client threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                initargs=(WARM_MODULES,)
+            )
+        return self._executor
+
+    async def start(self):
+        """Spin up and warm every worker ahead of the first request"""
+        if self.mode != "process":
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*[
+            loop.run_in_executor(executor, time.sleep, 0) for _ in range(self.max_workers)
+        ])
+        logger.info(f"Compute executor started with {self.max_workers} workers")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def compute(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result"""
+        if self.queue_depth >= self.max_queue:
+            self.metrics["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Analysis capacity exhausted, please retry",
+                headers={"Retry-After": "2"}
+            )
+
+        name = getattr(fn, "__qualname__", repr(fn))
+        self._by_function[name] = self._by_function.get(name, 0) + 1
+        self.metrics["submitted"] += 1
+        self.in_flight += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.queue_depth)
+        submitted_at = time.perf_counter()
+        slot_held_by_job = False
+
+        try:
+            if self.mode == "inline":
+                result, run_time = _timed_call(fn, args, kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor()
+                try:
+                    job = executor.submit(_timed_call, fn, args, kwargs)
+                    # The slot is freed when the worker is done, not when the caller stops
+                    # waiting: a timed-out job keeps its worker busy until it finishes
+                    job.add_done_callback(lambda _: self._release_slot_threadsafe(loop))
+                    slot_held_by_job = True
+                    # A job already running in a worker can't be interrupted; on
+                    # timeout it finishes in the background and its result is dropped
+                    result, run_time = await asyncio.wait_for(
+                        asyncio.wrap_future(job), timeout or self.default_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.metrics["timed_out"] += 1
+                    logger.error(f"Compute job {name} timed out")
+                    raise HTTPException(
+                        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                        detail="Analysis took too long to complete"
+                    )
+                except BrokenProcessPool:
+                    self._replace_broken_executor(executor)
+                    raise
+
+            self.metrics["completed"] += 1
+            self._run_times.append(run_time * 1000)
+            return result
+        except HTTPException:
+            raise
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            if not slot_held_by_job:
+                self.in_flight -= 1
+            self._latencies.append((time.perf_counter() - submitted_at) * 1000)
+
+    def _release_slot_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        """Done callback of a pool job; runs on the pool's management thread"""
+        try:
+            loop.call_soon_threadsafe(self._release_slot)
+        except RuntimeError:
+            pass  # the loop has closed, and the count with it
+
+    def _release_slot(self):
+        self.in_flight -= 1
+
+    def _replace_broken_executor(self, executor: ProcessPoolExecutor):
+        """Discard a pool whose worker died; the next job starts a fresh one"""
+        if self._executor is not executor:
+            return  # a concurrent job already replaced it
+        self.metrics["pool_restarts"] += 1
+        self._executor = None
+        # Fails the jobs still queued on the broken pool and lets its management thread exit
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        def percentile(values, pct):
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            return round(ordered[min(int(pct / 100 * len(ordered)), len(ordered) - 1)], 2)
+
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "default_timeout_seconds": self.default_timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            **self.metrics,
+            "latency_ms": {"p50": percentile(self._latencies, 50), "p95": percentile(self._latencies, 95)},
+            "run_ms": {"p50": percentile(self._run_times, 50), "p95": percentile(self._run_times, 95)},
+            "jobs_by_function": dict(self._by_function),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+# Global instance
+compute_executor = ComputeExecutor()
+
+async def compute(fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """Run a CPU-bound callable on the shared compute executor"""
+    return await compute_executor.compute(fn, *args, timeout=timeout, **kwargs)
@@ -3,20 +3,29 @@ Data Retention & Privacy Management Service
 Phase 4.3: GDPR Compliance & Automated Cleanup
 """
 
+import time
 import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
 import logging
 
 from models.security import DataRetentionPolicy, AuditEvent, SecurityEventType, RiskLevel
 from services.security_service import SecurityService
+from services.retention_ttl import (
+    TTL_FIELD, TTL_MANAGED_COLLECTIONS, compile_retention_periods, is_ttl_policy, retention_expiry
+)
 
 logger = logging.getLogger(__name__)
 
 class DataRetentionService:
     """GDPR-compliant data retention and privacy management"""
     
+    # Archive batching and throttling
+    ARCHIVE_BATCH_SIZE = 1000
+    ARCHIVE_MAX_RECORDS_PER_SECOND = 20000
+    
     def __init__(self):
         self.security_service = SecurityService()
     
@@ -271,6 +280,9 @@ class DataRetentionService:
             }):
                 policies.append(DataRetentionPolicy(**policy_doc))
             
+            # Age-cutoff policies on managed collections expire through TTL indexes
+            cleanup_results["ttl_compiled"] = await self.compile_ttl_policies(db, organization_id, policies)
+            
             for policy in policies:
                 try:
                     # Calculate cutoff date
@@ -278,6 +290,8 @@ class DataRetentionService:
                     
                     # Process each collection in the policy
                     for collection_name in policy.collection_names:
+                        if is_ttl_policy(policy) and collection_name in TTL_MANAGED_COLLECTIONS:
+                            continue
                         if hasattr(db, collection_name):
                             collection = getattr(db, collection_name)
                             
@@ -308,31 +322,10 @@ class DataRetentionService:
                                 cleanup_results["records_cleaned"] += result.deleted_count
                             
                             elif policy.cleanup_method == "archive":
-                                # Move to archive collection
-                                archive_collection = getattr(db, f"{collection_name}_archive")
-                                
-                                # Find records to archive
-                                cursor = collection.find({
-                                    "created_at": {"$lt": cutoff_date},
-                                    "organization_id": organization_id,
-                                    "archived": {"$ne": True}
-                                })
-                                
-                                archived_count = 0
-                                async for doc in cursor:
-                                    # Add archive metadata
-                                    doc["archived"] = True
-                                    doc["archived_at"] = datetime.utcnow()
-                                    doc["retention_policy"] = policy.name
-                                    
-                                    # Insert to archive
-                                    await archive_collection.insert_one(doc)
-                                    
-                                    # Remove from original
-                                    await collection.delete_one({"_id": doc["_id"]})
-                                    
-                                    archived_count += 1
-                                
+                                # Move to archive collection in resumable batches
+                                archived_count = await self._archive_collection(
+                                    db, policy, collection_name, cutoff_date
+                                )
                                 cleanup_results["records_cleaned"] += archived_count
                     
                     cleanup_results["policies_processed"] += 1
@@ -373,6 +366,137 @@ class DataRetentionService:
             logger.error(f"Automated cleanup failed: {e}")
             return {"success": False, "error": str(e)}
     
+    async def compile_ttl_policies(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        policies: List[DataRetentionPolicy]
+    ) -> Dict[str, Any]:
+        """Stamp TTL expiry on managed collections so Mongo deletes expired records itself"""
+        periods = compile_retention_periods(policies)
+        compiled = {}
+        
+        for collection_name, age_field in TTL_MANAGED_COLLECTIONS.items():
+            period_days = periods.get(collection_name)
+            state = await db.retention_ttl_state.find_one({
+                "organization_id": organization_id,
+                "collection_name": collection_name
+            })
+            previous_days = state.get("period_days") if state else None
+            collection = db[collection_name]
+            
+            if period_days is None:
+                if previous_days is not None:
+                    # Policy removed or changed method: stop expiring these records
+                    await collection.update_many(
+                        {"organization_id": organization_id, TTL_FIELD: {"$exists": True}},
+                        {"$unset": {TTL_FIELD: ""}}
+                    )
+                    await db.retention_ttl_state.delete_one({"_id": state["_id"]})
+                continue
+            
+            # Full restamp when the period changes, otherwise only backfill unstamped records
+            query = {"organization_id": organization_id}
+            if period_days == previous_days:
+                query[TTL_FIELD] = {"$exists": False}
+            result = await collection.update_many(
+                query,
+                [{"$set": {TTL_FIELD: {"$add": [f"${age_field}", period_days * 24 * 3600 * 1000]}}}]
+            )
+            
+            await db.retention_ttl_state.update_one(
+                {"organization_id": organization_id, "collection_name": collection_name},
+                {"$set": {"period_days": period_days, "compiled_at": datetime.utcnow()}},
+                upsert=True
+            )
+            compiled[collection_name] = {"period_days": period_days, "records_stamped": result.modified_count}
+        
+        retention_expiry.invalidate(organization_id)
+        return compiled
+    
+    async def _archive_collection(
+        self,
+        db: AsyncIOMotorDatabase,
+        policy: DataRetentionPolicy,
+        collection_name: str,
+        cutoff_date: datetime
+    ) -> int:
+        """Archive expired records in _id order, checkpointing progress on the policy"""
+        collection = db[collection_name]
+        archive_collection = db[f"{collection_name}_archive"]
+        checkpoint_field = f"archive_checkpoints.{collection_name}"
+        
+        # Resume an interrupted run with its original cutoff so the pass stays consistent
+        checkpoint = policy.archive_checkpoints.get(collection_name) or {}
+        last_id = checkpoint.get("last_id")
+        cutoff_date = checkpoint.get("cutoff_date") or cutoff_date
+        
+        base_query = {
+            "created_at": {"$lt": cutoff_date},
+            "organization_id": policy.organization_id,
+            "archived": {"$ne": True}
+        }
+        min_batch_seconds = self.ARCHIVE_BATCH_SIZE / self.ARCHIVE_MAX_RECORDS_PER_SECOND
+        archived_count = 0
+        
+        while True:
+            batch_started = time.monotonic()
+            query = dict(base_query)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            
+            batch = await collection.find(query).sort("_id", 1).limit(self.ARCHIVE_BATCH_SIZE).to_list(None)
+            if not batch:
+                break
+            
+            archived_at = datetime.utcnow()
+            for doc in batch:
+                doc["archived"] = True
+                doc["archived_at"] = archived_at
+                doc["retention_policy"] = policy.name
+            
+            try:
+                await archive_collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates are records copied by an interrupted run before their delete
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            
+            batch_ids = [doc["_id"] for doc in batch]
+            await collection.delete_many({"_id": {"$in": batch_ids}})
+            
+            last_id = batch_ids[-1]
+            archived_count += len(batch)
+            await db.data_retention_policies.update_one(
+                {"id": policy.id},
+                {
+                    "$set": {
+                        checkpoint_field: {
+                            "last_id": last_id,
+                            "cutoff_date": cutoff_date,
+                            "updated_at": archived_at
+                        }
+                    },
+                    "$inc": {"items_archived": len(batch)}
+                }
+            )
+            
+            if len(batch) < self.ARCHIVE_BATCH_SIZE:
+                break
+            
+            # Throttle so large backlogs don't starve foreground traffic
+            elapsed = time.monotonic() - batch_started
+            if elapsed < min_batch_seconds:
+                await asyncio.sleep(min_batch_seconds - elapsed)
+        
+        # Pass finished; the next run starts from the beginning with a fresh cutoff
+        await db.data_retention_policies.update_one(
+            {"id": policy.id},
+            {"$unset": {checkpoint_field: ""}}
+        )
+        
+        return archived_count
+    
     async def schedule_cleanup_tasks(self, db: AsyncIOMotorDatabase):
         """Schedule and run periodic cleanup tasks"""
         try:
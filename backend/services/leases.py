@@ -0,0 +1,48 @@
+"""
+Worker Leases
+Time-bounded Mongo leases so only one worker runs a piece of background work
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+import logging
+
+from services.broadcast_bus import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+async def acquire_lease(name: str, ttl_seconds: float, holder: Optional[str] = None) -> bool:
+    """
+    Take (or renew) the named lease for ttl_seconds.
+
+    Returns False while another holder's lease is unexpired. A holder that
+    dies simply lets its lease run out.
+    """
+    from database import get_database
+
+    db = await get_database()
+    holder = holder or WORKER_ID
+    now = datetime.utcnow()
+    try:
+        lease = await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lte": now}}, {"holder": holder}]},
+            {"$set": {"holder": holder, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease document exists and is held by someone else
+        return False
+    if lease is not None and lease.get("holder") != holder:
+        logger.info(f"Took over expired lease {name} from {lease.get('holder')}")
+    return True
+
+async def release_lease(name: str, holder: Optional[str] = None) -> None:
+    """Give up a lease early; a no-op if it has already passed to another holder"""
+    from database import get_database
+
+    try:
+        db = await get_database()
+        await db.leases.delete_one({"_id": name, "holder": holder or WORKER_ID})
+    except Exception as e:
+        logger.warning(f"Failed to release lease {name}: {e}")
@@ -0,0 +1,420 @@
+"""
+LLM Response Cache
+Content-addressed cache for LLM completions with in-flight request coalescing
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Union
+
+from auth.rate_limiter import BoundedTTLCache
+from services.llm_gateway import LLMCompletion, LLMRequest, llm_gateway
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("ENABLE_AI_CACHING", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "900"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # memory or mongo
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace so re-indented or re-wrapped prompts share a key"""
+    return " ".join(text.split())
+
+def cache_key(
+    provider: str,
+    model: str,
+    system_message: str,
+    prompt: str,
+    temperature: Optional[float] = None
+) -> str:
+    """Content address of a completion request"""
+    parts = [
+        provider,
+        model,
+        normalize_prompt(system_message or ""),
+        normalize_prompt(prompt),
+        "default" if temperature is None else f"{temperature:.3f}"
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: a bounded in-process LRU with TTL, optionally
+    backed by a Mongo collection shared across workers (expired through a
+    TTL index). Concurrent identical requests share one upstream call.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_ENABLED,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        backend: str = LLM_CACHE_BACKEND,
+        collection_name: str = "llm_response_cache"
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.collection_name = collection_name
+        self._memory = BoundedTTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        # Generation tasks are owned by the cache, not by any one caller
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.metrics = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "persistence_errors": 0,
+            "answered_by_fallback": 0,
+            "saved_seconds": 0.0
+        }
+
+    async def _load_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.backend != "mongo":
+            return None
+        try:
+            from database import get_database
+
+            db = await get_database()
+            return await db[self.collection_name].find_one({
+                "_id": key,
+                "expires_at": {"$gt": datetime.utcnow()}
+            })
+        except Exception as e:
+            self.metrics["persistence_errors"] += 1
+            logger.error(f"LLM cache lookup failed: {e}")
+            return None
+
+    async def _store_persistent(self, key: str, entry: Dict[str, Any], provider: str, model: str):
+        if self.backend != "mongo":
+            return
+        try:
+            from database import get_database
+
+            db = await get_database()
+            now = datetime.utcnow()
+            await db[self.collection_name].replace_one(
+                {"_id": key},
+                {
+                    **entry,
+                    "provider": provider,
+                    "model": model,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self.metrics["persistence_errors"] += 1
+            logger.error(f"LLM cache store failed: {e}")
+
+    async def get_or_generate(
+        self,
+        provider: str,
+        model: str,
+        system_message: str,
+        prompt: str,
+        generate: Callable[[], Awaitable[Union[str, LLMCompletion]]],
+        temperature: Optional[float] = None
+    ) -> str:
+        """Return a cached completion, or call generate() once for all concurrent callers"""
+        completion = await self.get_or_complete(provider, model, system_message, prompt, generate, temperature)
+        return completion["response"]
+
+    async def get_or_complete(
+        self,
+        provider: str,
+        model: str,
+        system_message: str,
+        prompt: str,
+        generate: Callable[[], Awaitable[Union[str, LLMCompletion]]],
+        temperature: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Like get_or_generate, but returns the response together with the
+        provider and model that produced it and whether it was hedged.
+
+        generate() may return an LLMCompletion; one answered by another model
+        (a hedged call won by the fallback) is cached as that model's answer,
+        never under the requested model's key.
+        """
+        if not self.enabled:
+            return self._completion_entry(await generate(), provider, model, 0.0)
+
+        key = cache_key(provider, model, system_message, prompt, temperature)
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            self.metrics["memory_hits"] += 1
+            self.metrics["saved_seconds"] += entry["latency_seconds"]
+            return {"provider": provider, "model": model, **entry, "hedged": False}
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            in_flight = asyncio.create_task(
+                self._fill(key, provider, model, system_message, prompt, temperature, generate)
+            )
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda task: self._settle(key, task))
+        return await self._wait(key, in_flight)
+
+    @staticmethod
+    def _completion_entry(
+        response: Union[str, LLMCompletion],
+        provider: str,
+        model: str,
+        latency_seconds: float
+    ) -> Dict[str, Any]:
+        if isinstance(response, LLMCompletion):
+            return {
+                "response": response.text,
+                "latency_seconds": latency_seconds,
+                "provider": response.provider,
+                "model": response.model,
+                "hedged": response.hedged
+            }
+        return {"response": response, "latency_seconds": latency_seconds, "provider": provider, "model": model, "hedged": False}
+
+    async def _fill(
+        self,
+        key: str,
+        provider: str,
+        model: str,
+        system_message: str,
+        prompt: str,
+        temperature: Optional[float],
+        generate: Callable[[], Awaitable[Union[str, LLMCompletion]]]
+    ) -> Dict[str, Any]:
+        try:
+            persisted = await self._load_persistent(key)
+            if persisted is not None:
+                self.metrics["persistent_hits"] += 1
+                self.metrics["saved_seconds"] += persisted.get("latency_seconds", 0.0)
+                entry = {"response": persisted["response"], "latency_seconds": persisted.get("latency_seconds", 0.0)}
+                self._memory[key] = entry
+                return {"provider": provider, "model": model, **entry, "hedged": False}
+
+            self.metrics["misses"] += 1
+            started = time.perf_counter()
+            completion = self._completion_entry(
+                await generate(), provider, model, round(time.perf_counter() - started, 3)
+            )
+            entry = {"response": completion["response"], "latency_seconds": completion["latency_seconds"]}
+            if (completion["provider"], completion["model"]) != (provider, model):
+                self.metrics["answered_by_fallback"] += 1
+                key = cache_key(completion["provider"], completion["model"], system_message, prompt, temperature)
+            await self._store_persistent(key, entry, completion["provider"], completion["model"])
+        except Exception:
+            # Failures are not cached; every waiter sees the same error
+            self.metrics["errors"] += 1
+            raise
+
+        self._memory[key] = entry
+        return completion
+
+    def _settle(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+        # Mark retrieved so an error with no waiters left isn't logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _wait(self, key: str, task: asyncio.Task) -> Dict[str, Any]:
+        """
+        Await a shared generation without letting this caller's cancellation
+        reach it; the generation is only cancelled once every waiter has left.
+        """
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            remaining = self._waiters.get(task, 1) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+            elif not task.done():
+                self._waiters.pop(task, None)
+                # Later callers start a fresh generation rather than join a cancelled one
+                if self._in_flight.get(key) is task:
+                    del self._in_flight[key]
+                task.cancel()
+
+    async def lookup(
+        self,
+        provider: str,
+        model: str,
+        system_message: str,
+        prompt: str,
+        temperature: Optional[float] = None
+    ) -> Optional[str]:
+        """Cached completion, waiting on an identical in-flight request; None on a miss"""
+        if not self.enabled:
+            return None
+
+        key = cache_key(provider, model, system_message, prompt, temperature)
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            self.metrics["memory_hits"] += 1
+            self.metrics["saved_seconds"] += entry["latency_seconds"]
+            return entry["response"]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                completion = await self._wait(key, in_flight)
+            except Exception:
+                return None
+            if (completion["provider"], completion["model"]) != (provider, model):
+                return None  # answered by the fallback model, not a hit for this one
+            self.metrics["coalesced"] += 1
+            return completion["response"]
+
+        persisted = await self._load_persistent(key)
+        if persisted is not None:
+            self.metrics["persistent_hits"] += 1
+            self.metrics["saved_seconds"] += persisted.get("latency_seconds", 0.0)
+            self._memory[key] = {"response": persisted["response"], "latency_seconds": persisted.get("latency_seconds", 0.0)}
+            return persisted["response"]
+
+        self.metrics["misses"] += 1
+        return None
+
+    async def store(
+        self,
+        provider: str,
+        model: str,
+        system_message: str,
+        prompt: str,
+        response: str,
+        latency_seconds: float,
+        temperature: Optional[float] = None
+    ):
+        """Record a completion produced outside get_or_generate (e.g. a finished stream)"""
+        if not self.enabled:
+            return
+
+        key = cache_key(provider, model, system_message, prompt, temperature)
+        entry = {"response": response, "latency_seconds": round(latency_seconds, 3)}
+        self._memory[key] = entry
+        await self._store_persistent(key, entry, provider, model)
+
+    def clear(self):
+        self._memory = BoundedTTLCache(maxsize=self._memory.maxsize, ttl=self.ttl_seconds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        hits = self.metrics["memory_hits"] + self.metrics["persistent_hits"] + self.metrics["coalesced"]
+        lookups = hits + self.metrics["misses"]
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self._memory.maxsize,
+            "entries": len(self._memory),
+            "in_flight": len(self._in_flight),
+            **self.metrics,
+            "saved_seconds": round(self.metrics["saved_seconds"], 3),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+# Global instance
+llm_response_cache = LLMResponseCache()
+
+class CachedLlmChat:
+    """
+    Drop-in for ``LlmChat(...).with_model(...)`` whose ``send_message`` goes
+    through the response cache; misses are sent through the LLM gateway.
+    After each ``send_message``, ``last_completion`` names the provider and
+    model that actually answered, which differ from the requested ones when
+    a hedged call was won by the fallback.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        session_id: str,
+        system_message: str,
+        temperature: Optional[float] = None,
+        timeout: Optional[float] = None,
+        hedge: bool = True
+    ):
+        self.api_key = api_key
+        self.session_id = session_id
+        self.system_message = system_message
+        self.temperature = temperature
+        self.timeout = timeout
+        self.hedge = hedge
+        self.provider = "openai"
+        self.model = "gpt-4o"
+        self.last_completion: Optional[Dict[str, Any]] = None
+
+    def with_model(self, provider: str, model: str) -> "CachedLlmChat":
+        self.provider = provider
+        self.model = model
+        return self
+
+    def _request(self, prompt: str) -> LLMRequest:
+        return LLMRequest(
+            provider=self.provider,
+            model=self.model,
+            system_message=self.system_message,
+            prompt=prompt,
+            api_key=self.api_key,
+            session_id=self.session_id,
+            temperature=self.temperature
+        )
+
+    async def send_message(self, message) -> str:
+        """Complete a UserMessage or plain prompt text"""
+        prompt = message if isinstance(message, str) else message.text
+
+        async def generate() -> LLMCompletion:
+            return await llm_gateway.complete(self._request(prompt), timeout=self.timeout, hedge=self.hedge)
+
+        completion = await llm_response_cache.get_or_complete(
+            self.provider, self.model, self.system_message, prompt, generate,
+            temperature=self.temperature
+        )
+        self.last_completion = {
+            "provider": completion["provider"],
+            "model": completion["model"],
+            "hedged": completion["hedged"]
+        }
+        return completion["response"]
+
+    async def stream_message(self, message) -> AsyncIterator[str]:
+        """
+        Yield the completion in chunks as the provider produces them. A cached
+        completion is replayed as a single chunk and a fully received stream
+        is cached; closing the generator early abandons the upstream request.
+        """
+        prompt = message if isinstance(message, str) else message.text
+        cached = await llm_response_cache.lookup(
+            self.provider, self.model, self.system_message, prompt,
+            temperature=self.temperature
+        )
+        if cached is not None:
+            yield cached
+            return
+
+        started = time.perf_counter()
+        parts = []
+        async for chunk in llm_gateway.stream(self._request(prompt), timeout=self.timeout):
+            parts.append(chunk)
+            yield chunk
+
+        await llm_response_cache.store(
+            self.provider, self.model, self.system_message, prompt,
+            "".join(parts), time.perf_counter() - started,
+            temperature=self.temperature
+        )
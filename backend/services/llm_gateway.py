@@ -0,0 +1,468 @@
+"""
+LLM Gateway
+Single path to LLM providers with concurrency, rate, deadline and circuit-breaker policy
+"""
+
+import os
+import time
+import asyncio
+import logging
+import dataclasses
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from auth.rate_limiter import TokenBucketRateLimiter, create_rate_limit_backend
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LLM_GATEWAY_PROVIDER = os.getenv("LLM_GATEWAY_PROVIDER", "emergent")  # emergent, local or record
+LLM_MAX_CONCURRENT_PER_PROVIDER = int(os.getenv("LLM_MAX_CONCURRENT_PER_PROVIDER", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "120"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("AI_RESPONSE_TIMEOUT", "30"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))  # 0 disables hedging
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RECOVERY_SECONDS = float(os.getenv("LLM_BREAKER_RECOVERY_SECONDS", "30"))
+
+# Second model tried when the first is slow or its provider's breaker is open
+HEDGE_TARGETS: Dict[str, Tuple[str, str]] = {
+    "openai": ("anthropic", "claude-3-5-sonnet-20241022"),
+    "anthropic": ("openai", "gpt-4o"),
+    "gemini": ("openai", "gpt-4o")
+}
+
+@dataclass
+class LLMRequest:
+    provider: str
+    model: str
+    system_message: str
+    prompt: str
+    api_key: Optional[str] = None
+    session_id: str = "llm-gateway"
+    temperature: Optional[float] = None
+
+    def retarget(self, provider: str, model: str) -> "LLMRequest":
+        return dataclasses.replace(self, provider=provider, model=model)
+
+@dataclass
+class LLMCompletion:
+    text: str
+    provider: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    latency_seconds: float
+    hedged: bool = False
+
+@lru_cache(maxsize=16)
+def _encoding_for(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Tokenizer count when tiktoken is installed, otherwise ~4 characters per token"""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding_for(model).encode(text, disallowed_special=()))
+    return max(1, round(len(text) / 4))
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(int(pct / 100 * len(ordered)), len(ordered) - 1)], 2)
+
+# ============================================================================
+# Providers
+# ============================================================================
+
+class EmergentProvider:
+    """Calls the hosted models through emergentintegrations"""
+
+    name = "emergent"
+    offline = False
+
+    def _create_chat(self, request: LLMRequest):
+        from emergentintegrations.llm.chat import LlmChat
+
+        return LlmChat(
+            api_key=request.api_key,
+            session_id=request.session_id,
+            system_message=request.system_message
+        ).with_model(request.provider, request.model)
+
+    async def complete(self, request: LLMRequest) -> str:
+        from emergentintegrations.llm.chat import UserMessage
+
+        return await self._create_chat(request).send_message(UserMessage(text=request.prompt))
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        from emergentintegrations.llm.chat import UserMessage
+
+        chat = self._create_chat(request)
+        message = UserMessage(text=request.prompt)
+        upstream = getattr(chat, "stream_message", None)
+        if upstream is None:
+            # Clients without a streaming API deliver the completion in one piece
+            yield await chat.send_message(message)
+            return
+        async for chunk in upstream(message):
+            if chunk:
+                yield chunk
+
+def create_llm_provider(name: Optional[str] = None):
+    """Build the provider named by LLM_GATEWAY_PROVIDER (emergent, local or record)"""
+    name = name or LLM_GATEWAY_PROVIDER
+    if name == "local":
+        from services.llm_local_provider import LocalLLMProvider
+        return LocalLLMProvider()
+    if name == "record":
+        from services.llm_local_provider import RecordingProvider
+        return RecordingProvider(EmergentProvider())
+    return EmergentProvider()
+
+# ============================================================================
+# Policy
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``recovery_seconds``; then lets one trial call through (half-open)
+    and closes again only if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                return False
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_seconds
+
+    def retry_after(self) -> float:
+        return max(self.recovery_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """A half-open trial ended without a verdict (e.g. the caller went away)"""
+        self._trial_in_flight = False
+
+class ProviderLane:
+    """Concurrency slots, breaker and metrics for one provider"""
+
+    LATENCY_WINDOW = 500
+
+    def __init__(self, max_concurrent: int, failure_threshold: int, recovery_seconds: float):
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_seconds)
+        self.in_flight = 0
+        self.metrics = {
+            "requests": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "rejected_open_circuit": 0,
+            "rejected_rate_limit": 0,
+            "input_tokens": 0,
+            "output_tokens": 0
+        }
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+    def record_completion(self, completion: LLMCompletion):
+        self.metrics["completed"] += 1
+        self.metrics["input_tokens"] += completion.input_tokens
+        self.metrics["output_tokens"] += completion.output_tokens
+        self.latencies.append(completion.latency_seconds * 1000)
+        self.breaker.record_success()
+
+    def record_failure(self, timed_out: bool = False):
+        self.metrics["timed_out" if timed_out else "failed"] += 1
+        self.breaker.record_failure()
+
+# ============================================================================
+# Gateway
+# ============================================================================
+
+class LLMGateway:
+    """
+    Every LLM call goes through here. Per provider it enforces a concurrency
+    limit, a shared requests-per-minute budget and a circuit breaker; every
+    call has a deadline, and slow completions can be hedged to a second
+    model, with the first successful answer winning.
+    """
+
+    def __init__(
+        self,
+        provider=None,
+        max_concurrent_per_provider: int = LLM_MAX_CONCURRENT_PER_PROVIDER,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        timeout_seconds: float = LLM_TIMEOUT_SECONDS,
+        hedge_after_seconds: float = LLM_HEDGE_AFTER_SECONDS,
+        failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds: float = LLM_BREAKER_RECOVERY_SECONDS,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None
+    ):
+        self.provider = provider or create_llm_provider()
+        self.max_concurrent_per_provider = max_concurrent_per_provider
+        self.timeout_seconds = timeout_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.rate_limiter = rate_limiter or TokenBucketRateLimiter(
+            create_rate_limit_backend(), rate=requests_per_minute, period=60
+        )
+        self._lanes: Dict[str, ProviderLane] = {}
+        self.metrics = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def _lane(self, provider: str) -> ProviderLane:
+        if provider not in self._lanes:
+            self._lanes[provider] = ProviderLane(
+                self.max_concurrent_per_provider, self.failure_threshold, self.recovery_seconds
+            )
+        return self._lanes[provider]
+
+    def _remaining(self, deadline: float) -> float:
+        return deadline - asyncio.get_running_loop().time()
+
+    def _deadline_exceeded(self, request: LLMRequest) -> HTTPException:
+        logger.error(f"LLM call to {request.provider}/{request.model} missed its deadline")
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"{request.provider} did not respond in time"
+        )
+
+    async def _admit(self, lane: ProviderLane, request: LLMRequest, deadline: float):
+        """Apply the breaker and rate budget, waiting for budget while the deadline allows"""
+        lane.metrics["requests"] += 1
+        if not lane.breaker.allow():
+            lane.metrics["rejected_open_circuit"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"{request.provider} is temporarily unavailable",
+                headers={"Retry-After": str(max(int(lane.breaker.retry_after()), 1))}
+            )
+
+        # Any exit without reaching the provider (rejection, limiter error,
+        # cancellation) must hand back a half-open trial
+        try:
+            while True:
+                decision = await self.rate_limiter.check(request.provider, scope="llm")
+                if decision.allowed:
+                    return
+                if decision.retry_after >= self._remaining(deadline):
+                    lane.metrics["rejected_rate_limit"] += 1
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail=f"{request.provider} request budget exhausted",
+                        headers={"Retry-After": str(max(int(decision.retry_after), 1))}
+                    )
+                await asyncio.sleep(decision.retry_after)
+        except BaseException:
+            lane.breaker.release_trial()
+            raise
+
+    async def _acquire_slot(self, lane: ProviderLane, request: LLMRequest, deadline: float):
+        try:
+            await asyncio.wait_for(lane.slots.acquire(), max(self._remaining(deadline), 0))
+        except asyncio.TimeoutError:
+            lane.breaker.release_trial()
+            lane.metrics["timed_out"] += 1
+            raise self._deadline_exceeded(request)
+        except BaseException:
+            lane.breaker.release_trial()
+            raise
+
+    async def _call(self, request: LLMRequest, deadline: float) -> LLMCompletion:
+        lane = self._lane(request.provider)
+        await self._admit(lane, request, deadline)
+        await self._acquire_slot(lane, request, deadline)
+        lane.in_flight += 1
+        started = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(self.provider.complete(request), max(self._remaining(deadline), 0))
+        except asyncio.TimeoutError:
+            lane.record_failure(timed_out=True)
+            raise self._deadline_exceeded(request)
+        except asyncio.CancelledError:
+            lane.breaker.release_trial()
+            raise
+        except Exception as e:
+            lane.record_failure()
+            logger.error(f"LLM call to {request.provider}/{request.model} failed: {e}")
+            raise
+        finally:
+            lane.in_flight -= 1
+            lane.slots.release()
+
+        completion = LLMCompletion(
+            text=text,
+            provider=request.provider,
+            model=request.model,
+            input_tokens=count_tokens(request.system_message, request.model) + count_tokens(request.prompt, request.model),
+            output_tokens=count_tokens(text, request.model),
+            latency_seconds=round(time.perf_counter() - started, 3)
+        )
+        lane.record_completion(completion)
+        return completion
+
+    async def complete(
+        self,
+        request: LLMRequest,
+        timeout: Optional[float] = None,
+        hedge: bool = True
+    ) -> LLMCompletion:
+        """Run one completion under the gateway's policy"""
+        deadline = asyncio.get_running_loop().time() + (timeout or self.timeout_seconds)
+        hedge_target = HEDGE_TARGETS.get(request.provider) if hedge and self.hedge_after_seconds > 0 else None
+        if hedge_target is None:
+            return await self._call(request, deadline)
+
+        hedge_request = request.retarget(*hedge_target)
+        if self._lane(request.provider).breaker.is_open():
+            self.metrics["failovers"] += 1
+            completion = await self._call(hedge_request, deadline)
+            completion.hedged = True
+            return completion
+
+        primary = asyncio.create_task(self._call(request, deadline))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after_seconds)
+            if primary in done and primary.exception() is None:
+                return primary.result()
+
+            self.metrics["hedged"] += 1
+            secondary = asyncio.create_task(self._call(hedge_request, deadline))
+            pending = {secondary} if primary in done else {primary, secondary}
+            error = primary.exception() if primary in done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        completion = task.result()
+                        if task is secondary:
+                            self.metrics["hedge_wins"] += 1
+                            completion.hedged = True
+                        return completion
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, request: LLMRequest, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream one completion under the gateway's policy. ``timeout`` bounds
+        the wait for each chunk rather than the whole response; streams are
+        not hedged because chunks may already have reached the client.
+        """
+        timeout = timeout or self.timeout_seconds
+        lane = self._lane(request.provider)
+        deadline = asyncio.get_running_loop().time() + timeout
+        await self._admit(lane, request, deadline)
+        await self._acquire_slot(lane, request, deadline)
+        lane.in_flight += 1
+        started = time.perf_counter()
+        upstream = self.provider.stream(request).__aiter__()
+        parts = []
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(upstream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                parts.append(chunk)
+                yield chunk
+        except asyncio.TimeoutError:
+            lane.record_failure(timed_out=True)
+            raise self._deadline_exceeded(request)
+        except (asyncio.CancelledError, GeneratorExit):
+            lane.breaker.release_trial()
+            raise
+        except Exception as e:
+            lane.record_failure()
+            logger.error(f"LLM stream from {request.provider}/{request.model} failed: {e}")
+            raise
+        finally:
+            lane.in_flight -= 1
+            lane.slots.release()
+            await upstream.aclose()
+
+        text = "".join(parts)
+        lane.record_completion(LLMCompletion(
+            text=text,
+            provider=request.provider,
+            model=request.model,
+            input_tokens=count_tokens(request.system_message, request.model) + count_tokens(request.prompt, request.model),
+            output_tokens=count_tokens(text, request.model),
+            latency_seconds=round(time.perf_counter() - started, 3)
+        ))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "provider_backend": self.provider.name,
+            "provider_metrics": self.provider.get_metrics() if hasattr(self.provider, "get_metrics") else {},
+            "max_concurrent_per_provider": self.max_concurrent_per_provider,
+            "requests_per_minute": self.rate_limiter.rate,
+            "timeout_seconds": self.timeout_seconds,
+            "hedge_after_seconds": self.hedge_after_seconds,
+            "token_counting": "tiktoken" if TIKTOKEN_AVAILABLE else "estimate",
+            **self.metrics,
+            "providers": {
+                name: {
+                    **lane.metrics,
+                    "in_flight": lane.in_flight,
+                    "circuit": lane.breaker.state,
+                    "circuit_trips": lane.breaker.trips,
+                    "latency_ms": {"p50": _percentile(lane.latencies, 50), "p95": _percentile(lane.latencies, 95)}
+                }
+                for name, lane in self._lanes.items()
+            },
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+# Global instance
+llm_gateway = LLMGateway()
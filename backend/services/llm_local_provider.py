@@ -0,0 +1,191 @@
+"""
+Local LLM Provider
+Deterministic offline provider replaying recorded or templated completions with realistic timing
+"""
+
+import os
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+logger = logging.getLogger(__name__)
+
+LLM_LOCAL_FIXTURES_PATH = os.getenv("LLM_LOCAL_FIXTURES_PATH", "")  # JSONL written by the record provider
+LLM_LOCAL_RECORD_PATH = os.getenv("LLM_LOCAL_RECORD_PATH", "llm_recordings.jsonl")
+LLM_LOCAL_SEED = int(os.getenv("LLM_LOCAL_SEED", "42"))
+LLM_LOCAL_TTFT_MS = float(os.getenv("LLM_LOCAL_TTFT_MS", "400"))  # median time to first token
+LLM_LOCAL_TTFT_SIGMA = float(os.getenv("LLM_LOCAL_TTFT_SIGMA", "0.35"))  # lognormal spread of TTFT
+LLM_LOCAL_TOKENS_PER_SECOND = float(os.getenv("LLM_LOCAL_TOKENS_PER_SECOND", "60"))
+LLM_LOCAL_TOKENS_PER_SECOND_SD = float(os.getenv("LLM_LOCAL_TOKENS_PER_SECOND_SD", "15"))
+LLM_LOCAL_OUTPUT_TOKENS = int(os.getenv("LLM_LOCAL_OUTPUT_TOKENS", "250"))  # median templated length
+LLM_LOCAL_FAILURE_RATE = float(os.getenv("LLM_LOCAL_FAILURE_RATE", "0"))
+
+# Words streamed per chunk; hosted providers send a few tokens per event
+STREAM_CHUNK_WORDS = 4
+
+TEMPLATE_SENTENCES = [
+    "Rebalance {topic} capacity toward the work on the critical path before the next milestone.",
+    "The current plan for {topic} carries schedule risk where dependencies converge late.",
+    "Assign senior owners to the {topic} items with the highest cost of delay.",
+    "Track {topic} utilisation weekly and flag anyone above 90% for two consecutive weeks.",
+    "Pair less experienced contributors with experts to close the {topic} skill gaps.",
+    "Defer low-priority {topic} scope rather than extending the timeline.",
+    "Budget variance on {topic} is within tolerance but trending upward.",
+    "Add a buffer after integration-heavy {topic} phases to absorb rework.",
+]
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+def fixture_key(system_message: str, prompt: str) -> str:
+    """Provider-independent key, so a recording replays for hedged or swapped models too"""
+    return hashlib.sha256(f"{_normalize(system_message)}\x1f{_normalize(prompt)}".encode("utf-8")).hexdigest()
+
+def load_fixtures(path: str) -> Dict[str, str]:
+    """Read recorded completions from a JSONL file; later lines win"""
+    fixtures: Dict[str, str] = {}
+    if not path or not os.path.exists(path):
+        return fixtures
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            fixtures[fixture_key(record.get("system_message", ""), record["prompt"])] = record["response"]
+    logger.info(f"Loaded {len(fixtures)} recorded LLM completions from {path}")
+    return fixtures
+
+class LocalLLMProvider:
+    """
+    Offline stand-in for the hosted models.
+
+    Returns the recorded completion for a prompt when one exists, otherwise
+    templated text of a sampled length. Time to first token is lognormal and
+    the token rate normal, both drawn from an RNG seeded by the prompt and
+    how many times it has been asked, so a given request sequence replays
+    with identical content and timing.
+    """
+
+    name = "local"
+    offline = True
+
+    def __init__(
+        self,
+        fixtures_path: str = LLM_LOCAL_FIXTURES_PATH,
+        seed: int = LLM_LOCAL_SEED,
+        ttft_ms: float = LLM_LOCAL_TTFT_MS,
+        ttft_sigma: float = LLM_LOCAL_TTFT_SIGMA,
+        tokens_per_second: float = LLM_LOCAL_TOKENS_PER_SECOND,
+        tokens_per_second_sd: float = LLM_LOCAL_TOKENS_PER_SECOND_SD,
+        output_tokens: int = LLM_LOCAL_OUTPUT_TOKENS,
+        failure_rate: float = LLM_LOCAL_FAILURE_RATE
+    ):
+        self.fixtures = load_fixtures(fixtures_path)
+        self.seed = seed
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_second_sd = tokens_per_second_sd
+        self.output_tokens = output_tokens
+        self.failure_rate = failure_rate
+        self.failing_providers = set()
+        self._occurrences: Dict[str, int] = {}
+        self.metrics = {"replayed": 0, "templated": 0, "injected_failures": 0}
+
+    def _plan(self, request):
+        """Choose the response text, TTFT and token rate for one call"""
+        key = fixture_key(request.system_message, request.prompt)
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+        rng = random.Random(f"{self.seed}:{request.provider}:{request.model}:{key}:{occurrence}")
+
+        if request.provider in self.failing_providers or rng.random() < self.failure_rate:
+            self.metrics["injected_failures"] += 1
+            raise RuntimeError(f"Simulated {request.provider} failure")
+
+        text = self.fixtures.get(key)
+        if text is not None:
+            self.metrics["replayed"] += 1
+        else:
+            self.metrics["templated"] += 1
+            text = self._template(request.prompt, rng)
+
+        ttft = rng.lognormvariate(0, self.ttft_sigma) * self.ttft_ms / 1000
+        rate = max(rng.gauss(self.tokens_per_second, self.tokens_per_second_sd), 1.0)
+        return text, ttft, rate
+
+    def _template(self, prompt: str, rng: random.Random) -> str:
+        words = [word.strip(".,:;!?()[]{}\"'").lower() for word in prompt.split()]
+        topics = [word for word in words if len(word) > 6] or ["delivery"]
+        target = max(int(rng.lognormvariate(0, 0.4) * self.output_tokens), 20)
+
+        sentences: List[str] = []
+        tokens = 0
+        while tokens < target:
+            sentence = rng.choice(TEMPLATE_SENTENCES).format(topic=rng.choice(topics))
+            sentences.append(sentence)
+            tokens += len(sentence) // 4
+        return " ".join(sentences)
+
+    async def complete(self, request) -> str:
+        from services.llm_gateway import count_tokens
+
+        text, ttft, rate = self._plan(request)
+        await asyncio.sleep(ttft + count_tokens(text, request.model) / rate)
+        return text
+
+    async def stream(self, request) -> AsyncIterator[str]:
+        from services.llm_gateway import count_tokens
+
+        text, ttft, rate = self._plan(request)
+        await asyncio.sleep(ttft)
+        words = text.split(" ")
+        for start in range(0, len(words), STREAM_CHUNK_WORDS):
+            chunk = " ".join(words[start:start + STREAM_CHUNK_WORDS])
+            if start + STREAM_CHUNK_WORDS < len(words):
+                chunk += " "
+            await asyncio.sleep(count_tokens(chunk, request.model) / rate)
+            yield chunk
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {**self.metrics, "fixtures": len(self.fixtures)}
+
+class RecordingProvider:
+    """Passes calls to another provider and appends each completion to a JSONL fixture file"""
+
+    offline = False
+
+    def __init__(self, inner, path: str = LLM_LOCAL_RECORD_PATH):
+        self.inner = inner
+        self.path = path
+        self.name = f"record:{inner.name}"
+
+    def _record(self, request, response: str):
+        try:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps({
+                    "provider": request.provider,
+                    "model": request.model,
+                    "system_message": request.system_message,
+                    "prompt": request.prompt,
+                    "response": response,
+                    "recorded_at": datetime.utcnow().isoformat()
+                }) + "\n")
+        except OSError as e:
+            logger.error(f"Could not record LLM completion: {e}")
+
+    async def complete(self, request) -> str:
+        response = await self.inner.complete(request)
+        self._record(request, response)
+        return response
+
+    async def stream(self, request) -> AsyncIterator[str]:
+        parts = []
+        async for chunk in self.inner.stream(request):
+            parts.append(chunk)
+            yield chunk
+        self._record(request, "".join(parts))
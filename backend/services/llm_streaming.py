@@ -0,0 +1,142 @@
+"""
+LLM Streaming
+Server-sent event framing and multiplexing for token-streamed LLM output
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Tuple
+
+from starlette.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_CONCURRENT_STREAMS = int(os.getenv("SSE_MAX_CONCURRENT_STREAMS", "3"))
+
+# An event stream yields (event name, payload) pairs
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+_STREAM_END = object()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Frame one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def sse_comment(text: str = "keep-alive") -> str:
+    """SSE comment line; keeps proxies from timing out an idle stream"""
+    return f": {text}\n\n"
+
+class EventStreamResponse(StreamingResponse):
+    """
+    ``text/event-stream`` response that closes its generator as soon as the
+    response ends, so a client disconnect cancels upstream LLM calls right
+    away instead of whenever the generator is garbage collected.
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[str], **kwargs):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **kwargs.pop("headers", {})}
+        super().__init__(content, headers=headers, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+async def sse_stream(
+    events: AsyncIterator[StreamEvent],
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS
+) -> AsyncIterator[str]:
+    """Frame a single event source, with keep-alives while the provider is silent"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Event stream failed: {e}")
+            await queue.put(("error", {"error": str(e)}))
+        finally:
+            await queue.put(_STREAM_END)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield sse_comment()
+                continue
+            if item is _STREAM_END:
+                break
+            yield sse_event(*item)
+    finally:
+        # Runs on normal completion and on client disconnect alike
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def multiplex_streams(
+    streams: Dict[str, AsyncIterator[StreamEvent]],
+    max_concurrency: int = SSE_MAX_CONCURRENT_STREAMS,
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS
+) -> AsyncIterator[str]:
+    """
+    Interleave several event sources into one SSE stream, in arrival order.
+
+    Each source is keyed by a stream id that is added to every event it
+    emits. At most ``max_concurrency`` sources run at a time; a failing
+    source produces an ``error`` event without stopping the others. The
+    stream ends with a ``done`` event listing completed and failed ids.
+    """
+    started = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_concurrency)
+    completed, failed = [], []
+
+    async def pump(stream_id: str, events: AsyncIterator[StreamEvent]):
+        try:
+            async with slots:
+                async for event, data in events:
+                    await queue.put((event, {"stream_id": stream_id, **data}))
+            completed.append(stream_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed.append(stream_id)
+            logger.error(f"Stream {stream_id} failed: {e}")
+            await queue.put(("error", {"stream_id": stream_id, "error": str(e)}))
+        finally:
+            await queue.put(_STREAM_END)
+
+    tasks = [asyncio.create_task(pump(stream_id, events)) for stream_id, events in streams.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            try:
+                item = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield sse_comment()
+                continue
+            if item is _STREAM_END:
+                remaining -= 1
+                continue
+            yield sse_event(*item)
+
+        yield sse_event("done", {
+            "completed": completed,
+            "failed": failed,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        })
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
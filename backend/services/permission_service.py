@@ -0,0 +1,340 @@
+"""
+Effective Permission Service
+Precomputed permission bitsets per (organization, user) with role inheritance
+"""
+
+import time
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Define all available permissions
+AVAILABLE_PERMISSIONS = {
+    "project": [
+        {"name": "create_project", "display_name": "Create Project", "description": "Create new projects"},
+        {"name": "edit_project", "display_name": "Edit Project", "description": "Edit existing projects"},
+        {"name": "delete_project", "display_name": "Delete Project", "description": "Delete projects"},
+        {"name": "view_project", "display_name": "View Project", "description": "View project details"},
+        {"name": "manage_project_team", "display_name": "Manage Project Team", "description": "Add/remove team members from projects"},
+        {"name": "view_project_analytics", "display_name": "View Project Analytics", "description": "Access project analytics and reports"},
+        {"name": "manage_project_budget", "display_name": "Manage Project Budget", "description": "Manage project budget and financial tracking"},
+    ],
+    "task": [
+        {"name": "create_task", "display_name": "Create Task", "description": "Create new tasks"},
+        {"name": "edit_task", "display_name": "Edit Task", "description": "Edit existing tasks"},
+        {"name": "delete_task", "display_name": "Delete Task", "description": "Delete tasks"},
+        {"name": "assign_task", "display_name": "Assign Task", "description": "Assign tasks to team members"},
+        {"name": "view_task_details", "display_name": "View Task Details", "description": "View detailed task information"},
+        {"name": "manage_task_dependencies", "display_name": "Manage Task Dependencies", "description": "Create and manage task dependencies"},
+        {"name": "view_task_time_tracking", "display_name": "View Task Time Tracking", "description": "Access task time tracking data"},
+    ],
+    "team": [
+        {"name": "create_team", "display_name": "Create Team", "description": "Create new teams"},
+        {"name": "edit_team", "display_name": "Edit Team", "description": "Edit team information"},
+        {"name": "delete_team", "display_name": "Delete Team", "description": "Delete teams"},
+        {"name": "manage_team_members", "display_name": "Manage Team Members", "description": "Add/remove team members"},
+        {"name": "view_team_analytics", "display_name": "View Team Analytics", "description": "Access team performance analytics"},
+        {"name": "manage_team_skills", "display_name": "Manage Team Skills", "description": "Manage team skills and competencies"},
+        {"name": "view_team_workload", "display_name": "View Team Workload", "description": "View team workload distribution"},
+    ],
+    "user": [
+        {"name": "create_user", "display_name": "Create User", "description": "Create new user accounts"},
+        {"name": "edit_user", "display_name": "Edit User", "description": "Edit user profiles"},
+        {"name": "delete_user", "display_name": "Delete User", "description": "Delete user accounts"},
+        {"name": "manage_user_roles", "display_name": "Manage User Roles", "description": "Assign and manage user roles"},
+        {"name": "view_user_profiles", "display_name": "View User Profiles", "description": "View detailed user profiles"},
+        {"name": "invite_users", "display_name": "Invite Users", "description": "Send user invitations"},
+        {"name": "manage_user_permissions", "display_name": "Manage User Permissions", "description": "Directly manage user permissions"},
+    ],
+    "system": [
+        {"name": "manage_system_settings", "display_name": "Manage System Settings", "description": "Access system configuration"},
+        {"name": "view_system_logs", "display_name": "View System Logs", "description": "Access system logs and diagnostics"},
+        {"name": "manage_integrations", "display_name": "Manage Integrations", "description": "Configure system integrations"},
+        {"name": "export_data", "display_name": "Export Data", "description": "Export system data"},
+        {"name": "manage_organizations", "display_name": "Manage Organizations", "description": "Manage organization settings"},
+        {"name": "backup_restore", "display_name": "Backup & Restore", "description": "Perform system backup and restore operations"},
+        {"name": "manage_api_access", "display_name": "Manage API Access", "description": "Configure API access and keys"},
+    ],
+    "security": [
+        {"name": "manage_security_settings", "display_name": "Manage Security Settings", "description": "Configure security settings"},
+        {"name": "view_security_dashboard", "display_name": "View Security Dashboard", "description": "Access security monitoring dashboard"},
+        {"name": "manage_mfa", "display_name": "Manage MFA", "description": "Configure multi-factor authentication"},
+        {"name": "audit_access", "display_name": "Audit Access", "description": "Access audit logs and security reports"},
+        {"name": "manage_compliance", "display_name": "Manage Compliance", "description": "Manage compliance settings and reports"},
+        {"name": "view_threat_detection", "display_name": "View Threat Detection", "description": "Access threat detection and response"},
+    ],
+    "analytics": [
+        {"name": "view_analytics", "display_name": "View Analytics", "description": "Access analytics dashboards"},
+        {"name": "export_reports", "display_name": "Export Reports", "description": "Export analytics reports"},
+        {"name": "manage_dashboards", "display_name": "Manage Dashboards", "description": "Create and manage custom dashboards"},
+        {"name": "view_financial_data", "display_name": "View Financial Data", "description": "Access financial analytics and reports"},
+        {"name": "advanced_analytics", "display_name": "Advanced Analytics", "description": "Access advanced analytics features"},
+        {"name": "ai_insights", "display_name": "AI Insights", "description": "Access AI-powered insights and recommendations"},
+    ]
+}
+
+# Bit position of each permission, in catalog order
+PERMISSION_NAMES: List[str] = [
+    permission["name"]
+    for category_permissions in AVAILABLE_PERMISSIONS.values()
+    for permission in category_permissions
+]
+PERMISSION_BITS: Dict[str, int] = {name: index for index, name in enumerate(PERMISSION_NAMES)}
+ALL_PERMISSIONS_MASK = (1 << len(PERMISSION_NAMES)) - 1
+
+# Stored bitsets are only valid for the catalog they were encoded against
+CATALOG_VERSION = hashlib.sha256(",".join(PERMISSION_NAMES).encode()).hexdigest()[:16]
+
+ADMIN_SYSTEM_ROLES = ("super_admin", "admin")
+
+def encode_permissions(permissions: Iterable[str]) -> int:
+    """Pack permission names into a bitset, ignoring unknown names"""
+    mask = 0
+    for name in permissions:
+        bit = PERMISSION_BITS.get(name)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+def decode_permissions(mask: int) -> List[str]:
+    """Expand a bitset back into permission names"""
+    return [name for index, name in enumerate(PERMISSION_NAMES) if mask >> index & 1]
+
+@dataclass
+class EffectivePermissions:
+    """A user's effective permissions; membership checks are single bit tests"""
+    user_id: str
+    organization_id: str
+    mask: int
+    roles: List[Tuple[str, str, int]] = field(default_factory=list)  # (role_id, display_name, mask)
+
+    def has(self, permission: str) -> bool:
+        bit = PERMISSION_BITS.get(permission)
+        return bit is not None and bool(self.mask >> bit & 1)
+
+    def source_roles(self, permission: str) -> List[str]:
+        bit = PERMISSION_BITS.get(permission)
+        if bit is None:
+            return []
+        return [role_name for _, role_name, role_mask in self.roles if role_mask >> bit & 1]
+
+    @property
+    def permissions(self) -> List[str]:
+        return decode_permissions(self.mask)
+
+    def roles_summary(self) -> List[Dict[str, Any]]:
+        return [
+            {"role_id": role_id, "role_name": role_name, "permissions": decode_permissions(role_mask)}
+            for role_id, role_name, role_mask in self.roles
+        ]
+
+    def to_document(self, generation: int) -> Dict[str, Any]:
+        # Masks are stored as hex strings so the catalog can outgrow 64 bits
+        return {
+            "organization_id": self.organization_id,
+            "user_id": self.user_id,
+            "mask": format(self.mask, "x"),
+            "roles": [
+                {"role_id": role_id, "role_name": role_name, "mask": format(role_mask, "x")}
+                for role_id, role_name, role_mask in self.roles
+            ],
+            "catalog_version": CATALOG_VERSION,
+            "generation": generation,
+            "computed_at": datetime.utcnow()
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "EffectivePermissions":
+        return cls(
+            user_id=doc["user_id"],
+            organization_id=doc["organization_id"],
+            mask=int(doc["mask"], 16),
+            roles=[(role["role_id"], role["role_name"], int(role["mask"], 16)) for role in doc.get("roles", [])]
+        )
+
+class PermissionService:
+    """
+    Resolves and caches effective permissions.
+
+    Role masks include the inherited parent closure and are computed once per
+    organization; user bitsets are persisted in user_permission_sets and held
+    in process. Writes that change roles or assignments bump the organization's
+    permission generation: stored bitsets and role closures from an older
+    generation are never used again, so other workers see changes once their
+    in-process entry expires (cache_ttl).
+    """
+
+    def __init__(self, cache_ttl: float = 60, max_entries: int = 50_000):
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self._user_cache: Dict[Tuple[str, str], Tuple[EffectivePermissions, float]] = {}
+        # organization -> (role masks, expiry, generation they were computed at)
+        self._role_cache: Dict[str, Tuple[Dict[str, Tuple[str, int]], float, int]] = {}
+
+    async def _generation(self, db: AsyncIOMotorDatabase, organization_id: str) -> int:
+        doc = await db.permission_generations.find_one({"_id": organization_id})
+        return doc["generation"] if doc else 0
+
+    async def _bump_generation(self, db: AsyncIOMotorDatabase, organization_id: str) -> int:
+        doc = await db.permission_generations.find_one_and_update(
+            {"_id": organization_id},
+            {"$inc": {"generation": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["generation"]
+
+    async def _role_masks(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        generation: int
+    ) -> Dict[str, Tuple[str, int]]:
+        """role_id -> (display_name, mask including inherited parents)"""
+        cached = self._role_cache.get(organization_id)
+        if cached and cached[1] > time.monotonic() and cached[2] == generation:
+            return cached[0]
+
+        roles = {}
+        async for role_doc in db.custom_roles.find({"organization_id": organization_id}):
+            roles[role_doc["id"]] = role_doc
+
+        def closure(role_id: str) -> int:
+            # Walk the inheritance chain; the visited set guards against cycles
+            mask = 0
+            visited = set()
+            while role_id in roles and role_id not in visited:
+                visited.add(role_id)
+                role_doc = roles[role_id]
+                mask |= encode_permissions(role_doc.get("permissions", []))
+                if not role_doc.get("inherits_permissions"):
+                    break
+                role_id = role_doc.get("parent_role_id")
+            return mask
+
+        role_masks = {
+            role_id: (role_doc.get("display_name", role_doc.get("name", role_id)), closure(role_id))
+            for role_id, role_doc in roles.items()
+        }
+        self._role_cache[organization_id] = (role_masks, time.monotonic() + self.cache_ttl, generation)
+        return role_masks
+
+    async def _compute(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        user_doc: Dict[str, Any],
+        generation: int
+    ) -> EffectivePermissions:
+        role_masks = await self._role_masks(db, organization_id, generation)
+
+        mask = 0
+        roles = []
+        async for assignment_doc in db.role_assignments.find({
+            "user_id": user_doc["id"],
+            "is_active": True,
+            "organization_id": organization_id
+        }):
+            role = role_masks.get(assignment_doc["role_id"])
+            if role:
+                mask |= role[1]
+                roles.append((assignment_doc["role_id"], role[0], role[1]))
+
+        # Admins get all permissions
+        system_role = user_doc.get("role")
+        if getattr(system_role, "value", system_role) in ADMIN_SYSTEM_ROLES:
+            mask = ALL_PERMISSIONS_MASK
+
+        return EffectivePermissions(
+            user_id=user_doc["id"],
+            organization_id=organization_id,
+            mask=mask,
+            roles=roles
+        )
+
+    async def get_effective_permissions(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        user_id: str
+    ) -> Optional[EffectivePermissions]:
+        """Effective permissions for a user, or None if the user is not in the organization"""
+        key = (organization_id, user_id)
+        cached = self._user_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        # Read before computing: a bitset built from state older than an invalidation carries the old generation
+        generation = await self._generation(db, organization_id)
+        stored = await db.user_permission_sets.find_one({
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "catalog_version": CATALOG_VERSION,
+            "generation": generation
+        })
+        if stored:
+            effective = EffectivePermissions.from_document(stored)
+        else:
+            user_doc = await db.users.find_one({"id": user_id, "organization_id": organization_id})
+            if not user_doc:
+                return None
+            effective = await self._compute(db, organization_id, user_doc, generation)
+            try:
+                # Never replace a bitset computed at a newer generation
+                await db.user_permission_sets.replace_one(
+                    {"organization_id": organization_id, "user_id": user_id, "generation": {"$lte": generation}},
+                    effective.to_document(generation),
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # a newer bitset is already stored
+
+        if len(self._user_cache) >= self.max_entries:
+            self._user_cache.pop(next(iter(self._user_cache)))
+        self._user_cache[key] = (effective, time.monotonic() + self.cache_ttl)
+        return effective
+
+    async def has_permission(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        user_id: str,
+        permission: str
+    ) -> bool:
+        effective = await self.get_effective_permissions(db, organization_id, user_id)
+        return bool(effective and effective.has(permission))
+
+    async def invalidate_users(self, db: AsyncIOMotorDatabase, organization_id: str, user_ids: Iterable[str]):
+        """Drop cached permissions for specific users (assignment changes)"""
+        user_ids = list(user_ids)
+        for user_id in user_ids:
+            self._user_cache.pop((organization_id, user_id), None)
+        try:
+            await self._bump_generation(db, organization_id)
+            await db.user_permission_sets.delete_many({
+                "organization_id": organization_id,
+                "user_id": {"$in": user_ids}
+            })
+        except Exception as e:
+            logger.error(f"Failed to invalidate stored permissions: {e}")
+
+    async def invalidate_organization(self, db: AsyncIOMotorDatabase, organization_id: str):
+        """Drop cached role closures and user permissions for an organization (role changes)"""
+        self._role_cache.pop(organization_id, None)
+        for key in [key for key in self._user_cache if key[0] == organization_id]:
+            del self._user_cache[key]
+        try:
+            await self._bump_generation(db, organization_id)
+            await db.user_permission_sets.delete_many({"organization_id": organization_id})
+        except Exception as e:
+            logger.error(f"Failed to invalidate stored permissions: {e}")
+
+# Global instance
+permission_service = PermissionService()
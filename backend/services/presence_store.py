@@ -0,0 +1,124 @@
+"""
+Presence Store
+Shared, expiring record of which users hold WebSocket connections on any worker
+"""
+
+import os
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_BACKEND = os.getenv("PRESENCE_BACKEND", "mongo")  # mongo | memory
+PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+
+class PresenceStore(ABC):
+    """
+    One record per connection, keyed by connection id and scoped to a
+    feature (the fan-out name) and group. Each worker refreshes its own
+    records well within the TTL, so the connections of a crashed worker
+    drop out on their own.
+    """
+
+    def __init__(self, ttl_seconds: int = PRESENCE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    def _record(self, channel, scope: str) -> Dict[str, Any]:
+        from services.broadcast_bus import WORKER_ID
+
+        return {
+            "scope": scope,
+            "group": channel.group,
+            "user_id": channel.user_id,
+            "worker_id": WORKER_ID,
+            "connected_at": channel.connected_at,
+            "last_activity": channel.last_activity,
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        }
+
+    @abstractmethod
+    async def refresh(self, scope: str, channels: List[Any]):
+        """Create or extend the records of these connections"""
+
+    @abstractmethod
+    async def remove(self, connection_ids: List[str]):
+        """Drop records for closed connections"""
+
+    @abstractmethod
+    async def members(self, scope: str, group: str) -> List[Dict[str, Any]]:
+        """Live connections in a group across all workers"""
+
+    async def users(self, scope: str, group: str) -> List[str]:
+        return sorted({member["user_id"] for member in await self.members(scope, group)})
+
+class InMemoryPresenceStore(PresenceStore):
+    """Records shared by every instance in the process; for tests and single-worker runs"""
+
+    _records: Dict[str, Dict[str, Any]] = {}
+
+    async def refresh(self, scope: str, channels: List[Any]):
+        for channel in channels:
+            self._records[channel.connection_id] = self._record(channel, scope)
+
+    async def remove(self, connection_ids: List[str]):
+        for connection_id in connection_ids:
+            self._records.pop(connection_id, None)
+
+    async def members(self, scope: str, group: str) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return [
+            {"connection_id": connection_id, **record}
+            for connection_id, record in self._records.items()
+            if record["scope"] == scope and record["group"] == group and record["expires_at"] > now
+        ]
+
+class MongoPresenceStore(PresenceStore):
+    """Records in the ``websocket_presence`` collection; a TTL index clears expired ones"""
+
+    def __init__(self, ttl_seconds: int = PRESENCE_TTL_SECONDS, collection_name: str = "websocket_presence"):
+        super().__init__(ttl_seconds)
+        self.collection_name = collection_name
+
+    async def _collection(self):
+        from database import get_database
+
+        db = await get_database()
+        return db[self.collection_name]
+
+    async def refresh(self, scope: str, channels: List[Any]):
+        if not channels:
+            return
+        collection = await self._collection()
+        await collection.bulk_write([
+            UpdateOne({"_id": channel.connection_id}, {"$set": self._record(channel, scope)}, upsert=True)
+            for channel in channels
+        ], ordered=False)
+
+    async def remove(self, connection_ids: List[str]):
+        if not connection_ids:
+            return
+        collection = await self._collection()
+        await collection.delete_many({"_id": {"$in": connection_ids}})
+
+    async def members(self, scope: str, group: str) -> List[Dict[str, Any]]:
+        collection = await self._collection()
+        # The TTL monitor runs about once a minute, so filter expired records explicitly
+        cursor = collection.find({"scope": scope, "group": group, "expires_at": {"$gt": datetime.utcnow()}})
+        return [
+            {"connection_id": doc.pop("_id"), **doc}
+            async for doc in cursor
+        ]
+
+def create_presence_store(backend_name: Optional[str] = None) -> PresenceStore:
+    """Build the store named by PRESENCE_BACKEND (mongo or memory)"""
+    backend_name = backend_name or PRESENCE_BACKEND
+    if backend_name == "memory":
+        return InMemoryPresenceStore()
+    return MongoPresenceStore()
+
+# Global instance
+presence_store = create_presence_store()
@@ -0,0 +1,99 @@
+"""
+Retention TTL Compilation
+Pure age-cutoff retention policies expressed as Mongo TTL expiry
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-document expiry stamped from the owning retention policy; each managed
+# collection carries a TTL index on this field (expireAfterSeconds=0)
+TTL_FIELD = "retention_expires_at"
+
+# Collections whose expiry is driven by the TTL index, mapped to the field the
+# retention period is measured from
+TTL_MANAGED_COLLECTIONS: Dict[str, str] = {
+    "audit_events": "created_at",
+    "notifications": "created_at",
+    "threat_detections": "first_detected",
+}
+
+def is_ttl_policy(policy) -> bool:
+    """A policy compiles to a TTL index only when it is a plain age cutoff"""
+    return (
+        policy.is_active
+        and policy.auto_cleanup_enabled
+        and policy.cleanup_method == "hard_delete"
+        and not policy.exceptions
+    )
+
+def compile_retention_periods(policies) -> Dict[str, int]:
+    """Shortest TTL-eligible retention period (days) per managed collection"""
+    periods: Dict[str, int] = {}
+    for policy in policies:
+        if not is_ttl_policy(policy):
+            continue
+        for collection_name in policy.collection_names:
+            if collection_name in TTL_MANAGED_COLLECTIONS:
+                current = periods.get(collection_name)
+                if current is None or policy.retention_period_days < current:
+                    periods[collection_name] = policy.retention_period_days
+    return periods
+
+class RetentionExpiryCache:
+    """Caches compiled retention periods so writers can stamp expiry without a policy read"""
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._periods: Dict[str, Tuple[Dict[str, int], float]] = {}
+
+    async def get_period_days(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        collection_name: str
+    ) -> Optional[int]:
+        cached = self._periods.get(organization_id)
+        if cached is None or cached[1] <= time.monotonic():
+            from models.security import DataRetentionPolicy
+
+            policies = []
+            async for policy_doc in db.data_retention_policies.find({
+                "organization_id": organization_id,
+                "is_active": True
+            }):
+                policies.append(DataRetentionPolicy(**policy_doc))
+            cached = (compile_retention_periods(policies), time.monotonic() + self.ttl_seconds)
+            self._periods[organization_id] = cached
+        return cached[0].get(collection_name)
+
+    async def expiry_for(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        collection_name: str,
+        created_at: datetime
+    ) -> Optional[datetime]:
+        """Expiry to stamp on a new document, or None if no TTL policy applies"""
+        try:
+            period_days = await self.get_period_days(db, organization_id, collection_name)
+        except Exception as e:
+            logger.error(f"Retention expiry lookup failed for {collection_name}: {e}")
+            return None
+        if period_days is None:
+            return None
+        return created_at + timedelta(days=period_days)
+
+    def invalidate(self, organization_id: Optional[str] = None):
+        if organization_id is None:
+            self._periods.clear()
+        else:
+            self._periods.pop(organization_id, None)
+
+# Global instance
+retention_expiry = RetentionExpiryCache()
@@ -6,87 +6,34 @@ Provides file upload, download, and management functionality using AWS S3.
 
 import os
 import uuid
-import hashlib
-from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any, Tuple
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
-from fastapi import HTTPException, UploadFile
-from pydantic import BaseModel
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse, Response
 import logging
 
-# Try to import magic, but make it optional
-try:
-    import magic
-    MAGIC_AVAILABLE = True
-except (ImportError, OSError) as e:
-    MAGIC_AVAILABLE = False
-    logging.warning(f"python-magic not available, will use fallback MIME detection: {e}")
+from services.file_storage import FileStorageBackend, FileUploadResult, StorageConfig, parse_range_header
 
 logger = logging.getLogger(__name__)
 
-class FileUploadResult(BaseModel):
-    file_id: str
-    filename: str
-    original_filename: str
-    file_path: str
-    size: int
-    content_type: str
-    checksum: str
-    project_id: str
-    uploaded_by: str
-    uploaded_at: datetime
-
-class S3Config:
+class S3Config(StorageConfig):
     """S3 configuration settings"""
     def __init__(self):
+        super().__init__()
         self.bucket_name = os.getenv('S3_BUCKET_NAME', 'enterprise-portfolio-files')
         self.region = os.getenv('AWS_REGION', 'us-east-1')
         self.access_key_id = os.getenv('AWS_ACCESS_KEY_ID', 'your-access-key-id')
         self.secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY', 'your-secret-access-key')
-        
-        # File validation settings
-        self.max_file_size = int(os.getenv('MAX_FILE_SIZE', 50 * 1024 * 1024))  # 50MB default
-        self.allowed_extensions = {
-            '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg',  # Images
-            '.pdf', '.doc', '.docx', '.txt', '.rtf',            # Documents
-            '.xls', '.xlsx', '.csv',                           # Spreadsheets
-            '.ppt', '.pptx',                                   # Presentations
-            '.zip', '.tar', '.gz', '.rar',                     # Archives
-            '.mp3', '.wav', '.ogg',                            # Audio
-            '.mp4', '.avi', '.mov', '.mkv',                    # Video
-            '.json', '.xml', '.yaml', '.yml'                   # Data files
-        }
-        
-        self.allowed_mime_types = {
-            # Images
-            'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/svg+xml',
-            # Documents
-            'application/pdf', 'text/plain', 'text/rtf',
-            'application/msword',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            # Spreadsheets
-            'application/vnd.ms-excel',
-            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'text/csv',
-            # Presentations
-            'application/vnd.ms-powerpoint',
-            'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-            # Archives
-            'application/zip', 'application/x-tar', 'application/gzip', 'application/x-rar-compressed',
-            # Audio
-            'audio/mpeg', 'audio/wav', 'audio/ogg',
-            # Video
-            'video/mp4', 'video/x-msvideo', 'video/quicktime', 'video/x-matroska',
-            # Data
-            'application/json', 'application/xml', 'text/xml', 'application/x-yaml'
-        }
 
-class S3FileService:
+class S3FileService(FileStorageBackend):
     """S3 file management service"""
     
+    backend_name = "s3"
+    supports_presigned_urls = True
+    
     def __init__(self):
-        self.config = S3Config()
+        super().__init__(S3Config())
         self._s3_client = None
         self._integration_configs = {}  # Cache for integration-specific configs
         
@@ -162,57 +109,20 @@ class S3FileService:
         """Get cached organization configuration"""
         return self._integration_configs.get(organization_id)
     
-    def _validate_file(self, file: UploadFile, content: bytes, organization_config=None) -> None:
-        """Validate file before upload"""
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No filename provided")
-        
-        # Use organization config if available, otherwise use default config
-        config = organization_config if organization_config else self.config
-        
-        # Check file extension
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        allowed_extensions = getattr(config, 'allowed_extensions', self.config.allowed_extensions)
-        
-        # Handle organization config format (list of strings vs set of extensions with dots)
-        if isinstance(allowed_extensions, list):
-            # Convert list of extensions (without dots) to set with dots
-            allowed_extensions = {f".{ext.lstrip('.')}" for ext in allowed_extensions}
-        
-        if file_ext not in allowed_extensions:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File type '{file_ext}' is not allowed"
-            )
-        
-        # Check file size
-        max_file_size = getattr(config, 'max_file_size_mb', getattr(config, 'max_file_size', self.config.max_file_size))
-        if isinstance(max_file_size, int) and max_file_size < 1000:  # Assume it's in MB
-            max_file_size = max_file_size * 1024 * 1024  # Convert MB to bytes
-        
-        if len(content) > max_file_size:
-            max_size_mb = max_file_size // (1024 * 1024)
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size exceeds maximum limit of {max_size_mb}MB"
-            )
-        
-        # Validate MIME type using file content
-        try:
-            if MAGIC_AVAILABLE:
-                detected_mime = magic.from_buffer(content, mime=True)
-                if detected_mime not in self.config.allowed_mime_types:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File type '{detected_mime}' is not allowed"
-                    )
-            else:
-                logger.debug("MIME validation skipped - libmagic not available")
-        except Exception as e:
-            logger.warning(f"Could not detect MIME type: {e}")
-            # Continue without MIME validation if detection fails
+    async def load_organization_config(self, organization_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Load the organization's S3 integration settings used for upload validation"""
+        if not organization_id:
+            return None
+        await self.load_integration_config(organization_id)
+        return self.get_organization_config(organization_id)
     
-    def _generate_file_path(self, project_id: str, filename: str) -> Tuple[str, str]:
+    def _generate_file_path(
+        self,
+        project_id: str,
+        filename: str,
+        checksum: str,
+        organization_id: Optional[str] = None
+    ) -> Tuple[str, str]:
         """Generate unique file path and file ID"""
         file_id = str(uuid.uuid4())
         # Clean filename to prevent path issues
@@ -220,84 +130,33 @@ class S3FileService:
         file_path = f"projects/{project_id}/files/{file_id}_{clean_filename}"
         return file_path, file_id
     
-    def _calculate_checksum(self, content: bytes) -> str:
-        """Calculate SHA256 checksum of file content"""
-        return hashlib.sha256(content).hexdigest()
-    
-    async def upload_file(
+    async def put_object(
         self,
-        file: UploadFile,
-        project_id: str,
-        uploaded_by: str,
-        description: Optional[str] = None,
+        file_path: str,
+        content: bytes,
+        content_type: str,
+        metadata: Dict[str, str],
         organization_id: Optional[str] = None
-    ) -> FileUploadResult:
-        """Upload file to S3"""
-        
-        # Load organization-specific config if provided
-        organization_config = None
+    ) -> None:
+        """Upload an object to S3"""
         s3_client = self.s3_client
         bucket_name = self.config.bucket_name
         
-        if organization_id:
-            await self.load_integration_config(organization_id)
-            organization_config = self.get_organization_config(organization_id)
-            if organization_config:
-                s3_client = self.get_s3_client_for_organization(organization_id)
-                bucket_name = organization_config["bucket_name"]
-        
-        # Read file content
-        content = await file.read()
+        organization_config = self.get_organization_config(organization_id) if organization_id else None
+        if organization_config:
+            s3_client = self.get_s3_client_for_organization(organization_id)
+            bucket_name = organization_config["bucket_name"]
         
-        # Validate file
-        self._validate_file(file, content, organization_config)
-        
-        # Generate file path and calculate checksum
-        file_path, file_id = self._generate_file_path(project_id, file.filename)
-        checksum = self._calculate_checksum(content)
-        
-        # Detect content type
         try:
-            if MAGIC_AVAILABLE:
-                content_type = magic.from_buffer(content, mime=True)
-            else:
-                content_type = file.content_type or 'application/octet-stream'
-        except Exception:
-            content_type = file.content_type or 'application/octet-stream'
-        
-        try:
-            # Upload to S3
             s3_client.put_object(
                 Bucket=bucket_name,
                 Key=file_path,
                 Body=content,
                 ContentType=content_type,
-                Metadata={
-                    'original_filename': file.filename,
-                    'project_id': project_id,
-                    'uploaded_by': uploaded_by,
-                    'file_id': file_id,
-                    'description': description or '',
-                    'checksum': checksum
-                },
+                Metadata=metadata,
                 ServerSideEncryption='AES256'  # Enable server-side encryption
             )
             
-            logger.info(f"File uploaded successfully: {file_path}")
-            
-            return FileUploadResult(
-                file_id=file_id,
-                filename=file.filename,
-                original_filename=file.filename,
-                file_path=file_path,
-                size=len(content),
-                content_type=content_type,
-                checksum=checksum,
-                project_id=project_id,
-                uploaded_by=uploaded_by,
-                uploaded_at=datetime.utcnow()
-            )
-            
         except ClientError as e:
             error_code = e.response.get('Error', {}).get('Code', 'Unknown')
             logger.error(f"S3 upload failed: {error_code} - {e}")
@@ -344,13 +203,17 @@ class S3FileService:
                     detail="Error retrieving file information"
                 )
     
-    def download_file_stream(self, file_path: str):
-        """Get file stream for download"""
+    def download_file_stream(self, file_path: str, byte_range: Optional[Tuple[int, int]] = None):
+        """Get file stream for download, optionally limited to an inclusive byte range"""
         try:
-            response = self.s3_client.get_object(
-                Bucket=self.config.bucket_name,
-                Key=file_path
-            )
+            request_params = {
+                'Bucket': self.config.bucket_name,
+                'Key': file_path
+            }
+            if byte_range:
+                request_params['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            
+            response = self.s3_client.get_object(**request_params)
             
             def file_generator():
                 try:
@@ -374,6 +237,40 @@ class S3FileService:
                     detail="Error downloading file"
                 )
     
+    def build_download_response(
+        self,
+        file_path: str,
+        filename: str,
+        media_type: str,
+        range_header: Optional[str] = None
+    ) -> Response:
+        """Stream an object from S3 with the same Range semantics as local storage"""
+        byte_range = None
+        if range_header:
+            size = self.get_file_info(file_path)['content_length']
+            byte_range = parse_range_header(range_header, size)
+        
+        file_generator, s3_response = self.download_file_stream(file_path, byte_range)
+        
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Accept-Ranges': 'bytes',
+        }
+        if 'ContentLength' in s3_response:
+            headers['Content-Length'] = str(s3_response['ContentLength'])
+        
+        status_code = 200
+        if byte_range:
+            status_code = 206
+            headers['Content-Range'] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        
+        return StreamingResponse(
+            file_generator,
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers
+        )
+    
     def generate_presigned_url(
         self,
         file_path: str,
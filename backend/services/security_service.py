@@ -3,26 +3,43 @@ Enterprise Security Service
 Phase 4.3: Comprehensive Security Operations
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import base64
+import hmac
+import os
 import secrets
 import hashlib
 import logging
 import json
 from passlib.totp import TOTP
 
+from auth.rate_limiter import BoundedTTLCache
+
 from models.security import (
     MFAConfiguration, AuditEvent, SecurityEventType, RiskLevel,
     SecurityPolicy, DataRetentionPolicy, ZeroTrustPolicy,
     SecurityEventQuery
 )
+from services.retention_ttl import (
+    TTL_FIELD, TTL_MANAGED_COLLECTIONS, is_ttl_policy, retention_expiry
+)
 
 logger = logging.getLogger(__name__)
 
 class SecurityService:
     """Enterprise security operations service"""
     
+    # Shared by every instance in the process: appends for an organization are
+    # serialized locally, and the unique sequence index keeps workers linear.
+    # Bounded so idle organizations are forgotten; an evicted lock or head only
+    # costs a reload, since the index still rejects a duplicate position
+    _chain_locks = BoundedTTLCache(maxsize=10_000, ttl=3600)
+    _chain_heads = BoundedTTLCache(maxsize=10_000, ttl=3600)
+    
     def __init__(self):
         self.verification_codes = {}  # In production, use Redis or similar
         self.backup_codes_used = set()
@@ -142,38 +159,127 @@ class SecurityService:
                 metadata=kwargs.get("metadata", {})
             )
             
-            # Create blockchain-style hash chain for immutability
-            await self._create_hash_chain(db, audit_event)
+            # Stamped for TTL expiry when a retention policy applies
+            extra_fields = {}
+            expires_at = await retention_expiry.expiry_for(
+                db, organization_id, "audit_events", audit_event.created_at
+            )
+            if expires_at:
+                extra_fields[TTL_FIELD] = expires_at
             
-            # Insert audit event
-            result = await db.audit_events.insert_one(audit_event.model_dump())
-            return result.acknowledged
+            # Append to the blockchain-style hash chain; an event that cannot be chained is not written
+            await self._append_chained_event(db, audit_event, extra_fields)
+            return True
             
         except Exception as e:
             logger.error(f"Failed to log security event: {e}")
             return False
     
-    async def _create_hash_chain(self, db: AsyncIOMotorDatabase, event: AuditEvent):
-        """Create blockchain-style hash chain for audit immutability"""
-        try:
-            # Get the last event's hash
+    def _compute_event_hash(
+        self,
+        organization_id: str,
+        timestamp: datetime,
+        description: str,
+        previous_hash: str
+    ) -> str:
+        """Hash an audit event together with its predecessor's hash"""
+        event_data = f"{organization_id}{timestamp.isoformat()}{description}{previous_hash}"
+        return hashlib.sha256(event_data.encode()).hexdigest()
+    
+    async def _load_chain_head(self, db: AsyncIOMotorDatabase, organization_id: str) -> Tuple[int, str]:
+        """Read the organization's chain head, creating it from legacy events on first use"""
+        head = await db.audit_chain_heads.find_one({"organization_id": organization_id})
+        if head:
+            # The head trails the events when a worker stopped between inserting an event and advancing it
             last_event = await db.audit_events.find_one(
-                {"organization_id": event.organization_id},
-                sort=[("timestamp", -1)]
+                {"organization_id": organization_id, "sequence": {"$gt": head["sequence"]}},
+                sort=[("sequence", -1)]
             )
+            if last_event:
+                return last_event["sequence"], last_event["hash_chain"]
+            return head["sequence"], head["head_hash"]
+        
+        # Events written before chain heads existed are linked by timestamp order
+        last_event = await db.audit_events.find_one(
+            {"organization_id": organization_id},
+            sort=[("timestamp", -1)]
+        )
+        head_hash = (last_event.get("hash_chain") or "genesis") if last_event else "genesis"
+        try:
+            await db.audit_chain_heads.insert_one({
+                "organization_id": organization_id,
+                "sequence": 0,
+                "head_hash": head_hash,
+                "updated_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            # Another worker created the head first
+            head = await db.audit_chain_heads.find_one({"organization_id": organization_id})
+            return head["sequence"], head["head_hash"]
+        
+        return 0, head_hash
+    
+    async def _append_chained_event(
+        self,
+        db: AsyncIOMotorDatabase,
+        event: AuditEvent,
+        extra_fields: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Insert an event as the next link of its organization's hash chain.
+        
+        The insert is the commit point: the unique (organization_id, sequence)
+        index lets exactly one event claim each position, and the chain head
+        is only advanced afterwards, so a failed insert never leaves a gap.
+        """
+        organization_id = event.organization_id
+        lock = self._chain_locks.get(organization_id)
+        if lock is None:
+            lock = asyncio.Lock()
+        # Re-stored on every append, so an active organization's lock is never evicted by its TTL
+        self._chain_locks[organization_id] = lock
+        
+        # MongoDB stores milliseconds; truncate so stored events re-hash identically
+        event.timestamp = event.timestamp.replace(microsecond=event.timestamp.microsecond // 1000 * 1000)
+        
+        async with lock:
+            try:
+                head = self._chain_heads.get(organization_id)
+                if head is None:
+                    head = await self._load_chain_head(db, organization_id)
+                
+                while True:
+                    sequence, previous_hash = head
+                    event.sequence = sequence + 1
+                    event.previous_hash = previous_hash
+                    event.hash_chain = self._compute_event_hash(
+                        organization_id, event.timestamp, event.description, previous_hash
+                    )
+                    
+                    try:
+                        await db.audit_events.insert_one({**event.model_dump(), **(extra_fields or {})})
+                        break
+                    except DuplicateKeyError:
+                        # Another worker took this position since our cached head; reload and retry
+                        head = await self._load_chain_head(db, organization_id)
+            except Exception:
+                self._chain_heads.pop(organization_id, None)
+                raise
             
-            previous_hash = last_event.get("hash_chain", "genesis") if last_event else "genesis"
-            
-            # Create hash of current event
-            event_data = f"{event.organization_id}{event.timestamp.isoformat()}{event.description}{previous_hash}"
-            current_hash = hashlib.sha256(event_data.encode()).hexdigest()
-            
-            event.previous_hash = previous_hash
-            event.hash_chain = current_hash
-            
+            self._chain_heads[organization_id] = (event.sequence, event.hash_chain)
+        
+        # Advance the shared head; it only moves forward, and a lagging head is repaired on load
+        try:
+            await db.audit_chain_heads.update_one(
+                {"organization_id": organization_id, "sequence": {"$lt": event.sequence}},
+                {"$set": {
+                    "sequence": event.sequence,
+                    "head_hash": event.hash_chain,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
         except Exception as e:
-            logger.error(f"Failed to create hash chain: {e}")
-            # Continue without hash chain if it fails
+            logger.warning(f"Audit chain head for {organization_id} not advanced past {event.sequence}: {e}")
     
     async def get_security_events(
         self,
@@ -216,61 +322,180 @@ class SecurityService:
             logger.error(f"Failed to get security events: {e}")
             return []
     
-    async def export_audit_trail(
+    def _json_default(self, value: Any) -> str:
+        """JSON encoder fallback for audit export documents"""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+    
+    def encode_export_checkpoint(self, state: Dict[str, Any]) -> str:
+        """Encode and sign an export resume point"""
+        payload = base64.urlsafe_b64encode(json.dumps(state, sort_keys=True).encode()).decode()
+        signature = hmac.new(self._checkpoint_secret(), payload.encode(), hashlib.sha256).hexdigest()
+        return f"{payload}.{signature}"
+    
+    def decode_export_checkpoint(
         self,
-        db: AsyncIOMotorDatabase,
+        token: str,
         organization_id: str,
         start_date: datetime,
-        end_date: datetime,
-        format: str = "json"
+        end_date: datetime
     ) -> Dict[str, Any]:
-        """Export audit trail for compliance"""
+        """Validate a checkpoint token and return its resume state"""
         try:
-            # Get events in date range
-            query = SecurityEventQuery(
-                start_date=start_date,
-                end_date=end_date,
-                limit=10000  # Large limit for export
-            )
-            events = await self.get_security_events(db, query)
-            
-            export_data = {
-                "organization_id": organization_id,
-                "export_date": datetime.utcnow(),
-                "period_start": start_date,
-                "period_end": end_date,
-                "total_events": len(events),
-                "events": [event.model_dump() for event in events],
-                "format": format,
-                "integrity_verified": await self._verify_hash_chain(db, events)
-            }
+            payload, signature = token.rsplit(".", 1)
+            expected = hmac.new(self._checkpoint_secret(), payload.encode(), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(signature, expected):
+                raise ValueError("Checkpoint signature mismatch")
+            state = json.loads(base64.urlsafe_b64decode(payload.encode()))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid checkpoint token: {e}")
+        
+        if (state.get("organization_id") != organization_id
+                or state.get("period_start") != start_date.isoformat()
+                or state.get("period_end") != end_date.isoformat()):
+            raise ValueError("Checkpoint token does not match this export")
+        return state
+    
+    def _checkpoint_secret(self) -> bytes:
+        return os.getenv("JWT_SECRET_KEY", "enterprise-portfolio-jwt-secret-key-2025").encode()
+    
+    async def stream_audit_trail(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        checkpoint_interval: int = 1000,
+        batch_size: int = 500
+    ) -> AsyncIterator[str]:
+        """
+        Stream an organization's audit trail as NDJSON in chain order.
+        
+        Events are read from a cursor oldest-first and verified as they pass:
+        each event must link to its predecessor's hash, and events appended
+        through the chain head have their SHA-256 recomputed. Memory use is
+        constant; a signed checkpoint line is emitted every
+        ``checkpoint_interval`` events so an interrupted export can resume.
+        """
+        state = checkpoint or {
+            "organization_id": organization_id,
+            "period_start": start_date.isoformat(),
+            "period_end": end_date.isoformat(),
+            "phase": "legacy",
+            "after_timestamp": None,
+            "after_id": None,
+            "after_sequence": 0,
+            "previous_hash": None,
+            "total_events": 0,
+            "hash_verified_events": 0,
+            "integrity_failures": 0
+        }
+        
+        yield json.dumps({
+            "type": "header",
+            "organization_id": organization_id,
+            "export_date": datetime.utcnow().isoformat(),
+            "period_start": state["period_start"],
+            "period_end": state["period_end"],
+            "resumed": checkpoint is not None,
+            "resumed_after_events": state["total_events"]
+        }) + "\n"
+        
+        base_query = {
+            "organization_id": organization_id,
+            "timestamp": {"$gte": start_date, "$lte": end_date}
+        }
+        buffer: List[str] = []
+        since_checkpoint = 0
+        
+        # Events logged before chain sequences existed, then the sequenced chain
+        for phase in ("legacy", "chain"):
+            if phase == "legacy" and state["phase"] != "legacy":
+                continue
             
-            return export_data
+            if phase == "legacy":
+                query = {**base_query, "sequence": None}
+                if state["after_timestamp"]:
+                    after_timestamp = datetime.fromisoformat(state["after_timestamp"])
+                    query["$or"] = [
+                        {"timestamp": {"$gt": after_timestamp}},
+                        {"timestamp": after_timestamp, "id": {"$gt": state["after_id"]}}
+                    ]
+                cursor = db.audit_events.find(query).sort([("timestamp", 1), ("id", 1)])
+            else:
+                if state["phase"] == "legacy":
+                    state["phase"] = "chain"
+                    state["previous_hash"] = None
+                query = {**base_query, "sequence": {"$gt": state["after_sequence"]}}
+                cursor = db.audit_events.find(query).sort("sequence", 1)
             
-        except Exception as e:
-            logger.error(f"Failed to export audit trail: {e}")
-            return {"error": str(e)}
-    
-    async def _verify_hash_chain(self, db: AsyncIOMotorDatabase, events: List[AuditEvent]) -> bool:
-        """Verify blockchain-style hash chain integrity"""
-        try:
-            for i, event in enumerate(events):
-                if i == 0:
-                    continue  # Skip first event
+            async for doc in cursor.batch_size(batch_size):
+                if state["previous_hash"] is None and phase == "chain" and doc["sequence"] > 1:
+                    # The predecessor may fall outside the export window
+                    predecessor = await db.audit_events.find_one(
+                        {"organization_id": organization_id, "sequence": doc["sequence"] - 1},
+                        {"hash_chain": 1}
+                    )
+                    state["previous_hash"] = predecessor.get("hash_chain") if predecessor else None
+                elif state["previous_hash"] is None and phase == "chain":
+                    state["previous_hash"] = doc.get("previous_hash")
                 
-                # Verify hash chain
-                previous_event = events[i-1]
-                expected_previous_hash = previous_event.hash_chain
+                link_verified = (
+                    state["previous_hash"] is None
+                    or doc.get("previous_hash") == state["previous_hash"]
+                )
+                hash_verified = None
+                if phase == "chain":
+                    hash_verified = doc.get("hash_chain") == self._compute_event_hash(
+                        organization_id, doc["timestamp"], doc["description"], doc.get("previous_hash") or ""
+                    )
+                    if hash_verified:
+                        state["hash_verified_events"] += 1
                 
-                if event.previous_hash != expected_previous_hash:
-                    logger.warning(f"Hash chain integrity violation detected in event {event.id}")
-                    return False
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Hash chain verification failed: {e}")
-            return False
+                if not link_verified or hash_verified is False:
+                    state["integrity_failures"] += 1
+                    logger.warning(f"Hash chain integrity violation detected in event {doc.get('id')}")
+                
+                buffer.append(json.dumps({
+                    "type": "event",
+                    "link_verified": link_verified,
+                    "hash_verified": hash_verified,
+                    "event": {key: value for key, value in doc.items() if key != "_id"}
+                }, default=self._json_default) + "\n")
+                
+                state["previous_hash"] = doc.get("hash_chain")
+                state["total_events"] += 1
+                if phase == "legacy":
+                    state["after_timestamp"] = doc["timestamp"].isoformat()
+                    state["after_id"] = doc.get("id")
+                else:
+                    state["after_sequence"] = doc["sequence"]
+                
+                since_checkpoint += 1
+                if since_checkpoint >= checkpoint_interval:
+                    since_checkpoint = 0
+                    buffer.append(json.dumps({
+                        "type": "checkpoint",
+                        "events_exported": state["total_events"],
+                        "token": self.encode_export_checkpoint(state)
+                    }) + "\n")
+                
+                if len(buffer) >= 100:
+                    yield "".join(buffer)
+                    buffer = []
+        
+        if buffer:
+            yield "".join(buffer)
+        
+        yield json.dumps({
+            "type": "summary",
+            "total_events": state["total_events"],
+            "hash_verified_events": state["hash_verified_events"],
+            "integrity_failures": state["integrity_failures"],
+            "integrity_verified": state["integrity_failures"] == 0
+        }) + "\n"
     
     # =============================================================================
     # SECURITY POLICY OPERATIONS
@@ -467,6 +692,9 @@ class SecurityService:
                 cutoff_date = datetime.utcnow() - timedelta(days=policy.retention_period_days)
                 
                 for collection_name in policy.collection_names:
+                    # Age-cutoff deletes on TTL-managed collections are handled by Mongo
+                    if is_ttl_policy(policy) and collection_name in TTL_MANAGED_COLLECTIONS:
+                        continue
                     if collection_name in ["audit_events", "users", "projects", "tasks", "comments"]:
                         result = await self._cleanup_collection(
                             db, collection_name, cutoff_date, policy.cleanup_method
@@ -817,7 +1045,7 @@ class SecurityService:
     ) -> int:
         """Generate realistic demo security events for demonstration"""
         try:
-            demo_events = []
+            generated = 0
             now = datetime.utcnow()
             
             # Generate various types of security events over the past 30 days
@@ -906,17 +1134,12 @@ class SecurityService:
                     timestamp=event_time
                 )
                 
-                # Create hash chain
-                await self._create_hash_chain(db, audit_event)
-                demo_events.append(audit_event.model_dump())
+                # Append to the hash chain
+                await self._append_chained_event(db, audit_event)
+                generated += 1
             
-            # Insert all demo events
-            if demo_events:
-                result = await db.audit_events.insert_many(demo_events)
-                logger.info(f"Generated {len(result.inserted_ids)} demo security events")
-                return len(result.inserted_ids)
-            
-            return 0
+            logger.info(f"Generated {generated} demo security events")
+            return generated
             
         except Exception as e:
             logger.error(f"Failed to generate demo security events: {e}")
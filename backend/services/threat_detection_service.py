@@ -6,299 +6,528 @@ Phase 4.3: AI-Powered Security Monitoring
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 import logging
 import json
 import asyncio
-from collections import defaultdict
+from collections import deque, OrderedDict
 
 from models.security import (
     ThreatDetection, RiskLevel, ThreatResponse,
-    SecurityEventType, AuditEvent
+    SecurityEventType
 )
+from services.retention_ttl import TTL_FIELD, retention_expiry
 
 logger = logging.getLogger(__name__)
 
+ROLE_HIERARCHY = {
+    "viewer": 1,
+    "member": 2,
+    "team_lead": 3,
+    "manager": 4,
+    "admin": 5,
+    "super_admin": 6
+}
+
+def is_privilege_escalation(old_role: Optional[str], new_role: Optional[str]) -> bool:
+    """Check if role change represents privilege escalation"""
+    return ROLE_HIERARCHY.get(new_role, 0) > ROLE_HIERARCHY.get(old_role, 0)
+
+class SlidingWindowCounter:
+    """Event count over a trailing time window, kept as fixed-width time buckets"""
+    
+    def __init__(self, window_seconds: int, bucket_count: int = 60):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = max(window_seconds / bucket_count, 1)
+        self.buckets: deque = deque()  # (bucket_start, count), oldest first
+        self.total = 0
+    
+    def _evict(self, now: float):
+        horizon = now - self.window_seconds
+        while self.buckets and self.buckets[0][0] + self.bucket_seconds <= horizon:
+            self.total -= self.buckets.popleft()[1]
+    
+    def add(self, timestamp: float) -> int:
+        """Record an event and return the count inside the window"""
+        self._evict(timestamp)
+        bucket_start = timestamp - (timestamp % self.bucket_seconds)
+        if self.buckets and self.buckets[-1][0] == bucket_start:
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([bucket_start, 1])
+        self.total += 1
+        return self.total
+    
+    def count(self, now: float) -> int:
+        self._evict(now)
+        return self.total
+    
+    def last_activity(self) -> float:
+        return self.buckets[-1][0] if self.buckets else 0.0
+    
+    def to_checkpoint(self) -> List[List[float]]:
+        return [list(bucket) for bucket in self.buckets]
+    
+    def restore(self, buckets: List[List[float]]):
+        self.buckets = deque([bucket_start, int(count)] for bucket_start, count in buckets)
+        self.total = sum(bucket[1] for bucket in self.buckets)
+
+class DistinctWindow:
+    """Distinct values seen over a trailing time window"""
+    
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        self.last_seen: "OrderedDict[str, float]" = OrderedDict()  # least recently seen first
+    
+    def _evict(self, now: float):
+        horizon = now - self.window_seconds
+        while self.last_seen:
+            value, seen_at = next(iter(self.last_seen.items()))
+            if seen_at > horizon:
+                break
+            self.last_seen.popitem(last=False)
+    
+    def add(self, value: str, timestamp: float) -> int:
+        """Record a value and return the number of distinct values inside the window"""
+        self._evict(timestamp)
+        self.last_seen[value] = timestamp
+        self.last_seen.move_to_end(value)
+        return len(self.last_seen)
+    
+    def count(self, now: float) -> int:
+        self._evict(now)
+        return len(self.last_seen)
+    
+    def values(self) -> List[str]:
+        return list(self.last_seen.keys())
+    
+    def last_activity(self) -> float:
+        return next(reversed(self.last_seen.values()), 0.0)
+    
+    def to_checkpoint(self) -> List[List[Any]]:
+        return [[value, seen_at] for value, seen_at in self.last_seen.items()]
+    
+    def restore(self, entries: List[List[Any]]):
+        self.last_seen = OrderedDict((value, seen_at) for value, seen_at in entries)
+
+class StreamingThreatDetector:
+    """
+    Incremental threat detection for one organization.
+    
+    Audit events are fed in sequence order and update per-user and per-IP
+    sliding windows, so every rule is evaluated in O(1) per event. A rule
+    fires once when its window crosses the threshold and stays quiet for the
+    rest of that window. Empty windows are swept periodically and each
+    kind of window tracks at most MAX_TRACKED_KEYS users or IPs, dropping
+    the least recently active first.
+    """
+    
+    MAX_TRACKED_KEYS = 10_000
+    PRUNE_INTERVAL_EVENTS = 1_000
+    
+    def __init__(self, organization_id: str, rules: Dict[str, Dict[str, Any]]):
+        self.organization_id = organization_id
+        self.rules = rules
+        self.last_sequence = 0
+        self.failed_logins: Dict[str, SlidingWindowCounter] = {}
+        self.exports: Dict[str, SlidingWindowCounter] = {}
+        self.access_ips: Dict[str, DistinctWindow] = {}
+        self.access_locations: Dict[str, DistinctWindow] = {}
+        self.alerted_until: Dict[str, float] = {}  # "rule:key" -> suppression expiry
+        self._events_since_prune = 0
+    
+    def _counter(self, windows: Dict[str, SlidingWindowCounter], key: str, rule: str) -> SlidingWindowCounter:
+        if key not in windows:
+            windows[key] = SlidingWindowCounter(self.rules[rule]["time_window"])
+        return windows[key]
+    
+    def _distinct(self, windows: Dict[str, DistinctWindow], key: str, rule: str) -> DistinctWindow:
+        if key not in windows:
+            windows[key] = DistinctWindow(self.rules[rule]["time_window"])
+        return windows[key]
+    
+    def _should_alert(self, detection_rule: str, key: str, window_seconds: int, now: float) -> bool:
+        alert_key = f"{detection_rule}:{key}"
+        if self.alerted_until.get(alert_key, 0) > now:
+            return False
+        self.alerted_until[alert_key] = now + window_seconds
+        return True
+    
+    def process_event(self, doc: Dict[str, Any]) -> List[ThreatDetection]:
+        """Update windows with one raw audit event document and return new threats"""
+        threats = []
+        event_type = doc.get("event_type")
+        timestamp = doc["timestamp"].timestamp()
+        user_id = doc.get("user_id")
+        ip_address = doc.get("ip_address")
+        
+        if event_type == SecurityEventType.LOGIN_FAILURE:
+            threats.extend(self._on_login_failure(doc, user_id, ip_address, timestamp))
+        elif event_type == SecurityEventType.PERMISSION_CHANGE:
+            threats.extend(self._on_permission_change(doc, user_id, ip_address))
+        elif event_type == SecurityEventType.DATA_EXPORT:
+            threats.extend(self._on_data_export(user_id, timestamp))
+        
+        if event_type in (SecurityEventType.LOGIN_SUCCESS, SecurityEventType.DATA_ACCESS) and user_id:
+            threats.extend(self._on_access(doc, user_id, ip_address, timestamp))
+        
+        if doc.get("sequence"):
+            self.last_sequence = doc["sequence"]
+        
+        self._events_since_prune += 1
+        if self._events_since_prune >= self.PRUNE_INTERVAL_EVENTS:
+            self.prune(timestamp)
+        return threats
+    
+    def prune(self, now: float):
+        """Drop empty windows and expired alert suppressions, and bound the number of tracked keys"""
+        for windows in (self.failed_logins, self.exports, self.access_ips, self.access_locations):
+            for key in [key for key, window in windows.items() if not window.count(now)]:
+                del windows[key]
+            if len(windows) > self.MAX_TRACKED_KEYS:
+                least_active = sorted(windows, key=lambda key: windows[key].last_activity())
+                for key in least_active[:len(windows) - self.MAX_TRACKED_KEYS]:
+                    del windows[key]
+        
+        self.alerted_until = {key: until for key, until in self.alerted_until.items() if until > now}
+        if len(self.alerted_until) > self.MAX_TRACKED_KEYS:
+            latest = sorted(self.alerted_until.items(), key=lambda item: item[1])[-self.MAX_TRACKED_KEYS:]
+            self.alerted_until = dict(latest)
+        self._events_since_prune = 0
+    
+    def _on_login_failure(self, doc, user_id, ip_address, timestamp) -> List[ThreatDetection]:
+        """Brute force: repeated failures for one user or from one IP"""
+        rule = self.rules["brute_force"]
+        keys = ([f"user:{user_id}"] if user_id else []) + ([f"ip:{ip_address}"] if ip_address else [])
+        failures = max(
+            [self._counter(self.failed_logins, key, "brute_force").add(timestamp) for key in keys],
+            default=0
+        )
+        
+        if failures == rule["block_threshold"]:
+            # Escalate an already-raised alert to an automatic block
+            threat = self._brute_force_threat(doc, user_id, failures)
+            threat.auto_response_taken = True
+            threat.is_blocked = True
+            threat.response_actions.append({
+                "action": "block_user",
+                "timestamp": datetime.utcnow(),
+                "reason": "Brute force attack detected"
+            })
+            return [threat]
+        
+        if failures >= rule["threshold"]:
+            # Alert once per window, whether the user or the source IP tripped it
+            alerts = [
+                self._should_alert("multiple_login_failures", key, rule["time_window"], timestamp)
+                for key in keys
+            ]
+            if any(alerts):
+                return [self._brute_force_threat(doc, user_id, failures)]
+        
+        return []
+    
+    def _brute_force_threat(self, doc, user_id, failures) -> ThreatDetection:
+        return ThreatDetection(
+            organization_id=self.organization_id,
+            threat_type="brute_force",
+            severity=RiskLevel.HIGH,
+            confidence=0.9,
+            detection_method="rule_based",
+            detection_rules=["multiple_login_failures"],
+            affected_users=[user_id] if user_id else [],
+            indicators=[
+                {
+                    "type": "failed_login_count",
+                    "value": failures,
+                    "threshold": self.rules["brute_force"]["threshold"]
+                }
+            ],
+            source_ip=doc.get("ip_address"),
+            user_agent=doc.get("user_agent"),
+            related_events=[doc["id"]] if doc.get("id") else []
+        )
+    
+    def _on_permission_change(self, doc, user_id, ip_address) -> List[ThreatDetection]:
+        """Privilege escalation: a role change to a higher level"""
+        details = doc.get("details") or {}
+        if not (user_id and "role" in details):
+            return []
+        
+        old_role = details.get("old_role")
+        new_role = details.get("new_role")
+        if not is_privilege_escalation(old_role, new_role):
+            return []
+        
+        return [ThreatDetection(
+            organization_id=self.organization_id,
+            threat_type="privilege_escalation",
+            severity=RiskLevel.HIGH,
+            confidence=0.8,
+            detection_method="rule_based",
+            detection_rules=["unauthorized_role_change"],
+            affected_users=[user_id],
+            indicators=[
+                {
+                    "type": "role_change",
+                    "old_role": old_role,
+                    "new_role": new_role
+                }
+            ],
+            source_ip=ip_address,
+            user_agent=doc.get("user_agent"),
+            related_events=[doc["id"]] if doc.get("id") else []
+        )]
+    
+    def _on_access(self, doc, user_id, ip_address, timestamp) -> List[ThreatDetection]:
+        """Unusual access: many source IPs or countries for one user"""
+        rule = self.rules["unusual_access"]
+        threats = []
+        
+        if ip_address:
+            ips = self._distinct(self.access_ips, user_id, "unusual_access")
+            if ips.add(ip_address, timestamp) >= rule["ip_threshold"] and \
+                    self._should_alert("multiple_ip_access", user_id, rule["time_window"], timestamp):
+                threats.append(ThreatDetection(
+                    organization_id=self.organization_id,
+                    threat_type="account_takeover",
+                    severity=RiskLevel.MEDIUM,
+                    confidence=0.6,
+                    detection_method="anomaly_detection",
+                    detection_rules=["multiple_ip_access"],
+                    affected_users=[user_id],
+                    indicators=[
+                        {
+                            "type": "ip_count",
+                            "value": ips.count(timestamp),
+                            "ips": ips.values()
+                        }
+                    ]
+                ))
+        
+        location = doc.get("location")
+        if location:
+            locations = self._distinct(self.access_locations, user_id, "unusual_access")
+            if locations.add(location.get("country", "unknown"), timestamp) >= rule["location_threshold"] and \
+                    self._should_alert("impossible_travel", user_id, rule["time_window"], timestamp):
+                threats.append(ThreatDetection(
+                    organization_id=self.organization_id,
+                    threat_type="impossible_travel",
+                    severity=RiskLevel.HIGH,
+                    confidence=0.8,
+                    detection_method="anomaly_detection",
+                    detection_rules=["impossible_travel"],
+                    affected_users=[user_id],
+                    indicators=[
+                        {
+                            "type": "location_count",
+                            "value": locations.count(timestamp),
+                            "locations": locations.values()
+                        }
+                    ]
+                ))
+        
+        return threats
+    
+    def _on_data_export(self, user_id, timestamp) -> List[ThreatDetection]:
+        """Data exfiltration: repeated exports by one user"""
+        rule = self.rules["data_exfiltration"]
+        exports = self._counter(self.exports, str(user_id), "data_exfiltration").add(timestamp)
+        if exports < rule["threshold"] or \
+                not self._should_alert("excessive_data_export", str(user_id), rule["time_window"], timestamp):
+            return []
+        
+        return [ThreatDetection(
+            organization_id=self.organization_id,
+            threat_type="data_exfiltration",
+            severity=RiskLevel.HIGH,
+            confidence=0.7,
+            detection_method="rule_based",
+            detection_rules=["excessive_data_export"],
+            affected_users=[user_id] if user_id else [],
+            indicators=[
+                {
+                    "type": "export_count",
+                    "value": exports,
+                    "threshold": rule["threshold"]
+                }
+            ]
+        )]
+    
+    def to_checkpoint(self, now: float) -> Dict[str, Any]:
+        """Prune, then serialize the remaining windows for persistence"""
+        self.prune(now)
+        
+        def counters(windows):
+            return {key: window.to_checkpoint() for key, window in windows.items()}
+        
+        return {
+            "last_sequence": self.last_sequence,
+            "failed_logins": counters(self.failed_logins),
+            "exports": counters(self.exports),
+            "access_ips": counters(self.access_ips),
+            "access_locations": counters(self.access_locations),
+            "alerted_until": dict(self.alerted_until)
+        }
+    
+    def restore(self, checkpoint: Dict[str, Any]):
+        """Rebuild windows from a persisted checkpoint"""
+        self.last_sequence = checkpoint.get("last_sequence", 0)
+        for attribute, rule, window_class in (
+            ("failed_logins", "brute_force", SlidingWindowCounter),
+            ("exports", "data_exfiltration", SlidingWindowCounter),
+            ("access_ips", "unusual_access", DistinctWindow),
+            ("access_locations", "unusual_access", DistinctWindow),
+        ):
+            windows = {}
+            for key, entries in checkpoint.get(attribute, {}).items():
+                window = window_class(self.rules[rule]["time_window"])
+                window.restore(entries)
+                windows[key] = window
+            setattr(self, attribute, windows)
+        self.alerted_until = dict(checkpoint.get("alerted_until", {}))
+
 class ThreatDetectionService:
     """AI-powered threat detection and response service"""
     
+    # Events whose sequence is still missing after this long are treated as lost
+    SEQUENCE_GAP_GRACE_SECONDS = 30
+    
     def __init__(self):
         self.detection_rules = self._initialize_detection_rules()
         self.threat_patterns = self._initialize_threat_patterns()
         self.risk_scoring = self._initialize_risk_scoring()
+        self._detectors: Dict[str, StreamingThreatDetector] = {}
     
     # =============================================================================
     # THREAT DETECTION ENGINE
     # =============================================================================
     
+    async def _get_detector(self, db: AsyncIOMotorDatabase, organization_id: str) -> StreamingThreatDetector:
+        """
+        Return the organization's detector, restoring it whenever the stored
+        checkpoint differs from it.
+        
+        Another worker may have advanced the checkpoint since this one last
+        ran; carrying on from the in-memory state would reprocess its events.
+        """
+        stored_sequence = await self._stored_sequence(db, organization_id)
+        detector = self._detectors.get(organization_id)
+        if detector is None or detector.last_sequence != stored_sequence:
+            detector = StreamingThreatDetector(organization_id, self.detection_rules)
+            state_doc = await db.threat_detection_state.find_one({"organization_id": organization_id})
+            if state_doc:
+                detector.restore(state_doc.get("checkpoint", {}))
+            self._detectors[organization_id] = detector
+        return detector
+    
+    async def _stored_sequence(self, db: AsyncIOMotorDatabase, organization_id: str) -> int:
+        """Last audit sequence covered by the organization's stored checkpoint"""
+        state_doc = await db.threat_detection_state.find_one(
+            {"organization_id": organization_id},
+            {"last_sequence": 1, "checkpoint.last_sequence": 1}
+        )
+        if not state_doc:
+            return 0
+        # Checkpoints saved before the top-level field existed only carry it inside
+        return state_doc.get("last_sequence", state_doc.get("checkpoint", {}).get("last_sequence", 0))
+    
+    async def _advance_checkpoint(
+        self,
+        db: AsyncIOMotorDatabase,
+        detector: StreamingThreatDetector,
+        start_sequence: int
+    ) -> bool:
+        """
+        Save the detector's checkpoint if the stored one is still where this run started.
+        
+        Returns False when another worker advanced it first; the events this
+        run processed are then that worker's to report.
+        """
+        now = datetime.utcnow()
+        try:
+            result = await db.threat_detection_state.update_one(
+                {
+                    "organization_id": detector.organization_id,
+                    "$or": [
+                        {"last_sequence": start_sequence},
+                        {"last_sequence": {"$exists": False}, "checkpoint.last_sequence": start_sequence},
+                    ]
+                },
+                {"$set": {
+                    "checkpoint": detector.to_checkpoint(now.timestamp()),
+                    "last_sequence": detector.last_sequence,
+                    "updated_at": now
+                }},
+                upsert=start_sequence == 0
+            )
+        except DuplicateKeyError:
+            # The first checkpoint was created by another worker
+            return False
+        return result.matched_count == 1 or result.upserted_id is not None
+    
     async def analyze_security_events(
         self,
         db: AsyncIOMotorDatabase,
-        organization_id: str
+        organization_id: str,
+        batch_size: int = 1000
     ) -> List[ThreatDetection]:
-        """Analyze recent security events for threats"""
+        """Consume audit events appended since the last run and return newly detected threats"""
         try:
-            # Get recent events for analysis
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
+            detector = await self._get_detector(db, organization_id)
+            start_sequence = detector.last_sequence
+            gap_deadline = datetime.utcnow() - timedelta(seconds=self.SEQUENCE_GAP_GRACE_SECONDS)
+            detected_threats = []
+            processed = 0
             
             cursor = db.audit_events.find({
                 "organization_id": organization_id,
-                "timestamp": {"$gte": one_hour_ago}
-            }).sort("timestamp", -1)
+                "sequence": {"$gt": detector.last_sequence}
+            }).sort("sequence", 1).limit(batch_size)
             
-            events = []
             async for doc in cursor:
-                events.append(AuditEvent(**doc))
-            
-            # Analyze events for threat patterns
-            detected_threats = []
-            
-            # Check for brute force attacks
-            brute_force_threats = await self._detect_brute_force(db, organization_id, events)
-            detected_threats.extend(brute_force_threats)
-            
-            # Check for privilege escalation
-            privilege_threats = await self._detect_privilege_escalation(db, organization_id, events)
-            detected_threats.extend(privilege_threats)
-            
-            # Check for unusual access patterns
-            access_threats = await self._detect_unusual_access(db, organization_id, events)
-            detected_threats.extend(access_threats)
-            
-            # Check for data exfiltration patterns
-            exfiltration_threats = await self._detect_data_exfiltration(db, organization_id, events)
-            detected_threats.extend(exfiltration_threats)
+                # Each sequence is claimed by its insert, so a gap is transient (a read
+                # lagging the write) or permanent (the event expired); wait briefly for
+                # the missing one rather than skipping it
+                if doc["sequence"] != detector.last_sequence + 1 and doc["timestamp"] > gap_deadline:
+                    break
+                detected_threats.extend(detector.process_event(doc))
+                processed += 1
+            
+            if not processed:
+                return []
+            
+            # Claim the processed range before reporting it, so two workers that
+            # ran over the same events never both insert their detections
+            if not await self._advance_checkpoint(db, detector, start_sequence):
+                self._detectors.pop(organization_id, None)
+                logger.info(f"Threat checkpoint for {organization_id} advanced by another worker; discarding this run")
+                return []
             
             # Save detected threats
-            for threat in detected_threats:
-                await self._save_threat_detection(db, threat)
+            if detected_threats:
+                threat_docs = []
+                for threat in detected_threats:
+                    threat_doc = threat.model_dump()
+                    expires_at = await retention_expiry.expiry_for(
+                        db, organization_id, "threat_detections", threat.first_detected
+                    )
+                    if expires_at:
+                        threat_doc[TTL_FIELD] = expires_at
+                    threat_docs.append(threat_doc)
+                await db.threat_detections.insert_many(threat_docs)
             
             return detected_threats
             
         except Exception as e:
+            # Drop in-memory state so the next run resumes from the last checkpoint
+            self._detectors.pop(organization_id, None)
             logger.error(f"Threat analysis failed: {e}")
             return []
     
-    async def _detect_brute_force(self, db, organization_id, events) -> List[ThreatDetection]:
-        """Detect brute force login attempts"""
-        try:
-            threats = []
-            
-            # Group failed login attempts by user
-            failed_logins = defaultdict(list)
-            for event in events:
-                if event.event_type == SecurityEventType.LOGIN_FAILURE:
-                    failed_logins[event.user_id].append(event)
-            
-            # Check for multiple failures from same user
-            for user_id, failures in failed_logins.items():
-                if len(failures) >= 5:  # 5+ failures in 1 hour
-                    threat = ThreatDetection(
-                        organization_id=organization_id,
-                        threat_type="brute_force",
-                        severity=RiskLevel.HIGH,
-                        confidence=0.9,
-                        detection_method="rule_based",
-                        detection_rules=["multiple_login_failures"],
-                        affected_users=[user_id] if user_id else [],
-                        indicators=[
-                            {
-                                "type": "failed_login_count",
-                                "value": len(failures),
-                                "threshold": 5
-                            }
-                        ],
-                        source_ip=failures[0].ip_address,
-                        user_agent=failures[0].user_agent
-                    )
-                    
-                    # Auto-response for brute force
-                    if len(failures) >= 10:
-                        threat.auto_response_taken = True
-                        threat.is_blocked = True
-                        threat.response_actions.append({
-                            "action": "block_user",
-                            "timestamp": datetime.utcnow(),
-                            "reason": "Brute force attack detected"
-                        })
-                    
-                    threats.append(threat)
-            
-            return threats
-            
-        except Exception as e:
-            logger.error(f"Brute force detection failed: {e}")
-            return []
-    
-    async def _detect_privilege_escalation(self, db, organization_id, events) -> List[ThreatDetection]:
-        """Detect privilege escalation attempts"""
-        try:
-            threats = []
-            
-            # Look for permission change events
-            permission_events = [
-                event for event in events
-                if event.event_type == SecurityEventType.PERMISSION_CHANGE
-            ]
-            
-            for event in permission_events:
-                # Check if user is attempting to escalate their own privileges
-                if event.user_id and "role" in event.details:
-                    old_role = event.details.get("old_role")
-                    new_role = event.details.get("new_role")
-                    
-                    if self._is_privilege_escalation(old_role, new_role):
-                        threat = ThreatDetection(
-                            organization_id=organization_id,
-                            threat_type="privilege_escalation",
-                            severity=RiskLevel.HIGH,
-                            confidence=0.8,
-                            detection_method="rule_based",
-                            detection_rules=["unauthorized_role_change"],
-                            affected_users=[event.user_id],
-                            indicators=[
-                                {
-                                    "type": "role_change",
-                                    "old_role": old_role,
-                                    "new_role": new_role
-                                }
-                            ],
-                            source_ip=event.ip_address,
-                            user_agent=event.user_agent
-                        )
-                        threats.append(threat)
-            
-            return threats
-            
-        except Exception as e:
-            logger.error(f"Privilege escalation detection failed: {e}")
-            return []
-    
-    async def _detect_unusual_access(self, db, organization_id, events) -> List[ThreatDetection]:
-        """Detect unusual access patterns"""
-        try:
-            threats = []
-            
-            # Group access events by user and time
-            access_patterns = defaultdict(lambda: {"ips": set(), "times": [], "locations": set()})
-            
-            for event in events:
-                if event.event_type in [SecurityEventType.LOGIN_SUCCESS, SecurityEventType.DATA_ACCESS]:
-                    if event.user_id:
-                        pattern = access_patterns[event.user_id]
-                        if event.ip_address:
-                            pattern["ips"].add(event.ip_address)
-                        pattern["times"].append(event.timestamp)
-                        if event.location:
-                            pattern["locations"].add(event.location.get("country", "unknown"))
-            
-            # Analyze patterns for anomalies
-            for user_id, pattern in access_patterns.items():
-                # Multiple IP addresses
-                if len(pattern["ips"]) >= 3:
-                    threat = ThreatDetection(
-                        organization_id=organization_id,
-                        threat_type="account_takeover",
-                        severity=RiskLevel.MEDIUM,
-                        confidence=0.6,
-                        detection_method="anomaly_detection",
-                        detection_rules=["multiple_ip_access"],
-                        affected_users=[user_id],
-                        indicators=[
-                            {
-                                "type": "ip_count",
-                                "value": len(pattern["ips"]),
-                                "ips": list(pattern["ips"])
-                            }
-                        ]
-                    )
-                    threats.append(threat)
-                
-                # Multiple countries
-                if len(pattern["locations"]) >= 2:
-                    threat = ThreatDetection(
-                        organization_id=organization_id,
-                        threat_type="impossible_travel",
-                        severity=RiskLevel.HIGH,
-                        confidence=0.8,
-                        detection_method="anomaly_detection",
-                        detection_rules=["impossible_travel"],
-                        affected_users=[user_id],
-                        indicators=[
-                            {
-                                "type": "location_count",
-                                "value": len(pattern["locations"]),
-                                "locations": list(pattern["locations"])
-                            }
-                        ]
-                    )
-                    threats.append(threat)
-            
-            return threats
-            
-        except Exception as e:
-            logger.error(f"Unusual access detection failed: {e}")
-            return []
-    
-    async def _detect_data_exfiltration(self, db, organization_id, events) -> List[ThreatDetection]:
-        """Detect potential data exfiltration"""
-        try:
-            threats = []
-            
-            # Look for excessive data export events
-            export_events = defaultdict(list)
-            for event in events:
-                if event.event_type == SecurityEventType.DATA_EXPORT:
-                    export_events[event.user_id].append(event)
-            
-            # Check for excessive exports
-            for user_id, exports in export_events.items():
-                if len(exports) >= 3:  # 3+ exports in 1 hour
-                    threat = ThreatDetection(
-                        organization_id=organization_id,
-                        threat_type="data_exfiltration",
-                        severity=RiskLevel.HIGH,
-                        confidence=0.7,
-                        detection_method="rule_based",
-                        detection_rules=["excessive_data_export"],
-                        affected_users=[user_id] if user_id else [],
-                        indicators=[
-                            {
-                                "type": "export_count",
-                                "value": len(exports),
-                                "threshold": 3
-                            }
-                        ]
-                    )
-                    threats.append(threat)
-            
-            return threats
-            
-        except Exception as e:
-            logger.error(f"Data exfiltration detection failed: {e}")
-            return []
-    
     def _is_privilege_escalation(self, old_role: str, new_role: str) -> bool:
         """Check if role change represents privilege escalation"""
-        role_hierarchy = {
-            "viewer": 1,
-            "member": 2,
-            "team_lead": 3,
-            "manager": 4,
-            "admin": 5,
-            "super_admin": 6
-        }
-        
-        old_level = role_hierarchy.get(old_role, 0)
-        new_level = role_hierarchy.get(new_role, 0)
-        
-        return new_level > old_level
-    
-    async def _save_threat_detection(self, db: AsyncIOMotorDatabase, threat: ThreatDetection):
-        """Save threat detection to database"""
-        try:
-            await db.threat_detections.insert_one(threat.model_dump())
-        except Exception as e:
-            logger.error(f"Failed to save threat detection: {e}")
+        return is_privilege_escalation(old_role, new_role)
     
     # =============================================================================
     # THREAT RESPONSE OPERATIONS
@@ -439,16 +668,17 @@ class ThreatDetectionService:
     async def start_real_time_monitoring(
         self,
         db: AsyncIOMotorDatabase,
-        organization_id: str
+        organization_id: str,
+        poll_interval: float = 5.0
     ):
-        """Start real-time threat monitoring"""
+        """Start real-time threat monitoring by tailing the audit chain"""
         try:
             logger.info(f"Starting real-time threat monitoring for org: {organization_id}")
             
             while True:
-                # Analyze recent events every 5 minutes
+                # Each pass only consumes events appended since the previous one
                 await self.analyze_security_events(db, organization_id)
-                await asyncio.sleep(300)  # 5 minutes
+                await asyncio.sleep(poll_interval)
                 
         except Exception as e:
             logger.error(f"Real-time monitoring failed: {e}")
@@ -462,6 +692,7 @@ class ThreatDetectionService:
         return {
             "brute_force": {
                 "threshold": 5,
+                "block_threshold": 10,
                 "time_window": 3600,  # 1 hour
                 "severity": RiskLevel.HIGH,
                 "auto_response": True
@@ -477,6 +708,13 @@ class ThreatDetectionService:
                 "severity": RiskLevel.HIGH,
                 "auto_response": False
             },
+            "unusual_access": {
+                "ip_threshold": 3,
+                "location_threshold": 2,
+                "time_window": 3600,
+                "severity": RiskLevel.MEDIUM,
+                "auto_response": False
+            },
             "impossible_travel": {
                 "min_distance": 1000,  # km
                 "max_travel_time": 3600,  # 1 hour
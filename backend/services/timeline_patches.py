@@ -0,0 +1,181 @@
+"""
+Timeline Patches
+Coalesced field-level task patches with per-project sequence numbers and replay
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from services.websocket_fanout import serialize_message
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_PATCH_WINDOW_MS = int(os.getenv("TIMELINE_PATCH_WINDOW_MS", "50"))
+TIMELINE_PATCH_RETENTION_MINUTES = int(os.getenv("TIMELINE_PATCH_RETENTION_MINUTES", "60"))
+TIMELINE_PATCH_REPLAY_LIMIT = int(os.getenv("TIMELINE_PATCH_REPLAY_LIMIT", "500"))
+
+# Bookkeeping that clients never render
+IGNORED_FIELDS = {"_id", "updated_at"}
+
+def _plain(value: Any) -> Any:
+    """JSON-shaped copy, so values compare the way clients will see them"""
+    return json.loads(serialize_message(value))
+
+def diff_fields(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of ``after`` whose value differs from ``before``"""
+    before, after = _plain(before), _plain(after)
+    return {
+        field: value
+        for field, value in after.items()
+        if field not in IGNORED_FIELDS and before.get(field, object()) != value
+    }
+
+class TimelinePatchCoalescer:
+    """
+    Turns bursts of task updates into compact patch frames.
+
+    Updates to a project are collected for ``window_seconds``; changes to the
+    same task within the window merge, later values winning. Each flush sends
+    one ``task_patch`` frame holding every touched task's changed fields and
+    the next project sequence number. Sequence numbers come from a shared
+    counter and frames are kept for ``retention`` so any worker can replay
+    what a reconnecting client missed.
+
+    Each worker publishes a frame once it is stored, so frames flushed by
+    different workers can reach a client out of sequence order. Clients
+    apply frames in ``seq`` order: a frame is held until its predecessor
+    arrives, and a gap that persists is filled by asking for a resync.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        window_seconds: float = TIMELINE_PATCH_WINDOW_MS / 1000,
+        retention: timedelta = timedelta(minutes=TIMELINE_PATCH_RETENTION_MINUTES),
+        replay_limit: int = TIMELINE_PATCH_REPLAY_LIMIT
+    ):
+        self.publish = publish
+        self.window_seconds = window_seconds
+        self.retention = retention
+        self.replay_limit = replay_limit
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}  # project -> task -> patch
+        self._flushes: Dict[str, asyncio.Task] = {}
+        self.metrics = {"updates": 0, "frames": 0, "coalesced": 0}
+
+    def submit(
+        self,
+        project_id: str,
+        task_id: str,
+        before: Dict[str, Any],
+        after: Dict[str, Any],
+        user_id: str,
+        conflicts: Optional[List[Any]] = None
+    ):
+        """
+        Queue the changes made by one task update for the next flush.
+        Conflicts are not stored on the task, so recomputed conflicts are
+        always sent; a client may have last seen them from another worker.
+        """
+        changes = diff_fields(before, after)
+        if conflicts is not None:
+            changes["conflicts"] = _plain(conflicts)
+
+        self.metrics["updates"] += 1
+        if not changes:
+            return
+
+        pending = self._pending.setdefault(project_id, {})
+        if task_id in pending:
+            self.metrics["coalesced"] += 1
+            pending[task_id]["changes"].update(changes)
+            pending[task_id]["user_id"] = user_id
+        else:
+            pending[task_id] = {"task_id": task_id, "changes": changes, "user_id": user_id}
+
+        if project_id not in self._flushes:
+            self._flushes[project_id] = asyncio.create_task(self._flush_after_window(project_id))
+
+    async def _flush_after_window(self, project_id: str):
+        try:
+            await asyncio.sleep(self.window_seconds)
+        finally:
+            # Updates arriving from here on start the next window
+            self._flushes.pop(project_id, None)
+        patches = list(self._pending.pop(project_id, {}).values())
+        if not patches:
+            return
+        try:
+            await self._send(project_id, patches)
+        except Exception as e:
+            logger.error(f"Failed to send timeline patches for project {project_id}: {e}")
+
+    async def _send(self, project_id: str, patches: List[Dict[str, Any]]):
+        from database import get_database
+
+        db = await get_database()
+        counter = await db.timeline_sequences.find_one_and_update(
+            {"_id": project_id},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        now = datetime.utcnow()
+        frame = {
+            "type": "task_patch",
+            "project_id": project_id,
+            "seq": counter["seq"],
+            "patches": patches,
+            "timestamp": now.isoformat()
+        }
+        await db.timeline_patches.insert_one({
+            "project_id": project_id,
+            "seq": counter["seq"],
+            "frame": frame,
+            "expires_at": now + self.retention
+        })
+        self.metrics["frames"] += 1
+        await self.publish(project_id, frame)
+
+    async def current_sequence(self, project_id: str) -> int:
+        from database import get_database
+
+        db = await get_database()
+        counter = await db.timeline_sequences.find_one({"_id": project_id})
+        return counter["seq"] if counter else 0
+
+    async def replay(self, project_id: str, since: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Frames after ``since`` in order, or None when some have expired or
+        there are too many to be worth replaying; the client should then
+        reload the timeline and continue from the current sequence.
+        """
+        from database import get_database
+
+        db = await get_database()
+        current = await self.current_sequence(project_id)
+        if since >= current:
+            return []
+        if current - since > self.replay_limit:
+            return None
+
+        cursor = db.timeline_patches.find(
+            {"project_id": project_id, "seq": {"$gt": since}},
+            {"_id": 0, "frame": 1, "seq": 1}
+        ).sort("seq", 1)
+        docs = await cursor.to_list(length=self.replay_limit)
+        if len(docs) != current - since:
+            return None  # expired, or a frame was never stored
+        return [doc["frame"] for doc in docs]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "window_ms": round(self.window_seconds * 1000),
+            "pending_projects": len(self._pending)
+        }
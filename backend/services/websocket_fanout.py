@@ -0,0 +1,488 @@
+"""
+WebSocket Fan-out
+Per-connection bounded send queues drained by writer tasks, relayed across workers
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import WebSocket
+
+from services.broadcast_bus import WORKER_ID, BroadcastBus, broadcast_bus
+from services.presence_store import PresenceStore, presence_store
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "coalesce")  # drop | coalesce | disconnect
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+WS_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "20"))
+# Nothing received for this long closes the socket; 0 (the default) never reaps, since listen-only
+# clients don't answer heartbeats and the server's protocol pings already drop half-open sockets
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "0"))
+WS_METRICS_WINDOW_SECONDS = int(os.getenv("WS_METRICS_WINDOW_SECONDS", "10"))
+
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+
+# "Try again later": the client fell too far behind and should reconnect
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# "Internal error": a send failed, so the socket is closed rather than left half-open
+SEND_FAILURE_CLOSE_CODE = 1011
+# Application close code (4000-4999) for a client that stopped answering heartbeats; mirrors HTTP 408
+IDLE_CLOSE_CODE = 4408
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def serialize_message(message: Dict[str, Any]) -> str:
+    """Encode a message once, however many connections it is sent to"""
+    return json.dumps(message, default=_json_default)
+
+class TrafficWindow:
+    """Messages and bytes over the last ``window_seconds``, in one-second buckets"""
+
+    def __init__(self, window_seconds: int = WS_METRICS_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.messages = 0
+        self.bytes = 0
+        self._buckets: Deque[List[int]] = deque()  # [second, messages, bytes]
+
+    def record(self, size: int):
+        second = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += 1
+            self._buckets[-1][2] += size
+        else:
+            self._buckets.append([second, 1, size])
+            while self._buckets[0][0] <= second - self.window_seconds:
+                self._buckets.popleft()
+        self.messages += 1
+        self.bytes += size
+
+    def rates(self) -> Dict[str, float]:
+        cutoff = int(time.monotonic()) - self.window_seconds
+        recent = [bucket for bucket in self._buckets if bucket[0] > cutoff]
+        return {
+            "messages_per_second": round(sum(bucket[1] for bucket in recent) / self.window_seconds, 2),
+            "bytes_per_second": round(sum(bucket[2] for bucket in recent) / self.window_seconds, 1),
+            "messages_total": self.messages,
+            "bytes_total": self.bytes
+        }
+
+class GroupTraffic:
+    """Outbound and inbound traffic of one group's connections on this worker"""
+
+    def __init__(self):
+        self.sent = TrafficWindow()
+        self.received = TrafficWindow()
+
+class ConnectionChannel:
+    """
+    One WebSocket with its own outbound queue and writer task.
+
+    ``send`` never awaits the socket: it appends to a queue of at most
+    ``max_queue`` frames that the writer drains in order. When the queue is
+    full the slow-consumer policy decides what gives way:
+
+    - ``drop``: the new frame is discarded
+    - ``coalesce``: a queued frame with the same coalesce key is replaced,
+      otherwise the oldest queued frame is discarded for the new one
+    - ``disconnect``: the connection is closed so the client reconnects
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        group: str,
+        user_id: str,
+        metrics: Dict[str, int],
+        on_close: Callable[["ConnectionChannel"], None],
+        traffic: Optional[GroupTraffic] = None,
+        max_queue: int = WS_SEND_QUEUE_SIZE,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.connection_id = f"{user_id}_{group}_{uuid.uuid4().hex[:8]}"
+        self.websocket = websocket
+        self.group = group
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.connected_at = datetime.utcnow()
+        self.last_activity = self.connected_at
+        self.last_received = time.monotonic()
+        self.traffic = traffic or GroupTraffic()
+        self.closed = False
+        self.max_depth = 0
+        self.dropped = 0
+        self._metrics = metrics
+        self._on_close = on_close
+        self._pending: Deque[Tuple[Optional[str], str]] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def touch(self, size: int = 0):
+        """Note a frame received from the client; any frame proves the connection is alive"""
+        self.last_received = time.monotonic()
+        self.last_activity = datetime.utcnow()
+        self.traffic.received.record(size)
+
+    def preload(self, texts: Sequence[str]):
+        """Queue frames ahead of everything else, regardless of the queue bound"""
+        self._pending.extend((None, text) for text in texts)
+        self.max_depth = max(self.max_depth, len(self._pending))
+        if self._pending:
+            self._wakeup.set()
+
+    def send(self, text: str, coalesce_key: Optional[str] = None) -> bool:
+        """Queue a serialized frame; returns False if it was not accepted"""
+        if self.closed:
+            return False
+
+        if self.policy == "coalesce" and coalesce_key is not None:
+            for index, (key, _) in enumerate(self._pending):
+                if key == coalesce_key:
+                    self._pending[index] = (coalesce_key, text)
+                    self._metrics["coalesced"] += 1
+                    return True
+
+        if len(self._pending) >= self.max_queue:
+            if self.policy == "disconnect":
+                self._metrics["slow_disconnects"] += 1
+                logger.warning(f"Disconnecting slow WebSocket consumer {self.connection_id} ({self.depth} queued)")
+                self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self._record_drop()
+            if self.policy == "drop":
+                return False
+            self._pending.popleft()
+
+        self._pending.append((coalesce_key, text))
+        self._metrics["enqueued"] += 1
+        self.max_depth = max(self.max_depth, len(self._pending))
+        self._wakeup.set()
+        return True
+
+    def _record_drop(self):
+        self.dropped += 1
+        self._metrics["dropped"] += 1
+
+    async def _drain(self):
+        try:
+            while True:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                _, text = self._pending.popleft()
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                self._metrics["sent"] += 1
+                self._metrics["bytes_sent"] += len(text)
+                self.traffic.sent.record(len(text))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._metrics["send_errors"] += 1
+            logger.error(f"Error sending WebSocket message to {self.connection_id}: {e}")
+            self._writer = None  # already finishing; close() must not cancel it
+            # Close the socket too, so the endpoint's receive loop ends and the client reconnects
+            self.close(SEND_FAILURE_CLOSE_CODE)
+
+    def close(self, code: Optional[int] = None):
+        """Stop the writer and discard queued frames; optionally close the socket with a code"""
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.clear()
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+        self._on_close(self)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # already gone
+
+class WebSocketFanout:
+    """
+    Connection registry for one WebSocket feature.
+
+    Connections are indexed by group (a project or collaboration session)
+    and by user, so a broadcast touches only the group's connections. A
+    message is serialized once and queued on each connection's channel, so
+    a slow client never delays the others. Every broadcast is also relayed
+    over the broadcast bus to the same fan-out on other workers, and each
+    connection is recorded in the shared presence store.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_queue: int = WS_SEND_QUEUE_SIZE,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+        heartbeat_interval: float = WS_HEARTBEAT_INTERVAL_SECONDS,
+        idle_timeout: float = WS_IDLE_TIMEOUT_SECONDS,
+        bus: Optional[BroadcastBus] = None,
+        presence: Optional[PresenceStore] = None,
+        sequencer: Optional[Callable[[str, Dict[str, Any]], str]] = None
+    ):
+        self.name = name
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.bus = bus if bus is not None else broadcast_bus
+        self.presence = presence if presence is not None else presence_store
+        # Optionally stamps and records each group message on this worker, returning the frame to send
+        self.sequencer = sequencer
+        self.channels: Dict[str, ConnectionChannel] = {}
+        self.groups: Dict[str, Set[str]] = {}  # group -> connection ids
+        self.users: Dict[str, Set[str]] = {}  # user_id -> connection ids
+        self.traffic: Dict[str, GroupTraffic] = {}  # group -> traffic on this worker
+        self._departed: List[str] = []  # closed connections whose presence is not yet removed
+        self._presence_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "bytes_sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "slow_disconnects": 0,
+            "send_errors": 0,
+            "relayed_out": 0,
+            "relayed_in": 0,
+            "relay_errors": 0,
+            "presence_errors": 0,
+            "heartbeats": 0,
+            "idle_reaped": 0
+        }
+        self.bus.subscribe(name, self._on_bus_message)
+
+    async def register(
+        self,
+        websocket: WebSocket,
+        group: str,
+        user_id: str,
+        backlog: Sequence[str] = ()
+    ) -> ConnectionChannel:
+        """Index an accepted WebSocket, start its writer and announce its presence"""
+        traffic = self.traffic.setdefault(group, GroupTraffic())
+        channel = ConnectionChannel(
+            websocket, group, user_id, self.metrics, self._discard, traffic,
+            max_queue=self.max_queue, policy=self.policy, send_timeout=self.send_timeout
+        )
+        # Queued before the channel is indexed, so replayed frames precede any new broadcast
+        channel.preload(backlog)
+        self.channels[channel.connection_id] = channel
+        self.groups.setdefault(group, set()).add(channel.connection_id)
+        self.users.setdefault(user_id, set()).add(channel.connection_id)
+        channel.start()
+
+        await self._sync_presence([channel])
+        if self._presence_task is None or self._presence_task.done():
+            self._presence_task = asyncio.create_task(self._maintain_presence())
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        return channel
+
+    async def unregister(self, channel: ConnectionChannel):
+        channel.close()
+        await self._sync_presence([])
+
+    def _discard(self, channel: ConnectionChannel):
+        self.channels.pop(channel.connection_id, None)
+        self._departed.append(channel.connection_id)
+        for index, key in ((self.groups, channel.group), (self.users, channel.user_id)):
+            connection_ids = index.get(key)
+            if connection_ids is None:
+                continue
+            connection_ids.discard(channel.connection_id)
+            if not connection_ids:
+                del index[key]
+        if channel.group not in self.groups:
+            self.traffic.pop(channel.group, None)
+
+    async def _sync_presence(self, channels: List[ConnectionChannel]):
+        departed, self._departed = self._departed, []
+        try:
+            await self.presence.remove(departed)
+            await self.presence.refresh(self.name, channels)
+        except Exception as e:
+            self.metrics["presence_errors"] += 1
+            logger.error(f"Presence update for {self.name} failed: {e}")
+
+    async def _maintain_presence(self):
+        """Keep this worker's records alive while it holds connections"""
+        while self.channels or self._departed:
+            await asyncio.sleep(self.presence.ttl_seconds / 3)
+            await self._sync_presence(list(self.channels.values()))
+
+    async def _heartbeat(self):
+        """
+        Send a heartbeat frame to every connection and, when an idle timeout
+        is set, close those that sent nothing within it. Reaping is opt-in:
+        only enable it for clients that answer a heartbeat with any frame,
+        such as a ``pong``.
+        """
+        while self.channels:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            text = serialize_message({"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()})
+            for channel in list(self.channels.values()):
+                if self.idle_timeout and now - channel.last_received > self.idle_timeout:
+                    self.metrics["idle_reaped"] += 1
+                    logger.info(f"Closing idle WebSocket {channel.connection_id}")
+                    channel.close(IDLE_CLOSE_CODE)
+                elif channel.send(text, coalesce_key="heartbeat"):
+                    self.metrics["heartbeats"] += 1
+
+    async def members(self, group: str) -> List[Dict[str, Any]]:
+        """Connections in a group on every worker, from the presence store"""
+        return await self.presence.members(self.name, group)
+
+    async def user_connection_count(self, group: str, user_id: str) -> int:
+        """How many connections (tabs) a user has open in a group, on any worker"""
+        return sum(member["user_id"] == user_id for member in await self.members(group))
+
+    def group_channels(self, group: str) -> List[ConnectionChannel]:
+        return [self.channels[connection_id] for connection_id in self.groups.get(group, ())]
+
+    def user_channels(self, user_id: str, group: Optional[str] = None) -> List[ConnectionChannel]:
+        channels = [self.channels[connection_id] for connection_id in self.users.get(user_id, ())]
+        if group is not None:
+            channels = [channel for channel in channels if channel.group == group]
+        return channels
+
+    def _deliver_to_group(
+        self,
+        group: str,
+        text: str,
+        exclude_user: Optional[str] = None,
+        coalesce_key: Optional[str] = None
+    ) -> int:
+        return sum(
+            channel.send(text, coalesce_key)
+            for channel in self.group_channels(group)
+            if not (exclude_user and channel.user_id == exclude_user)
+        )
+
+    def _deliver_to_user(self, user_id: str, text: str, group: Optional[str] = None) -> int:
+        return sum(channel.send(text) for channel in self.user_channels(user_id, group))
+
+    async def _relay(self, envelope: Dict[str, Any]):
+        try:
+            await self.bus.publish(self.name, envelope)
+            self.metrics["relayed_out"] += 1
+        except Exception as e:
+            self.metrics["relay_errors"] += 1
+            logger.error(f"Relaying {self.name} broadcast to other workers failed: {e}")
+
+    async def _on_bus_message(self, envelope: Dict[str, Any]):
+        self.metrics["relayed_in"] += 1
+        if envelope["kind"] == "user":
+            self._deliver_to_user(envelope["user_id"], envelope["text"], envelope.get("group"))
+            return
+        
+        text = envelope["text"]
+        if self.sequencer:
+            text = self.sequencer(envelope["group"], json.loads(text))
+        self._deliver_to_group(envelope["group"], text, envelope.get("exclude_user"), envelope.get("coalesce_key"))
+
+    async def broadcast(
+        self,
+        group: str,
+        message: Dict[str, Any],
+        exclude_user: Optional[str] = None,
+        coalesce_key: Optional[str] = None
+    ) -> int:
+        """Queue a message for every connection in a group, here and on other workers; returns local deliveries"""
+        text = serialize_message(message)
+        local_text = self.sequencer(group, message) if self.sequencer else text
+        delivered = self._deliver_to_group(group, local_text, exclude_user, coalesce_key)
+        # Other workers receive the unstamped message and sequence it themselves
+        await self._relay({
+            "kind": "group",
+            "group": group,
+            "text": text,
+            "exclude_user": exclude_user,
+            "coalesce_key": coalesce_key
+        })
+        return delivered
+
+    async def send_to_user(self, user_id: str, message: Dict[str, Any], group: Optional[str] = None) -> int:
+        """Queue a message for every connection of a user, optionally within one group, on any worker"""
+        text = serialize_message(message)
+        delivered = self._deliver_to_user(user_id, text, group)
+        await self._relay({"kind": "user", "user_id": user_id, "group": group, "text": text})
+        return delivered
+
+    async def get_group_metrics(self, group: str) -> Dict[str, Any]:
+        """Live connections in a group (all workers) and its message and byte rates (this worker)"""
+        channels = self.group_channels(group)
+        traffic = self.traffic.get(group) or GroupTraffic()
+        try:
+            members = await self.members(group)
+            live_connections = len(members)
+            live_users = len({member["user_id"] for member in members})
+        except Exception as e:
+            logger.error(f"Presence lookup for {self.name} group {group} failed: {e}")
+            live_connections = live_users = None
+        return {
+            "group": group,
+            "worker_id": WORKER_ID,
+            "live_connections": live_connections,
+            "live_users": live_users,
+            "worker_connections": len(channels),
+            "window_seconds": traffic.sent.window_seconds,
+            "sent": traffic.sent.rates(),
+            "received": traffic.received.rates(),
+            "queue_depth": sum(channel.depth for channel in channels),
+            "dropped": sum(channel.dropped for channel in channels)
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        depths = [channel.depth for channel in self.channels.values()]
+        return {
+            "name": self.name,
+            "worker_id": WORKER_ID,
+            "bus": self.bus.backend_name,
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "connections": len(self.channels),
+            "groups": len(self.groups),
+            "queue_depth": {
+                "total": sum(depths),
+                "max": max(depths, default=0),
+                "high_water": max((channel.max_depth for channel in self.channels.values()), default=0)
+            },
+            "slowest_connections": [
+                {"connection_id": channel.connection_id, "depth": channel.depth, "dropped": channel.dropped}
+                for channel in sorted(self.channels.values(), key=lambda c: c.depth, reverse=True)[:5]
+                if channel.depth or channel.dropped
+            ],
+            **self.metrics
+        }
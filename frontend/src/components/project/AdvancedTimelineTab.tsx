@@ -29,7 +29,8 @@ import {
   DynamicTimelineTask,
   TaskConflict,
   TimelineFilter,
-  TimelineViewConfig
+  TimelineViewConfig,
+  WebSocketMessage
 } from '../../services/dynamicTimelineService';
 import AdvancedGanttChart from './AdvancedGanttChart';
 import CriticalPathPanel from './CriticalPathPanel';
@@ -148,7 +149,8 @@ const AdvancedTimelineTab: React.FC<AdvancedTimelineTabProps> = ({
           setIsRealTimeConnected(dynamicTimelineService.isWebSocketConnected());
           
           // Subscribe to real-time events
-          dynamicTimelineService.on('task_updated', handleTaskUpdatedEvent);
+          dynamicTimelineService.on('task_patch', handleTaskPatchEvent);
+          dynamicTimelineService.on('resync_required', handleResyncRequiredEvent);
           dynamicTimelineService.on('task_created', handleTaskCreatedEvent);
           dynamicTimelineService.on('dependency_updated', handleDependencyUpdatedEvent);
           dynamicTimelineService.on('conflict_detected', handleConflictDetectedEvent);
@@ -161,7 +163,8 @@ const AdvancedTimelineTab: React.FC<AdvancedTimelineTabProps> = ({
 
     return () => {
       if (wsInitialized.current) {
-        dynamicTimelineService.off('task_updated', handleTaskUpdatedEvent);
+        dynamicTimelineService.off('task_patch', handleTaskPatchEvent);
+        dynamicTimelineService.off('resync_required', handleResyncRequiredEvent);
         dynamicTimelineService.off('task_created', handleTaskCreatedEvent);
         dynamicTimelineService.off('dependency_updated', handleDependencyUpdatedEvent);
         dynamicTimelineService.off('conflict_detected', handleConflictDetectedEvent);
@@ -174,9 +177,18 @@ const AdvancedTimelineTab: React.FC<AdvancedTimelineTabProps> = ({
   /**
    * Real-time event handlers
    */
-  const handleTaskUpdatedEvent = useCallback((message: any) => {
-    console.log('📨 Task updated via WebSocket:', message);
-    // Refresh timeline data
+  const handleTaskPatchEvent = useCallback((message: WebSocketMessage) => {
+    console.log('📨 Task patch via WebSocket:', message);
+    // Apply only the changed fields; the service delivers patches in sequence order
+    const changesByTask = new Map<string, Partial<DynamicTimelineTask>>((message.patches || []).map(patch => [patch.task_id, patch.changes]));
+    setTimelineTasks(prev => prev.map(task =>
+      changesByTask.has(task.id) ? { ...task, ...changesByTask.get(task.id) } : task
+    ));
+  }, []);
+
+  const handleResyncRequiredEvent = useCallback((message: WebSocketMessage) => {
+    console.log('🔄 Timeline resync required:', message);
+    // Missed patches could not be replayed; reload the timeline
     fetchTimelineData();
   }, []);
 
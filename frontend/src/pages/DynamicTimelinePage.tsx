@@ -114,7 +114,8 @@ export const DynamicTimelinePage: React.FC = () => {
         setIsWebSocketConnected(true);
         
         // Set up event listeners
-        dynamicService.on('task_updated', handleTaskUpdated);
+        dynamicService.on('task_patch', handleTaskPatch);
+        dynamicService.on('resync_required', handleResyncRequired);
         dynamicService.on('task_created', handleTaskCreated);
         dynamicService.on('task_deleted', handleTaskDeleted);
         dynamicService.on('dependency_updated', handleDependencyUpdated);
@@ -145,14 +146,17 @@ export const DynamicTimelinePage: React.FC = () => {
   }, [selectedProjectId, tokens?.access_token]);
 
   // WebSocket event handlers
-  const handleTaskUpdated = useCallback((message: WebSocketMessage) => {
-    const updatedTask = message.data;
+  const handleTaskPatch = useCallback((message: WebSocketMessage) => {
+    // Patches carry only the changed fields of each task, delivered in sequence order
+    const patches = message.patches || [];
+    const changesByTask = new Map<string, Partial<DynamicTimelineTask>>(patches.map(patch => [patch.task_id, patch.changes]));
     setTasks(prev => prev.map(task => 
-      task.id === updatedTask.id ? { ...task, ...updatedTask } : task
+      changesByTask.has(task.id) ? { ...task, ...changesByTask.get(task.id) } : task
     ));
     
-    if (notificationsEnabled && message.user_id !== tokens?.user_id) {
-      toast.success(`Task "${updatedTask.name}" updated by ${message.user_id}`);
+    const editors = Array.from(new Set(patches.map(patch => patch.user_id).filter(userId => userId !== tokens?.user_id)));
+    if (notificationsEnabled && editors.length > 0) {
+      toast.success(`${patches.length === 1 ? 'Task' : `${patches.length} tasks`} updated by ${editors.join(', ')}`);
     }
   }, [notificationsEnabled, tokens?.user_id]);
 
@@ -259,6 +263,11 @@ export const DynamicTimelinePage: React.FC = () => {
     }
   }, [selectedProjectId, tokens?.access_token, filter, dynamicService]);
 
+  // Missed patches could not be replayed; reload the timeline and continue from the server's sequence
+  const handleResyncRequired = useCallback(() => {
+    fetchTimelineData();
+  }, [fetchTimelineData]);
+
   // Fetch real-time statistics
   const fetchRealtimeStats = useCallback(async () => {
     if (!tokens?.access_token) return;
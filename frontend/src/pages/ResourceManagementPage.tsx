@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   Users, 
   TrendingUp, 
@@ -35,6 +35,7 @@ interface ResourceAllocation {
     available_capacity_hours: number;
   };
   ai_recommendations: any;
+  ai_job_id?: string;
   optimization_strategies: any[];
   improvement_metrics: {
     current_efficiency: number;
@@ -75,6 +76,7 @@ interface SkillsAssignment {
   }>;
   skills_analysis: any;
   ai_insights: any;
+  ai_job_id?: string;
   assignment_strategy: any;
 }
 
@@ -113,6 +115,13 @@ interface SkillsGapAnalysis {
   training_roadmap: any;
 }
 
+// AI analyses run as background jobs; the page polls for their result and fills in this field
+const AI_JOB_RESULT_FIELDS: { [key: string]: string } = {
+  allocation: 'ai_recommendations',
+  skills: 'ai_insights',
+};
+const AI_JOB_POLL_INTERVAL_MS = 2000;
+
 const ResourceManagementPage: React.FC = () => {
   const [activeTab, setActiveTab] = useState('allocation');
   const [resourceAllocation, setResourceAllocation] = useState<ResourceAllocation | null>(null);
@@ -121,9 +130,52 @@ const ResourceManagementPage: React.FC = () => {
   const [workloadBalancing, setWorkloadBalancing] = useState<WorkloadBalancing | null>(null);
   const [skillsGapAnalysis, setSkillsGapAnalysis] = useState<SkillsGapAnalysis | null>(null);
   const [loading, setLoading] = useState<{ [key: string]: boolean }>({});
+  const [aiJobStatus, setAiJobStatus] = useState<{ [key: string]: string }>({});
+  const mountedRef = useRef(true);
 
   const backendUrl = API_URL;
 
+  useEffect(() => {
+    mountedRef.current = true;
+    return () => {
+      mountedRef.current = false;
+    };
+  }, []);
+
+  const pollAiJob = async (jobId: string, setter: Function, key: string) => {
+    const field = AI_JOB_RESULT_FIELDS[key];
+    setAiJobStatus(prev => ({ ...prev, [key]: 'running' }));
+    while (mountedRef.current) {
+      await new Promise(resolve => setTimeout(resolve, AI_JOB_POLL_INTERVAL_MS));
+      if (!mountedRef.current) return;
+      try {
+        const authTokens = localStorage.getItem('auth_tokens');
+        const token = authTokens ? JSON.parse(authTokens).access_token : null;
+        const response = await fetch(`${backendUrl}/api/resource-management/ai-jobs/${jobId}`, {
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json',
+          },
+        });
+        if (!response.ok) {
+          console.error(`Failed to poll AI job for ${key}:`, response.status, response.statusText);
+          setAiJobStatus(prev => ({ ...prev, [key]: 'failed' }));
+          return;
+        }
+        const job = await response.json();
+        if (job.status === 'queued' || job.status === 'running') continue;
+        if (job.status === 'completed') {
+          setter((prev: any) => (prev && prev.ai_job_id === jobId ? { ...prev, [field]: job.result } : prev));
+        }
+        setAiJobStatus(prev => ({ ...prev, [key]: job.status }));
+        return;
+      } catch (error) {
+        // Transient network error; try again on the next interval
+        console.error(`Error polling AI job for ${key}:`, error);
+      }
+    }
+  };
+
   const fetchData = async (endpoint: string, setter: Function, key: string) => {
     setLoading(prev => ({ ...prev, [key]: true }));
     try {
@@ -145,6 +197,9 @@ const ResourceManagementPage: React.FC = () => {
         const data = await response.json();
         console.log(`Data received for ${key}:`, data);
         setter(data);
+        if (data.ai_job_id && AI_JOB_RESULT_FIELDS[key]) {
+          pollAiJob(data.ai_job_id, setter, key);
+        }
       } else {
         console.error(`Failed to fetch ${key}:`, response.status, response.statusText);
       }
@@ -299,7 +354,14 @@ const ResourceManagementPage: React.FC = () => {
             <h3 className="text-lg font-medium text-gray-900">AI-Powered Recommendations</h3>
           </div>
           <div className="space-y-4">
-            {Object.entries(resourceAllocation.ai_recommendations.recommendations || {}).map(([key, value]) => (
+            {!resourceAllocation.ai_recommendations && (
+              <p className="text-sm text-gray-500">
+                {aiJobStatus.allocation === 'running'
+                  ? 'Generating AI recommendations...'
+                  : 'AI recommendations are unavailable right now.'}
+              </p>
+            )}
+            {Object.entries(resourceAllocation.ai_recommendations?.recommendations || {}).map(([key, value]) => (
               <div key={key} className="border-l-4 border-blue-500 pl-4">
                 <h4 className="text-sm font-medium text-gray-900 capitalize">
                   {key.replace(/_/g, ' ')}
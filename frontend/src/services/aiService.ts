@@ -164,15 +164,13 @@ class AIService {
    * Predict task duration using ML
    */
   async predictTaskDuration(
-    taskData: Record<string, any>,
-    historicalTasks?: Record<string, any>[]
+    taskData: Record<string, any>
   ): Promise<TaskDurationPrediction> {
     try {
       const response = await axios.post(
         `${getAPI_BASE_URL()}/api/ai-ml/predict/task-duration`,
         {
-          task_data: taskData,
-          historical_tasks: historicalTasks || []
+          task_data: taskData
         },
         { headers: this.getAuthHeaders() }
       )
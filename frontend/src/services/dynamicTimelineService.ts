@@ -83,19 +83,36 @@ export interface TimelineViewConfig {
   show_resource_conflicts: boolean;
 }
 
+export interface TaskPatch {
+  task_id: string;
+  changes: Partial<DynamicTimelineTask>;
+  user_id: string;
+}
+
 export interface WebSocketMessage {
-  type: 'task_updated' | 'task_created' | 'task_deleted' | 'dependency_updated' | 'user_joined' | 'user_left' | 'conflict_detected';
+  type: 'task_patch' | 'resync_required' | 'task_created' | 'task_deleted' | 'dependency_updated' | 'user_joined' | 'user_left' | 'conflict_detected';
   data: any;
   timestamp: string;
   user_id?: string;
+  // task_patch: the project's patch sequence number and the changed fields of each task
+  // resync_required: the current sequence to continue from after reloading
+  seq?: number;
+  patches?: TaskPatch[];
 }
 
+// How long a task_patch may wait for a missing predecessor before asking the server to replay
+const PATCH_GAP_TIMEOUT_MS = 2000;
+
 export class DynamicTimelineService {
   private ws: WebSocket | null = null;
   private wsReconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private eventListeners: Map<string, ((message: WebSocketMessage) => void)[]> = new Map();
   private isConnected = false;
+  // Patches are applied in sequence order; frames from different server workers can arrive out of order
+  private lastPatchSeq: number | null = null;
+  private pendingPatches: Map<number, WebSocketMessage> = new Map();
+  private patchGapTimer: ReturnType<typeof setTimeout> | null = null;
 
   constructor() {
     this.initializeWebSocket = this.initializeWebSocket.bind(this);
@@ -114,7 +131,9 @@ export class DynamicTimelineService {
   initializeWebSocket(projectId: string, token: string): Promise<void> {
     return new Promise((resolve, reject) => {
       try {
-        const wsUrl = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/api/timeline/ws/${projectId}`;
+        // On reconnect, the server replays the patches missed since the last one applied
+        const since = this.lastPatchSeq !== null ? `?since=${this.lastPatchSeq}` : '';
+        const wsUrl = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/api/timeline/ws/${projectId}${since}`;
         
         // Add timeout for WebSocket connection
         const connectionTimeout = setTimeout(() => {
@@ -202,7 +221,69 @@ export class DynamicTimelineService {
    */
   private handleWebSocketMessage(message: WebSocketMessage) {
     console.log('📨 WebSocket message received:', message);
-    
+
+    if (message.type === 'task_patch') {
+      this.handleTaskPatch(message);
+      return;
+    }
+    if (message.type === 'resync_required') {
+      // Listeners reload the timeline; patches continue from the server's current sequence
+      this.resetPatchSequence(message.seq ?? null);
+    }
+
+    this.notifyListeners(message);
+  }
+
+  /**
+   * Deliver task patches in sequence order, holding any that arrive before
+   * their predecessor and asking for a replay if the gap does not close
+   */
+  private handleTaskPatch(message: WebSocketMessage) {
+    const seq = message.seq;
+    if (seq === undefined) {
+      return;
+    }
+    if (this.lastPatchSeq === null) {
+      // First patch since the timeline was loaded
+      this.lastPatchSeq = seq - 1;
+    }
+    if (seq <= this.lastPatchSeq) {
+      return; // already applied, e.g. replayed alongside a live copy
+    }
+
+    this.pendingPatches.set(seq, message);
+    while (this.pendingPatches.has(this.lastPatchSeq + 1)) {
+      const next = this.pendingPatches.get(this.lastPatchSeq + 1)!;
+      this.pendingPatches.delete(this.lastPatchSeq + 1);
+      this.lastPatchSeq += 1;
+      this.notifyListeners(next);
+    }
+
+    if (this.pendingPatches.size === 0) {
+      if (this.patchGapTimer) {
+        clearTimeout(this.patchGapTimer);
+        this.patchGapTimer = null;
+      }
+    } else if (!this.patchGapTimer) {
+      this.patchGapTimer = setTimeout(() => {
+        this.patchGapTimer = null;
+        if (this.pendingPatches.size > 0) {
+          this.sendRealtimeMessage({ type: 'resync', since: this.lastPatchSeq });
+        }
+      }, PATCH_GAP_TIMEOUT_MS);
+    }
+  }
+
+  private resetPatchSequence(seq: number | null) {
+    this.lastPatchSeq = seq;
+    this.pendingPatches.clear();
+    if (this.patchGapTimer) {
+      clearTimeout(this.patchGapTimer);
+      this.patchGapTimer = null;
+    }
+  }
+
+  private notifyListeners(message: WebSocketMessage) {
     // Notify all listeners for this message type
     const listeners = this.eventListeners.get(message.type) || [];
     listeners.forEach(listener => {
@@ -758,6 +839,7 @@ export class DynamicTimelineService {
       this.ws = null;
       this.isConnected = false;
     }
+    this.resetPatchSequence(null);
   }
 
   /**
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the file storage backends
+
+Writes and downloads (full and HTTP Range) a set of payloads through the
+local and S3 storage backends in-process and reports MB/s for each. The S3
+backend is skipped unless real AWS credentials are configured.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', '.env'))
+
+from services.file_storage import LocalFileStorage, LocalStorageConfig
+from services.s3_service import S3FileService
+
+PAYLOAD_SIZES = [64 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+ITERATIONS = 5
+
+async def consume_response(response, range_header=None):
+    """Drive an ASGI response to completion and return the number of body bytes"""
+    headers = [(b"range", range_header.encode())] if range_header else []
+    scope = {"type": "http", "method": "GET", "headers": headers, "path": "/"}
+    received = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            received += len(message.get("body", b""))
+
+    await response(scope, receive, send)
+    return received
+
+async def benchmark_backend(storage):
+    """Measure upload, full download and ranged download throughput"""
+    results = []
+    for size in PAYLOAD_SIZES:
+        upload_seconds = 0.0
+        download_seconds = 0.0
+        range_seconds = 0.0
+
+        for _ in range(ITERATIONS):
+            # Fresh content each pass so content-addressed writes are never skipped
+            payload = os.urandom(size)
+            started = time.perf_counter()
+            checksum = storage._calculate_checksum(payload)
+            file_path, _ = storage._generate_file_path("benchmark-project", "benchmark.bin.zip", checksum)
+            await storage.put_object(file_path, payload, "application/zip", {"checksum": checksum})
+            upload_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = storage.build_download_response(file_path, "benchmark.bin.zip", "application/zip")
+            assert await consume_response(response) == size
+            download_seconds += time.perf_counter() - started
+
+            range_header = f"bytes={size // 2}-"
+            started = time.perf_counter()
+            response = storage.build_download_response(file_path, "benchmark.bin.zip", "application/zip", range_header)
+            assert await consume_response(response, range_header) == size - size // 2
+            range_seconds += time.perf_counter() - started
+
+            storage.delete_file(file_path)
+
+        megabytes = size * ITERATIONS / (1024 * 1024)
+        results.append({
+            "size_kb": size // 1024,
+            "upload_mb_s": megabytes / upload_seconds,
+            "download_mb_s": megabytes / download_seconds,
+            "range_mb_s": (megabytes / 2) / range_seconds,
+        })
+    return results
+
+def print_results(name, results):
+    print(f"\n📦 {name}")
+    print(f"    {'size (KB)':>10} {'upload MB/s':>12} {'download MB/s':>14} {'range MB/s':>11}")
+    for row in results:
+        print(f"    {row['size_kb']:>10} {row['upload_mb_s']:>12.1f} {row['download_mb_s']:>14.1f} {row['range_mb_s']:>11.1f}")
+
+async def main():
+    print("🚀 File storage backend throughput benchmark")
+
+    with tempfile.TemporaryDirectory() as storage_root:
+        config = LocalStorageConfig()
+        config.root_path = storage_root
+        print_results("local", await benchmark_backend(LocalFileStorage(config)))
+
+    s3_storage = S3FileService()
+    if s3_storage.config.access_key_id in ("", "your-access-key-id"):
+        print("\n⚠️  Skipping s3: AWS credentials are not configured")
+    else:
+        print_results("s3", await benchmark_backend(s3_storage))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for background AI jobs
+
+Two job services stand in for two workers sharing Mongo: the per-organization
+concurrency cap holds across both, superseded, cancelled and interrupted
+jobs record the right status, and jobs orphaned by a stopped worker are
+marked failed.
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BROADCAST_BUS_BACKEND", "memory")
+os.environ.setdefault("PRESENCE_BACKEND", "memory")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+import services.ai_job_service as ai_job_module
+from services.ai_job_service import AIJobService
+
+# Queued jobs re-check for a free slot quickly in tests
+ai_job_module.AI_JOB_SLOT_POLL_SECONDS = 0.01
+
+async def job_status(db, job_id: str) -> str:
+    return (await db.ai_jobs.find_one({"id": job_id}))["status"]
+
+async def test_concurrency_cap_spans_workers():
+    """An organization never runs more jobs than its cap, whichever workers accepted them"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"ai-job-test-{uuid.uuid4()}"
+
+    try:
+        workers = [AIJobService(max_concurrent_per_org=2) for _ in range(2)]
+        running, peak = 0, 0
+
+        async def analysis():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.03)
+            running -= 1
+            return {"recommendations": []}
+
+        job_ids = [
+            await workers[i % 2].submit(organization_id, f"user-{i}", "portfolio_insights", analysis)
+            for i in range(8)
+        ]
+        await asyncio.gather(*[task for worker in workers for task in list(worker._tasks.values())])
+
+        assert peak == 2, f"Cap of 2 exceeded across workers (peak {peak})"
+        assert [await job_status(db, job_id) for job_id in job_ids] == ["completed"] * 8
+        assert await db.leases.count_documents({"_id": {"$regex": f"^ai_job_slot:{organization_id}:"}}) == 0
+        print("✅ 8 jobs on 2 workers never exceeded the per-organization cap of 2")
+
+    finally:
+        await db.ai_jobs.delete_many({"organization_id": organization_id})
+        await close_mongo_connection()
+
+async def test_cancellation_statuses():
+    """Superseded, cancelled and interrupted jobs each end with the right status"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"ai-job-test-{uuid.uuid4()}"
+
+    try:
+        service = AIJobService(max_concurrent_per_org=1)
+
+        async def slow_analysis():
+            await asyncio.sleep(10)
+
+        first = await service.submit(organization_id, "alice", "risk_review", slow_analysis)
+        await asyncio.sleep(0.02)
+        second = await service.submit(organization_id, "alice", "risk_review", slow_analysis)
+        await asyncio.sleep(0.02)
+        assert await job_status(db, first) == "superseded"
+        assert await job_status(db, second) == "running"
+
+        assert await service.cancel(second, organization_id)
+        await asyncio.sleep(0.02)
+        assert await job_status(db, second) == "cancelled"
+        assert not await service.cancel(second, organization_id), "A finished job cannot be cancelled again"
+        print("✅ Superseded and cancelled jobs keep their status")
+
+        # Cancelled for another reason, e.g. the worker shutting down
+        third = await service.submit(organization_id, "alice", "risk_review", slow_analysis)
+        await asyncio.sleep(0.02)
+        service._tasks[third].cancel()
+        await asyncio.sleep(0.02)
+        assert await job_status(db, third) == "cancelled", "Interrupted job was left looking live"
+        print("✅ A job interrupted by shutdown is recorded as cancelled")
+
+    finally:
+        await db.ai_jobs.delete_many({"organization_id": organization_id})
+        await close_mongo_connection()
+
+async def test_stale_jobs_fail():
+    """Jobs whose worker stopped heartbeating are marked failed; live ones are left alone"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"ai-job-test-{uuid.uuid4()}"
+
+    try:
+        now = datetime.utcnow()
+        await db.ai_jobs.insert_many([
+            {"id": str(uuid.uuid4()), "name": name, "organization_id": organization_id, "status": status, "heartbeat_at": heartbeat}
+            for name, status, heartbeat in [
+                ("orphaned-running", "running", now - timedelta(hours=1)),
+                ("orphaned-queued", "queued", now - timedelta(hours=1)),
+                ("live", "running", now),
+                ("finished", "completed", now - timedelta(hours=1)),
+            ]
+        ])
+
+        assert await AIJobService().fail_stale_jobs(stale_seconds=300) == 2
+        statuses = {
+            job["name"]: job["status"]
+            for job in await db.ai_jobs.find({"organization_id": organization_id}).to_list(length=None)
+        }
+        assert statuses == {
+            "orphaned-running": "failed",
+            "orphaned-queued": "failed",
+            "live": "running",
+            "finished": "completed"
+        }, statuses
+        print("✅ Orphaned queued and running jobs marked failed")
+
+    finally:
+        await db.ai_jobs.delete_many({"organization_id": organization_id})
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrency_cap_spans_workers())
+    asyncio.run(test_cancellation_statuses())
+    asyncio.run(test_stale_jobs_fail())
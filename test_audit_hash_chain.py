@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for audit hash-chain appends
+
+Fires 1,000 simultaneous security events for a throwaway organization and
+verifies the resulting chain is linear: sequences are contiguous and every
+event links to the hash of its predecessor. Also races workers that share
+nothing but the database on the unique sequence index, and checks that a
+failed insert leaves no gap and that a chain head left behind by a crash is
+repaired.
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from auth.rate_limiter import BoundedTTLCache
+from database import connect_to_mongo, close_mongo_connection, get_database
+from models.security import SecurityEventType, RiskLevel
+from services.security_service import SecurityService
+
+CONCURRENT_EVENTS = 1000
+WORKER_EVENTS = 50
+
+def make_worker_service(retries: list) -> SecurityService:
+    """A service with its own lock and head cache, as a separate worker process would have"""
+
+    class WorkerSecurityService(SecurityService):
+        _chain_locks = BoundedTTLCache(maxsize=100, ttl=3600)
+        _chain_heads = BoundedTTLCache(maxsize=100, ttl=3600)
+
+        async def _load_chain_head(self, db, organization_id):
+            retries.append(organization_id)
+            return await super()._load_chain_head(db, organization_id)
+
+    return WorkerSecurityService()
+
+async def assert_chain_linear(db, organization_id: str, count: int) -> str:
+    """Check sequences 1..count link hash to hash; returns the last hash"""
+    events = await db.audit_events.find(
+        {"organization_id": organization_id}
+    ).sort("sequence", 1).to_list(length=None)
+    assert [event["sequence"] for event in events] == list(range(1, count + 1)), "Sequences are not contiguous"
+
+    previous_hash = "genesis"
+    for event in events:
+        assert event["previous_hash"] == previous_hash, f"Chain forks at sequence {event['sequence']}"
+        expected_hash = SecurityService()._compute_event_hash(
+            event["organization_id"], event["timestamp"], event["description"], previous_hash
+        )
+        assert event["hash_chain"] == expected_hash, f"Hash mismatch at sequence {event['sequence']}"
+        previous_hash = event["hash_chain"]
+    return previous_hash
+
+async def test_concurrent_hash_chain_appends():
+    """Append events concurrently and verify chain linearity"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"chain-test-{uuid.uuid4()}"
+
+    try:
+        # Separate instances share chain state, as the routes and middleware do
+        services = [SecurityService() for _ in range(4)]
+        results = await asyncio.gather(*[
+            services[i % len(services)].log_security_event(
+                db,
+                event_type=SecurityEventType.DATA_ACCESS,
+                user_id="chain-test-user",
+                organization_id=organization_id,
+                description=f"Concurrent chain event {i}",
+                risk_level=RiskLevel.LOW
+            )
+            for i in range(CONCURRENT_EVENTS)
+        ])
+        assert all(results), "Some events failed to log"
+        print(f"✅ Logged {CONCURRENT_EVENTS} concurrent events")
+
+        previous_hash = await assert_chain_linear(db, organization_id, CONCURRENT_EVENTS)
+        print("✅ Sequences are contiguous, the hash chain is linear and every hash verifies")
+
+        head = await db.audit_chain_heads.find_one({"organization_id": organization_id})
+        assert head["sequence"] == CONCURRENT_EVENTS and head["head_hash"] == previous_hash
+        print("✅ Chain head matches the last event")
+
+    finally:
+        await db.audit_events.delete_many({"organization_id": organization_id})
+        await db.audit_chain_heads.delete_one({"organization_id": organization_id})
+        SecurityService._chain_heads.pop(organization_id, None)
+        SecurityService._chain_locks.pop(organization_id, None)
+        await close_mongo_connection()
+
+async def test_cross_worker_appends_race():
+    """Workers without a shared lock collide on the unique index, retry, and keep one linear chain"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"chain-test-{uuid.uuid4()}"
+    retries = []
+
+    try:
+        workers = [make_worker_service(retries) for _ in range(4)]
+        results = await asyncio.gather(*[
+            workers[i % len(workers)].log_security_event(
+                db,
+                event_type=SecurityEventType.DATA_ACCESS,
+                user_id="chain-test-user",
+                organization_id=organization_id,
+                description=f"Cross-worker chain event {i}",
+                risk_level=RiskLevel.LOW
+            )
+            for i in range(WORKER_EVENTS)
+        ])
+        assert all(results), "Some events failed to log"
+        # One initial load per worker; anything beyond is a DuplicateKeyError retry
+        assert len(retries) > len(workers), "Workers never raced on the sequence index"
+
+        previous_hash = await assert_chain_linear(db, organization_id, WORKER_EVENTS)
+        head = await db.audit_chain_heads.find_one({"organization_id": organization_id})
+        assert head["sequence"] == WORKER_EVENTS and head["head_hash"] == previous_hash
+        print(f"✅ {len(retries) - len(workers)} index collisions between workers retried into one linear chain")
+
+    finally:
+        await db.audit_events.delete_many({"organization_id": organization_id})
+        await db.audit_chain_heads.delete_one({"organization_id": organization_id})
+        await close_mongo_connection()
+
+async def test_failed_appends_leave_no_gap():
+    """A failed insert does not advance the chain, and a lagging head is repaired from the events"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"chain-test-{uuid.uuid4()}"
+    service = SecurityService()
+
+    async def log(description):
+        return await service.log_security_event(
+            db,
+            event_type=SecurityEventType.DATA_ACCESS,
+            user_id="chain-test-user",
+            organization_id=organization_id,
+            description=description
+        )
+
+    try:
+        assert await log("first")
+        with patch.object(type(db.audit_events), "insert_one", AsyncMock(side_effect=RuntimeError("insert failed"))):
+            assert not await log("never stored")
+        assert await log("second")
+        print("✅ Failed insert reported and skipped without a gap")
+
+        # A worker that died after inserting but before advancing the head, seen from a stale cache
+        await db.audit_chain_heads.update_one({"organization_id": organization_id}, {"$set": {"sequence": 1}})
+        SecurityService._chain_heads[organization_id] = (1, "stale")
+        assert await log("third")
+
+        events = await db.audit_events.find(
+            {"organization_id": organization_id}
+        ).sort("sequence", 1).to_list(length=None)
+        assert [event["description"] for event in events] == ["first", "second", "third"]
+        assert [event["sequence"] for event in events] == [1, 2, 3]
+        previous_hash = "genesis"
+        for event in events:
+            assert event["previous_hash"] == previous_hash, f"Chain forks at sequence {event['sequence']}"
+            previous_hash = event["hash_chain"]
+        head = await db.audit_chain_heads.find_one({"organization_id": organization_id})
+        assert head["sequence"] == 3 and head["head_hash"] == previous_hash
+        print("✅ Lagging chain head repaired and chain stays linear")
+
+    finally:
+        await db.audit_events.delete_many({"organization_id": organization_id})
+        await db.audit_chain_heads.delete_one({"organization_id": organization_id})
+        SecurityService._chain_heads.pop(organization_id, None)
+        SecurityService._chain_locks.pop(organization_id, None)
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrent_hash_chain_appends())
+    asyncio.run(test_cross_worker_appends_race())
+    asyncio.run(test_failed_appends_leave_no_gap())
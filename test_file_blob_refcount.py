@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for reference-counted file blobs
+
+Writes to a throwaway local storage root: identical uploads share one
+stored object, releasing all but the last reference keeps it, and the last
+references released concurrently delete the object exactly once.
+"""
+
+import io
+import os
+import sys
+import uuid
+import shutil
+import asyncio
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.file_storage import LocalFileStorage, LocalStorageConfig
+
+class CountingStorage(LocalFileStorage):
+    """Local storage that records every object deletion"""
+
+    def __init__(self, root_path: str):
+        config = LocalStorageConfig()
+        config.root_path = root_path
+        super().__init__(config)
+        self.deleted = []
+
+    def delete_file(self, file_path: str) -> bool:
+        self.deleted.append(file_path)
+        return super().delete_file(file_path)
+
+def make_upload(content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="notes.txt", headers=Headers({"content-type": "text/plain"}))
+
+async def test_last_release_deletes_once():
+    """The stored object outlives every reference but the last, then is deleted once"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"blob-test-{uuid.uuid4()}"
+    root_path = tempfile.mkdtemp(prefix="blob-test-")
+
+    try:
+        storage = CountingStorage(root_path)
+        content = f"meeting notes {uuid.uuid4()}".encode()
+        first = await storage.upload_file(make_upload(content), "project-1", "alice", organization_id=organization_id)
+        duplicates = await asyncio.gather(*[
+            storage.upload_file(make_upload(content), f"project-{i}", "bob", organization_id=organization_id)
+            for i in range(2, 5)
+        ])
+
+        assert all(result.deduplicated and result.blob_id == first.blob_id for result in duplicates)
+        assert {result.file_path for result in duplicates} == {first.file_path}
+        blob = await db.file_blobs.find_one({"id": first.blob_id})
+        assert blob["ref_count"] == 4
+        object_path = storage._resolve_path(first.file_path)
+        print("✅ 4 identical uploads share one stored object")
+
+        await storage.release_blob(first.blob_id)
+        await storage.release_blob(first.blob_id)
+        assert os.path.exists(object_path) and not storage.deleted
+        assert (await db.file_blobs.find_one({"id": first.blob_id}))["ref_count"] == 2
+        print("✅ Object kept while references remain")
+
+        await asyncio.gather(*[storage.release_blob(first.blob_id) for _ in range(2)])
+        assert storage.deleted == [first.file_path], f"Expected one deletion, got {storage.deleted}"
+        assert not os.path.exists(object_path)
+        assert await db.file_blobs.find_one({"id": first.blob_id}) is None
+        print("✅ Last references released together deleted the object exactly once")
+
+        # Releasing a reference that no longer exists is harmless
+        await storage.release_blob(first.blob_id)
+        assert len(storage.deleted) == 1
+
+    finally:
+        await db.file_blobs.delete_many({"organization_id": organization_id})
+        shutil.rmtree(root_path, ignore_errors=True)
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(test_last_release_deletes_once())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM response cache and gateway
+
+Runs entirely offline against LocalLLMProvider: concurrent identical
+requests share one upstream call, a cancelled caller does not cancel the
+shared generation, the circuit breaker opens and fails over, slow calls are
+hedged, a hedged answer is cached and labelled as the fallback model's, and
+a half-open trial is handed back when its caller goes away.
+"""
+
+import os
+import sys
+import asyncio
+from unittest.mock import patch
+
+os.environ.setdefault("LLM_GATEWAY_PROVIDER", "local")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("LLM_CACHE_BACKEND", "memory")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from fastapi import HTTPException
+
+from auth.rate_limiter import InMemoryRateLimitBackend, TokenBucketRateLimiter
+from services.llm_cache import CachedLlmChat, LLMResponseCache
+from services.llm_gateway import LLMGateway, LLMRequest
+from services.llm_local_provider import LocalLLMProvider
+
+def make_gateway(provider=None, **kwargs) -> LLMGateway:
+    """Gateway with a fast local provider and an unconstrained in-memory rate budget"""
+    return LLMGateway(
+        provider=provider or LocalLLMProvider(ttft_ms=5, tokens_per_second=5000, output_tokens=20),
+        rate_limiter=TokenBucketRateLimiter(InMemoryRateLimitBackend(), rate=100_000, period=60),
+        **kwargs
+    )
+
+def make_request(provider: str = "openai", prompt: str = "Summarize the portfolio delivery risks") -> LLMRequest:
+    model = "gpt-4o" if provider == "openai" else "claude-3-5-sonnet-20241022"
+    return LLMRequest(provider=provider, model=model, system_message="You are a PM assistant", prompt=prompt)
+
+class SlowProvider(LocalLLMProvider):
+    """Local provider whose completions from some providers take a while"""
+
+    def __init__(self, slow_providers, delay: float):
+        super().__init__(ttft_ms=5, tokens_per_second=5000, output_tokens=20)
+        self.slow_providers = set(slow_providers)
+        self.delay = delay
+
+    async def complete(self, request) -> str:
+        if request.provider in self.slow_providers:
+            await asyncio.sleep(self.delay)
+        return await super().complete(request)
+
+async def test_cache_coalesces_concurrent_requests():
+    """Identical concurrent requests make one upstream call and share its answer"""
+    gateway = make_gateway()
+    cache = LLMResponseCache(enabled=True, backend="memory")
+    request = make_request()
+
+    async def generate() -> str:
+        return (await gateway.complete(request, hedge=False)).text
+
+    responses = await asyncio.gather(*[
+        cache.get_or_generate(request.provider, request.model, request.system_message, request.prompt, generate)
+        for _ in range(20)
+    ])
+    assert len(set(responses)) == 1, "Coalesced callers saw different responses"
+    assert gateway.provider.metrics["templated"] == 1, "More than one upstream call was made"
+    assert cache.metrics["coalesced"] == 19
+    print("✅ 20 concurrent identical requests made one upstream call")
+
+    # Whitespace-only differences share the cache entry
+    again = await cache.get_or_generate(
+        request.provider, request.model, request.system_message, "  Summarize the portfolio\n delivery risks ", generate
+    )
+    assert again == responses[0] and cache.metrics["memory_hits"] == 1
+    print("✅ Re-wrapped prompt served from the cache")
+
+async def test_cache_generation_survives_cancelled_callers():
+    """Only the last waiter leaving cancels a shared generation"""
+    cache = LLMResponseCache(enabled=True, backend="memory")
+    release = asyncio.Event()
+    started, cancelled = [], []
+
+    async def generate() -> str:
+        started.append(True)
+        try:
+            await release.wait()
+            return "shared answer"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    def ask(prompt: str):
+        return asyncio.create_task(cache.get_or_generate("openai", "gpt-4o", "", prompt, generate))
+
+    first, second = ask("survive"), ask("survive")
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled, "Cancelling the first caller cancelled the shared generation"
+    release.set()
+    assert await second == "shared answer" and len(started) == 1
+    print("✅ Cancelling the first caller leaves the generation to the others")
+
+    release.clear()
+    first, second = ask("abandon"), ask("abandon")
+    await asyncio.sleep(0.01)
+    first.cancel()
+    second.cancel()
+    await asyncio.sleep(0.01)
+    assert len(cancelled) == 1, "Generation kept running with no one waiting"
+    assert not cache._in_flight and not cache._waiters
+    release.set()
+    assert await cache.get_or_generate("openai", "gpt-4o", "", "abandon", generate) == "shared answer"
+    print("✅ Generation cancelled once every caller left, and the next caller starts afresh")
+
+    attempts = []
+
+    async def failing() -> str:
+        attempts.append(True)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider exploded")
+
+    results = await asyncio.gather(*[
+        cache.get_or_generate("openai", "gpt-4o", "", "fails", failing) for _ in range(3)
+    ], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results) and len(attempts) == 1
+    await asyncio.gather(cache.get_or_generate("openai", "gpt-4o", "", "fails", failing), return_exceptions=True)
+    assert len(attempts) == 2, "A failure was cached"
+    print("✅ A failure reaches every waiter and is not cached")
+
+async def test_breaker_opens_and_fails_over():
+    """Repeated failures open the breaker; hedged calls then go straight to the fallback model"""
+    gateway = make_gateway(failure_threshold=2, recovery_seconds=60, hedge_after_seconds=0.5)
+    gateway.provider.failing_providers.add("openai")
+
+    for _ in range(2):
+        try:
+            await gateway.complete(make_request(), hedge=False)
+            raise AssertionError("Injected failure did not surface")
+        except RuntimeError:
+            pass
+    lane = gateway._lane("openai")
+    assert lane.breaker.state == "open" and lane.breaker.trips == 1
+
+    try:
+        await gateway.complete(make_request(), hedge=False)
+        raise AssertionError("Open breaker let a call through")
+    except HTTPException as e:
+        assert e.status_code == 503 and "Retry-After" in e.headers
+    assert lane.metrics["rejected_open_circuit"] == 1
+    print("✅ Breaker opened after 2 failures and rejects with Retry-After")
+
+    completion = await gateway.complete(make_request())
+    assert completion.hedged and completion.provider == "anthropic"
+    assert gateway.metrics["failovers"] == 1
+    print("✅ Hedged call failed over to the fallback provider")
+
+async def test_slow_primary_is_hedged():
+    """A primary slower than the hedge delay loses to the secondary"""
+    provider = SlowProvider({"openai"}, delay=2.0)
+    gateway = make_gateway(provider=provider, hedge_after_seconds=0.05)
+
+    completion = await gateway.complete(make_request(), timeout=5)
+    assert completion.hedged and completion.provider == "anthropic"
+    assert gateway.metrics["hedged"] == 1 and gateway.metrics["hedge_wins"] == 1
+    await asyncio.sleep(0.01)
+    assert gateway._lane("openai").in_flight == 0, "Losing primary was not cancelled"
+    print("✅ Slow primary hedged; the secondary won and the primary was cancelled")
+
+async def test_hedged_answer_cached_as_fallback_model():
+    """A fallback model's answer is reported and cached as that model's, not the primary's"""
+    provider = SlowProvider({"openai"}, delay=2.0)
+    gateway = make_gateway(provider=provider, hedge_after_seconds=0.05)
+    cache = LLMResponseCache(enabled=True, backend="memory")
+    request = make_request()
+
+    def chat(provider_name: str, model: str) -> CachedLlmChat:
+        return CachedLlmChat(api_key="", session_id="hedge-test", system_message=request.system_message, timeout=5) \
+            .with_model(provider_name, model)
+
+    with patch("services.llm_cache.llm_gateway", gateway), patch("services.llm_cache.llm_response_cache", cache):
+        primary = chat("openai", "gpt-4o")
+        response = await primary.send_message(request.prompt)
+        assert primary.last_completion == {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022", "hedged": True}
+        assert cache.metrics["answered_by_fallback"] == 1
+        assert await cache.lookup("openai", "gpt-4o", request.system_message, request.prompt) is None, \
+            "Fallback answer cached under the primary model"
+        print("✅ Hedged answer labelled with the fallback model and kept out of the primary's cache entry")
+
+        fallback = chat("anthropic", "claude-3-5-sonnet-20241022")
+        assert await fallback.send_message(request.prompt) == response
+        assert fallback.last_completion == {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022", "hedged": False}
+        assert cache.metrics["memory_hits"] == 1
+        print("✅ The same answer served from the cache to a direct request for the fallback model")
+
+async def test_half_open_trial_released_on_cancellation():
+    """A half-open trial whose caller leaves before reaching the provider is handed back"""
+    gateway = make_gateway(max_concurrent_per_provider=1, failure_threshold=1, recovery_seconds=0)
+    lane = gateway._lane("openai")
+    lane.breaker.record_failure()
+    await lane.slots.acquire()  # every slot busy, so the trial waits for one
+
+    waiting = asyncio.create_task(gateway.complete(make_request(), timeout=5, hedge=False))
+    await asyncio.sleep(0.02)
+    assert lane.breaker.state == "half_open" and lane.breaker._trial_in_flight
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert not lane.breaker._trial_in_flight, "Cancelled trial left the breaker stuck half-open"
+    lane.slots.release()
+
+    completion = await gateway.complete(make_request(), hedge=False)
+    assert completion.text and lane.breaker.state == "closed"
+    print("✅ Cancelled trial released; the next call closed the breaker")
+
+if __name__ == "__main__":
+    asyncio.run(test_cache_coalesces_concurrent_requests())
+    asyncio.run(test_cache_generation_survives_cancelled_callers())
+    asyncio.run(test_breaker_opens_and_fails_over())
+    asyncio.run(test_slow_primary_is_hedged())
+    asyncio.run(test_hedged_answer_cached_as_fallback_model())
+    asyncio.run(test_half_open_trial_released_on_cancellation())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for SSE framing and multiplexing of LLM streams
+
+Uses in-process event sources and a bare ASGI receive/send pair: streams
+interleave with keep-alives while sources are silent, a failing source does
+not stop the others, and a client disconnect cancels every producer still
+running.
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from services.llm_streaming import EventStreamResponse, multiplex_streams, sse_stream
+
+class Producer:
+    """An event source that records whether it finished or was cancelled"""
+
+    def __init__(self, tokens, delay: float = 0.0, fail: bool = False, hang: bool = False):
+        self.tokens, self.delay, self.fail, self.hang = tokens, delay, fail, hang
+        self.started = self.cancelled = self.finished = False
+
+    async def events(self):
+        self.started = True
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield "token", {"text": token}
+            if self.fail:
+                raise RuntimeError("provider exploded")
+            if self.hang:
+                await asyncio.sleep(3600)
+            self.finished = True
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+async def collect(frames) -> list:
+    return [frame async for frame in frames]
+
+async def test_multiplex_interleaves_and_isolates_failures():
+    """Every source's events arrive tagged; a failure is reported and the rest complete"""
+    producers = {
+        "summary": Producer(["a", "b"], delay=0.01),
+        "risks": Producer(["c"], fail=True),
+        "timeline": Producer(["d", "e", "f"], delay=0.005),
+    }
+    frames = await collect(multiplex_streams(
+        {stream_id: producer.events() for stream_id, producer in producers.items()},
+        max_concurrency=2
+    ))
+
+    assert sum(frame.startswith("event: token") for frame in frames) == 6
+    assert any('"stream_id": "risks", "error": "provider exploded"' in frame for frame in frames)
+    assert frames[-1].startswith("event: done")
+    done = json.loads(frames[-1].split("data: ", 1)[1])
+    assert sorted(done["completed"]) == ["summary", "timeline"] and done["failed"] == ["risks"]
+    print("✅ Three sources multiplexed; the failing one reported without stopping the others")
+
+    frames = await collect(sse_stream(Producer(["slow"], delay=0.05).events(), heartbeat_seconds=0.02))
+    assert frames[0] == ": keep-alive\n\n" and frames[-1].startswith("event: token")
+    print("✅ Keep-alive comments sent while a source is silent")
+
+async def test_disconnect_cancels_producers():
+    """Closing the stream, or the client going away, cancels the running producers"""
+    hanging = [Producer(["x"], hang=True) for _ in range(2)]
+    queued = Producer(["never"])
+    frames = multiplex_streams(
+        {"a": hanging[0].events(), "b": hanging[1].events(), "c": queued.events()},
+        max_concurrency=2
+    )
+    assert (await frames.__anext__()).startswith("event: token")
+    await frames.aclose()
+    assert all(producer.cancelled for producer in hanging), "Closing the stream left producers running"
+    assert not queued.started, "A source waiting for a slot was started after the stream closed"
+    print("✅ Closing a multiplexed stream cancelled its producers")
+
+    producer = Producer(["x"], hang=True)
+    response = EventStreamResponse(sse_stream(producer.events()))
+    sent = []
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message.get("body"):
+            disconnected.set()
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.0"}, "method": "GET", "path": "/stream", "headers": []}
+    await asyncio.wait_for(response(scope, receive, send), timeout=2)
+    assert sent[0]["type"] == "http.response.start"
+    assert dict(sent[0]["headers"])[b"content-type"].startswith(b"text/event-stream")
+    assert producer.cancelled, "Client disconnect left the producer running"
+    print("✅ Client disconnect cancelled the upstream producer")
+
+if __name__ == "__main__":
+    asyncio.run(test_multiplex_interleaves_and_isolates_failures())
+    asyncio.run(test_disconnect_cancels_producers())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for effective permission bitsets
+
+Two permission services stand in for two workers sharing Mongo: a role
+granted through inheritance shows up in the bitset, revoking an assignment
+removes it, and every invalidation bumps the organization's generation so
+the other worker stops trusting its stored bitsets.
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.permission_service import PermissionService, decode_permissions, encode_permissions
+
+async def test_grant_revoke_and_generation():
+    """Grants and revocations reach every worker once the generation moves"""
+    await connect_to_mongo()
+    db = await get_database()
+    organization_id = f"permission-test-{uuid.uuid4()}"
+
+    try:
+        # No in-process caching, so each check goes to the stored bitset
+        worker_a, worker_b = PermissionService(cache_ttl=0), PermissionService(cache_ttl=0)
+        await db.users.insert_one({"id": "alice", "organization_id": organization_id, "role": "team_member"})
+        await db.custom_roles.insert_many([
+            {"id": "viewer", "organization_id": organization_id, "display_name": "Viewer",
+             "permissions": ["view_project"]},
+            {"id": "editor", "organization_id": organization_id, "display_name": "Editor",
+             "permissions": ["edit_task"], "inherits_permissions": True, "parent_role_id": "viewer"},
+        ])
+
+        assert not await worker_b.has_permission(db, organization_id, "alice", "edit_task")
+        assert await worker_b.get_effective_permissions(db, organization_id, "nobody") is None
+        generation = await worker_a._generation(db, organization_id)
+
+        # Grant
+        await db.role_assignments.insert_one({
+            "id": "assignment-1", "user_id": "alice", "role_id": "editor",
+            "organization_id": organization_id, "is_active": True
+        })
+        await worker_a.invalidate_users(db, organization_id, ["alice"])
+        assert await worker_a._generation(db, organization_id) == generation + 1
+        effective = await worker_b.get_effective_permissions(db, organization_id, "alice")
+        assert effective.permissions == ["view_project", "edit_task"], effective.permissions
+        assert effective.source_roles("view_project") == ["Editor"], "Inherited permission lost its source"
+        stored = await db.user_permission_sets.find_one({"organization_id": organization_id, "user_id": "alice"})
+        assert stored["generation"] == generation + 1
+        print("✅ Granted role and its inherited parent reach the other worker")
+
+        # Revoke
+        await db.role_assignments.update_one({"id": "assignment-1"}, {"$set": {"is_active": False}})
+        await worker_a.invalidate_users(db, organization_id, ["alice"])
+        assert await worker_a._generation(db, organization_id) == generation + 2
+        # A slower worker stores the bitset it computed before the revocation
+        await db.user_permission_sets.insert_one({**stored, "_id": uuid.uuid4().hex})
+        assert not await worker_b.has_permission(db, organization_id, "alice", "view_project")
+        print("✅ Revoked assignment removed on the other worker, ignoring a bitset from the old generation")
+
+        # A role change invalidates the whole organization
+        await db.role_assignments.update_one({"id": "assignment-1"}, {"$set": {"is_active": True}})
+        await worker_a.invalidate_users(db, organization_id, ["alice"])
+        assert await worker_b.has_permission(db, organization_id, "alice", "edit_task")
+        await db.custom_roles.update_one({"id": "viewer"}, {"$set": {"permissions": ["export_data"]}})
+        await worker_a.invalidate_organization(db, organization_id)
+        assert await worker_a._generation(db, organization_id) == generation + 4
+        effective = await worker_b.get_effective_permissions(db, organization_id, "alice")
+        assert effective.permissions == ["edit_task", "export_data"], effective.permissions
+        print("✅ Role change bumps the generation and rebuilds inherited masks")
+
+    finally:
+        await db.users.delete_many({"organization_id": organization_id})
+        await db.custom_roles.delete_many({"organization_id": organization_id})
+        await db.role_assignments.delete_many({"organization_id": organization_id})
+        await db.user_permission_sets.delete_many({"organization_id": organization_id})
+        await db.permission_generations.delete_one({"_id": organization_id})
+        await close_mongo_connection()
+
+def test_bitset_encoding():
+    """Unknown names are ignored and masks round-trip in catalog order"""
+    mask = encode_permissions(["edit_task", "not_a_permission", "view_project"])
+    assert decode_permissions(mask) == ["view_project", "edit_task"]
+    assert encode_permissions([]) == 0
+    print("✅ Permission bitsets round-trip")
+
+if __name__ == "__main__":
+    test_bitset_encoding()
+    asyncio.run(test_grant_revoke_and_generation())
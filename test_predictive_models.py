@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the predictive model registry
+
+Trains with the inline compute executor into a throwaway registry: each
+organization's models see only its own history, concurrent trainers publish
+distinct complete versions, and the training lease lets one worker train a
+model at a time.
+"""
+
+import os
+import sys
+import uuid
+import shutil
+import asyncio
+import tempfile
+import threading
+
+os.environ.setdefault("COMPUTE_EXECUTOR_MODE", "inline")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from ai_ml.model_registry import ModelRegistry, organization_path, train_model_version
+from ai_ml.predictive_analytics import PredictiveAnalyticsEngine
+from services.leases import acquire_lease, release_lease
+
+async def seed_history(db, organization_id: str, hours: float, count: int = 30):
+    """Completed tasks for one organization; only the project links older tasks to it"""
+    project_id = f"{organization_id}-project"
+    await db.projects.insert_one({"id": project_id, "organization_id": organization_id, "status": "active"})
+    await db.tasks.insert_many([
+        {
+            "id": f"{organization_id}-task-{i}",
+            "project_id": project_id,
+            "status": "completed",
+            "estimated_hours": 8,
+            "actual_hours": hours + i % 3,
+            "updated_at": i
+        }
+        for i in range(count)
+    ])
+
+async def test_models_are_scoped_per_organization():
+    """Training and predictions never mix organizations"""
+    await connect_to_mongo()
+    db = await get_database()
+    registry_path = tempfile.mkdtemp(prefix="model-registry-test-")
+    small_org, large_org = f"models-test-{uuid.uuid4()}", f"models-test-{uuid.uuid4()}"
+
+    try:
+        engine = PredictiveAnalyticsEngine(registry=ModelRegistry(root_path=registry_path))
+        await seed_history(db, small_org, hours=10)
+        await seed_history(db, large_org, hours=200)
+
+        X, y = await engine.load_training_data(db, "task_duration", small_org)
+        assert len(X) == 30 and y.max() < 20, "Training data leaked across organizations"
+
+        results = await engine.retrain_from_database(db, small_org, ["task_duration"])
+        assert results["task_duration"]["scheduled"]
+        await asyncio.gather(*engine.registry._training.values())
+
+        trained = await engine.predict_task_duration({"estimated_hours": 8}, small_org)
+        untrained = await engine.predict_task_duration({"estimated_hours": 8}, large_org)
+        assert trained.model_performance["model_version"] == 1 and trained.prediction < 20
+        assert untrained.confidence == 0.5, "Organization without a model should get the fallback"
+        assert engine.get_model_status(large_org)["models_trained"] == []
+        print("✅ Model trained on one organization's history serves only that organization")
+
+    finally:
+        await db.projects.delete_many({"organization_id": {"$in": [small_org, large_org]}})
+        await db.tasks.delete_many({"project_id": {"$in": [f"{small_org}-project", f"{large_org}-project"]}})
+        shutil.rmtree(registry_path, ignore_errors=True)
+        await close_mongo_connection()
+
+async def test_concurrent_training_and_lease():
+    """Simultaneous trainers claim distinct versions; the lease keeps a second worker out"""
+    await connect_to_mongo()
+    db = await get_database()
+    registry_path = tempfile.mkdtemp(prefix="model-registry-test-")
+    organization_id = f"models-test-{uuid.uuid4()}"
+
+    try:
+        engine = PredictiveAnalyticsEngine(registry=ModelRegistry(root_path=registry_path))
+        await seed_history(db, organization_id, hours=10)
+        X, y = await engine.load_training_data(db, "task_duration", organization_id)
+
+        versions = []
+        trainers = [
+            threading.Thread(target=lambda: versions.append(
+                train_model_version(registry_path, "task_duration", organization_id, X, y, keep_versions=10)["version"]
+            ))
+            for _ in range(6)
+        ]
+        for trainer in trainers:
+            trainer.start()
+        for trainer in trainers:
+            trainer.join()
+
+        model_dir = os.path.join(organization_path(registry_path, organization_id), "task_duration")
+        assert sorted(versions) == list(range(1, 7)), f"Trainers collided on a version: {versions}"
+        for version in versions:
+            assert sorted(os.listdir(os.path.join(model_dir, f"v{version}"))) == ["metadata.json", "model.joblib", "scaler.joblib"]
+        assert not [entry for entry in os.listdir(model_dir) if entry.startswith(".staging-")]
+        with open(os.path.join(model_dir, "LATEST")) as latest_file:
+            assert latest_file.read() == "6"
+        print("✅ 6 concurrent trainers published versions 1-6, each complete")
+
+        lease_name = f"model_training:{organization_id}:task_duration"
+        assert await acquire_lease(lease_name, 60, holder="another-worker")
+        results = await engine.retrain_from_database(db, organization_id, ["task_duration"])
+        assert results["task_duration"] == {"scheduled": False, "reason": "training already in progress"}
+        await release_lease(lease_name, holder="another-worker")
+        results = await engine.retrain_from_database(db, organization_id, ["task_duration"])
+        assert results["task_duration"]["scheduled"]
+        await asyncio.gather(*engine.registry._training.values())
+        assert await db.leases.find_one({"_id": lease_name}) is None, "Lease not released after training"
+        print("✅ Training lease held by another worker blocks retraining until released")
+
+    finally:
+        await db.projects.delete_many({"organization_id": organization_id})
+        await db.tasks.delete_many({"project_id": f"{organization_id}-project"})
+        shutil.rmtree(registry_path, ignore_errors=True)
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(test_models_are_scoped_per_organization())
+    asyncio.run(test_concurrent_training_and_lease())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the GCRA rate limiter and the bounded TTL cache
+
+Runs on a controlled clock against the in-memory backend: a burst is
+admitted, the next request is rejected with the wait until a token refills,
+the limiter fails open when its backend is down, and the cache evicts by
+age and by size.
+"""
+
+import sys
+import os
+import asyncio
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from auth.rate_limiter import (
+    BoundedTTLCache, InMemoryRateLimitBackend, RateLimitBackend, TokenBucketRateLimiter
+)
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class FailingBackend(RateLimitBackend):
+    async def acquire(self, key, now, emission_interval, tolerance):
+        raise ConnectionError("rate limit store unavailable")
+
+async def test_gcra_allow_deny_and_retry_after():
+    """A burst is admitted, then requests wait one emission interval each"""
+    clock = FakeClock()
+    # 10 requests a minute with a burst of 3: a token every 6 seconds
+    limiter = TokenBucketRateLimiter(InMemoryRateLimitBackend(), rate=10, period=60, burst=3)
+
+    with patch("auth.rate_limiter.time.time", clock):
+        decisions = [await limiter.check("alice", scope="api") for _ in range(3)]
+        assert all(decision.allowed for decision in decisions)
+        assert [decision.remaining for decision in decisions] == [2, 1, 0]
+
+        denied = await limiter.check("alice", scope="api")
+        assert not denied.allowed and denied.remaining == 0
+        assert abs(denied.retry_after - 6.0) < 1e-6, denied.retry_after
+        print("✅ Burst of 3 admitted; the 4th rejected with retry_after of one interval")
+
+        other = await limiter.check("bob", scope="api")
+        assert other.allowed, "Limits must be per identifier"
+        assert (await limiter.check("alice", scope="login")).allowed, "Limits must be per scope"
+
+        clock.now += 3
+        assert abs((await limiter.check("alice", scope="api")).retry_after - 3.0) < 1e-6
+        clock.now += 3
+        assert (await limiter.check("alice", scope="api")).allowed, "Token did not refill after retry_after"
+        assert not (await limiter.check("alice", scope="api")).allowed
+        print("✅ Waiting retry_after refills exactly one token")
+
+        clock.now += 60
+        assert [(await limiter.check("alice", scope="api")).allowed for _ in range(4)] == [True, True, True, False]
+        print("✅ Idle key refills to the full burst, never beyond")
+
+    assert limiter.metrics["rejected"] == 4 and limiter.rejected_by_scope == {"api": 4}
+
+    failing = TokenBucketRateLimiter(FailingBackend(), rate=1, period=60)
+    assert (await failing.check("alice")).allowed, "Limiter should fail open"
+    assert failing.metrics["backend_errors"] == 1
+    print("✅ Backend failure fails open and is counted")
+
+def test_bounded_ttl_cache():
+    """Entries expire after the TTL and the least recently used go first when full"""
+    clock = FakeClock()
+    with patch("auth.rate_limiter.time.monotonic", clock):
+        cache = BoundedTTLCache(maxsize=2, ttl=10)
+        cache["a"] = 1
+        cache["b"] = 2
+        assert cache.get("a") == 1  # a is now the most recently used
+        cache["c"] = 3
+        assert "b" not in cache and cache.get("a") == 1 and cache["c"] == 3 and len(cache) == 2
+        print("✅ Full cache evicts the least recently used entry")
+
+        clock.now += 11
+        assert cache.get("a", "gone") == "gone" and "c" not in cache
+        cache["d"] = 4
+        assert cache.pop("d") == 4 and cache.pop("d", None) is None
+        try:
+            cache["d"]
+            raise AssertionError("Missing key did not raise KeyError")
+        except KeyError:
+            pass
+        print("✅ Entries expire after their TTL")
+
+if __name__ == "__main__":
+    asyncio.run(test_gcra_allow_deny_and_retry_after())
+    test_bounded_ttl_cache()
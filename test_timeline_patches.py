@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for coalesced timeline task patches
+
+Bursts of task updates become one sequenced patch frame, two workers share
+a project's sequence, a reconnecting client replays the frames it missed
+from either worker ahead of any live frame, and a gap that cannot be
+replayed asks for a resync.
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+
+os.environ.setdefault("BROADCAST_BUS_BACKEND", "memory")
+os.environ.setdefault("PRESENCE_BACKEND", "memory")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from routes.dynamic_timeline import EnhancedTimelineConnectionManager
+from services.timeline_patches import TimelinePatchCoalescer
+
+WINDOW_SECONDS = 0.02
+
+def make_worker(sent: list, **kwargs) -> TimelinePatchCoalescer:
+    async def publish(project_id, frame):
+        sent.append(frame)
+    return TimelinePatchCoalescer(publish, window_seconds=WINDOW_SECONDS, **kwargs)
+
+def task(task_id: str, **fields):
+    return {"id": task_id, "name": f"Task {task_id}", "duration": 8, "progress": 0, "updated_at": "ignored", **fields}
+
+async def test_patches_coalesce_and_replay():
+    """Updates within a window merge into one frame; frames replay in order from any worker"""
+    await connect_to_mongo()
+    db = await get_database()
+    project_id = f"patch-test-{uuid.uuid4()}"
+
+    try:
+        sent_a, sent_b = [], []
+        worker_a, worker_b = make_worker(sent_a), make_worker(sent_b)
+
+        # A drag: many updates to one task, plus another task, inside one window
+        before = task("t1")
+        for progress in range(10, 60, 10):
+            after = task("t1", progress=progress, updated_at=f"tick-{progress}")
+            worker_a.submit(project_id, "t1", before, after, "alice")
+            before = after
+        worker_a.submit(project_id, "t2", task("t2"), task("t2", duration=16), "alice")
+        worker_a.submit(project_id, "t3", task("t3"), task("t3", updated_at="only bookkeeping"), "alice")
+        await asyncio.sleep(WINDOW_SECONDS * 3)
+
+        assert len(sent_a) == 1, f"Expected one frame, got {len(sent_a)}"
+        frame = sent_a[0]
+        patches = {patch["task_id"]: patch["changes"] for patch in frame["patches"]}
+        assert frame["seq"] == 1 and patches == {"t1": {"progress": 50}, "t2": {"duration": 16}}
+        assert worker_a.metrics["coalesced"] == 4
+        print("✅ Burst of 7 updates sent as one frame with only the changed fields")
+
+        # The other worker continues the same project sequence
+        worker_b.submit(project_id, "t1", task("t1", progress=50), task("t1", progress=60), "bob")
+        await asyncio.sleep(WINDOW_SECONDS * 3)
+        worker_a.submit(project_id, "t2", task("t2", duration=16), task("t2", duration=24), "alice")
+        await asyncio.sleep(WINDOW_SECONDS * 3)
+        assert [frame["seq"] for frame in sent_b] == [2]
+        assert [frame["seq"] for frame in sent_a] == [1, 3]
+        print("✅ Workers share one sequence per project")
+
+        for worker in (worker_a, worker_b):
+            replayed = await worker.replay(project_id, 1)
+            assert [frame["seq"] for frame in replayed] == [2, 3]
+            assert replayed[0]["patches"][0]["changes"] == {"progress": 60}
+        assert await worker_b.replay(project_id, 3) == []
+        print("✅ Missed frames replayed in order by either worker")
+
+    finally:
+        await db.timeline_patches.delete_many({"project_id": project_id})
+        await db.timeline_sequences.delete_one({"_id": project_id})
+        await close_mongo_connection()
+
+async def test_unreplayable_gaps_and_conflicts():
+    """Too long or expired gaps return None; recomputed conflicts are always sent"""
+    await connect_to_mongo()
+    db = await get_database()
+    project_id = f"patch-test-{uuid.uuid4()}"
+
+    try:
+        sent = []
+        worker = make_worker(sent, replay_limit=3)
+        for duration in range(1, 6):
+            worker.submit(project_id, "t1", task("t1", duration=duration - 1), task("t1", duration=duration), "alice")
+            await asyncio.sleep(WINDOW_SECONDS * 3)
+        assert [frame["seq"] for frame in sent] == [1, 2, 3, 4, 5]
+
+        assert await worker.replay(project_id, 0) is None, "Gap beyond the replay limit must resync"
+        assert len(await worker.replay(project_id, 2)) == 3
+        await db.timeline_patches.delete_one({"project_id": project_id, "seq": 4})
+        assert await worker.replay(project_id, 2) is None, "Expired frame must resync"
+        print("✅ Gaps over the replay limit or with expired frames require a resync")
+
+        # Unchanged conflicts are still sent: another worker may have sent different ones since
+        conflicts = [{"type": "dependency", "affected_tasks": ["t1", "t2"]}]
+        for _ in range(2):
+            worker.submit(project_id, "t1", task("t1"), task("t1"), "alice", conflicts=conflicts)
+            await asyncio.sleep(WINDOW_SECONDS * 3)
+        assert [frame["patches"][0]["changes"] for frame in sent[-2:]] == [{"conflicts": conflicts}] * 2
+        worker.submit(project_id, "t1", task("t1"), task("t1"), "alice", conflicts=[])
+        await asyncio.sleep(WINDOW_SECONDS * 3)
+        assert sent[-1]["patches"][0]["changes"] == {"conflicts": []}, "Cleared conflicts were not sent"
+        print("✅ Recomputed conflicts sent every time, including when cleared")
+
+    finally:
+        await db.timeline_patches.delete_many({"project_id": project_id})
+        await db.timeline_sequences.delete_one({"_id": project_id})
+        await close_mongo_connection()
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+async def test_reconnect_replays_before_live_frames():
+    """Replayed patches are queued ahead of patches flushed while the client connects"""
+    await connect_to_mongo()
+    db = await get_database()
+    project_id = f"patch-test-{uuid.uuid4()}"
+
+    try:
+        manager = EnhancedTimelineConnectionManager()
+        manager.patches.window_seconds = WINDOW_SECONDS
+        for duration in range(1, 4):
+            manager.patches.submit(project_id, "t1", task("t1", duration=duration - 1), task("t1", duration=duration), "alice")
+            await asyncio.sleep(WINDOW_SECONDS * 3)
+
+        websocket = FakeWebSocket()
+        # A live patch lands while the reconnecting client is being registered
+        manager.patches.submit(project_id, "t1", task("t1", duration=3), task("t1", duration=4), "alice")
+        channel = await manager.connect(websocket, project_id, "bob", since=1)
+        await asyncio.sleep(WINDOW_SECONDS * 3)
+        patches = [frame["seq"] for frame in websocket.frames if frame["type"] == "task_patch"]
+        assert patches == [2, 3, 4], f"Replay must precede live patches: {patches}"
+        print("✅ Reconnecting client replayed 2-3 before the live patch 4")
+
+        stale = FakeWebSocket()
+        await db.timeline_patches.delete_one({"project_id": project_id, "seq": 1})
+        stale_channel = await manager.connect(stale, project_id, "carol", since=0)
+        await asyncio.sleep(0.01)
+        assert stale.frames[0]["type"] == "resync_required" and stale.frames[0]["seq"] == 4
+        print("✅ Unreplayable gap answered with resync_required and the current sequence")
+
+        await manager.disconnect(channel)
+        await manager.disconnect(stale_channel)
+
+    finally:
+        await db.timeline_patches.delete_many({"project_id": project_id})
+        await db.timeline_sequences.delete_one({"_id": project_id})
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(test_patches_coalesce_and_replay())
+    asyncio.run(test_unreplayable_gaps_and_conflicts())
+    asyncio.run(test_reconnect_replays_before_live_frames())
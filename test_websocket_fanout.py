@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Tests for WebSocket fan-out
+
+Uses in-memory broadcast buses (one per simulated worker) and the in-memory
+presence store: slow-consumer policies, writer failure and idle reaping,
+relaying broadcasts between workers, shared presence, and ring-buffer
+replay of a collaboration session's frames, which is per worker.
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+
+os.environ.setdefault("BROADCAST_BUS_BACKEND", "memory")
+os.environ.setdefault("PRESENCE_BACKEND", "memory")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from ai_ml.realtime_collaboration import RealTimeCollaborationEngine, SessionEventLog
+from services.broadcast_bus import InMemoryBroadcastBus
+from services.presence_store import InMemoryPresenceStore
+from services.websocket_fanout import (
+    IDLE_CLOSE_CODE, SEND_FAILURE_CLOSE_CODE, SLOW_CONSUMER_CLOSE_CODE, WebSocketFanout
+)
+
+class FakeWebSocket:
+    """Records frames; sends can be held back to simulate a slow client, or fail"""
+
+    def __init__(self, fail: bool = False):
+        self.frames = []
+        self.fail = fail
+        self.close_code = None
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise ConnectionResetError("connection reset by peer")
+        await self.flowing.wait()
+        self.frames.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+def make_fanout(name: str, **kwargs) -> WebSocketFanout:
+    """A fan-out playing one worker, with its own bus and the shared presence store"""
+    return WebSocketFanout(name, bus=InMemoryBroadcastBus(), presence=InMemoryPresenceStore(), send_timeout=5, **kwargs)
+
+async def flood(fanout: WebSocketFanout, group: str, count: int, coalesce_key=None):
+    """Broadcast numbered frames once the writer is blocked on the first"""
+    await fanout.broadcast(group, {"type": "update", "n": 0}, coalesce_key=coalesce_key)
+    await asyncio.sleep(0.01)
+    for n in range(1, count):
+        await fanout.broadcast(group, {"type": "update", "n": n}, coalesce_key=coalesce_key)
+
+async def drain(websocket: FakeWebSocket):
+    websocket.flowing.set()
+    await asyncio.sleep(0.02)
+    return [frame["n"] for frame in websocket.frames if frame["type"] == "update"]
+
+async def test_slow_consumer_policies():
+    """Each policy decides what gives way when a client's queue is full"""
+    name = f"test-policies-{uuid.uuid4().hex[:6]}"
+
+    fanout = make_fanout(f"{name}-drop", max_queue=3, policy="drop")
+    websocket = FakeWebSocket()
+    websocket.flowing.clear()
+    channel = await fanout.register(websocket, "project", "slow-user")
+    await flood(fanout, "project", 10)
+    assert await drain(websocket) == [0, 1, 2, 3], "drop should keep the oldest queued frames"
+    assert channel.dropped == 6 and not channel.closed
+    print("✅ drop: new frames discarded once the queue is full")
+
+    fanout = make_fanout(f"{name}-coalesce", max_queue=3, policy="coalesce")
+    websocket = FakeWebSocket()
+    websocket.flowing.clear()
+    await fanout.register(websocket, "project", "slow-user")
+    await flood(fanout, "project", 10, coalesce_key="cursor:someone")
+    assert await drain(websocket) == [0, 9], "coalesce should keep only the latest keyed frame"
+    assert fanout.metrics["coalesced"] == 8
+
+    websocket = FakeWebSocket()
+    websocket.flowing.clear()
+    await fanout.register(websocket, "other-project", "slow-user")
+    await flood(fanout, "other-project", 10)
+    assert await drain(websocket) == [0, 7, 8, 9], "coalesce should drop the oldest unkeyed frames"
+    print("✅ coalesce: keyed frames merge, unkeyed frames displace the oldest")
+
+    fanout = make_fanout(f"{name}-disconnect", max_queue=3, policy="disconnect")
+    websocket = FakeWebSocket()
+    websocket.flowing.clear()
+    channel = await fanout.register(websocket, "project", "slow-user")
+    await flood(fanout, "project", 10)
+    await asyncio.sleep(0.01)
+    assert channel.closed and websocket.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert fanout.metrics["slow_disconnects"] == 1 and not fanout.group_channels("project")
+    print("✅ disconnect: slow client closed with 1013 and unindexed")
+
+async def test_failed_writer_closes_socket():
+    """A failed send closes the socket as well as the channel; silent clients are reaped"""
+    fanout = make_fanout(f"test-failures-{uuid.uuid4().hex[:6]}")
+    healthy, broken = FakeWebSocket(), FakeWebSocket(fail=True)
+    await fanout.register(healthy, "project", "healthy-user")
+    broken_channel = await fanout.register(broken, "project", "broken-user")
+
+    await fanout.broadcast("project", {"type": "update", "n": 1})
+    await asyncio.sleep(0.02)
+    assert broken_channel.closed and broken.close_code == SEND_FAILURE_CLOSE_CODE
+    assert fanout.metrics["send_errors"] == 1
+    assert [channel.user_id for channel in fanout.group_channels("project")] == ["healthy-user"]
+    assert [frame["n"] for frame in healthy.frames] == [1]
+    print("✅ Failed send closed that socket with 1011; other clients unaffected")
+
+    fanout = make_fanout(f"test-idle-{uuid.uuid4().hex[:6]}", heartbeat_interval=0.02, idle_timeout=0.05)
+    quiet, chatty = FakeWebSocket(), FakeWebSocket()
+    quiet_channel = await fanout.register(quiet, "project", "quiet-user")
+    chatty_channel = await fanout.register(chatty, "project", "chatty-user")
+    for _ in range(6):
+        await asyncio.sleep(0.02)
+        chatty_channel.touch()
+    assert quiet_channel.closed and quiet.close_code == IDLE_CLOSE_CODE
+    assert not chatty_channel.closed and any(frame["type"] == "heartbeat" for frame in chatty.frames)
+    print("✅ Client silent past the idle timeout closed with 4408")
+
+async def test_cross_worker_relay_and_presence():
+    """Broadcasts and direct messages reach connections held by other workers"""
+    name = f"test-relay-{uuid.uuid4().hex[:6]}"
+    worker_a, worker_b = make_fanout(name), make_fanout(name)
+    alice, bob, bob_other_tab = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await worker_a.register(alice, "project", "alice")
+    bob_channel = await worker_b.register(bob, "project", "bob")
+    await worker_a.register(bob_other_tab, "project", "bob")
+
+    delivered = await worker_a.broadcast("project", {"type": "update", "n": 1}, exclude_user="alice")
+    await worker_b.send_to_user("alice", {"type": "direct", "n": 2})
+    await asyncio.sleep(0.02)
+    assert delivered == 1, "Only bob's tab on worker A is local"
+    assert [frame["n"] for frame in bob.frames] == [1], "Broadcast was not relayed to worker B"
+    assert [frame["n"] for frame in bob_other_tab.frames] == [1]
+    assert [frame["n"] for frame in alice.frames] == [2], "exclude_user or the user relay misbehaved"
+    assert worker_a.metrics["relayed_out"] == 1 and worker_b.metrics["relayed_in"] == 1
+    print("✅ Broadcasts and direct messages relayed between workers, exclusions honoured")
+
+    members = await worker_b.members("project")
+    assert sorted(member["user_id"] for member in members) == ["alice", "bob", "bob"]
+    assert await worker_a.user_connection_count("project", "bob") == 2
+    await worker_b.unregister(bob_channel)
+    assert await worker_a.user_connection_count("project", "bob") == 1
+    print("✅ Presence shows connections on every worker and drops closed ones")
+
+async def test_ring_buffer_replay():
+    """A reconnecting client replays missed frames from the session's ring buffer"""
+    log = SessionEventLog(size=5)
+    fanout = make_fanout(f"test-replay-{uuid.uuid4().hex[:6]}", sequencer=lambda group, message: log.append(message))
+
+    first = FakeWebSocket()
+    first_channel = await fanout.register(first, "session", "alice")
+    for n in range(1, 5):
+        await fanout.broadcast("session", {"type": "update", "n": n})
+    await asyncio.sleep(0.02)
+    last_seen = first.frames[1]["seq"]
+    await fanout.unregister(first_channel)
+
+    for n in range(5, 7):
+        await fanout.broadcast("session", {"type": "update", "n": n})
+    backlog = log.frames_since(last_seen, log.epoch)
+    assert [json.loads(text)["n"] for text in backlog] == [3, 4, 5, 6]
+
+    second = FakeWebSocket()
+    await fanout.register(second, "session", "alice", backlog=backlog)
+    await fanout.broadcast("session", {"type": "update", "n": 7})
+    await asyncio.sleep(0.02)
+    assert [frame["n"] for frame in second.frames] == [3, 4, 5, 6, 7], "Replay must precede new frames"
+    assert [frame["seq"] for frame in second.frames] == list(range(last_seen + 1, last_seen + 6))
+    print("✅ Missed frames replayed in order ahead of new broadcasts")
+
+    assert log.frames_since(0, log.epoch) is None, "Evicted frames cannot be replayed"
+    assert log.frames_since(last_seen, "another-epoch") is None, "Another worker's sequence is meaningless here"
+    assert log.frames_since(log.seq + 1, log.epoch) is None
+    assert log.frames_since(log.seq, log.epoch) == []
+    print("✅ Evicted frames, foreign epochs and future sequences require a resync")
+
+async def test_replay_is_per_worker():
+    """A collaboration client resuming on another worker is told to resync, then replays there"""
+    name = f"test-collab-{uuid.uuid4().hex[:6]}"
+    workers = []
+    for _ in range(2):
+        engine = RealTimeCollaborationEngine()
+        engine.fanout = make_fanout(name, sequencer=engine._sequence_frame)
+        workers.append(engine)
+    worker_a, worker_b = workers
+
+    first = FakeWebSocket()
+    channel = await worker_a.connect_user(first, "alice", "session")
+    await worker_a.broadcast_to_session("session", {"type": "update", "n": 1})
+    await asyncio.sleep(0.02)
+    last_frame = first.frames[-1]
+    await worker_a.disconnect_user(channel)
+
+    # Sequence numbers and epochs are assigned by each worker, so worker B cannot interpret A's
+    second = FakeWebSocket()
+    channel = await worker_b.connect_user(second, "alice", "session", since=last_frame["seq"], epoch=last_frame["epoch"])
+    await asyncio.sleep(0.02)
+    resync = second.frames[0]
+    log_b = worker_b.session_log("session")
+    assert resync["type"] == "resync_required" and resync["epoch"] == log_b.epoch != last_frame["epoch"]
+    print("✅ Resuming on another worker answered with resync_required and that worker's epoch")
+
+    await worker_b.disconnect_user(channel)
+    await worker_a.broadcast_to_session("session", {"type": "update", "n": 2})
+    await asyncio.sleep(0.02)
+    third = FakeWebSocket()
+    await worker_b.connect_user(third, "alice", "session", since=resync["seq"], epoch=resync["epoch"])
+    await asyncio.sleep(0.02)
+    assert 2 in [frame.get("n") for frame in third.frames], "Frames missed on the same worker were not replayed"
+    print("✅ Continuing from that epoch replays on the worker that issued it")
+
+if __name__ == "__main__":
+    asyncio.run(test_slow_consumer_policies())
+    asyncio.run(test_failed_writer_closes_socket())
+    asyncio.run(test_cross_worker_relay_and_presence())
+    asyncio.run(test_ring_buffer_replay())
+    asyncio.run(test_replay_is_per_worker())